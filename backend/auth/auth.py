@@ -1,141 +1,167 @@
 from flask import Blueprint, request, jsonify
-from models import SessionLocal, User
+from models import User
+from db import get_session
+from .principal import Principal, UserRecordCache
 import jwt
 from config import Config
+from responses import compress_response
 import datetime
 from functools import wraps
 
 auth_bp = Blueprint('auth',__name__)
+auth_bp.after_request(compress_response)
+
+# Версии токенов пользователей для быстрого режима аутентификации
+user_records = UserRecordCache(Config.AUTH_USER_CACHE_TTL)
+
+def create_token(user):
+    return jwt.encode(
+        {
+            'id': user.id,
+            'login': user.login,
+            'name': user.name,
+            'surname': user.surname,
+            'ver': user.token_version or 0,
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
+        },
+        Config.SECRET_KEY,
+        algorithm="HS256"
+    )
 
 @auth_bp.route('/register', methods = ['POST'])
 def register():
     data = request.get_json()
-    session = SessionLocal()
-    try:
-        if session.query(User).filter_by(login=data['login']).first():
-                return jsonify({'error': 'Login already exists'}), 400
-            
-        user = User(
-            login=data['login'],
-            password=data['password'],
-            name=data['name'],
-            surname=data['surname']
-        )
-            
-        session.add(user)
-        session.commit()
-        return jsonify({'message': 'User created successfully'}), 201
-    finally:
-        session.close()
+    session = get_session()
+    if session.query(User).filter_by(login=data['login']).first():
+            return jsonify({'error': 'Login already exists'}), 400
+        
+    user = User(
+        login=data['login'],
+        password=data['password'],
+        name=data['name'],
+        surname=data['surname']
+    )
+        
+    session.add(user)
+    session.commit()
+    return jsonify({'message': 'User created successfully'}), 201
 
 @auth_bp.route('/login', methods = ['POST'])
 def login():
     data = request.get_json()
-    session = SessionLocal()
+    session = get_session()
 
-    try:
-        user = session.query(User).filter_by(login=data['login']).first()
-        
-        if not user or user.password != data['password']:
-            return jsonify({'error': 'Invalid credentials'}), 401
-        
-        # Generate JWT token
-        token = jwt.encode(
-            {
-                'id': user.id,
-                'login': user.login,
-                'name': user.name,
-                'surname': user.surname,
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-            },
-            Config.SECRET_KEY,
-            algorithm="HS256"
-        )
-        
-        return jsonify({
-            'token': token,
-            'login': user.login,
-            'name':user.name,
-            'surname':user.surname,
-            'score':user.score
-        }), 200
-    finally:
-        session.close()
+    user = session.query(User).filter_by(login=data['login']).first()
+    
+    if not user or user.password != data['password']:
+        return jsonify({'error': 'Invalid credentials'}), 401
+    
+    # Generate JWT token
+    token = create_token(user)
+    
+    return jsonify({
+        'token': token,
+        'login': user.login,
+        'name':user.name,
+        'surname':user.surname,
+        'score':user.score
+    }), 200
 
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
     return jsonify({'message': 'Logged out successfully'}), 200
 
+def principal_from_claims(data):
+    """
+    Быстрый режим: данные пользователя берутся из подписанного токена,
+    из базы читается только версия токена, и то лишь при промахе кэша
+    """
+    record = user_records.get(data['id'])
+    if record is None:
+        row = get_session().query(User.token_version).filter_by(id=data['id']).first()
+        if not row:
+            return None
+        record = user_records.set(data['id'], row.token_version or 0)
+    return Principal(data['id'], data.get('login'), data.get('name'), data.get('surname'), record.token_version)
+
+def principal_from_db(data):
+    user = get_session().query(User).filter_by(id=data['id']).first()
+    return Principal.from_user(user) if user else None
+
 def token_required(f):
+    """
+    Передает в обработчик Principal текущего пользователя.
+    При AUTH_FAST_PATH запрос к users выполняется только при промахе кэша версий токенов
+    """
     @wraps(f)
     def decorated(*args, **kwargs):
-        session = SessionLocal()
+        auth_header = request.headers.get('Authorization')
+        if auth_header and auth_header.startswith('Bearer'):
+            token = auth_header.split(' ')[1]  
+        else:
+            return jsonify({"message": "Token is missing!"}), 403
+
         try:
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer'):
-                token = auth_header.split(' ')[1]  
+            data = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
+            if Config.AUTH_FAST_PATH:
+                current_user = principal_from_claims(data)
             else:
-                return jsonify({"message": "Token is missing!"}), 403
-
-            try:
-                data = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"])
-                current_user = session.query(User).filter_by(id=data['id']).first()
-                if not current_user:
-                    return jsonify({"message": "User not found!"}), 403
-            except Exception as e:
-                return jsonify({"message": f"Token is invalid! {str(e)}"}), 403
-            
-            return f(current_user, *args, **kwargs)
-        finally:
-            session.close()
+                current_user = principal_from_db(data)
+            if not current_user:
+                return jsonify({"message": "User not found!"}), 403
+        except Exception as e:
+            return jsonify({"message": f"Token is invalid! {str(e)}"}), 403
+        
+        # Токены, выданные до смены данных пользователя, отзываются
+        if current_user.token_version != data.get('ver', 0):
+            return jsonify({"message": "Token has been revoked!"}), 403
+        
+        return f(current_user, *args, **kwargs)
     return decorated
 
 @auth_bp.route('/change_user_data', methods=['POST'])
 @token_required
 def change_user_data(current_user):
-    session = SessionLocal()
+    session = get_session()
     try:
         data = request.get_json()
-        
+        user = current_user.user
+        if user is None:
+            # В быстром режиме пользователь мог быть удален после выдачи токена
+            user_records.invalidate(current_user.id)
+            return jsonify({"message": "User not found!"}), 401
+
         # Проверяем, какие поля нужно обновить
         if 'name' in data:
-            current_user.name = data['name']
+            user.name = data['name']
         if 'surname' in data:
-            current_user.surname = data['surname']
+            user.surname = data['surname']
         if 'login' in data:
             # Проверяем, не занят ли уже такой логин
             existing_user = session.query(User).filter_by(login=data['login']).first()
-            if existing_user and existing_user.id != current_user.id:
+            if existing_user and existing_user.id != user.id:
                 return jsonify({"message": "Логин уже занят"}), 400
-            current_user.login = data['login']
+            user.login = data['login']
         if 'password' in data and data['password']:
-            current_user.password = data['password']
+            user.password = data['password']
+            
+        # Старые токены с прежними данными перестают приниматься
+        user.token_version = (user.token_version or 0) + 1
             
         session.commit()
+        user_records.invalidate(user.id)
         
         # Создаем новый токен с обновленными данными
-        token = jwt.encode(
-            {
-                'id': current_user.id,
-                'login': current_user.login,
-                'name': current_user.name,
-                'surname': current_user.surname,
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-            },
-            Config.SECRET_KEY,
-            algorithm="HS256"
-        )
+        token = create_token(user)
         
         return jsonify({
             'token': token,
-            'login': current_user.login,
-            'name': current_user.name,
-            'surname': current_user.surname,
-            'score': current_user.score,
+            'login': user.login,
+            'name': user.name,
+            'surname': user.surname,
+            'score': user.score,
             'message': 'Данные пользователя успешно обновлены'
         }), 200
     except Exception as e:
         session.rollback()
         return jsonify({"message": f"Ошибка при обновлении данных: {str(e)}"}), 500
-    finally:
-        session.close()
@@ -0,0 +1,73 @@
+import threading
+import time
+from typing import Optional
+from models import User
+from db import get_session
+
+
+class Principal:
+    """
+    Легковесный пользователь запроса, собранный из подписанных claims токена.
+    Полная запись User загружается только при обращении к .user
+    """
+    __slots__ = ('id', 'login', 'name', 'surname', 'token_version', '_user')
+
+    def __init__(self, id: str, login: str, name: str, surname: str, token_version: int, user: Optional[User] = None):
+        self.id = id
+        self.login = login
+        self.name = name
+        self.surname = surname
+        self.token_version = token_version
+        self._user = user
+
+    @classmethod
+    def from_user(cls, user: User) -> 'Principal':
+        return cls(user.id, user.login, user.name, user.surname, user.token_version or 0, user)
+
+    @property
+    def user(self) -> Optional[User]:
+        if self._user is None:
+            self._user = get_session().query(User).filter_by(id=self.id).first()
+        return self._user
+
+
+class UserRecord:
+    __slots__ = ('token_version', 'expires_at')
+
+    def __init__(self, token_version: int, expires_at: float):
+        self.token_version = token_version
+        self.expires_at = expires_at
+
+
+class UserRecordCache:
+    """
+    TTL кэш версий токенов пользователей внутри процесса.
+    После смены версии в другом воркере старый токен перестает приниматься
+    не позже чем через ttl секунд
+    """
+    def __init__(self, ttl: int = 30, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[UserRecord]:
+        record = self._records.get(user_id)
+        if record is None or record.expires_at < time.monotonic():
+            return None
+        return record
+
+    def set(self, user_id: str, token_version: int) -> UserRecord:
+        with self._lock:
+            if len(self._records) >= self.max_size:
+                now = time.monotonic()
+                self._records = {key: value for key, value in self._records.items() if value.expires_at >= now}
+                if len(self._records) >= self.max_size:
+                    self._records.clear()
+            record = UserRecord(token_version, time.monotonic() + self.ttl)
+            self._records[user_id] = record
+            return record
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._records.pop(user_id, None)
@@ -0,0 +1,59 @@
+"""
+Активность пользователя: прежний GROUP BY date(completed_at) по test_result
+против чтения дневных итогов user_activity_daily
+"""
+import random
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import func
+from common import SessionLocal, measure
+from models import User, TestResult
+from quiz.activity import backfill_activity, load_activity, tests_count
+
+USERS = 200
+RESULTS_PER_USER = 500
+
+
+def main():
+    random.seed(1)
+    session = SessionLocal()
+    now = datetime.utcnow()
+    user_ids = [str(uuid4()) for _ in range(USERS)]
+    session.execute(User.__table__.insert(), [
+        {'id': user_id, 'login': user_id, 'password': 'p', 'name': 'n', 'surname': 's', 'score': 0}
+        for user_id in user_ids
+    ])
+    session.execute(TestResult.__table__.insert(), [
+        {'id': str(uuid4()), 'user_id': user_id, 'score': random.randrange(100),
+         'completed_at': now - timedelta(minutes=random.randrange(365 * 24 * 60))}
+        for user_id in user_ids for _ in range(RESULTS_PER_USER)
+    ])
+    session.commit()
+    print(f"backfill: {backfill_activity(session)} daily rows from {USERS * RESULTS_PER_USER} results")
+    session.commit()
+
+    user_id = user_ids[0]
+    today = now.date()
+    since = today - timedelta(days=89)
+
+    def group_by():
+        rows = (
+            session.query(func.date(TestResult.completed_at), func.count(TestResult.id))
+            .filter(TestResult.user_id == user_id, TestResult.completed_at >= since)
+            .group_by(func.date(TestResult.completed_at))
+            .all()
+        )
+        counts = {str(day): count for day, count in rows}
+        return [{'date': (since + timedelta(days=i)).isoformat(), 'count': counts.get((since + timedelta(days=i)).isoformat(), 0)} for i in range(90)]
+
+    print(f"GROUP BY test_result, 90 days:   {measure(group_by, 200):.3f} ms")
+    print(f"user_activity_daily, 90 days:    {measure(lambda: load_activity(session, user_id, since, today), 200):.3f} ms")
+    print(f"user_activity_daily, year/week:  {measure(lambda: load_activity(session, user_id, today - timedelta(days=364), today, 'week'), 200):.3f} ms")
+    count_all = lambda: session.query(func.count(TestResult.id)).filter(TestResult.user_id == user_id).scalar()
+    print(f"tests count, COUNT(*):           {measure(count_all, 200):.3f} ms")
+    print(f"tests count, rollup SUM:         {measure(lambda: tests_count(session, user_id), 200):.3f} ms")
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
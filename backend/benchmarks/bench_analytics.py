@@ -0,0 +1,81 @@
+"""
+Аналитика викторины по ~1 млн ответов: агрегаты SQL GROUP BY
+(выбор вариантов и доля верных ответов по вопросам) против загрузки
+ответов в матрицу numpy, ее пересчета и чтения из кэша
+"""
+import random
+import time
+from uuid import uuid4
+from sqlalchemy import func
+from common import SessionLocal, seed_quiz, measure
+from models import User, TestResult, AttemptAnswer, Options, Question
+from quiz.analytics import QuizAnalyticsService
+
+ATTEMPTS = 50000
+QUESTIONS = 20
+BATCH = 50000
+
+
+def main():
+    random.seed(1)
+    session = SessionLocal()
+    quiz_id = seed_quiz(session, QUESTIONS)
+    user_id = str(uuid4())
+    session.execute(User.__table__.insert(), [{'id': user_id, 'login': user_id, 'password': 'p', 'name': 'n', 'surname': 's', 'score': 0}])
+    options = {}
+    for question_id, option_id in session.query(Options.question_id, Options.id).join(Question).filter(Question.quiz_id == quiz_id).order_by(Options.id):
+        options.setdefault(question_id, []).append(option_id)
+
+    started = time.perf_counter()
+    results = []
+    answers = []
+    for _ in range(ATTEMPTS):
+        test_result_id = str(uuid4())
+        results.append({'id': test_result_id, 'user_id': user_id, 'quiz_id': quiz_id, 'score': random.randrange(QUESTIONS * 100)})
+        for question_id, option_ids in options.items():
+            answers.append({'test_result_id': test_result_id, 'question_id': question_id,
+                            'option_ids': [random.choice(option_ids)], 'text_answer': None})
+        if len(answers) >= BATCH:
+            session.execute(TestResult.__table__.insert(), results)
+            session.execute(AttemptAnswer.__table__.insert(), answers)
+            results, answers = [], []
+    if results:
+        session.execute(TestResult.__table__.insert(), results)
+        session.execute(AttemptAnswer.__table__.insert(), answers)
+    session.commit()
+    print(f"seed: {ATTEMPTS} attempts, {ATTEMPTS * QUESTIONS} answers in {time.perf_counter() - started:.1f} s")
+
+    # В бенчмарке все вопросы с одним ответом, поэтому option_ids - ровно один ID
+    # и SQL может группировать по нему напрямую
+    def group_by():
+        option_counts = (
+            session.query(AttemptAnswer.option_ids, func.count())
+            .join(TestResult, TestResult.id == AttemptAnswer.test_result_id)
+            .filter(TestResult.quiz_id == quiz_id)
+            .group_by(AttemptAnswer.option_ids)
+            .all()
+        )
+        correct = (
+            session.query(AttemptAnswer.question_id, func.count(), func.sum(Options.is_correct))
+            .join(TestResult, TestResult.id == AttemptAnswer.test_result_id)
+            .join(Options, Options.id == AttemptAnswer.option_ids)
+            .filter(TestResult.quiz_id == quiz_id)
+            .group_by(AttemptAnswer.question_id)
+            .all()
+        )
+        return option_counts, correct
+
+    service = QuizAnalyticsService(max_size=4, refresh_interval=3600)
+    print(f"SQL GROUP BY (counts + correctness): {measure(group_by, 3):.1f} ms")
+
+    stats = service.get(session, quiz_id)
+    print(f"numpy load from DB:                  {stats['load_ms']:.1f} ms")
+    print(f"numpy compute (full item analysis):  {stats['compute_ms']:.1f} ms")
+    matrix = service._entries[quiz_id]['matrix']
+    print(f"numpy recompute:                     {measure(matrix.compute, 5):.1f} ms")
+    print(f"cached get:                          {measure(lambda: service.get(session, quiz_id), 1000) * 1000:.1f} us")
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
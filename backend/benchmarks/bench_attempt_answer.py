@@ -0,0 +1,154 @@
+"""
+Хранение ответов: прежняя схема user_answer (строка на каждый выбранный
+вариант со своим UUID) против attempt_answer (строка на вопрос попытки,
+варианты списком). Размер таблиц с индексами, скорость записи и чтения
+ответов попыток
+"""
+import random
+import time
+from uuid import uuid4
+from sqlalchemy import text
+from common import SessionLocal, engine, ensure_category, measure
+from models import User, TestResult, UserAnswer, AttemptAnswer, Quiz, Question, Options, QuestionType
+
+ATTEMPTS = 20000
+# Вопросы викторины: (тип, число вариантов, сколько вариантов выбирают)
+LAYOUT = [(QuestionType.SINGLE, 4, 1)] * 10 + [(QuestionType.MULTIPLE, 5, 3)] * 5 + [(QuestionType.TEXT_ANSWER, 1, 0)] * 5
+BATCH = 20000
+READ_ATTEMPTS = 200
+
+
+def seed_quiz(session):
+    category = ensure_category(session)
+    quiz = Quiz(id=str(uuid4()), title='Bench answers', description='bench', category_id=category.id)
+    session.add(quiz)
+    questions = []
+    for i, (question_type, options_count, picks) in enumerate(LAYOUT):
+        question = Question(id=str(uuid4()), question_type=question_type, quiz_id=quiz.id, points=100, question=f'Вопрос {i}?')
+        session.add(question)
+        option_ids = [str(uuid4()) for _ in range(options_count)]
+        for j, option_id in enumerate(option_ids):
+            session.add(Options(id=option_id, question_id=question.id, name=f'Вариант {j}', is_correct=j == 0))
+        questions.append((question.id, question_type, option_ids, picks))
+    session.commit()
+    return quiz.id, questions
+
+
+def legacy_rows(user_id, test_result_id, answers):
+    rows = []
+    for question_id, option_ids, text_answer in answers:
+        if text_answer is not None:
+            rows.append({'id': str(uuid4()), 'user_id': user_id, 'question_id': question_id,
+                         'option_id': None, 'text_answer': text_answer, 'test_result_id': test_result_id})
+        for option_id in option_ids:
+            rows.append({'id': str(uuid4()), 'user_id': user_id, 'question_id': question_id,
+                         'option_id': option_id, 'text_answer': None, 'test_result_id': test_result_id})
+    return rows
+
+
+def attempt_rows(test_result_id, answers):
+    return [{'test_result_id': test_result_id, 'question_id': question_id,
+             'option_ids': option_ids or None, 'text_answer': text_answer}
+            for question_id, option_ids, text_answer in answers]
+
+
+def table_bytes(session, table: str) -> int:
+    """
+    Размер таблицы вместе с индексами в Postgres
+    """
+    return session.execute(text('SELECT pg_total_relation_size(:table)'), {'table': table}).scalar()
+
+
+def database_bytes(session) -> int:
+    """
+    Размер файла SQLite: без dbstat размер таблицы оценивается по приросту числа страниц
+    """
+    page_size = session.execute(text('PRAGMA page_size')).scalar()
+    return session.execute(text('PRAGMA page_count')).scalar() * page_size
+
+
+def write(session, table, attempts, build):
+    size_before = database_bytes(session) if engine.dialect.name == 'sqlite' else None
+    started = time.perf_counter()
+    rows = 0
+    batch = []
+    for attempt in attempts:
+        batch.extend(build(attempt))
+        if len(batch) >= BATCH:
+            session.execute(table.insert(), batch)
+            rows += len(batch)
+            batch = []
+    if batch:
+        session.execute(table.insert(), batch)
+        rows += len(batch)
+    session.commit()
+    seconds = time.perf_counter() - started
+    if size_before is None:
+        size = table_bytes(session, table.name)
+    else:
+        size = database_bytes(session) - size_before
+    return rows, seconds, size
+
+
+def main():
+    random.seed(1)
+    session = SessionLocal()
+    quiz_id, questions = seed_quiz(session)
+    user_id = str(uuid4())
+    session.execute(User.__table__.insert(), [{'id': user_id, 'login': user_id, 'password': 'p', 'name': 'n', 'surname': 's', 'score': 0}])
+
+    attempts = []
+    for _ in range(ATTEMPTS):
+        answers = []
+        for question_id, question_type, option_ids, picks in questions:
+            if question_type == QuestionType.TEXT_ANSWER:
+                answers.append((question_id, [], random.choice(['Париж', 'Лондон', 'Берлин'])))
+            else:
+                answers.append((question_id, random.sample(option_ids, picks), None))
+        attempts.append((str(uuid4()), answers))
+    session.execute(TestResult.__table__.insert(), [
+        {'id': test_result_id, 'user_id': user_id, 'quiz_id': quiz_id, 'score': 0} for test_result_id, _ in attempts
+    ])
+    session.commit()
+
+    legacy = write(session, UserAnswer.__table__, attempts, lambda attempt: legacy_rows(user_id, attempt[0], attempt[1]))
+    compact = write(session, AttemptAnswer.__table__, attempts, lambda attempt: attempt_rows(attempt[0], attempt[1]))
+    for name, (rows, seconds, size) in (('user_answer', legacy), ('attempt_answer', compact)):
+        print(f"{name:15} {rows:>8} rows  {size / 1024 / 1024:8.1f} MiB  {size / ATTEMPTS:7.0f} B/attempt  "
+              f"write {rows / seconds:>9.0f} rows/s  {ATTEMPTS / seconds:>7.0f} attempts/s")
+
+    sample = [test_result_id for test_result_id, _ in random.sample(attempts, READ_ATTEMPTS)]
+
+    def read_legacy():
+        answers = {}
+        for test_result_id in sample:
+            rows = session.query(UserAnswer.question_id, UserAnswer.option_id, UserAnswer.text_answer) \
+                .filter(UserAnswer.test_result_id == test_result_id).all()
+            by_question = answers.setdefault(test_result_id, {})
+            for question_id, option_id, text_answer in rows:
+                answer = by_question.setdefault(question_id, {'option_ids': [], 'text_answer': None})
+                if option_id is not None:
+                    answer['option_ids'].append(option_id)
+                if text_answer is not None:
+                    answer['text_answer'] = text_answer
+        return answers
+
+    def read_compact():
+        answers = {}
+        for test_result_id in sample:
+            rows = session.query(AttemptAnswer.question_id, AttemptAnswer.option_ids, AttemptAnswer.text_answer) \
+                .filter(AttemptAnswer.test_result_id == test_result_id).all()
+            answers[test_result_id] = {
+                question_id: {'option_ids': option_ids or [], 'text_answer': text_answer}
+                for question_id, option_ids, text_answer in rows
+            }
+        return answers
+
+    assert read_legacy() == read_compact()
+    print(f"read {READ_ATTEMPTS} attempts, user_answer:    {measure(read_legacy, 5):.1f} ms")
+    print(f"read {READ_ATTEMPTS} attempts, attempt_answer: {measure(read_compact, 5):.1f} ms")
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
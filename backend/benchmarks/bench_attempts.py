@@ -0,0 +1,88 @@
+"""
+Прохождение большой викторины: GET всей викторины (с is_correct) и одна
+отправка submit-answers против попытки - страницы вопросов без ответов,
+сохранение ответов по странице в локальный SQLite и одна запись при завершении
+"""
+import json
+import os
+import tempfile
+import time
+from common import SessionLocal, QueryCounter, ensure_category
+from ids import new_id
+from quiz.attempts import AttemptStore, PublicQuizCache
+from quiz.loader import load_quiz_tree, serialize_quiz
+from quiz.scoring import answer_keys, grader
+from quiz.submissions import build_submission, store_submissions
+from quiz.writer import build_quiz_rows, insert_quiz_rows
+from models import User
+
+QUESTIONS = 200
+PAGE_SIZE = 10
+ATTEMPTS = 20
+
+
+def main():
+    session = SessionLocal()
+    category_id = ensure_category(session).id
+    rows = build_quiz_rows({
+        'title': 'Bench',
+        'category_id': category_id,
+        'questions': [{
+            'question_type': 'SINGLE',
+            'question': f'Вопрос {i}: ' + 'текст вопроса ' * 8,
+            'options': [{'name': f'Вариант ответа {j}', 'is_correct': j == 0} for j in range(4)]
+        } for i in range(QUESTIONS)]
+    })
+    insert_quiz_rows(session, rows)
+    user = User(id=new_id(), login=f"bench-{new_id()}", password='x', name='b', surname='b')
+    session.add(user)
+    session.commit()
+    quiz_id = rows.quiz['id']
+
+    full = json.dumps(serialize_quiz(load_quiz_tree(session, quiz_id)), ensure_ascii=False).encode('utf-8')
+    public = PublicQuizCache().get(session, quiz_id)
+    page = json.dumps([public.questions[question_id] for question_id in public.order[:PAGE_SIZE]],
+                      ensure_ascii=False).encode('utf-8')
+    print(f"{QUESTIONS} questions: full quiz {len(full) / 1024:.1f} KiB (answers included), "
+          f"page of {PAGE_SIZE} {len(page) / 1024:.1f} KiB (no answers)")
+
+    answer_key = answer_keys.get(session, quiz_id)
+    correct = {option['question_id']: option['id'] for option in rows.options if option['is_correct']}
+    answers = [{'question_id': question_id, 'option_ids': [option_id]} for question_id, option_id in correct.items()]
+    counter = QueryCounter()
+
+    started = time.perf_counter()
+    with counter.track():
+        for _ in range(ATTEMPTS):
+            submission = build_submission(user.id, quiz_id, answer_key, grader.grade(answer_key, answers), answers)
+            store_submissions(session, [submission])
+            session.commit()
+    burst_ms = (time.perf_counter() - started) * 1000 / ATTEMPTS
+    print(f"submit-answers: {burst_ms:.2f} ms per attempt in one request, {counter.count // ATTEMPTS} main DB queries")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = AttemptStore(os.path.join(directory, 'attempts.db'))
+        page_ms = []
+        finish_ms = 0.0
+        with counter.track():
+            for _ in range(ATTEMPTS):
+                attempt = store.create(user.id, quiz_id, public.order)
+                for start in range(0, QUESTIONS, PAGE_SIZE):
+                    started = time.perf_counter()
+                    store.save_answers(attempt['id'], answers[start:start + PAGE_SIZE])
+                    page_ms.append((time.perf_counter() - started) * 1000)
+                started = time.perf_counter()
+                saved = list(store.answers(attempt['id']).values())
+                submission = build_submission(user.id, quiz_id, answer_key, grader.grade(answer_key, saved), saved)
+                store_submissions(session, [submission])
+                session.commit()
+                store.finish(attempt['id'], submission['test_result_id'])
+                finish_ms += (time.perf_counter() - started) * 1000
+        page_ms.sort()
+        print(f"attempt: save page p50 {page_ms[len(page_ms) // 2]:.2f} ms, p99 {page_ms[int(len(page_ms) * 0.99)]:.2f} ms "
+              f"(local SQLite), finish {finish_ms / ATTEMPTS:.2f} ms, {counter.count // ATTEMPTS} main DB queries")
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
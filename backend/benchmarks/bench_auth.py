@@ -0,0 +1,51 @@
+"""
+Нагрузочный тест аутентификации: пропускная способность защищенного
+эндпоинта с быстрым режимом AUTH_FAST_PATH и без него
+"""
+import threading
+import time
+from common import QueryCounter
+from config import Config
+from app import app
+
+REQUESTS_PER_THREAD = 500
+THREADS = 4
+
+
+def login(client):
+    client.post('/api/auth/register', json={'login': 'bench', 'password': 'bench', 'name': 'b', 'surname': 'b'})
+    token = client.post('/api/auth/login', json={'login': 'bench', 'password': 'bench'}).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def run(headers) -> float:
+    def worker():
+        client = app.test_client()
+        for _ in range(REQUESTS_PER_THREAD):
+            client.get('/api/quiz/cache-stats', headers=headers)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return THREADS * REQUESTS_PER_THREAD / (time.perf_counter() - start)
+
+
+def main():
+    headers = login(app.test_client())
+    counter = QueryCounter()
+    for fast_path in (False, True):
+        Config.AUTH_FAST_PATH = fast_path
+        client = app.test_client()
+        client.get('/api/quiz/cache-stats', headers=headers)
+        with counter.track():
+            for _ in range(10):
+                client.get('/api/quiz/cache-stats', headers=headers)
+        rps = run(headers)
+        print(f"AUTH_FAST_PATH={fast_path!s:<5} | queries/request: {counter.count / 10:.1f} | {rps:8.0f} req/s")
+
+
+if __name__ == '__main__':
+    main()
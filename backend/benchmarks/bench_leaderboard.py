@@ -0,0 +1,69 @@
+"""
+Рейтинг на 1M пользователей: построение, место пользователя, top-k
+и обновления в памяти против ORDER BY / COUNT по таблице users
+"""
+import os
+import random
+import time
+from uuid import uuid4
+from sqlalchemy import func
+from common import SessionLocal, engine
+from models import User
+from quiz.leaderboard import Leaderboard
+
+USERS = int(os.getenv('BENCH_USERS', 1_000_000))
+SQL_USERS = int(os.getenv('BENCH_SQL_USERS', USERS))
+
+
+def per_call_us(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1_000_000 / repeat
+
+
+def main():
+    random.seed(1)
+    user_ids = [uuid4().hex for _ in range(USERS)]
+    scores = {user_id: random.randrange(0, 100_000) for user_id in user_ids}
+
+    start = time.perf_counter()
+    board = Leaderboard(scores)
+    print(f"build {USERS} users: {time.perf_counter() - start:.2f} s")
+
+    sample = random.sample(user_ids, 1000)
+    it = iter(sample * 100)
+    print(f"rank lookup: {per_call_us(lambda: board.rank(next(it)), 20000):.1f} us")
+    print(f"top 10: {per_call_us(lambda: board.top(10), 20000):.1f} us")
+    print(f"page 100 at offset 500000: {per_call_us(lambda: board.top(100, USERS // 2), 2000):.1f} us")
+    it = iter(sample * 100)
+    print(f"add score (submission): {per_call_us(lambda: board.add(next(it), random.randrange(1, 500)), 20000):.1f} us")
+
+    # Те же запросы к таблице users (без индекса по счету)
+    session = SessionLocal()
+    start = time.perf_counter()
+    rows = [{'id': user_id, 'login': user_id, 'password': 'p', 'name': 'n', 'surname': 's', 'score': scores[user_id]}
+            for user_id in user_ids[:SQL_USERS]]
+    for i in range(0, len(rows), 50_000):
+        session.execute(User.__table__.insert(), rows[i:i + 50_000])
+    session.commit()
+    print(f"\nSQL: inserted {SQL_USERS} users in {time.perf_counter() - start:.1f} s ({engine.dialect.name})")
+
+    user_id = user_ids[0]
+
+    def sql_rank():
+        score = session.query(User.score).filter(User.id == user_id).scalar()
+        return session.query(func.count(User.id)).filter(User.score > score).scalar() + 1
+
+    def sql_top():
+        return session.query(User.id, User.score).order_by(User.score.desc(), User.id).limit(10).all()
+
+    print(f"SQL rank (COUNT score >): {per_call_us(sql_rank, 5) / 1000:.1f} ms")
+    print(f"SQL top 10 (ORDER BY): {per_call_us(sql_top, 5) / 1000:.1f} ms")
+    session.execute(User.__table__.delete())
+    session.commit()
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Удаление викторины с историей ответов: прежний обход (DELETE вариантов на
+каждый вопрос, ответы не удалялись) и удаление всех ответов одним запросом
+против purge_quiz (ответы пачками по PURGE_BATCH_SIZE, каждая в своей транзакции).
+Самая долгая транзакция - оценка того, сколько держатся блокировки
+"""
+import time
+from common import SessionLocal, QueryCounter, ensure_category, engine
+from ids import new_id
+from models import Quiz, Question, Options, TestResult, AttemptAnswer
+from quiz.purge import purge_quiz
+from quiz.writer import build_quiz_rows, insert_quiz_rows
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.sql import func
+
+QUESTIONS = 50
+ATTEMPTS = 4000
+BATCH_SIZES = (1000, 10000)
+
+
+def create_quiz(category_id) -> str:
+    session = SessionLocal()
+    try:
+        rows = build_quiz_rows({
+            'title': 'Bench',
+            'category_id': category_id,
+            'questions': [{
+                'question_type': 'SINGLE',
+                'question': f'Вопрос {i}?',
+                'options': [{'name': f'Вариант {j}', 'is_correct': j == 0} for j in range(4)]
+            } for i in range(QUESTIONS)]
+        })
+        insert_quiz_rows(session, rows)
+        results = [{'id': new_id(), 'score': 1, 'quiz_id': rows.quiz['id']} for _ in range(ATTEMPTS)]
+        session.execute(TestResult.__table__.insert(), results)
+        options = {}
+        for option in rows.options:
+            options.setdefault(option['question_id'], []).append(option['id'])
+        session.execute(AttemptAnswer.__table__.insert(), [
+            {'test_result_id': result['id'], 'question_id': question['id'], 'option_ids': options[question['id']][:1]}
+            for result in results for question in rows.questions
+        ])
+        session.commit()
+        return rows.quiz['id']
+    finally:
+        session.close()
+
+
+def mark(session, quiz_id: str):
+    session.execute(update(Quiz).where(Quiz.id == quiz_id).values(deleted_at=func.now()))
+    session.commit()
+
+
+def delete_per_question(session, quiz_id: str):
+    for question in session.query(Question).filter(Question.quiz_id == quiz_id).all():
+        session.query(Options).filter(Options.question_id == question.id).delete()
+    session.query(Question).filter(Question.quiz_id == quiz_id).delete()
+    session.query(Quiz).filter(Quiz.id == quiz_id).delete()
+    session.commit()
+
+
+def delete_single_statement(session, quiz_id: str):
+    question_ids = select(Question.id).where(Question.quiz_id == quiz_id)
+    session.execute(delete(AttemptAnswer.__table__).where(AttemptAnswer.question_id.in_(question_ids)))
+    session.execute(delete(Options.__table__).where(Options.question_id.in_(question_ids)))
+    session.execute(delete(Question.__table__).where(Question.quiz_id == quiz_id))
+    session.execute(delete(Quiz.__table__).where(Quiz.id == quiz_id))
+    session.commit()
+
+
+class TransactionTimer:
+    """
+    Длительность самой долгой транзакции движка
+    """
+    def __init__(self):
+        self.longest = 0.0
+        self._started = None
+
+    def _begin(self, connection):
+        self._started = time.perf_counter()
+
+    def _commit(self, connection):
+        if self._started is not None:
+            self.longest = max(self.longest, time.perf_counter() - self._started)
+            self._started = None
+
+    def __enter__(self):
+        event.listen(engine, 'begin', self._begin)
+        event.listen(engine, 'commit', self._commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, 'begin', self._begin)
+        event.remove(engine, 'commit', self._commit)
+
+
+def main():
+    session = SessionLocal()
+    category_id = ensure_category(session).id
+    session.close()
+
+    counter = QueryCounter()
+    variants = [('per question (old)', delete_per_question), ('single statement', delete_single_statement)]
+    variants += [(f'purge, batch {size}', lambda s, q, size=size: purge_quiz(s, q, batch_size=size, pause=0))
+                 for size in BATCH_SIZES]
+    print(f"{QUESTIONS} questions, {ATTEMPTS * QUESTIONS} attempt answers")
+    print(f"{'variant':20} | {'queries':>7} | {'total ms':>8} | {'longest tx ms':>13} | {'answers left':>12}")
+    for name, remove in variants:
+        quiz_id = create_quiz(category_id)
+        session = SessionLocal()
+        try:
+            mark(session, quiz_id)
+            with counter.track(), TransactionTimer() as timer:
+                started = time.perf_counter()
+                remove(session, quiz_id)
+                total = time.perf_counter() - started
+            left = session.query(AttemptAnswer).filter(
+                AttemptAnswer.question_id.in_(select(Question.id).where(Question.quiz_id == quiz_id))
+            ).count()
+            # Старый вариант оставлял ответы на удаленные вопросы
+            orphans = session.query(AttemptAnswer).join(TestResult, TestResult.id == AttemptAnswer.test_result_id)\
+                .filter(TestResult.quiz_id == quiz_id).count()
+            session.execute(delete(AttemptAnswer.__table__))
+            session.commit()
+        finally:
+            session.close()
+        print(f"{name:20} | {counter.count:>7} | {total * 1000:>8.1f} | {timer.longest * 1000:>13.1f} | {max(left, orphans):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Сравнение старой загрузки викторины (запрос на каждый вопрос) с load_quiz_tree:
+количество запросов и задержка в зависимости от числа вопросов
+"""
+from common import SessionLocal, QueryCounter, seed_quiz, measure
+from models import Quiz, Question, Options
+from quiz.loader import load_quiz_tree, serialize_quiz
+
+
+def load_naive(session, quiz_id):
+    quiz = session.query(Quiz).filter(Quiz.id == quiz_id).first()
+    questions = session.query(Question).filter(Question.quiz_id == quiz_id).all()
+    questions_data = []
+    for question in questions:
+        options = session.query(Options).filter(Options.question_id == question.id).all()
+        questions_data.append({
+            'id': question.id,
+            'options': [{'id': o.id, 'name': o.name, 'is_correct': o.is_correct} for o in options]
+        })
+    return {'id': quiz.id, 'questions': questions_data}
+
+
+def load_tree(session, quiz_id):
+    return serialize_quiz(load_quiz_tree(session, quiz_id))
+
+
+def run_once(loader, quiz_id):
+    session = SessionLocal()
+    try:
+        return loader(session, quiz_id)
+    finally:
+        session.close()
+
+
+def main():
+    counter = QueryCounter()
+    print(f"{'questions':>9} | {'naive q':>7} | {'naive ms':>8} | {'tree q':>6} | {'tree ms':>7}")
+    for questions_count in (5, 20, 50, 200):
+        session = SessionLocal()
+        quiz_id = seed_quiz(session, questions_count)
+        session.close()
+
+        results = []
+        for loader in (load_naive, load_tree):
+            with counter.track():
+                run_once(loader, quiz_id)
+            queries = counter.count
+            elapsed = measure(lambda: run_once(loader, quiz_id))
+            results.append((queries, elapsed))
+
+        (naive_q, naive_ms), (tree_q, tree_ms) = results
+        print(f"{questions_count:>9} | {naive_q:>7} | {naive_ms:>8.2f} | {tree_q:>6} | {tree_ms:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Обновление викторины: прежний обход через ORM (запрос на каждый вопрос
+и вариант, flush на каждый новый вопрос) против сверки quiz/reconcile.py
+(загрузка тремя запросами, diff в памяти, пакетные UPDATE/DELETE/INSERT).
+В каждом вопросе меняется текст, переименовывается, добавляется и удаляется
+по варианту ответа, плюс добавляется несколько новых вопросов
+"""
+import time
+from common import SessionLocal, QueryCounter, ensure_category
+from ids import new_id
+from models import Quiz, Question, Options
+from quiz.reconcile import apply_quiz_changes, diff_quiz, load_quiz_state
+from quiz.writer import build_quiz_rows, insert_quiz_rows
+
+REPEAT = 10
+NEW_QUESTIONS = 5
+
+
+def create_quiz(category_id, questions_count: int) -> str:
+    session = SessionLocal()
+    try:
+        rows = build_quiz_rows({
+            'title': 'Bench',
+            'description': 'bench',
+            'category_id': category_id,
+            'questions': [{
+                'question_type': 'SINGLE',
+                'question': f'Вопрос {i}?',
+                'points': 100,
+                'options': [{'name': f'Вариант {j}', 'is_correct': j == 0} for j in range(4)]
+            } for i in range(questions_count)]
+        })
+        insert_quiz_rows(session, rows)
+        session.commit()
+        return rows.quiz['id']
+    finally:
+        session.close()
+
+
+def make_update(session, quiz_id: str) -> dict:
+    state = load_quiz_state(session, quiz_id)
+    options = {}
+    for option in state.options.values():
+        options.setdefault(option['question_id'], []).append(option)
+    questions = []
+    for question in state.questions.values():
+        question_options = sorted(options[question['id']], key=lambda option: option['name'])
+        questions.append({
+            'id': question['id'],
+            'question_type': 'SINGLE',
+            'points': 100,
+            'question': question['question'] + ' (ред.)',
+            'options': [
+                {'id': question_options[0]['id'], 'name': question_options[0]['name'], 'is_correct': True},
+                {'id': question_options[1]['id'], 'name': 'Новое название', 'is_correct': False},
+                {'name': 'Новый вариант', 'is_correct': False}
+            ],
+            'delete_options': [question_options[-1]['id']]
+        })
+    for i in range(NEW_QUESTIONS):
+        questions.append({
+            'question_type': 'SINGLE',
+            'question': f'Новый вопрос {i}?',
+            'options': [{'name': 'Да', 'is_correct': True}, {'name': 'Нет'}]
+        })
+    return {'title': 'Bench (ред.)', 'questions': questions}
+
+
+def update_orm(session, quiz_id: str, data: dict):
+    quiz = session.query(Quiz).filter(Quiz.id == quiz_id).first()
+    quiz.title = data['title']
+    for question_data in data['questions']:
+        if question_data.get('id'):
+            question = session.query(Question).filter(Question.id == question_data['id']).first()
+            question.question_type = question_data['question_type']
+            question.points = question_data['points']
+            question.question = question_data['question']
+            for option_data in question_data['options']:
+                if option_data.get('id'):
+                    option = session.query(Options).filter(Options.id == option_data['id']).first()
+                    option.name = option_data['name']
+                    option.is_correct = option_data['is_correct']
+                else:
+                    session.add(Options(id=new_id(), question_id=question.id, name=option_data['name'],
+                                        is_correct=option_data.get('is_correct', False)))
+            for option_id in question_data['delete_options']:
+                session.query(Options).filter(Options.id == option_id).delete()
+        else:
+            question = Question(id=new_id(), question_type=question_data['question_type'], quiz_id=quiz.id,
+                                points=question_data.get('points', 100), question=question_data['question'])
+            session.add(question)
+            session.flush()
+            for option_data in question_data['options']:
+                session.add(Options(id=new_id(), question_id=question.id, name=option_data['name'],
+                                    is_correct=option_data.get('is_correct', False)))
+    session.commit()
+
+
+def update_reconcile(session, quiz_id: str, data: dict):
+    state = load_quiz_state(session, quiz_id)
+    changes = diff_quiz(state, data)
+    apply_quiz_changes(session, quiz_id, changes, state.quiz['version'])
+    session.commit()
+
+
+def run(updater, category_id, questions_count: int, counter: QueryCounter):
+    queries = 0
+    elapsed = 0.0
+    for _ in range(REPEAT):
+        quiz_id = create_quiz(category_id, questions_count)
+        session = SessionLocal()
+        try:
+            data = make_update(session, quiz_id)
+            session.commit()
+            with counter.track():
+                started = time.perf_counter()
+                updater(session, quiz_id, data)
+                elapsed += time.perf_counter() - started
+            queries = counter.count
+        finally:
+            session.close()
+    return queries, elapsed * 1000 / REPEAT
+
+
+def main():
+    session = SessionLocal()
+    category_id = ensure_category(session).id
+    session.close()
+
+    counter = QueryCounter()
+    print(f"{'questions':>9} | {'orm q':>5} | {'orm ms':>8} | {'diff q':>6} | {'diff ms':>7}")
+    for questions_count in (10, 50, 200):
+        orm_q, orm_ms = run(update_orm, category_id, questions_count, counter)
+        diff_q, diff_ms = run(update_reconcile, category_id, questions_count, counter)
+        print(f"{questions_count:>9} | {orm_q:>5} | {orm_ms:>8.2f} | {diff_q:>6} | {diff_ms:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
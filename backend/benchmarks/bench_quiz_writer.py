@@ -0,0 +1,73 @@
+"""
+Сравнение создания викторины через ORM (add + flush на каждый вопрос)
+с пакетной вставкой build_quiz_rows/insert_quiz_rows
+"""
+from uuid import uuid4
+from common import SessionLocal, QueryCounter, ensure_category, measure
+from models import Quiz, Question, Options
+from quiz.writer import build_quiz_rows, insert_quiz_rows
+
+
+def make_payload(category_id, questions_count, options_count=4):
+    return {
+        'title': 'Bench',
+        'description': 'bench',
+        'category_id': category_id,
+        'questions': [{
+            'question_type': 'SINGLE',
+            'question': f'Вопрос {i}?',
+            'points': 100,
+            'options': [{'name': f'Вариант {j}', 'is_correct': j == 0} for j in range(options_count)]
+        } for i in range(questions_count)]
+    }
+
+
+def write_orm(payload):
+    session = SessionLocal()
+    try:
+        quiz = Quiz(id=str(uuid4()), title=payload['title'], description=payload['description'],
+                    category_id=payload['category_id'])
+        session.add(quiz)
+        session.flush()
+        for question_data in payload['questions']:
+            question = Question(id=str(uuid4()), question_type=question_data['question_type'], quiz_id=quiz.id,
+                                points=question_data['points'], question=question_data['question'])
+            session.add(question)
+            session.flush()
+            for option_data in question_data['options']:
+                session.add(Options(id=str(uuid4()), question_id=question.id, name=option_data['name'],
+                                    is_correct=option_data['is_correct']))
+        session.commit()
+    finally:
+        session.close()
+
+
+def write_bulk(payload):
+    session = SessionLocal()
+    try:
+        insert_quiz_rows(session, build_quiz_rows(payload))
+        session.commit()
+    finally:
+        session.close()
+
+
+def main():
+    session = SessionLocal()
+    category_id = ensure_category(session).id
+    session.close()
+
+    counter = QueryCounter()
+    print(f"{'questions':>9} | {'orm q':>5} | {'orm ms':>8} | {'bulk q':>6} | {'bulk ms':>7}")
+    for questions_count in (10, 50, 200):
+        payload = make_payload(category_id, questions_count)
+        results = []
+        for writer in (write_orm, write_bulk):
+            with counter.track():
+                writer(payload)
+            results.append((counter.count, measure(lambda: writer(payload), repeat=10)))
+        (orm_q, orm_ms), (bulk_q, bulk_ms) = results
+        print(f"{questions_count:>9} | {orm_q:>5} | {orm_ms:>8.2f} | {bulk_q:>6} | {bulk_ms:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Ответы чтения до и после слоя responses.py: размер тела и задержка без сжатия,
+с gzip (и br, если установлен brotli) и повторный запрос с If-None-Match (304).
+Запросы идут через тестовый клиент Flask, без сети
+"""
+from uuid import uuid4
+from common import SessionLocal, ensure_category, measure
+from app import app
+from quiz.writer import build_quiz_rows, insert_quiz_rows
+from responses import ENCODINGS
+
+QUESTIONS = 200
+LIST_QUIZZES = 50
+
+
+def main():
+    session = SessionLocal()
+    category_id = ensure_category(session).id
+    quiz_ids = []
+    for i in range(LIST_QUIZZES):
+        rows = build_quiz_rows({
+            'title': f'Bench {i}',
+            'description': 'Описание викторины для бенчмарка ответов API',
+            'category_id': category_id,
+            'questions': [{
+                'question_type': 'SINGLE',
+                'question': f'Вопрос {j}: ' + 'текст вопроса ' * 8,
+                'options': [{'name': f'Вариант ответа {k}', 'is_correct': k == 0} for k in range(4)]
+            } for j in range(QUESTIONS if i == 0 else 1)]
+        })
+        insert_quiz_rows(session, rows)
+        quiz_ids.append(rows.quiz['id'])
+    session.commit()
+    session.close()
+
+    client = app.test_client()
+    login = f'bench-{uuid4().hex[:8]}'
+    client.post('/api/auth/register', json={'login': login, 'password': 'p', 'name': 'b', 'surname': 'b'})
+    token = client.post('/api/auth/login', json={'login': login, 'password': 'p'}).json['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/quiz/submit-answers', json={'quiz_id': quiz_ids[0], 'answers': []}, headers=headers)
+
+    endpoints = {
+        f'quiz ({QUESTIONS} questions)': f'/api/quiz/quizes/{quiz_ids[0]}',
+        f'list (limit {LIST_QUIZZES})': f'/api/quiz/quizes?limit={LIST_QUIZZES}',
+        'categories': '/api/quiz/categories',
+        'user-activity (365 days)': '/api/quiz/user-activity?days=365',
+    }
+    variants = [('plain', {})] + [(encoding, {'Accept-Encoding': encoding}) for encoding in ENCODINGS]
+    print(f"{'endpoint':26} {'variant':8} {'bytes':>8} {'ms':>7}")
+    for name, url in endpoints.items():
+        etag = None
+        for variant, extra in variants:
+            request_headers = dict(headers, **extra)
+            response = client.get(url, headers=request_headers)
+            etag = response.headers.get('ETag')
+            ms = measure(lambda: client.get(url, headers=request_headers), 30)
+            print(f"{name:26} {variant:8} {len(response.data):>8} {ms:>7.2f}")
+        conditional_headers = dict(headers, **{'If-None-Match': etag})
+        response = client.get(url, headers=conditional_headers)
+        ms = measure(lambda: client.get(url, headers=conditional_headers), 30)
+        print(f"{name:26} {response.status_code:<8} {len(response.data):>8} {ms:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
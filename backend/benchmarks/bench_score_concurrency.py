@@ -0,0 +1,104 @@
+"""
+Проверка учета баллов под конкурентной нагрузкой: несколько потоков
+одновременно отправляют ответы одного пользователя, после чего счет
+сравнивается с суммой по журналу результатов. Для сравнения показывается,
+сколько обновлений теряет прежнее чтение-изменение-запись через ORM.
+Завершается с кодом 1, если обновления потеряны
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from common import SessionLocal, seed_quiz
+from config import Config
+from app import app
+from models import User
+from quiz.ledger import score_drift
+from quiz.loader import load_quiz_tree
+
+THREADS = 8
+SUBMISSIONS_PER_THREAD = 50
+
+
+def run_threads(target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def legacy_lost_updates(user_id, points=10) -> int:
+    """
+    Прежний способ: user.score += points в ORM и commit
+    """
+    session = SessionLocal()
+    start = session.query(User.score).filter(User.id == user_id).scalar() or 0
+    session.close()
+
+    def worker(i):
+        session = SessionLocal()
+        try:
+            for _ in range(SUBMISSIONS_PER_THREAD):
+                user = session.query(User).filter(User.id == user_id).first()
+                score = user.score or 0
+                time.sleep(0)
+                user.score = score + points
+                session.commit()
+        finally:
+            session.close()
+
+    run_threads(worker)
+    session = SessionLocal()
+    final = session.query(User.score).filter(User.id == user_id).scalar()
+    session.close()
+    return (start + THREADS * SUBMISSIONS_PER_THREAD * points - final) // points
+
+
+def main():
+    session = SessionLocal()
+    quiz_id = seed_quiz(session, 10)
+    quiz = load_quiz_tree(session, quiz_id)
+    answers = [{'question_id': q.id, 'option_ids': [o.id for o in q.options if o.is_correct]} for q in quiz.questions]
+    session.close()
+
+    client = app.test_client()
+    client.post('/api/auth/register', json={'login': 'racer', 'password': 'p', 'name': 'r', 'surname': 'r'})
+    token = client.post('/api/auth/login', json={'login': 'racer', 'password': 'p'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    session = SessionLocal()
+    user_id = session.query(User.id).filter(User.login == 'racer').scalar()
+    session.close()
+
+    Config.SUBMISSION_JOURNAL_PATH = os.path.join(tempfile.mkdtemp(prefix='quizmaker-journal-'), 'submissions.db')
+    failed = False
+    for write_behind in (False, True):
+        Config.SUBMISSION_WRITE_BEHIND = write_behind
+
+        def worker(i):
+            client = app.test_client()
+            for _ in range(SUBMISSIONS_PER_THREAD):
+                response = client.post('/api/quiz/submit-answers', json={'quiz_id': quiz_id, 'answers': answers}, headers=headers)
+                assert response.status_code in (201, 202), response.data
+
+        run_threads(worker)
+        if write_behind:
+            from quiz.submissions import get_submission_writer
+            get_submission_writer().flush()
+
+        session = SessionLocal()
+        score = session.query(User.score).filter(User.id == user_id).scalar()
+        drift = score_drift(session, [user_id])
+        session.close()
+        mode = 'write-behind' if write_behind else 'sync'
+        print(f"{mode:<12} | {THREADS}x{SUBMISSIONS_PER_THREAD} submissions | score {score} | drift {drift or 'none'}")
+        failed = failed or bool(drift)
+
+    print(f"legacy ORM read-modify-write: lost {legacy_lost_updates(user_id)} of {THREADS * SUBMISSIONS_PER_THREAD} updates")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
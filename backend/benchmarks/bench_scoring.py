@@ -0,0 +1,56 @@
+"""
+Микробенчмарки проверки ответов: компиляция ключа и проверка одной отправки
+в разных режимах Grader
+"""
+import random
+import time
+from common import SessionLocal, seed_quiz
+from quiz.loader import load_quiz_tree
+from quiz.scoring import Grader, compile_answer_key, normalize_text
+
+
+def per_call_us(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1_000_000 / repeat
+
+
+def make_answers(key, correct_share=0.7):
+    answers = []
+    for question_id, question_key in key.questions.items():
+        correct = sorted(question_key.correct)
+        if random.random() < correct_share:
+            answers.append({'question_id': question_id, 'option_ids': correct})
+        else:
+            answers.append({'question_id': question_id, 'option_ids': correct[:1] + ['wrong']})
+    return answers
+
+
+def main():
+    random.seed(1)
+    session = SessionLocal()
+    quiz_id = seed_quiz(session, 50)
+    quiz = load_quiz_tree(session, quiz_id)
+    session.close()
+
+    print(f"compile key (50 questions): {per_call_us(lambda: compile_answer_key(quiz), 2000):.1f} us")
+    key = compile_answer_key(quiz)
+    submissions = [make_answers(key) for _ in range(200)]
+
+    for multiple_mode, text_mode in (('exact', 'normalized'), ('partial', 'normalized'), ('exact', 'fuzzy')):
+        grader = Grader(multiple_mode, text_mode)
+        iterator = iter(submissions * 50)
+        elapsed = per_call_us(lambda: grader.grade(key, next(iterator)), 10000)
+        print(f"grade 50 answers [{multiple_mode}/{text_mode}]: {elapsed:.1f} us")
+
+    text = '  Столица — Москва!  '
+    print(f"normalize_text: {per_call_us(lambda: normalize_text(text), 100000):.2f} us")
+    fuzzy = Grader(text_mode='fuzzy')
+    text_key = compile_answer_key(quiz).questions[next(iter(key.questions))]
+    text_key.text_answers = ('москва',)
+    print(f"fuzzy text match: {per_call_us(lambda: fuzzy.match_text(text_key, 'масква'), 100000):.2f} us")
+
+
+if __name__ == '__main__':
+    main()
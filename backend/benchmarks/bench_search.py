@@ -0,0 +1,88 @@
+"""
+Поиск викторин: задержка запроса в зависимости от размера корпуса.
+Сравнивается QuizSearchService (индекс в памяти для SQLite или tsvector
+для Postgres) с фильтром LIKE '%слово%' по викторинам и вопросам
+"""
+import random
+import time
+from itertools import accumulate
+from uuid import uuid4
+from sqlalchemy import or_
+from common import SessionLocal, ensure_category, measure
+from models import Quiz, Question, Options
+from quiz.search import QuizSearchService, refresh_documents
+
+SIZES = (1000, 10000, 50000)
+WORDS = 20000
+QUESTIONS = 2
+OPTIONS = 3
+SYLLABLES = ['ка', 'ло', 'ми', 'ре', 'ст', 'на', 'по', 'ти', 'ва', 'зе', 'ру', 'до', 'ше', 'ки', 'ба', 'мо']
+
+
+def make_words(count: int) -> list:
+    words = set()
+    while len(words) < count:
+        words.add(''.join(random.choice(SYLLABLES) for _ in range(random.randint(2, 5))))
+    return sorted(words, key=lambda word: random.random())
+
+
+def main():
+    random.seed(1)
+    words = make_words(WORDS)
+    # Частоты слов по закону Ципфа
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(words))))
+    text = lambda count: ' '.join(random.choices(words, cum_weights=cum_weights, k=count))
+
+    session = SessionLocal()
+    categories = [ensure_category(session, f'Search {i}').id for i in range(10)]
+    common, rare = words[0], words[5000]
+    queries = {
+        'common word': common,
+        'rare word': rare,
+        'prefix': rare[:4],
+        'typo': rare[:2] + rare[3:] if len(rare) > 4 else rare + 'а',
+        'two words': f'{words[1]} {words[40]}',
+    }
+
+    created = 0
+    for size in SIZES:
+        quizzes, questions, options = [], [], []
+        for _ in range(size - created):
+            quiz_id = str(uuid4())
+            quizzes.append({'id': quiz_id, 'title': text(4)[:56], 'description': text(12), 'category_id': random.choice(categories)})
+            for _ in range(QUESTIONS):
+                question_id = str(uuid4())
+                questions.append({'id': question_id, 'quiz_id': quiz_id, 'question_type': 'SINGLE', 'points': 1, 'question': text(10)})
+                for j in range(OPTIONS):
+                    options.append({'id': str(uuid4()), 'question_id': question_id, 'name': text(2), 'is_correct': j == 0})
+        session.execute(Quiz.__table__.insert(), quizzes)
+        session.execute(Question.__table__.insert(), questions)
+        session.execute(Options.__table__.insert(), options)
+        session.commit()
+        created = size
+
+        service = QuizSearchService('auto', refresh_interval=3600)
+        started = time.perf_counter()
+        if service.uses_postgres:
+            refresh_documents(session)
+            session.commit()
+        service.rebuild()
+        print(f"\n{size} quizzes: index build {time.perf_counter() - started:.2f} s, {service.stats()}")
+
+        for name, query in queries.items():
+            _, total = service.search(session, query)
+            search_ms = measure(lambda: service.search(session, query), 20)
+            filtered_ms = measure(lambda: service.search(session, query, categories[0]), 20)
+            print(f"  {name:12} {query!r:24} found {total:6}  search {search_ms:8.2f} ms  with category {filtered_ms:8.2f} ms")
+
+        word = f'%{rare}%'
+        like = lambda: session.query(Quiz.id).filter(or_(
+            Quiz.title.like(word), Quiz.description.like(word),
+            Quiz.id.in_(session.query(Question.quiz_id).filter(Question.question.like(word)))
+        )).limit(20).all()
+        print(f"  LIKE '%{rare}%' (no ranking, no typos): {measure(like, 5):.2f} ms")
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Потоковый разбор ответа LLM: время до первого вопроса при генерации
+с имитацией скорости модели и пропускная способность парсера
+"""
+import time
+import common  # noqa: F401 - настраивает sys.path и базу
+from quiz.generation import build_messages, parse_generated_quiz
+from quiz.llm import FakeLLMClient
+from quiz.stream_parser import QuizStreamParser, parse_quiz_stream
+
+
+def main():
+    messages = build_messages('Benchmark', ' '.join(f'слово{i}' for i in range(50)), 20)
+    # Около 2 секунд на весь ответ, как у модели с ~300 токенов в секунду
+    client = FakeLLMClient(delay=2.0, piece_size=8)
+
+    start = time.perf_counter()
+    parse_generated_quiz(client.complete(messages))
+    full = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parser = QuizStreamParser()
+    first = None
+    count = 0
+    for piece in client.stream(messages):
+        for _ in parser.feed(piece):
+            count += 1
+            if first is None:
+                first = time.perf_counter() - start
+    parser.close()
+    print(f"complete + json.loads: first question after {full * 1000:.0f} ms")
+    print(f"stream: first question after {first * 1000:.0f} ms, all {count} after {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    content = FakeLLMClient()._content(messages)
+    repeat = 200
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse_quiz_stream([content[i:i + 16] for i in range(0, len(content), 16)])
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"parser throughput: {len(content) / elapsed / 1024:.0f} KiB/s ({len(content)} chars in {elapsed * 1000:.2f} ms)")
+
+    truncated = content[:len(content) * 2 // 3]
+    parser, questions = parse_quiz_stream([truncated])
+    print(f"truncated at 2/3: {len(questions)} of {count} questions recovered, truncated={parser.truncated}")
+
+
+if __name__ == '__main__':
+    main()
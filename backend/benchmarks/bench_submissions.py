@@ -0,0 +1,91 @@
+"""
+Нагрузочный тест отправки ответов в пиковый момент экзамена: задержка
+подтверждения (p50/p99) и устойчивая скорость сохранения отправок
+с синхронной записью и с отложенной записью через журнал
+"""
+import os
+import tempfile
+import threading
+import time
+from common import SessionLocal, seed_quiz
+from config import Config
+from app import app
+from quiz.loader import load_quiz_tree
+
+THREADS = 16
+SUBMISSIONS_PER_THREAD = 100
+
+
+def register(client, i):
+    login = f'student{i}'
+    client.post('/api/auth/register', json={'login': login, 'password': 'p', 'name': 's', 'surname': 's'})
+    token = client.post('/api/auth/login', json={'login': login, 'password': 'p'}).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def run(mode, quiz_id, answers, headers):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(i):
+        client = app.test_client()
+        local = []
+        for j in range(SUBMISSIONS_PER_THREAD):
+            start = time.perf_counter()
+            response = client.post(
+                '/api/quiz/submit-answers',
+                json={'quiz_id': quiz_id, 'answers': answers},
+                headers={**headers[i], 'Idempotency-Key': f'{mode}-{i}-{j}'}
+            )
+            local.append(time.perf_counter() - start)
+            assert response.status_code in (201, 202), response.data
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    acked = time.perf_counter() - start
+
+    if Config.SUBMISSION_WRITE_BEHIND:
+        from quiz.submissions import get_submission_writer
+        journal = get_submission_writer().journal
+        while journal.stats()['queued']:
+            time.sleep(0.01)
+    stored = time.perf_counter() - start
+
+    total = THREADS * SUBMISSIONS_PER_THREAD
+    print(
+        f"{mode:<12} | ack p50 {percentile(latencies, 0.5) * 1000:6.1f} ms | p99 {percentile(latencies, 0.99) * 1000:6.1f} ms"
+        f" | acks {total / acked:6.0f}/s | stored {total / stored:6.0f}/s"
+    )
+
+
+def main():
+    session = SessionLocal()
+    quiz_id = seed_quiz(session, 20)
+    quiz = load_quiz_tree(session, quiz_id)
+    answers = [{'question_id': q.id, 'option_ids': [o.id for o in q.options if o.is_correct]} for q in quiz.questions]
+    session.close()
+
+    client = app.test_client()
+    headers = [register(client, i) for i in range(THREADS)]
+
+    # Аутентификация без запроса к users, чтобы сравнивать только запись ответов
+    Config.AUTH_FAST_PATH = True
+    Config.SUBMISSION_JOURNAL_PATH = os.path.join(tempfile.mkdtemp(prefix='quizmaker-journal-'), 'submissions.db')
+    for write_behind in (False, True):
+        Config.SUBMISSION_WRITE_BEHIND = write_behind
+        run('write-behind' if write_behind else 'sync', quiz_id, answers, headers)
+
+
+if __name__ == '__main__':
+    main()
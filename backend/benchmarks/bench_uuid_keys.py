@@ -0,0 +1,116 @@
+"""
+Ключи таблиц: varchar(36) с uuid4 (прежняя схема), varchar(36) с UUIDv7
+и GUID с UUIDv7 (в Postgres - нативный uuid, 16 байт). В SQLite GUID хранится
+строкой, поэтому для сравнения добавлен вариант blob(16).
+Размер таблиц и индексов, скорость вставки и соединения родитель-потомок
+"""
+import random
+import time
+from uuid import uuid4
+from sqlalchemy import Column, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table, select, func, text
+from common import engine, measure
+from ids import uuid7
+from models import GUID
+
+PARENTS = 100000
+CHILDREN_PER_PARENT = 5
+LOOKUPS = 1000
+BATCH = 20000
+
+
+def variants():
+    result = [
+        ('varchar uuid4', String(36), lambda: str(uuid4())),
+        ('varchar uuid7', String(36), lambda: str(uuid7())),
+        ('GUID uuid7', GUID, lambda: str(uuid7())),
+    ]
+    if engine.dialect.name == 'sqlite':
+        result.append(('blob16 uuid7', LargeBinary(16), lambda: uuid7().bytes))
+    return result
+
+
+def make_tables(metadata, suffix: str, key_type):
+    parent = Table(
+        f'bench_parent_{suffix}', metadata,
+        Column('id', key_type, primary_key=True),
+        Column('name', String(50))
+    )
+    child = Table(
+        f'bench_child_{suffix}', metadata,
+        Column('id', key_type, primary_key=True),
+        Column('parent_id', key_type, ForeignKey(parent.c.id)),
+        Column('value', Integer),
+        Index(f'ix_bench_child_{suffix}_parent_id', 'parent_id')
+    )
+    return parent, child
+
+
+def table_sizes(connection, table: Table) -> tuple:
+    """
+    Размер данных и индексов таблицы в байтах
+    """
+    if engine.dialect.name == 'postgresql':
+        return (
+            connection.execute(text('SELECT pg_table_size(:t)'), {'t': table.name}).scalar(),
+            connection.execute(text('SELECT pg_indexes_size(:t)'), {'t': table.name}).scalar()
+        )
+    rows = dict(connection.execute(text('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')).all())
+    indexes = [name for name in rows if name.startswith(f'sqlite_autoindex_{table.name}_') or name.startswith(f'ix_{table.name}_')]
+    # В SQLite строковый первичный ключ - отдельный индекс поверх rowid-таблицы
+    return rows.get(table.name, 0), sum(rows[name] for name in indexes)
+
+
+def main():
+    random.seed(1)
+    metadata = MetaData()
+    tables = {}
+    for index, (name, key_type, generate) in enumerate(variants()):
+        tables[name] = make_tables(metadata, str(index), key_type) + (generate,)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    print(f"{'variant':15} {'insert, s':>10} {'data, MiB':>10} {'index, MiB':>11} {'lookup join, ms':>16} {'full join, ms':>14}")
+    for name, (parent, child, generate) in tables.items():
+        parent_ids = [generate() for _ in range(PARENTS)]
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            for i in range(0, PARENTS, BATCH):
+                connection.execute(parent.insert(), [{'id': key, 'name': 'n'} for key in parent_ids[i:i + BATCH]])
+            # Потомки приходят вперемешку, как ответы разных пользователей
+            children = [(parent_id, random.randrange(100)) for parent_id in parent_ids for _ in range(CHILDREN_PER_PARENT)]
+            random.shuffle(children)
+            for i in range(0, len(children), BATCH):
+                connection.execute(child.insert(), [
+                    {'id': generate(), 'parent_id': parent_id, 'value': value}
+                    for parent_id, value in children[i:i + BATCH]
+                ])
+        insert_seconds = time.perf_counter() - started
+
+        with engine.connect() as connection:
+            if engine.dialect.name == 'postgresql':
+                connection.exec_driver_sql(f'ANALYZE {parent.name}')
+                connection.exec_driver_sql(f'ANALYZE {child.name}')
+            data = 0
+            indexes = 0
+            for table in (parent, child):
+                table_data, table_indexes = table_sizes(connection, table)
+                data += table_data
+                indexes += table_indexes
+
+            sample = random.sample(parent_ids, LOOKUPS)
+            lookup = select(func.count(), func.sum(child.c.value)) \
+                .select_from(child.join(parent, child.c.parent_id == parent.c.id)) \
+                .where(parent.c.id.in_(sample))
+            full = select(parent.c.name, func.sum(child.c.value)) \
+                .select_from(child.join(parent, child.c.parent_id == parent.c.id)) \
+                .group_by(parent.c.name)
+            lookup_ms = measure(lambda: connection.execute(lookup).all(), 5)
+            full_ms = measure(lambda: connection.execute(full).all(), 3)
+        print(f"{name:15} {insert_seconds:10.1f} {data / 1024 / 1024:10.1f} {indexes / 1024 / 1024:11.1f} "
+              f"{lookup_ms:16.1f} {full_ms:14.1f}")
+
+    metadata.drop_all(engine)
+
+
+if __name__ == '__main__':
+    main()
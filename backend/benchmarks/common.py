@@ -0,0 +1,88 @@
+"""
+Общие утилиты для бенчмарков.
+Запуск из каталога backend: python benchmarks/<имя>.py
+По умолчанию используется временная SQLite база, для замеров на Postgres
+задайте DATABASE_URL
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+if not os.environ.get('DATABASE_URL'):
+    _db_file = os.path.join(tempfile.mkdtemp(prefix='quizmaker-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_file}'
+
+from sqlalchemy import event
+import migrations
+from models import Base, engine, SessionLocal, Category, Quiz, Question, Options, QuestionType
+
+migrations.create_schema(engine, Base.metadata)
+
+
+class QueryCounter:
+    """
+    Считает SQL запросы, отправленные движком
+    """
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    @contextmanager
+    def track(self):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+        try:
+            yield self
+        finally:
+            event.remove(engine, 'before_cursor_execute', self._on_execute)
+
+
+def ensure_category(session, name='Benchmark'):
+    category = session.query(Category).filter(Category.name == name).first()
+    if not category:
+        category = Category(id=uuid4().hex, name=name)
+        session.add(category)
+        session.commit()
+    return category
+
+
+def seed_quiz(session, questions_count: int, options_count: int = 4) -> str:
+    """
+    Создает викторину с заданным числом вопросов и возвращает ее ID
+    """
+    category = ensure_category(session)
+    quiz = Quiz(id=str(uuid4()), title=f'Bench {questions_count}', description='bench', category_id=category.id)
+    session.add(quiz)
+    for i in range(questions_count):
+        question = Question(
+            id=str(uuid4()),
+            question_type=QuestionType.SINGLE,
+            quiz_id=quiz.id,
+            points=100,
+            question=f'Вопрос {i}?'
+        )
+        session.add(question)
+        for j in range(options_count):
+            session.add(Options(id=str(uuid4()), question_id=question.id, name=f'Вариант {j}', is_correct=j == 0))
+    session.commit()
+    return quiz.id
+
+
+def measure(fn, repeat: int = 20) -> float:
+    """
+    Возвращает среднее время выполнения fn в миллисекундах
+    """
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
@@ -0,0 +1,137 @@
+import click
+from flask.cli import with_appcontext
+from models import engine, SessionLocal
+
+
+@click.command('db-upgrade')
+@with_appcontext
+def db_upgrade():
+    """
+    Применяет непримененные миграции схемы. Пустая база создается целиком по моделям
+    """
+    import migrations
+    from models import Base
+    if migrations.create_schema(engine, Base.metadata):
+        click.echo('Схема создана')
+        return
+    applied = migrations.upgrade(engine)
+    if applied:
+        for name in applied:
+            click.echo(f'Применена миграция {name}')
+    else:
+        click.echo('Схема актуальна')
+
+
+@click.command('explain-queries')
+@with_appcontext
+def explain_queries():
+    """
+    Печатает планы горячих запросов и отмечает последовательные сканы
+    """
+    import explain
+    session = SessionLocal()
+    try:
+        found = False
+        for name, plan, scans in explain.report(session):
+            marker = 'SEQ SCAN: ' + ', '.join(scans) if scans else 'ok'
+            click.echo(f'{name}: {marker}')
+            for line in plan:
+                click.echo(f'    {line}')
+            found = found or bool(scans)
+        if found:
+            raise SystemExit(1)
+    finally:
+        session.close()
+
+
+@click.command('rebuild-scores')
+@click.option('--dry-run', is_flag=True, help='Только показать расхождения')
+@with_appcontext
+def rebuild_scores(dry_run):
+    """
+    Пересчитывает счета пользователей по журналу результатов тестов
+    """
+    from quiz.ledger import rebuild_user_scores, score_drift
+    session = SessionLocal()
+    try:
+        drift = score_drift(session)
+        for row in drift[:20]:
+            click.echo(f"{row['user_id']}: {row['score']} -> {row['ledger']}")
+        if dry_run:
+            click.echo(f'Расхождений: {len(drift)}')
+            return
+        updated = rebuild_user_scores(session)
+        session.commit()
+        click.echo(f'Исправлено счетов: {updated}')
+    finally:
+        session.close()
+
+
+@click.command('backfill-activity')
+@with_appcontext
+def backfill_activity_command():
+    """
+    Пересобирает дневные итоги активности пользователей из результатов тестов
+    """
+    from quiz.activity import backfill_activity
+    session = SessionLocal()
+    try:
+        rows = backfill_activity(session)
+        session.commit()
+        click.echo(f'Дневных итогов: {rows}')
+    finally:
+        session.close()
+
+
+@click.command('rebuild-search')
+@with_appcontext
+def rebuild_search():
+    """
+    Пересобирает поисковые документы викторин (quiz_search) в Postgres
+    """
+    from quiz.search import quiz_search, refresh_documents
+    if not quiz_search.uses_postgres:
+        click.echo('Поиск использует индекс в памяти, он строится при первом запросе')
+        return
+    session = SessionLocal()
+    try:
+        documents = refresh_documents(session)
+        session.commit()
+        click.echo(f'Документов: {documents}')
+    finally:
+        session.close()
+
+
+
+@click.command('purge-quizzes')
+@with_appcontext
+def purge_quizzes():
+    """
+    Окончательно удаляет помеченные к удалению викторины вместе с историей ответов
+    """
+    from quiz.purge import purge_pending
+    session = SessionLocal()
+    try:
+        click.echo(f'Удалено викторин: {purge_pending(session)}')
+    finally:
+        session.close()
+
+
+@click.command('recover-jobs')
+@with_appcontext
+def recover_jobs():
+    """
+    Завершает ошибкой задачи генерации, брошенные перезапущенными воркерами
+    """
+    from quiz.jobs import recover_stale_jobs
+    click.echo(f'Прервано задач: {recover_stale_jobs()}')
+
+
+def register_commands(app):
+    app.cli.add_command(db_upgrade)
+    app.cli.add_command(explain_queries)
+    app.cli.add_command(rebuild_scores)
+    app.cli.add_command(backfill_activity_command)
+    app.cli.add_command(rebuild_search)
+    app.cli.add_command(purge_quizzes)
+    app.cli.add_command(recover_jobs)
@@ -3,9 +3,114 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'default-secret-key')
+
+    # Быстрая аутентификация по claims токена без запроса пользователя на каждый вызов
+    AUTH_FAST_PATH = os.getenv('AUTH_FAST_PATH', 'false').lower() == 'true'
+    AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 30))
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+
+    # Генерация викторин: groq или fake (локальная заглушка без сети)
+    LLM_BACKEND = os.getenv('LLM_BACKEND', 'groq')
+    LLM_MODEL = os.getenv('LLM_MODEL', 'llama3-70b-8192')
+    GENERATION_WORKERS = int(os.getenv('GENERATION_WORKERS', 2))
+    GENERATION_QUEUE_LIMIT = int(os.getenv('GENERATION_QUEUE_LIMIT', 20))
+    GENERATION_TIMEOUT = float(os.getenv('GENERATION_TIMEOUT', 60))
+    GENERATION_RETRIES = int(os.getenv('GENERATION_RETRIES', 2))
+    GENERATION_RETRY_BACKOFF = float(os.getenv('GENERATION_RETRY_BACKOFF', 1))
+    # Незавершенная задача без обновлений дольше этого числа секунд считается прерванной
+    # (очередь задач живет в памяти воркера и теряется при его перезапуске)
+    GENERATION_STALE_AFTER = float(os.getenv('GENERATION_STALE_AFTER', 900))
+
+    # Длинные документы делятся на фрагменты и обрабатываются параллельно
+    GENERATION_MAX_QUESTIONS = int(os.getenv('GENERATION_MAX_QUESTIONS', 50))
+    CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', 3000))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 200))
+    CHUNK_CONCURRENCY = int(os.getenv('CHUNK_CONCURRENCY', 4))
+    CHUNK_DEDUPE_THRESHOLD = float(os.getenv('CHUNK_DEDUPE_THRESHOLD', 0.6))
+    LLM_RATE_LIMIT = float(os.getenv('LLM_RATE_LIMIT', 2))
+    LLM_RATE_BURST = int(os.getenv('LLM_RATE_BURST', 4))
+
+    # Кэш результатов генерации: в памяти и в файле SQLite (пустой путь отключает диск)
+    GENERATION_CACHE_PATH = os.getenv('GENERATION_CACHE_PATH', os.path.join(BASE_DIR, 'instance', 'generation_cache.db'))
+    GENERATION_CACHE_MEMORY_BYTES = int(os.getenv('GENERATION_CACHE_MEMORY_BYTES', 8 * 1024 * 1024))
+    GENERATION_CACHE_DISK_BYTES = int(os.getenv('GENERATION_CACHE_DISK_BYTES', 256 * 1024 * 1024))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    CORS_HEADERS = 'Content-Type'
\ No newline at end of file
+
+    # Пул соединений. На процесс gunicorn нужно не меньше соединений, чем потоков (--threads)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+    CORS_HEADERS = 'Content-Type'
+
+    # Кэш сериализованных викторин: local (в процессе), redis (общий для воркеров) или fake
+    QUIZ_CACHE_BACKEND = os.getenv('QUIZ_CACHE_BACKEND', 'local')
+    QUIZ_CACHE_URL = os.getenv('QUIZ_CACHE_URL', 'redis://localhost:6379/0')
+    QUIZ_CACHE_SIZE = int(os.getenv('QUIZ_CACHE_SIZE', 1024))
+    QUIZ_CACHE_TTL = int(os.getenv('QUIZ_CACHE_TTL', 300))
+    QUIZ_COUNT_TTL = int(os.getenv('QUIZ_COUNT_TTL', 60))
+
+    # Размер пачки для импорта и экспорта викторин в NDJSON
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 100))
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 100))
+
+    # Проверка ответов: MULTIPLE - exact или partial, TEXT_ANSWER - normalized или fuzzy
+    SCORING_MULTIPLE_MODE = os.getenv('SCORING_MULTIPLE_MODE', 'exact')
+    SCORING_TEXT_MODE = os.getenv('SCORING_TEXT_MODE', 'normalized')
+    SCORING_FUZZY_THRESHOLD = float(os.getenv('SCORING_FUZZY_THRESHOLD', 0.85))
+    ANSWER_KEY_CACHE_SIZE = int(os.getenv('ANSWER_KEY_CACHE_SIZE', 256))
+
+    # Отложенная запись ответов: запрос подтверждается после записи в локальный журнал,
+    # а фоновый поток переносит отправки в базу пачками
+    SUBMISSION_WRITE_BEHIND = os.getenv('SUBMISSION_WRITE_BEHIND', 'false').lower() == 'true'
+    SUBMISSION_JOURNAL_PATH = os.getenv('SUBMISSION_JOURNAL_PATH', os.path.join(BASE_DIR, 'instance', 'submissions.db'))
+    SUBMISSION_BATCH_SIZE = int(os.getenv('SUBMISSION_BATCH_SIZE', 500))
+    SUBMISSION_FLUSH_INTERVAL = float(os.getenv('SUBMISSION_FLUSH_INTERVAL', 0.05))
+    SUBMISSION_LEASE = int(os.getenv('SUBMISSION_LEASE', 30))
+    SUBMISSION_MAX_ATTEMPTS = int(os.getenv('SUBMISSION_MAX_ATTEMPTS', 5))
+    SUBMISSION_RETENTION = int(os.getenv('SUBMISSION_RETENTION', 24 * 3600))
+
+    # Прохождение викторины по шагам: состояние попыток в локальном файле SQLite
+    ATTEMPT_STORE_PATH = os.getenv('ATTEMPT_STORE_PATH', os.path.join(BASE_DIR, 'instance', 'attempts.db'))
+    ATTEMPT_TTL = int(os.getenv('ATTEMPT_TTL', 2 * 3600))
+    ATTEMPT_PAGE_SIZE = int(os.getenv('ATTEMPT_PAGE_SIZE', 10))
+    ATTEMPT_MAX_PAGE_SIZE = int(os.getenv('ATTEMPT_MAX_PAGE_SIZE', 50))
+    ATTEMPT_CACHE_SIZE = int(os.getenv('ATTEMPT_CACHE_SIZE', 256))
+
+    # Рейтинги в памяти процесса сверяются с базой раз в LEADERBOARD_RECONCILE_INTERVAL секунд
+    LEADERBOARD_RECONCILE_INTERVAL = int(os.getenv('LEADERBOARD_RECONCILE_INTERVAL', 300))
+    LEADERBOARD_MAX_LIMIT = int(os.getenv('LEADERBOARD_MAX_LIMIT', 100))
+
+    # Максимальный период для /user-activity
+    ACTIVITY_MAX_DAYS = int(os.getenv('ACTIVITY_MAX_DAYS', 731))
+
+    # Аналитика ответов: число викторин в памяти и интервал пересборки из базы
+    ANALYTICS_CACHE_SIZE = int(os.getenv('ANALYTICS_CACHE_SIZE', 64))
+    ANALYTICS_REFRESH_INTERVAL = int(os.getenv('ANALYTICS_REFRESH_INTERVAL', 300))
+
+    # Поиск викторин: auto - tsvector в Postgres, индекс в памяти в остальных базах
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+    SEARCH_TEXT_CONFIG = os.getenv('SEARCH_TEXT_CONFIG', 'simple')
+    SEARCH_REFRESH_INTERVAL = int(os.getenv('SEARCH_REFRESH_INTERVAL', 300))
+    # Задержка фонового обновления документов Postgres: записи подряд обновляются одним запросом
+    SEARCH_REFRESH_DELAY = float(os.getenv('SEARCH_REFRESH_DELAY', 1.0))
+    SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', 50))
+
+    # Сжатие ответов API (br - если установлен пакет brotli, иначе gzip)
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+    COMPRESS_CACHE_SIZE = int(os.getenv('COMPRESS_CACHE_SIZE', 256))
+
+    # Удаление викторин: история ответов удаляется фоновой задачей пачками с паузой между ними
+    PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 1000))
+    PURGE_BATCH_PAUSE = float(os.getenv('PURGE_BATCH_PAUSE', 0.05))
+    PURGE_WORKERS = int(os.getenv('PURGE_WORKERS', 1))
+    PURGE_QUEUE_LIMIT = int(os.getenv('PURGE_QUEUE_LIMIT', 100))
@@ -0,0 +1,149 @@
+"""
+Движок, пул соединений и сессия на время запроса.
+
+Обработчики и token_required получают одну сессию через get_session():
+она создается при первом обращении в запросе и закрывается в teardown,
+поэтому аутентифицированный запрос занимает одно соединение из пула.
+"""
+import threading
+import time
+from flask import g
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from config import Config
+
+
+class PoolMetrics:
+    """
+    Счетчики пула соединений: выдачи, ожидание свободного соединения, таймауты
+    """
+    def __init__(self):
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def as_dict(self) -> dict:
+        waits = self.checkouts or 1
+        return {
+            'checkouts': self.checkouts,
+            'checkins': self.checkins,
+            'connects': self.connects,
+            'invalidations': self.invalidations,
+            'timeouts': self.timeouts,
+            'wait_avg_ms': round(self.wait_total * 1000 / waits, 3),
+            'wait_max_ms': round(self.wait_max * 1000, 3)
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool, который измеряет время ожидания свободного соединения
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+def engine_options(config=Config) -> dict:
+    """
+    Параметры create_engine из Config. Для SQLite используется пул по умолчанию
+    """
+    url = make_url(config.SQLALCHEMY_DATABASE_URI)
+    if url.get_backend_name() == 'sqlite':
+        return {}
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config.DB_POOL_SIZE,
+        'max_overflow': config.DB_MAX_OVERFLOW,
+        'pool_timeout': config.DB_POOL_TIMEOUT,
+        'pool_recycle': config.DB_POOL_RECYCLE,
+        'pool_pre_ping': config.DB_POOL_PRE_PING
+    }
+    if url.get_backend_name() == 'postgresql' and config.DB_STATEMENT_TIMEOUT_MS:
+        options['connect_args'] = {'options': f'-c statement_timeout={config.DB_STATEMENT_TIMEOUT_MS}'}
+    return options
+
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI, **engine_options())
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@event.listens_for(engine, 'connect')
+def on_connect(dbapi_connection, connection_record):
+    pool_metrics.connects += 1
+    if engine.dialect.name == 'sqlite':
+        # LIKE с учетом регистра, как в Postgres: так префиксный поиск использует индекс
+        dbapi_connection.execute('PRAGMA case_sensitive_like = ON')
+
+
+@event.listens_for(engine, 'checkout')
+def on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.checkouts += 1
+
+
+@event.listens_for(engine, 'checkin')
+def on_checkin(dbapi_connection, connection_record):
+    pool_metrics.checkins += 1
+
+
+@event.listens_for(engine, 'invalidate')
+def on_invalidate(dbapi_connection, connection_record, exception):
+    pool_metrics.invalidations += 1
+
+
+def get_session():
+    """
+    Сессия текущего запроса. Вне запроса используйте SessionLocal() и закрывайте ее сами
+    """
+    if 'db_session' not in g:
+        g.db_session = SessionLocal()
+    return g.db_session
+
+
+def close_session(exception=None):
+    session = g.pop('db_session', None)
+    if session is not None:
+        if exception is not None:
+            session.rollback()
+        session.close()
+
+
+def pool_stats() -> dict:
+    stats = pool_metrics.as_dict()
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'checked_in': pool.checkedin()
+        })
+    return stats
+
+
+def init_app(app):
+    app.teardown_appcontext(close_session)
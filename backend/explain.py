@@ -0,0 +1,89 @@
+"""
+EXPLAIN для горячих запросов из quiz.py и auth.py.
+Показывает план каждого запроса и отмечает последовательные сканы таблиц.
+На Postgres сканирование проверяется с enable_seqscan=off: если план все
+равно использует Seq Scan, подходящего индекса нет. На SQLite проверяется
+EXPLAIN QUERY PLAN (SCAN без USING INDEX).
+
+Запуск: flask explain-queries
+"""
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import User, Quiz, Category, Question, Options, TestResult, UserActivityDaily, AttemptAnswer
+
+_SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?!.*USING (?:COVERING )?INDEX)')
+_PG_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def hot_queries(session) -> dict:
+    """
+    Запросы в том виде, в котором их строят обработчики
+    """
+    sample_id = '00000000-0000-0000-0000-000000000000'
+    since = datetime.utcnow() - timedelta(days=90)
+    return {
+        'auth.login': session.query(User).filter_by(login='login'),
+        'auth.token_required': session.query(User).filter_by(id=sample_id),
+        'quiz.get_quizes[category]': session.query(Quiz, Category.name)
+            .join(Category, Quiz.category_id == Category.id)
+            .filter(Quiz.category_id == sample_id, Quiz.id > sample_id)
+            .order_by(Quiz.id).limit(100),
+        'quiz.get_quizes[title]': session.query(Quiz.id)
+            .filter(Quiz.title.like('abc%')),
+        'quiz.load_quiz_tree[questions]': session.query(Question)
+            .filter(Question.quiz_id.in_([sample_id])),
+        'quiz.load_quiz_tree[options]': session.query(Options)
+            .filter(Options.question_id.in_([sample_id])),
+        'quiz.get_user_tests_count': session.query(func.sum(UserActivityDaily.tests_count))
+            .filter(UserActivityDaily.user_id == sample_id),
+        'quiz.get_user_activity': session.query(UserActivityDaily.day, UserActivityDaily.tests_count)
+            .filter(UserActivityDaily.user_id == sample_id, UserActivityDaily.day >= since.date()),
+        'quiz.submit_answers[idempotency]': session.query(TestResult.id)
+            .filter(TestResult.user_id == sample_id, TestResult.idempotency_key == 'key'),
+        'quiz.get_quiz_analytics[answers]': session.query(AttemptAnswer.question_id, AttemptAnswer.option_ids)
+            .join(TestResult, TestResult.id == AttemptAnswer.test_result_id)
+            .filter(TestResult.quiz_id == sample_id),
+    }
+
+
+def explain(session, query) -> list:
+    """
+    Возвращает строки плана запроса для текущего диалекта
+    """
+    connection = session.connection()
+    dialect = connection.dialect
+    compiled = query.statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = connection.exec_driver_sql('EXPLAIN ' + str(compiled), params)
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)
+    return [row[-1] for row in rows]
+
+
+def sequential_scans(plan: list) -> list:
+    """
+    Возвращает таблицы, которые читаются последовательным сканом
+    """
+    pattern = _PG_SEQ_SCAN if any('Scan' in line for line in plan) else _SQLITE_SCAN
+    tables = []
+    for line in plan:
+        tables.extend(pattern.findall(line))
+    return tables
+
+
+def report(session) -> list:
+    """
+    Возвращает (имя запроса, план, таблицы с последовательным сканом)
+    """
+    results = []
+    for name, query in hot_queries(session).items():
+        plan = explain(session, query)
+        results.append((name, plan, sequential_scans(plan)))
+    session.rollback()
+    return results
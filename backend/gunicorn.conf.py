@@ -0,0 +1,20 @@
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+# При threads > 1 каждый поток держит свою сессию запроса, DB_POOL_SIZE должен быть не меньше threads
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+
+def post_fork(server, worker):
+    # Соединения, открытые в мастере до fork (preload_app), нельзя делить между процессами
+    from db import engine
+    engine.dispose()
+
+
+def post_worker_init(worker):
+    # Задачи генерации, брошенные перезапущенным воркером, завершаются ошибкой.
+    # Только при старте воркера: не при сборке приложения для flask-команд и тестов
+    from quiz.jobs import recover_stale_jobs
+    recover_stale_jobs()
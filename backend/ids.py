@@ -0,0 +1,44 @@
+"""
+Генерация идентификаторов записей.
+
+UUIDv7 (RFC 9562): первые 48 бит - время в миллисекундах, поэтому новые
+ключи растут монотонно и вставка идет в конец индекса, а не в случайную
+страницу, как с uuid4. В пределах одной миллисекунды порядок задает
+12-битный счетчик, остальные 62 бита случайные
+"""
+import os
+import threading
+import time
+from uuid import UUID
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> UUID:
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            # Счетчик начинается со случайного значения в нижней половине диапазона
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # Счетчик переполнен (или часы ушли назад): берем следующую миллисекунду
+                _last_ms += 1
+                _counter = 0
+        ms = _last_ms
+        counter = _counter
+    random_bits = int.from_bytes(os.urandom(8), 'big') & 0x3FFFFFFFFFFFFFFF
+    value = (ms & 0xFFFFFFFFFFFF) << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | random_bits
+    return UUID(int=value)
+
+
+def new_id() -> str:
+    """
+    Новый идентификатор записи в виде строки
+    """
+    return str(uuid7())
@@ -0,0 +1,127 @@
+"""
+Версионированные миграции схемы базы данных.
+
+Каждая миграция - модуль migrations/versions/NNNN_описание.py с функцией
+upgrade(connection). Примененные версии записываются в таблицу
+schema_migrations, каждая миграция выполняется в своей транзакции.
+На пустой базе схема создается целиком по моделям (create_all), а все миграции
+отмечаются примененными. Миграции пишутся идемпотентными: повторное создание
+объектов пропускается.
+
+Запуск: flask db-upgrade
+"""
+import importlib
+import os
+import re
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, inspect
+
+VERSIONS_DIR = os.path.join(os.path.dirname(__file__), 'versions')
+_VERSION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+# Произвольный ключ advisory lock, чтобы два процесса не мигрировали одновременно
+_PG_LOCK_KEY = 727001
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', String(4), primary_key=True),
+    Column('name', String(128), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+
+def discover() -> list:
+    """
+    Возвращает список (версия, имя модуля) в порядке версий
+    """
+    migrations = []
+    for filename in sorted(os.listdir(VERSIONS_DIR)):
+        match = _VERSION_FILE.match(filename)
+        if match:
+            migrations.append((match.group(1), filename[:-3]))
+    return migrations
+
+
+def applied_versions(connection) -> set:
+    schema_migrations.create(connection, checkfirst=True)
+    return {row.version for row in connection.execute(schema_migrations.select())}
+
+
+def pending(engine) -> list:
+    with engine.begin() as connection:
+        applied = applied_versions(connection)
+    return [(version, name) for version, name in discover() if version not in applied]
+
+
+def create_schema(engine, metadata) -> bool:
+    """
+    Создает схему по моделям, если база пустая, и отмечает все миграции примененными.
+    Возвращает True, если схема была создана
+    """
+    with engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection.exec_driver_sql(f'SELECT pg_advisory_xact_lock({_PG_LOCK_KEY})')
+        if inspect(connection).has_table('users'):
+            return False
+        metadata.create_all(connection)
+        applied = applied_versions(connection)
+        connection.execute(schema_migrations.insert(), [
+            {'version': version, 'name': name, 'applied_at': datetime.utcnow()}
+            for version, name in discover() if version not in applied
+        ])
+    return True
+
+
+def upgrade(engine) -> list:
+    """
+    Применяет все непримененные миграции и возвращает их список
+    """
+    applied_now = []
+    for version, name in discover():
+        with engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                connection.exec_driver_sql(f'SELECT pg_advisory_xact_lock({_PG_LOCK_KEY})')
+            if version in applied_versions(connection):
+                continue
+            module = importlib.import_module(f'migrations.versions.{name}')
+            module.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+            applied_now.append(name)
+    return applied_now
+
+
+def reflect_table(connection, table_name: str) -> Table:
+    return Table(table_name, MetaData(), autoload_with=connection)
+
+
+def create_index(connection, name: str, table_name: str, *columns: str, **kwargs):
+    """
+    Создает индекс, если его еще нет
+    """
+    table = reflect_table(connection, table_name)
+    Index(name, *(table.c[column] for column in columns), **kwargs).create(connection, checkfirst=True)
+
+
+def has_column(connection, table_name: str, column_name: str) -> bool:
+    return any(column['name'] == column_name for column in inspect(connection).get_columns(table_name))
+
+
+def add_column(connection, table_name: str, column: Column):
+    """
+    Добавляет колонку в существующую таблицу, если ее еще нет
+    """
+    if has_column(connection, table_name, column.name):
+        return
+    table = Table(table_name, MetaData(), column)
+    compiler = connection.dialect.ddl_compiler(connection.dialect, None)
+    preparer = compiler.preparer
+    specification = compiler.get_column_specification(column)
+    # Внешний ключ задается в самой колонке: get_column_specification его не включает
+    for foreign_key in column.foreign_keys:
+        referred_table, referred_column = foreign_key.target_fullname.split('.')
+        specification += f' REFERENCES {preparer.quote(referred_table)} ({preparer.quote(referred_column)})'
+        if foreign_key.ondelete:
+            specification += f' ON DELETE {foreign_key.ondelete}'
+    connection.exec_driver_sql(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {specification}')
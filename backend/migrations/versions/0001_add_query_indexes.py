@@ -0,0 +1,15 @@
+"""
+Индексы для внешних ключей и фильтров, используемых в quiz.py и auth.py
+"""
+from migrations import create_index
+
+
+def upgrade(connection):
+    create_index(connection, 'ix_quiz_category_id_id', 'quiz', 'category_id', 'id')
+    create_index(connection, 'ix_quiz_title', 'quiz', 'title', postgresql_ops={'title': 'varchar_pattern_ops'})
+    create_index(connection, 'ix_questions_quiz_id', 'questions', 'quiz_id')
+    create_index(connection, 'ix_options_question_id', 'options', 'question_id')
+    create_index(connection, 'ix_user_answer_user_id_question_id', 'user_answer', 'user_id', 'question_id')
+    create_index(connection, 'ix_user_answer_question_id', 'user_answer', 'question_id')
+    create_index(connection, 'ix_user_answer_option_id', 'user_answer', 'option_id')
+    create_index(connection, 'ix_test_result_user_id_completed_at', 'test_result', 'user_id', 'completed_at')
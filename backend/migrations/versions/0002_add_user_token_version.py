@@ -0,0 +1,9 @@
+"""
+Версия токена пользователя для отзыва JWT
+"""
+from sqlalchemy import Column, Integer
+from migrations import add_column
+
+
+def upgrade(connection):
+    add_column(connection, 'users', Column('token_version', Integer, nullable=False, server_default='0'))
@@ -0,0 +1,10 @@
+"""
+Ключ идемпотентности отправки ответов
+"""
+from sqlalchemy import Column, String
+from migrations import add_column, create_index
+
+
+def upgrade(connection):
+    add_column(connection, 'test_result', Column('idempotency_key', String(100), nullable=True))
+    create_index(connection, 'ix_test_result_user_id_idempotency_key', 'test_result', 'user_id', 'idempotency_key', unique=True)
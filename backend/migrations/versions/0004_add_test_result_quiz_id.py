@@ -0,0 +1,10 @@
+"""
+Викторина результата теста для рейтингов по викторинам и категориям
+"""
+from sqlalchemy import Column, String
+from migrations import add_column, create_index
+
+
+def upgrade(connection):
+    add_column(connection, 'test_result', Column('quiz_id', String(36), nullable=True))
+    create_index(connection, 'ix_test_result_quiz_id_user_id', 'test_result', 'quiz_id', 'user_id')
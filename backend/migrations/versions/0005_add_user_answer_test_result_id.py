@@ -0,0 +1,10 @@
+"""
+Связь ответа пользователя с попыткой (test_result)
+"""
+from sqlalchemy import Column, ForeignKey, String
+from migrations import add_column, create_index
+
+
+def upgrade(connection):
+    add_column(connection, 'user_answer', Column('test_result_id', String(36), ForeignKey('test_result.id'), nullable=True))
+    create_index(connection, 'ix_user_answer_test_result_id', 'user_answer', 'test_result_id')
@@ -0,0 +1,68 @@
+"""
+Ответы попыток: таблица attempt_answer (строка на вопрос, выбранные варианты
+списком) и перенос в нее ответов из user_answer, у которых указана попытка.
+Ответы без попытки остаются в user_answer
+"""
+from sqlalchemy import Column, ForeignKey, MetaData, String, Table, Text, select
+from migrations import reflect_table
+
+BATCH_SIZE = 1000
+
+
+def attempt_answer_table(connection) -> Table:
+    metadata = MetaData()
+    # Таблицы внешних ключей отражаются в ту же MetaData
+    Table('test_result', metadata, autoload_with=connection)
+    Table('questions', metadata, autoload_with=connection)
+    return Table(
+        'attempt_answer', metadata,
+        Column('test_result_id', String(36), ForeignKey('test_result.id'), primary_key=True),
+        Column('question_id', String(36), ForeignKey('questions.id'), primary_key=True),
+        Column('option_ids', Text, nullable=True),
+        Column('text_answer', Text, nullable=True)
+    )
+
+
+def upgrade(connection):
+    attempt_answer = attempt_answer_table(connection)
+    attempt_answer.create(connection, checkfirst=True)
+
+    user_answer = reflect_table(connection, 'user_answer')
+    existing = select(attempt_answer.c.test_result_id, attempt_answer.c.question_id)
+    existing = {tuple(row) for row in connection.execute(existing)}
+    rows = connection.execute(
+        select(user_answer.c.test_result_id, user_answer.c.question_id, user_answer.c.option_id, user_answer.c.text_answer)
+        .where(user_answer.c.test_result_id.isnot(None))
+        .order_by(user_answer.c.test_result_id, user_answer.c.question_id)
+    )
+
+    batch = []
+    current = None
+    for test_result_id, question_id, option_id, text_answer in rows:
+        key = (test_result_id, question_id)
+        if current is None or current['key'] != key:
+            if current is not None and current['key'] not in existing:
+                batch.append(current)
+            current = {'key': key, 'option_ids': [], 'text_answer': None}
+        if option_id is not None:
+            current['option_ids'].append(option_id)
+        if text_answer is not None and current['text_answer'] is None:
+            current['text_answer'] = text_answer
+        if len(batch) >= BATCH_SIZE:
+            _insert(connection, attempt_answer, batch)
+            batch = []
+    if current is not None and current['key'] not in existing:
+        batch.append(current)
+    if batch:
+        _insert(connection, attempt_answer, batch)
+
+    connection.execute(user_answer.delete().where(user_answer.c.test_result_id.isnot(None)))
+
+
+def _insert(connection, attempt_answer: Table, batch: list):
+    connection.execute(attempt_answer.insert(), [{
+        'test_result_id': answer['key'][0],
+        'question_id': answer['key'][1],
+        'option_ids': ','.join(answer['option_ids']) if answer['option_ids'] else None,
+        'text_answer': answer['text_answer']
+    } for answer in batch])
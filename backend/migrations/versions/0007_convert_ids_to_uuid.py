@@ -0,0 +1,84 @@
+"""
+Ключи и ссылки на них - нативный uuid в Postgres вместо varchar(36).
+Колонки меняются группами (первичный ключ и все ссылающиеся на него колонки):
+внешние ключи группы снимаются, тип меняется через USING col::uuid,
+после чего внешние ключи создаются заново. Если в группе есть значение,
+которое не является UUID, миграция останавливается с ошибкой и ничего не меняет.
+В SQLite ключи остаются строками, миграция ничего не делает
+"""
+from sqlalchemy import inspect
+
+# Первичный ключ -> колонки, которые на него ссылаются (в том числе без внешнего ключа)
+KEY_GROUPS = [
+    (('users', 'id'), [
+        ('user_answer', 'user_id'), ('test_result', 'user_id'),
+        ('user_activity_daily', 'user_id'), ('generation_job', 'user_id'),
+    ]),
+    (('category', 'id'), [('quiz', 'category_id'), ('generation_job', 'category_id')]),
+    (('quiz', 'id'), [('questions', 'quiz_id'), ('test_result', 'quiz_id'), ('generation_job', 'quiz_id')]),
+    (('questions', 'id'), [('options', 'question_id'), ('user_answer', 'question_id'), ('attempt_answer', 'question_id')]),
+    (('options', 'id'), [('user_answer', 'option_id')]),
+    (('test_result', 'id'), [('user_answer', 'test_result_id'), ('attempt_answer', 'test_result_id')]),
+    (('user_answer', 'id'), []),
+    (('generation_job', 'id'), []),
+]
+
+UUID_PATTERN = r'^\{?[0-9a-fA-F]{8}-?([0-9a-fA-F]{4}-?){3}[0-9a-fA-F]{12}\}?$'
+
+
+def quote(connection, name: str) -> str:
+    return connection.dialect.identifier_preparer.quote(name)
+
+
+def upgrade(connection):
+    if connection.dialect.name != 'postgresql':
+        return
+    tables = set(inspect(connection).get_table_names())
+
+    for (table, key), references in KEY_GROUPS:
+        # Новый инспектор на каждую группу: отраженные схемы кэшируются
+        inspector = inspect(connection)
+        columns = [(name, column) for name, column in [(table, key)] + references if name in tables]
+        types = {
+            (name, column['name']): column['type'] for name, _ in columns
+            for column in inspector.get_columns(name)
+        }
+        columns = [(name, column) for name, column in columns
+                   if (name, column) in types and types[(name, column)].__visit_name__.lower() != 'uuid']
+        if not columns:
+            continue
+
+        for name, column in columns:
+            invalid = connection.exec_driver_sql(
+                f'SELECT {quote(connection, column)} FROM {quote(connection, name)} '
+                f'WHERE {quote(connection, column)} IS NOT NULL AND {quote(connection, column)} !~ %(pattern)s LIMIT 1',
+                {'pattern': UUID_PATTERN}
+            ).scalar()
+            if invalid is not None:
+                raise ValueError(f"{name}.{column}: значение {invalid!r} не является UUID, перевод ключей на uuid невозможен")
+
+        # Внешние ключи, которые ссылаются на ключ группы
+        foreign_keys = []
+        for name in {name for name, _ in columns}:
+            for foreign_key in inspector.get_foreign_keys(name):
+                if foreign_key['referred_table'] == table and foreign_key['name']:
+                    foreign_keys.append((name, foreign_key))
+        for name, foreign_key in foreign_keys:
+            connection.exec_driver_sql(
+                f'ALTER TABLE {quote(connection, name)} DROP CONSTRAINT {quote(connection, foreign_key["name"])}'
+            )
+
+        for name, column in columns:
+            connection.exec_driver_sql(
+                f'ALTER TABLE {quote(connection, name)} ALTER COLUMN {quote(connection, column)} '
+                f'TYPE uuid USING {quote(connection, column)}::uuid'
+            )
+
+        for name, foreign_key in foreign_keys:
+            constrained = ', '.join(quote(connection, column) for column in foreign_key['constrained_columns'])
+            referred = ', '.join(quote(connection, column) for column in foreign_key['referred_columns'])
+            connection.exec_driver_sql(
+                f'ALTER TABLE {quote(connection, name)} ADD CONSTRAINT {quote(connection, foreign_key["name"])} '
+                f'FOREIGN KEY ({constrained}) REFERENCES {quote(connection, table)} ({referred})'
+                + (f' ON DELETE {foreign_key["options"]["ondelete"]}' if foreign_key['options'].get('ondelete') else '')
+            )
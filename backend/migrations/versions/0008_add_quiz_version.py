@@ -0,0 +1,9 @@
+"""
+Версия викторины для оптимистичной блокировки при обновлении
+"""
+from sqlalchemy import Column, Integer
+from migrations import add_column
+
+
+def upgrade(connection):
+    add_column(connection, 'quiz', Column('version', Integer, nullable=False, server_default='1'))
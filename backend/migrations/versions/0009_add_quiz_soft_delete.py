@@ -0,0 +1,50 @@
+"""
+Мягкое удаление викторин (deleted_at, archived) и ON DELETE CASCADE
+для вопросов, вариантов и ответов. В SQLite внешние ключи не меняются
+(ALTER TABLE не умеет менять ограничения), удаление там выполняется
+пакетами в quiz/purge.py
+"""
+from sqlalchemy import Boolean, Column, DateTime, false, inspect
+from migrations import add_column
+
+# (таблица, колонка) -> таблица, на которую ссылается внешний ключ
+CASCADE_KEYS = [
+    ('questions', 'quiz_id', 'quiz'),
+    ('options', 'question_id', 'questions'),
+    ('user_answer', 'question_id', 'questions'),
+    ('user_answer', 'option_id', 'options'),
+    ('attempt_answer', 'question_id', 'questions'),
+]
+
+
+def quote(connection, name: str) -> str:
+    return connection.dialect.identifier_preparer.quote(name)
+
+
+def upgrade(connection):
+    add_column(connection, 'quiz', Column('deleted_at', DateTime(timezone=True), nullable=True))
+    add_column(connection, 'quiz', Column('archived', Boolean, nullable=False, server_default=false()))
+    if connection.dialect.name != 'postgresql':
+        return
+
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for table, column, referred in CASCADE_KEYS:
+        if table not in tables:
+            continue
+        for foreign_key in inspector.get_foreign_keys(table):
+            if foreign_key['referred_table'] != referred or foreign_key['constrained_columns'] != [column]:
+                continue
+            if (foreign_key['options'].get('ondelete') or '').upper() == 'CASCADE':
+                continue
+            name = foreign_key['name']
+            connection.exec_driver_sql(f'ALTER TABLE {quote(connection, table)} DROP CONSTRAINT {quote(connection, name)}')
+            # NOT VALID: существующие строки уже проверены старым ограничением, таблица не сканируется под блокировкой
+            connection.exec_driver_sql(
+                f'ALTER TABLE {quote(connection, table)} ADD CONSTRAINT {quote(connection, name)} '
+                f'FOREIGN KEY ({quote(connection, column)}) REFERENCES {quote(connection, referred)} '
+                f'({quote(connection, foreign_key["referred_columns"][0])}) ON DELETE CASCADE NOT VALID'
+            )
+            connection.exec_driver_sql(
+                f'ALTER TABLE {quote(connection, table)} VALIDATE CONSTRAINT {quote(connection, name)}'
+            )
@@ -0,0 +1,69 @@
+"""
+Таблицы user_activity_daily, generation_job и quiz_search для существующих баз.
+Создаются после 0007: внешние ключи должны совпадать по типу с ключами,
+которые в Postgres уже переведены на uuid. Дневные итоги активности
+заполняются из test_result, если таблица создана этой миграцией
+"""
+from sqlalchemy import (
+    Column, Date, DateTime, Enum, ForeignKey, Index, Integer, MetaData, Table, Text, func, insert, inspect, select
+)
+from sqlalchemy.dialects import postgresql
+from models import GUID
+
+JOB_STATUSES = ('PENDING', 'RUNNING', 'SUCCEEDED', 'FAILED')
+
+
+def tables(connection) -> dict:
+    metadata = MetaData()
+    # Таблицы внешних ключей отражаются в ту же MetaData
+    Table('users', metadata, autoload_with=connection)
+    Table('category', metadata, autoload_with=connection)
+    return {
+        'user_activity_daily': Table(
+            'user_activity_daily', metadata,
+            Column('user_id', GUID, ForeignKey('users.id'), primary_key=True),
+            Column('day', Date, primary_key=True),
+            Column('tests_count', Integer, nullable=False),
+            Column('score_sum', Integer, nullable=False)
+        ),
+        'generation_job': Table(
+            'generation_job', metadata,
+            Column('id', GUID, primary_key=True),
+            Column('user_id', GUID, ForeignKey('users.id'), nullable=False),
+            Column('category_id', GUID, ForeignKey('category.id'), nullable=False),
+            Column('status', Enum(*JOB_STATUSES, name='jobstatus'), nullable=False),
+            Column('progress', Integer, nullable=False),
+            Column('attempts', Integer, nullable=False),
+            Column('quiz_id', GUID, nullable=True),
+            Column('error', Text, nullable=True),
+            Column('created_at', DateTime(timezone=True), server_default=func.now(), nullable=False),
+            Column('updated_at', DateTime(timezone=True), server_default=func.now(), nullable=False),
+            Index('ix_generation_job_user_id_created_at', 'user_id', 'created_at')
+        ),
+        'quiz_search': Table(
+            'quiz_search', metadata,
+            Column('quiz_id', GUID, primary_key=True),
+            Column('category_id', GUID, nullable=False),
+            Column('document', Text().with_variant(postgresql.TSVECTOR(), 'postgresql')),
+            Index('ix_quiz_search_document', 'document', postgresql_using='gin'),
+            Index('ix_quiz_search_category_id', 'category_id')
+        ),
+    }
+
+
+def upgrade(connection):
+    existing = set(inspect(connection).get_table_names())
+    created = tables(connection)
+    for table in created.values():
+        table.create(connection, checkfirst=True)
+
+    if 'user_activity_daily' not in existing:
+        activity = created['user_activity_daily']
+        test_result = Table('test_result', MetaData(), autoload_with=connection)
+        day = func.date(test_result.c.completed_at)
+        connection.execute(insert(activity).from_select(
+            ['user_id', 'day', 'tests_count', 'score_sum'],
+            select(test_result.c.user_id, day, func.count(test_result.c.id), func.coalesce(func.sum(test_result.c.score), 0))
+            .where(test_result.c.user_id.isnot(None))
+            .group_by(test_result.c.user_id, day)
+        ))
@@ -0,0 +1,12 @@
+"""
+Время последней записи викторины: версия списка викторин для ETag (max(updated_at))
+"""
+from sqlalchemy import Column, DateTime
+from migrations import add_column, create_index, has_column
+
+
+def upgrade(connection):
+    if not has_column(connection, 'quiz', 'updated_at'):
+        add_column(connection, 'quiz', Column('updated_at', DateTime(timezone=True), nullable=True))
+        connection.exec_driver_sql('UPDATE quiz SET updated_at = CURRENT_TIMESTAMP')
+    create_index(connection, 'ix_quiz_updated_at', 'quiz', 'updated_at')
@@ -0,0 +1,20 @@
+"""
+Поисковые документы (quiz_search) для викторин, созданных до появления таблицы.
+Нужны только в Postgres: в остальных базах индекс строится в памяти.
+Викторины, у которых документ уже есть, пропускаются
+"""
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from models import Quiz, QuizSearchDocument
+
+
+def upgrade(connection):
+    if connection.dialect.name != 'postgresql':
+        return
+    from quiz.search import document_vector
+    source = select(Quiz.id, Quiz.category_id, document_vector(Quiz)).where(Quiz.deleted_at.is_(None))
+    connection.execute(
+        insert(QuizSearchDocument.__table__)
+        .from_select(['quiz_id', 'category_id', 'document'], source)
+        .on_conflict_do_nothing(index_elements=['quiz_id'])
+    )
@@ -1,81 +1,266 @@
-from uuid import uuid4
 from enum import Enum
-from sqlalchemy import create_engine, Column, String,Integer, DateTime, ForeignKey, Enum as dbenum, Text, Boolean
+from uuid import UUID
+from sqlalchemy import Column, String,Integer, Date, DateTime, ForeignKey, Enum as dbenum, Text, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.sql import func
-from config import Config
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import false, func
+from sqlalchemy.sql.functions import FunctionElement
+from db import engine, SessionLocal
+from ids import new_id
 
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
 Base = declarative_base()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class GUID(TypeDecorator):
+    """
+    UUID: в Postgres - нативный uuid (16 байт), в остальных базах - строка из 36 символов.
+    В Python значение всегда строка. В Postgres строка, не являющаяся UUID,
+    передается как NULL: поиск по такому ID ничего не находит, а не падает с ошибкой
+    """
+    impl = String(36)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID())
+        return dialect.type_descriptor(String(36))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if dialect.name == 'postgresql':
+            try:
+                return str(value if isinstance(value, UUID) else UUID(str(value)))
+            except ValueError:
+                return None
+        return str(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else str(value)
+
+
+class IdList(TypeDecorator):
+    """
+    Список ID в одной текстовой колонке через запятую
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else ','.join(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value.split(',') if value else []
+
+
+class utcnow(FunctionElement):
+    """
+    Время записи строки по часам сервера базы. В Postgres - clock_timestamp() (момент
+    выполнения запроса, а не начала транзакции), в SQLite - с миллисекундами:
+    CURRENT_TIMESTAMP там с точностью до секунды
+    """
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+    return 'clock_timestamp()'
+
+
+@compiles(utcnow, 'sqlite')
+def _utcnow_sqlite(element, compiler, **kw):
+    return "STRFTIME('%Y-%m-%d %H:%M:%f', 'now')"
+
 
 class QuestionType(str,Enum):
     SINGLE = "SINGLE"
     MULTIPLE = "MULTIPLE"
     TEXT_ANSWER = "TEXT_ANSWER"
 
+class JobStatus(str,Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
 
 class User(Base):
     __tablename__ = 'users'
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid4()))
+    id = Column(GUID, primary_key=True, default=new_id)
     login = Column(String(80), unique=True, nullable=False)
     password = Column(String(128), unique=False, nullable=False)
     name = Column(String(20))
     surname = Column(String(20))
     score = Column(Integer, default=0)
+    # Увеличивается при смене данных пользователя, чтобы отозвать выданные токены
+    token_version = Column(Integer, nullable=False, default=0, server_default='0')
 
 class Category(Base):
     __tablename__ = 'category'
 
-    id = Column(String(32), primary_key=True,nullable=False, default=lambda:uuid4())
+    id = Column(GUID, primary_key=True,nullable=False, default=new_id)
     name = Column(String(36), nullable = False)
 
 class Quiz(Base):
     __tablename__ = 'quiz'
+    __table_args__ = (
+        # Список викторин: фильтр по категории с пагинацией по id
+        Index('ix_quiz_category_id_id', 'category_id', 'id'),
+        # Поиск по префиксу названия (LIKE 'prefix%')
+        Index('ix_quiz_title', 'title', postgresql_ops={'title': 'varchar_pattern_ops'}),
+        # Версия списка викторин для ETag: max(updated_at) по индексу
+        Index('ix_quiz_updated_at', 'updated_at'),
+    )
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid4()))
+    id = Column(GUID, primary_key=True, default=new_id)
     title = Column(String(56), nullable=False)
     description = Column(Text)
-    category_id = Column(String(36), ForeignKey('category.id'), nullable=False)
+    category_id = Column(GUID, ForeignKey('category.id'), nullable=False)
     image_url = Column(String(500), nullable=True, default="https://res.cloudinary.com/dq2pbzrtu/image/upload/v1746344368/localhost-file-not-found_w9r4qz.jpg")
+    # Увеличивается при каждом изменении викторины (оптимистичная блокировка при PATCH)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+    # Мягкое удаление: викторина скрыта с этого момента. Архивные можно восстановить,
+    # у остальных вопросы и история ответов удаляются фоновой задачей (quiz/purge.py)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+    archived = Column(Boolean, nullable=False, default=False, server_default=false())
+    # Время последней записи (в том числе удаления и восстановления), ставится базой
+    updated_at = Column(DateTime(timezone=True), default=utcnow(), onupdate=utcnow())
+
+    questions = relationship('Question', back_populates='quiz')
 
 
 class Question(Base):
     __tablename__ = 'questions'
+    __table_args__ = (
+        Index('ix_questions_quiz_id', 'quiz_id'),
+    )
 
-    id = Column(String(36), primary_key=True, nullable=False, default=lambda:uuid4())
+    id = Column(GUID, primary_key=True, nullable=False, default=new_id)
     question_type = Column(dbenum(QuestionType), nullable=False)
-    quiz_id = Column(String(36), ForeignKey('quiz.id'), nullable=False)
+    quiz_id = Column(GUID, ForeignKey('quiz.id', ondelete='CASCADE'), nullable=False)
     points = Column(Integer, nullable=False, default=100)
     question = Column(Text, nullable=True)
     image_url = Column(String(500), nullable=True)
 
+    quiz = relationship('Quiz', back_populates='questions')
+    options = relationship('Options', back_populates='question')
+
 class Options(Base):
     __tablename__ = 'options'
+    __table_args__ = (
+        Index('ix_options_question_id', 'question_id'),
+    )
 
-    id = Column(String(36), primary_key=True, nullable=False, default=lambda:uuid4())
-    question_id = Column(String(36), ForeignKey('questions.id'))
+    id = Column(GUID, primary_key=True, nullable=False, default=new_id)
+    question_id = Column(GUID, ForeignKey('questions.id', ondelete='CASCADE'))
     name = Column(String(100),nullable=False)
     is_correct = Column(Boolean, default=False)
 
+    question = relationship('Question', back_populates='options')
+
 class UserAnswer(Base):
     __tablename__ = 'user_answer'
+    __table_args__ = (
+        Index('ix_user_answer_user_id_question_id', 'user_id', 'question_id'),
+        Index('ix_user_answer_question_id', 'question_id'),
+        Index('ix_user_answer_option_id', 'option_id'),
+        Index('ix_user_answer_test_result_id', 'test_result_id'),
+    )
 
-    id = Column(String(36), primary_key=True, nullable=False, default=lambda:uuid4())
-    user_id = Column(String(36), ForeignKey('users.id'))
-    question_id = Column(String(36), ForeignKey('questions.id'))
+    id = Column(GUID, primary_key=True, nullable=False, default=new_id)
+    user_id = Column(GUID, ForeignKey('users.id'))
+    question_id = Column(GUID, ForeignKey('questions.id', ondelete='CASCADE'))
     text_answer = Column(Text, nullable=True)
-    option_id = Column(String(36), ForeignKey('options.id'), nullable=True)
+    option_id = Column(GUID, ForeignKey('options.id', ondelete='CASCADE'), nullable=True)
+    # Ответы с попыткой переносятся в attempt_answer (миграция 0006), здесь остаются только старые
+    test_result_id = Column(GUID, ForeignKey('test_result.id'), nullable=True)
 
 class TestResult(Base):
     __tablename__ = 'test_result'
+    __table_args__ = (
+        # Количество тестов и активность пользователя по дням
+        Index('ix_test_result_user_id_completed_at', 'user_id', 'completed_at'),
+        # Повторная отправка с тем же ключом идемпотентности не засчитывается дважды
+        Index('ix_test_result_user_id_idempotency_key', 'user_id', 'idempotency_key', unique=True),
+        # Пересчет рейтингов по викторинам и категориям
+        Index('ix_test_result_quiz_id_user_id', 'quiz_id', 'user_id'),
+    )
 
-    id = Column(String(36), primary_key=True, nullable=False, default=lambda:uuid4())
-    user_id = Column(String(36), ForeignKey('users.id'))
+    id = Column(GUID, primary_key=True, nullable=False, default=new_id)
+    user_id = Column(GUID, ForeignKey('users.id'))
     score = Column(Integer)
     completed_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now(), nullable=False)
+    idempotency_key = Column(String(100), nullable=True)
+    # Без внешнего ключа: результаты остаются в журнале баллов после удаления викторины
+    quiz_id = Column(GUID, nullable=True)
+
+class AttemptAnswer(Base):
+    """
+    Ответ на вопрос в рамках попытки: одна строка на вопрос,
+    выбранные варианты хранятся списком в option_ids
+    """
+    __tablename__ = 'attempt_answer'
+
+    test_result_id = Column(GUID, ForeignKey('test_result.id'), primary_key=True)
+    question_id = Column(GUID, ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True)
+    option_ids = Column(IdList, nullable=True)
+    text_answer = Column(Text, nullable=True)
+
+class QuizSearchDocument(Base):
+    """
+    Поисковый документ викторины для Postgres: tsvector из названия, описания,
+    вопросов и вариантов ответов. В остальных базах не заполняется,
+    поиск идет по индексу в памяти (quiz/search.py)
+    """
+    __tablename__ = 'quiz_search'
+    __table_args__ = (
+        Index('ix_quiz_search_document', 'document', postgresql_using='gin'),
+        Index('ix_quiz_search_category_id', 'category_id'),
+    )
+
+    # Без внешнего ключа: документ удаляется вслед за викториной при обновлении поиска
+    quiz_id = Column(GUID, primary_key=True)
+    category_id = Column(GUID, nullable=False)
+    document = Column(Text().with_variant(postgresql.TSVECTOR(), 'postgresql'))
+
+class UserActivityDaily(Base):
+    """
+    Количество пройденных тестов и сумма баллов пользователя за день.
+    Обновляется при сохранении результатов, пересобирается командой flask backfill-activity
+    """
+    __tablename__ = 'user_activity_daily'
+
+    user_id = Column(GUID, ForeignKey('users.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    tests_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+
+class GenerationJob(Base):
+    __tablename__ = 'generation_job'
+    __table_args__ = (
+        Index('ix_generation_job_user_id_created_at', 'user_id', 'created_at'),
+    )
 
-Base.metadata.create_all(engine) 
\ No newline at end of file
+    id = Column(GUID, primary_key=True, default=new_id)
+    user_id = Column(GUID, ForeignKey('users.id'), nullable=False)
+    category_id = Column(GUID, ForeignKey('category.id'), nullable=False)
+    status = Column(dbenum(JobStatus), nullable=False, default=JobStatus.PENDING)
+    progress = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Без внешнего ключа: викторину могут удалить, а история задачи останется
+    quiz_id = Column(GUID, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
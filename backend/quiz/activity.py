@@ -0,0 +1,144 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from models import TestResult, UserActivityDaily
+
+BUCKETS = ('day', 'week', 'month')
+
+
+def activity_deltas(submissions: Iterable[dict]) -> Dict[Tuple[str, date], Tuple[int, int]]:
+    """
+    Количество тестов и сумма баллов по (пользователь, день) для пачки отправок
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for submission in submissions:
+        day = datetime.fromisoformat(submission['completed_at']).date()
+        delta = deltas[(submission['user_id'], day)]
+        delta[0] += 1
+        delta[1] += submission['score']
+    return {key: tuple(value) for key, value in deltas.items()}
+
+
+def upsert_activity(session, deltas: Dict[Tuple[str, date], Tuple[int, int]]):
+    """
+    Добавляет отправки в дневные итоги одним INSERT ... ON CONFLICT DO UPDATE
+    (Postgres и SQLite), в остальных базах - UPDATE и INSERT для новых дней
+    """
+    if not deltas:
+        return
+    rows = [
+        {'user_id': user_id, 'day': day, 'tests_count': count, 'score_sum': score}
+        for (user_id, day), (count, score) in deltas.items()
+    ]
+    table = UserActivityDaily.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        statement = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id', 'day'],
+            set_={
+                'tests_count': table.c.tests_count + statement.excluded.tests_count,
+                'score_sum': table.c.score_sum + statement.excluded.score_sum
+            }
+        )
+        session.execute(statement, rows)
+        return
+    for row in rows:
+        updated = session.execute(
+            table.update()
+            .where(table.c.user_id == row['user_id'], table.c.day == row['day'])
+            .values(tests_count=table.c.tests_count + row['tests_count'], score_sum=table.c.score_sum + row['score_sum'])
+        ).rowcount
+        if not updated:
+            session.execute(table.insert(), row)
+
+
+def backfill_activity(session, user_ids: Optional[List[str]] = None) -> int:
+    """
+    Пересобирает дневные итоги из test_result одним INSERT ... SELECT
+    и возвращает число строк итогов. Не коммитит транзакцию
+    """
+    table = UserActivityDaily.__table__
+    day = func.date(TestResult.completed_at)
+    source = (
+        select(TestResult.user_id, day, func.count(TestResult.id), func.coalesce(func.sum(TestResult.score), 0))
+        .where(TestResult.user_id.isnot(None))
+        .group_by(TestResult.user_id, day)
+    )
+    delete = table.delete()
+    if user_ids is not None:
+        source = source.where(TestResult.user_id.in_(user_ids))
+        delete = delete.where(table.c.user_id.in_(user_ids))
+    session.execute(delete)
+    return session.execute(
+        insert(table).from_select(['user_id', 'day', 'tests_count', 'score_sum'], source)
+    ).rowcount
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day: date, bucket: str) -> date:
+    if bucket == 'week':
+        return day + timedelta(days=7)
+    if bucket == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def load_activity(session, user_id: str, start: date, end: date, bucket: str = 'day') -> dict:
+    """
+    Активность за период [start, end] плотными массивами: counts[i] и scores[i]
+    относятся к i-му интервалу bucket, начиная с start (для week и month
+    start выравнивается на начало недели или месяца)
+    """
+    start = bucket_start(start, bucket)
+    rows = (
+        session.query(UserActivityDaily.day, UserActivityDaily.tests_count, UserActivityDaily.score_sum)
+        .filter(UserActivityDaily.user_id == user_id, UserActivityDaily.day >= start, UserActivityDaily.day <= end)
+        .all()
+    )
+    starts = []
+    current = start
+    while current <= end:
+        starts.append(current)
+        current = next_bucket(current, bucket)
+    index = {day: i for i, day in enumerate(starts)}
+    counts = [0] * len(starts)
+    scores = [0] * len(starts)
+    for day, tests_count, score_sum in rows:
+        i = index[bucket_start(day, bucket)]
+        counts[i] += tests_count
+        scores[i] += score_sum
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket': bucket,
+        'counts': counts,
+        'scores': scores,
+        'total': sum(counts)
+    }
+
+
+def tests_count(session, user_id: str) -> int:
+    return session.query(func.coalesce(func.sum(UserActivityDaily.tests_count), 0)).filter(
+        UserActivityDaily.user_id == user_id
+    ).scalar()
+
+
+def activity_version(session, user_id: str) -> tuple:
+    """
+    Версия дневных итогов пользователя для ETag: меняется при любом сохраненном результате.
+    Одна агрегация по первичному ключу (user_id, day) вместо построения ответа
+    """
+    return tuple(session.query(
+        func.count(), func.coalesce(func.sum(UserActivityDaily.tests_count), 0),
+        func.coalesce(func.sum(UserActivityDaily.score_sum), 0)
+    ).filter(UserActivityDaily.user_id == user_id).one())
@@ -0,0 +1,305 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from typing import Iterable, List, Optional
+import numpy as np
+from sqlalchemy import select
+from config import Config
+from models import TestResult, AttemptAnswer
+from .loader import load_quiz_tree, quiz_version
+from .scoring import compile_answer_key, grader
+
+# Доля попыток с лучшим и худшим результатом для индекса дискриминации
+DISCRIMINATION_GROUP = 0.27
+
+
+class QuizAnswerMatrix:
+    """
+    Ответы на викторину в колоночном виде: строка - попытка (test_result),
+    столбец - вариант ответа. Варианты идут подряд по вопросам, поэтому
+    агрегаты по вопросам считаются через np.add.reduceat без циклов по попыткам.
+    Текстовый ответ, совпавший с правильным, отмечается как выбор правильных вариантов
+    """
+    def __init__(self, quiz):
+        self.quiz_id = quiz.id
+        self.version = quiz.version
+        self.key = compile_answer_key(quiz)
+        # Копии полей, чтобы матрица не зависела от сессии, загрузившей викторину
+        self.questions = [{
+            'id': question.id,
+            'question': question.question,
+            'question_type': question.question_type,
+            'points': question.points or 0,
+            'options': [
+                {'id': option.id, 'name': option.name, 'is_correct': bool(option.is_correct)}
+                for option in question.options
+            ]
+        } for question in quiz.questions if question.options]
+        self.question_index = {question['id']: i for i, question in enumerate(self.questions)}
+        options = [(i, option) for i, question in enumerate(self.questions) for option in question['options']]
+        self.option_index = {option['id']: column for column, (_, option) in enumerate(options)}
+        self.option_question = np.array([i for i, _ in options], dtype=np.int32)
+        self.starts = np.array(
+            [0] + list(np.cumsum([len(question['options']) for question in self.questions])[:-1]), dtype=np.int64
+        ) if self.questions else np.zeros(0, dtype=np.int64)
+        self.correct_mask = np.array([option['is_correct'] for _, option in options], dtype=bool)
+        self.points = np.array([question['points'] for question in self.questions], dtype=np.float64)
+        self.correct_columns = {
+            question['id']: [self.option_index[option['id']] for option in question['options'] if option['is_correct']]
+            for question in self.questions
+        }
+        self.options_count = len(options)
+
+        self.attempt_index = {}
+        self.selections = np.zeros((0, self.options_count), dtype=bool)
+        self.answered = np.zeros((0, len(self.questions)), dtype=bool)
+        self.scores = np.zeros(0, dtype=np.float64)
+        self._pending = []
+
+    def __len__(self):
+        return len(self.attempt_index)
+
+    def _text_columns(self, question_id: str, text_answer) -> List[int]:
+        question_key = self.key.questions.get(question_id)
+        if question_key is None or not grader.match_text(question_key, text_answer):
+            return []
+        return self.correct_columns[question_id]
+
+    def load(self, attempts: List[tuple], answers: Iterable[tuple]):
+        """
+        Заполняет матрицу из строк (test_result_id, score) и
+        (test_result_id, question_id, option_ids, text_answer) таблицы attempt_answer
+        """
+        self.attempt_index = {attempt_id: i for i, (attempt_id, _) in enumerate(attempts)}
+        self.scores = np.array([score or 0 for _, score in attempts], dtype=np.float64)
+        self.selections = np.zeros((len(attempts), self.options_count), dtype=bool)
+        self.answered = np.zeros((len(attempts), len(self.questions)), dtype=bool)
+        self._pending = []
+
+        rows = []
+        columns = []
+        answered_rows = []
+        answered_columns = []
+        attempt_index = self.attempt_index
+        option_index = self.option_index
+        question_index = self.question_index
+        for attempt_id, question_id, option_ids, text_answer in answers:
+            row = attempt_index.get(attempt_id)
+            question = question_index.get(question_id)
+            if row is None or question is None:
+                continue
+            answered_rows.append(row)
+            answered_columns.append(question)
+            for option_id in option_ids or ():
+                column = option_index.get(option_id)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+            if text_answer is not None:
+                for column in self._text_columns(question_id, text_answer):
+                    rows.append(row)
+                    columns.append(column)
+        self.selections[np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)] = True
+        self.answered[np.array(answered_rows, dtype=np.int64), np.array(answered_columns, dtype=np.int64)] = True
+
+    def append(self, submission: dict):
+        """
+        Добавляет попытку в формате submissions.build_submission
+        """
+        if submission['test_result_id'] in self.attempt_index:
+            return
+        selected = np.zeros(self.options_count, dtype=bool)
+        answered = np.zeros(len(self.questions), dtype=bool)
+        for answer in submission['answers']:
+            question = self.question_index.get(answer['question_id'])
+            if question is None:
+                continue
+            answered[question] = True
+            columns = [self.option_index[option_id] for option_id in answer['option_ids'] if option_id in self.option_index]
+            if answer.get('text_answer') is not None:
+                columns += self._text_columns(answer['question_id'], answer['text_answer'])
+            selected[columns] = True
+        self.attempt_index[submission['test_result_id']] = len(self.attempt_index)
+        self._pending.append((selected, answered, submission['score']))
+
+    def _flush(self):
+        if not self._pending:
+            return
+        selected, answered, scores = zip(*self._pending)
+        self.selections = np.vstack([self.selections, np.array(selected, dtype=bool)])
+        self.answered = np.vstack([self.answered, np.array(answered, dtype=bool)])
+        self.scores = np.concatenate([self.scores, np.array(scores, dtype=np.float64)])
+        self._pending = []
+
+    def compute(self) -> dict:
+        """
+        Статистика викторины и вопросов: доля выбора вариантов, трудность
+        (доля верных ответов), индекс дискриминации (разница доли верных
+        ответов у 27% лучших и худших попыток) и точечно-бисериальная корреляция
+        ответа с баллом за остальные вопросы
+        """
+        self._flush()
+        attempts = len(self.scores)
+        selections = self.selections
+        answered = self.answered
+
+        if self.questions and attempts:
+            mismatches = np.add.reduceat(selections ^ self.correct_mask, self.starts, axis=1)
+            correct = (mismatches == 0) & answered
+        else:
+            correct = np.zeros((attempts, len(self.questions)), dtype=bool)
+
+        answered_count = answered.sum(axis=0)
+        correct_count = correct.sum(axis=0)
+        option_count = selections.sum(axis=0)
+        option_base = answered_count[self.option_question] if self.options_count else np.zeros(0)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            difficulty = np.where(answered_count > 0, correct_count / np.maximum(answered_count, 1), np.nan)
+            option_share = np.where(option_base > 0, option_count / np.maximum(option_base, 1), np.nan)
+
+            discrimination = np.full(len(self.questions), np.nan)
+            group = int(round(attempts * DISCRIMINATION_GROUP))
+            if group > 0 and attempts >= 2:
+                order = np.argsort(self.scores, kind='stable')
+                lower = correct[order[:group]]
+                upper = correct[order[-group:]]
+                discrimination = upper.mean(axis=0) - lower.mean(axis=0)
+
+            item = correct.astype(np.float64)
+            rest = self.scores[:, None] - item * self.points[None, :]
+            item_centered = item - item.mean(axis=0) if attempts else item
+            rest_centered = rest - rest.mean(axis=0) if attempts else rest
+            denominator = np.sqrt((item_centered ** 2).sum(axis=0) * (rest_centered ** 2).sum(axis=0))
+            point_biserial = np.where(denominator > 0, (item_centered * rest_centered).sum(axis=0) / np.where(denominator > 0, denominator, 1), np.nan)
+
+        def number(value, digits=4):
+            return None if value is None or np.isnan(value) else round(float(value), digits)
+
+        questions = []
+        for i, question in enumerate(self.questions):
+            start = int(self.starts[i])
+            questions.append({
+                'question_id': question['id'],
+                'question': question['question'],
+                'question_type': question['question_type'],
+                'points': question['points'],
+                'answered': int(answered_count[i]),
+                'correct': int(correct_count[i]),
+                'difficulty': number(difficulty[i]),
+                'discrimination': number(discrimination[i]),
+                'point_biserial': number(point_biserial[i]),
+                'options': [{
+                    'option_id': option['id'],
+                    'name': option['name'],
+                    'is_correct': option['is_correct'],
+                    'count': int(option_count[start + j]),
+                    'share': number(option_share[start + j])
+                } for j, option in enumerate(question['options'])]
+            })
+
+        score = None
+        if attempts:
+            p25, median, p75 = np.percentile(self.scores, [25, 50, 75])
+            score = {
+                'mean': number(self.scores.mean(), 2),
+                'median': number(median, 2),
+                'std': number(self.scores.std(), 2),
+                'min': number(self.scores.min(), 2),
+                'max': number(self.scores.max(), 2),
+                'p25': number(p25, 2),
+                'p75': number(p75, 2),
+                'mean_percent': number(self.scores.mean() / self.key.max_score * 100, 2) if self.key.max_score else None
+            }
+        return {
+            'quiz_id': self.quiz_id,
+            'attempts': attempts,
+            'max_score': self.key.max_score,
+            'score': score,
+            'questions': questions
+        }
+
+
+class QuizAnalyticsService:
+    """
+    Матрицы ответов викторин в памяти процесса (LRU на max_size викторин).
+    Новые попытки добавляются по мере сохранения, матрица пересобирается из
+    базы при изменении викторины (Quiz.version в базе, поэтому правка в любом
+    воркере видна сразу) и раз в refresh_interval секунд, чтобы учесть попытки,
+    сохраненные другими процессами.
+    Готовая статистика кэшируется до следующего изменения
+    """
+    def __init__(self, max_size: int = 64, refresh_interval: float = 300):
+        self.max_size = max_size
+        self.refresh_interval = refresh_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, session, quiz_id: str) -> Optional[QuizAnswerMatrix]:
+        quiz = load_quiz_tree(session, quiz_id)
+        if quiz is None:
+            return None
+        matrix = QuizAnswerMatrix(quiz)
+        attempts = session.execute(
+            select(TestResult.id, TestResult.score).where(TestResult.quiz_id == quiz_id)
+        ).all()
+        # Ответы читаются через Core пачками: на миллионе строк ORM-обертка строк заметно дороже самой выборки
+        answers = session.connection().execution_options(stream_results=True).execute(
+            select(AttemptAnswer.test_result_id, AttemptAnswer.question_id, AttemptAnswer.option_ids, AttemptAnswer.text_answer)
+            .join(TestResult, TestResult.id == AttemptAnswer.test_result_id)
+            .where(TestResult.quiz_id == quiz_id)
+        )
+        matrix.load(attempts, chain.from_iterable(answers.partitions(50000)))
+        return matrix
+
+    def get(self, session, quiz_id: str) -> Optional[dict]:
+        """
+        Статистика викторины или None, если викторины нет
+        """
+        version = quiz_version(session, quiz_id)
+        if version is None:
+            with self._lock:
+                self._entries.pop(quiz_id, None)
+            return None
+        with self._lock:
+            entry = self._entries.get(quiz_id)
+            fresh = entry is not None and entry['version'] == version \
+                and time.monotonic() - entry['loaded_at'] < self.refresh_interval
+            if fresh:
+                self._entries.move_to_end(quiz_id)
+                if entry['stats'] is None:
+                    started = time.perf_counter()
+                    entry['stats'] = entry['matrix'].compute()
+                    entry['stats']['compute_ms'] = round((time.perf_counter() - started) * 1000, 3)
+                return entry['stats']
+
+        started = time.perf_counter()
+        matrix = self._load(session, quiz_id)
+        if matrix is None:
+            return None
+        loaded = time.perf_counter()
+        stats = matrix.compute()
+        stats['load_ms'] = round((loaded - started) * 1000, 3)
+        stats['compute_ms'] = round((time.perf_counter() - loaded) * 1000, 3)
+        with self._lock:
+            # Викторину могли изменить после чтения версии: матрица хранится под версией загруженного дерева
+            self._entries[quiz_id] = {'version': matrix.version, 'matrix': matrix, 'stats': stats, 'loaded_at': time.monotonic()}
+            self._entries.move_to_end(quiz_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return stats
+
+    def record(self, submissions: Iterable[dict]):
+        """
+        Добавляет сохраненные попытки в уже загруженные матрицы
+        """
+        with self._lock:
+            for submission in submissions:
+                entry = self._entries.get(submission.get('quiz_id'))
+                if entry is not None:
+                    entry['matrix'].append(submission)
+                    entry['stats'] = None
+
+
+quiz_analytics = QuizAnalyticsService(Config.ANALYTICS_CACHE_SIZE, Config.ANALYTICS_REFRESH_INTERVAL)
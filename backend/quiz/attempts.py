@@ -0,0 +1,244 @@
+"""
+Прохождение викторины по шагам: попытка начинается на сервере, вопросы
+отдаются страницами без правильных ответов, ответы сохраняются по мере
+прохождения, а при завершении попытка проверяется и записывается в
+test_result/attempt_answer одной отправкой, как через submit-answers.
+
+Состояние попыток хранится в локальном файле SQLite (общий для воркеров
+одного сервера), а не в основной базе: промежуточные ответы не нагружают
+ее записью. Попытка истекает через ATTEMPT_TTL секунд без сохранения ответов
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from config import Config
+from ids import new_id
+from models import QuestionType
+from .loader import load_quiz_tree, quiz_version, serialize_question
+
+
+def public_question(question) -> dict:
+    """
+    Вопрос без ключа ответа: у вариантов нет is_correct, у TEXT_ANSWER нет вариантов
+    (их названия и есть правильные ответы)
+    """
+    data = serialize_question(question)
+    if question.question_type == QuestionType.TEXT_ANSWER:
+        data['options'] = []
+    else:
+        data['options'] = [{'id': option['id'], 'name': option['name']} for option in data['options']]
+    return data
+
+
+class PublicQuiz:
+    """
+    Вопросы викторины для прохождения, подготовленные один раз на версию викторины
+    """
+    def __init__(self, quiz):
+        self.id = quiz.id
+        self.title = quiz.title
+        self.description = quiz.description
+        self.category_id = quiz.category_id
+        self.questions = {question.id: public_question(question) for question in quiz.questions}
+        self.order = [question.id for question in quiz.questions]
+
+
+class PublicQuizCache:
+    """
+    LRU кэш вопросов без ответов. Как и AnswerKeyCache, ключ включает версию
+    викторины из базы, поэтому после правки в любом воркере попытки получают
+    те же вопросы, по которым их будут проверять
+    """
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._quizzes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session, quiz_id: str) -> Optional[PublicQuiz]:
+        version = quiz_version(session, quiz_id)
+        if version is None:
+            return None
+        cache_key = (quiz_id, version)
+        with self._lock:
+            quiz = self._quizzes.get(cache_key)
+            if quiz is not None:
+                self._quizzes.move_to_end(cache_key)
+                return quiz
+
+        tree = load_quiz_tree(session, quiz_id)
+        if tree is None:
+            return None
+        quiz = PublicQuiz(tree)
+        cache_key = (quiz_id, tree.version)
+        with self._lock:
+            self._quizzes[cache_key] = quiz
+            while len(self._quizzes) > self.max_size:
+                self._quizzes.popitem(last=False)
+        return quiz
+
+
+def _join(ids: List[str]) -> str:
+    return ','.join(ids)
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return value.split(',') if value else []
+
+
+class AttemptStore:
+    """
+    Попытки и их ответы в файле SQLite (WAL). Ответ хранится строкой на вопрос,
+    поэтому сохранение нескольких ответов не переписывает всю попытку.
+    Срок жизни продлевается при каждом сохранении, истекшие попытки удаляются
+    не чаще раза в cleanup_interval секунд
+    """
+    def __init__(self, path: str, ttl: int = 7200, cleanup_interval: int = 60):
+        self.path = path
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS attempt ('
+                'id TEXT PRIMARY KEY, user_id TEXT NOT NULL, quiz_id TEXT NOT NULL, question_ids TEXT NOT NULL, '
+                'test_result_id TEXT, created_at REAL NOT NULL, expires_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_attempt_expires_at ON attempt (expires_at)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS attempt_answer ('
+                'attempt_id TEXT NOT NULL, question_id TEXT NOT NULL, option_ids TEXT, text_answer TEXT, '
+                'PRIMARY KEY (attempt_id, question_id)) WITHOUT ROWID'
+            )
+
+    def _connection(self):
+        # Соединение на поток; после fork соединение родителя не используется
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Незавершенные попытки не критичны: fsync на каждый ответ не нужен
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _attempt(row) -> dict:
+        return {
+            'id': row[0], 'user_id': row[1], 'quiz_id': row[2], 'question_ids': _split(row[3]),
+            'test_result_id': row[4], 'created_at': row[5], 'expires_at': row[6]
+        }
+
+    def create(self, user_id: str, quiz_id: str, question_ids: List[str]) -> dict:
+        now = time.time()
+        attempt = (new_id(), user_id, quiz_id, _join(question_ids), None, now, now + self.ttl)
+        connection = self._connection()
+        with self._write_lock, connection:
+            connection.execute('INSERT INTO attempt VALUES (?, ?, ?, ?, ?, ?, ?)', attempt)
+        self.cleanup()
+        return self._attempt(attempt)
+
+    def get(self, attempt_id: str) -> Optional[dict]:
+        """
+        Попытка или None, если ее нет или она истекла
+        """
+        row = self._connection().execute(
+            'SELECT id, user_id, quiz_id, question_ids, test_result_id, created_at, expires_at '
+            'FROM attempt WHERE id = ? AND expires_at > ?', (attempt_id, time.time())
+        ).fetchone()
+        return self._attempt(row) if row else None
+
+    def answers(self, attempt_id: str, question_ids: Optional[List[str]] = None) -> Dict[str, dict]:
+        """
+        Сохраненные ответы попытки (или только на question_ids) по ID вопроса
+        """
+        query = 'SELECT question_id, option_ids, text_answer FROM attempt_answer WHERE attempt_id = ?'
+        params = [attempt_id]
+        if question_ids is not None:
+            if not question_ids:
+                return {}
+            query += f" AND question_id IN ({','.join('?' * len(question_ids))})"
+            params += question_ids
+        return {
+            question_id: {'question_id': question_id, 'option_ids': _split(option_ids), 'text_answer': text_answer}
+            for question_id, option_ids, text_answer in self._connection().execute(query, params)
+        }
+
+    def answered(self, attempt_id: str) -> int:
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM attempt_answer WHERE attempt_id = ?', (attempt_id,)
+        ).fetchone()[0]
+
+    def save_answers(self, attempt_id: str, answers: List[dict]) -> float:
+        """
+        Сохраняет ответы (повторный ответ на вопрос заменяет предыдущий)
+        и продлевает попытку. Возвращает новый срок истечения
+        """
+        expires_at = time.time() + self.ttl
+        connection = self._connection()
+        with self._write_lock, connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO attempt_answer (attempt_id, question_id, option_ids, text_answer) VALUES (?, ?, ?, ?)',
+                [(attempt_id, answer['question_id'], _join(answer.get('option_ids') or []) or None, answer.get('text_answer'))
+                 for answer in answers]
+            )
+            connection.execute('UPDATE attempt SET expires_at = ? WHERE id = ?', (expires_at, attempt_id))
+        return expires_at
+
+    def finish(self, attempt_id: str, test_result_id: str):
+        """
+        Отмечает попытку завершенной. Ответы больше не нужны: они уже в основной базе
+        """
+        connection = self._connection()
+        with self._write_lock, connection:
+            connection.execute('UPDATE attempt SET test_result_id = ? WHERE id = ?', (test_result_id, attempt_id))
+            connection.execute('DELETE FROM attempt_answer WHERE attempt_id = ?', (attempt_id,))
+
+    def cleanup(self, force: bool = False) -> int:
+        """
+        Удаляет истекшие попытки вместе с ответами
+        """
+        now = time.time()
+        if not force and now - self._last_cleanup < self.cleanup_interval:
+            return 0
+        self._last_cleanup = now
+        connection = self._connection()
+        with self._write_lock, connection:
+            connection.execute(
+                'DELETE FROM attempt_answer WHERE attempt_id IN (SELECT id FROM attempt WHERE expires_at <= ?)', (now,)
+            )
+            cursor = connection.execute('DELETE FROM attempt WHERE expires_at <= ?', (now,))
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        now = time.time()
+        active, finished = self._connection().execute(
+            'SELECT COUNT(*) - COUNT(test_result_id), COUNT(test_result_id) FROM attempt WHERE expires_at > ?', (now,)
+        ).fetchone()
+        return {'active': active, 'finished': finished}
+
+
+public_quizzes = PublicQuizCache(Config.ATTEMPT_CACHE_SIZE)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_attempt_store() -> AttemptStore:
+    """
+    Хранилище создается при первом обращении, чтобы файл не появлялся без использования API попыток
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AttemptStore(Config.ATTEMPT_STORE_PATH, Config.ATTEMPT_TTL)
+    return _store
@@ -0,0 +1,193 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from config import Config
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class LocalCacheBackend:
+    """
+    Кэш внутри процесса: LRU с ограничением по количеству записей и TTL
+    """
+    def __init__(self, max_size: int = 1024, ttl: int = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SharedCacheBackend:
+    """
+    Общий для всех воркеров gunicorn кэш поверх Redis-совместимого клиента.
+    Вытеснение по LRU выполняет сам сервер (maxmemory-policy allkeys-lru)
+    """
+    def __init__(self, client, ttl: int = 300):
+        self.client = client
+        self.ttl = ttl
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        self.client.set(key, value, ex=ttl or self.ttl)
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+
+class FakeRedisClient:
+    """
+    Локальная замена Redis-клиента для тестов и разработки без сервера
+    """
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return 1 if self._data.pop(key, None) else 0
+
+
+class QuizCache:
+    """
+    Read-through кэш сериализованных викторин (JSON в байтах).
+    Ключ записи включает версию викторины из базы, поэтому правка в любом
+    воркере сразу делает старую запись недостижимой
+    """
+    def __init__(self, backend, ttl: int = 300, count_ttl: int = 60):
+        self.backend = backend
+        self.ttl = ttl
+        self.count_ttl = count_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def subscribe(self, callback: Callable[[str], None]):
+        """
+        callback(quiz_id) вызывается после каждой инвалидации викторины
+        """
+        self._listeners.append(callback)
+
+    @staticmethod
+    def _payload_key(quiz_id: str, version: int) -> str:
+        return f'quiz:{quiz_id}:v{version}'
+
+    def get_or_load(self, quiz_id: str, version: int, loader: Callable[[], Optional[dict]]) -> Optional[bytes]:
+        """
+        Возвращает JSON викторины из кэша или строит его через loader.
+        version - версия викторины из базы (Quiz.version), ее видят все воркеры:
+        после правки в любом процессе запись со старой версией больше не читается.
+        Если loader вернул None (викторины нет), ничего не кэшируется
+        """
+        # Версию вызывающий читает до загрузки: если викторину изменят во время загрузки,
+        # более новые данные попадут под старую версию, но не наоборот
+        key = self._payload_key(quiz_id, version)
+        payload = self.backend.get(key)
+        if payload is not None:
+            with self._lock:
+                self.hits += 1
+            return payload
+
+        with self._lock:
+            self.misses += 1
+        data = loader()
+        if data is None:
+            return None
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.backend.set(key, payload, self.ttl)
+        return payload
+
+    def get_count(self, filters: tuple, list_version: str, loader: Callable[[], int]) -> int:
+        """
+        Количество викторин для фильтров списка. list_version - версия списка из базы
+        (quiz_list_version): значение живет до любой записи в викторины или до истечения count_ttl
+        """
+        key = f'quiz:count:v{list_version}:' + json.dumps(filters, ensure_ascii=False)
+        value = self.backend.get(key)
+        if value is not None:
+            return int(value)
+        count = loader()
+        self.backend.set(key, str(count).encode(), self.count_ttl)
+        return count
+
+    def invalidate(self, quiz_id: str):
+        # Записи викторины не удаляются: новая версия в базе уже делает их недостижимыми,
+        # а вытесняются они по TTL и LRU
+        for callback in self._listeners:
+            callback(quiz_id)
+
+    def stats(self) -> dict:
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions
+        }
+
+
+def create_quiz_cache(config=Config) -> QuizCache:
+    """
+    Создает кэш викторин по настройкам QUIZ_CACHE_*
+    """
+    if config.QUIZ_CACHE_BACKEND == 'redis':
+        if redis is None:
+            raise RuntimeError("Для QUIZ_CACHE_BACKEND=redis необходимо установить пакет redis")
+        backend = SharedCacheBackend(redis.Redis.from_url(config.QUIZ_CACHE_URL), config.QUIZ_CACHE_TTL)
+    elif config.QUIZ_CACHE_BACKEND == 'fake':
+        backend = SharedCacheBackend(FakeRedisClient(), config.QUIZ_CACHE_TTL)
+    else:
+        backend = LocalCacheBackend(config.QUIZ_CACHE_SIZE, config.QUIZ_CACHE_TTL)
+    return QuizCache(backend, config.QUIZ_CACHE_TTL, config.QUIZ_COUNT_TTL)
+
+
+quiz_cache = create_quiz_cache()
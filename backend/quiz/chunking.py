@@ -0,0 +1,211 @@
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from .scoring import normalize_text
+
+_TOKEN = re.compile(r'\w+|[^\w\s]')
+_HEADING = re.compile(r'^(#{1,6}\s+\S|\d+(\.\d+)*[.)]?\s+\S.{0,80}$|[A-ZА-ЯЁ0-9][^.!?]{0,80}:$)')
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Приблизительное число токенов: слова и знаки препинания с запасом на
+    разбиение длинных слов токенизатором модели
+    """
+    return math.ceil(len(_TOKEN.findall(text)) * 1.4)
+
+
+def split_sections(text: str) -> List[List[str]]:
+    """
+    Делит текст на разделы по заголовкам, раздел - список абзацев
+    """
+    sections = [[]]
+    for paragraph in re.split(r'\n\s*\n', text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        first_line = paragraph.split('\n', 1)[0].strip()
+        if _HEADING.match(first_line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(paragraph)
+    return [section for section in sections if section]
+
+
+def split_oversized(paragraph: str, max_tokens: int) -> List[str]:
+    """
+    Делит слишком длинный абзац по предложениям, а предложения - по словам
+    """
+    pieces = []
+    current = []
+    current_tokens = 0
+    for sentence in _SENTENCE_END.split(paragraph):
+        units = [sentence]
+        if estimate_tokens(sentence) > max_tokens:
+            words = sentence.split()
+            step = max(1, int(max_tokens / 1.4))
+            units = [' '.join(words[i:i + step]) for i in range(0, len(words), step)]
+        for unit in units:
+            unit_tokens = estimate_tokens(unit)
+            if current and current_tokens + unit_tokens > max_tokens:
+                pieces.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += unit_tokens
+    if current:
+        pieces.append(' '.join(current))
+    return pieces
+
+
+def overlap_tail(text: str, overlap_tokens: int) -> str:
+    """
+    Конец фрагмента длиной около overlap_tokens, начиная с границы предложения, если она есть
+    """
+    if overlap_tokens <= 0:
+        return ''
+    words = text.split()
+    tail = ' '.join(words[-max(1, int(overlap_tokens / 1.4)):])
+    sentences = _SENTENCE_END.split(tail, maxsplit=1)
+    return sentences[1] if len(sentences) > 1 and sentences[1] else tail
+
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """
+    Делит текст на фрагменты не длиннее max_tokens. Фрагменты собираются из
+    целых абзацев, новый раздел начинает новый фрагмент, если текущий заполнен
+    больше чем наполовину. Каждый следующий фрагмент начинается с перекрытия
+    из конца предыдущего
+    """
+    piece_limit = max(max_tokens - overlap_tokens, max_tokens // 2)
+    pieces = []
+    for section in split_sections(text):
+        for i, paragraph in enumerate(section):
+            for j, piece in enumerate(split_oversized(paragraph, piece_limit)):
+                pieces.append((piece, i == 0 and j == 0))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    # Токены без учета перекрытия: в каждом фрагменте должен быть хотя бы один новый кусок
+    new_tokens = 0
+    for piece, starts_section in pieces:
+        piece_tokens = estimate_tokens(piece)
+        is_full = new_tokens and current_tokens + piece_tokens > max_tokens
+        is_section_break = new_tokens and starts_section and current_tokens > max_tokens / 2
+        if is_full or is_section_break:
+            chunks.append('\n\n'.join(current))
+            tail = overlap_tail(chunks[-1], overlap_tokens)
+            current = [tail] if tail else []
+            current_tokens = estimate_tokens(tail) if tail else 0
+            new_tokens = 0
+        current.append(piece)
+        current_tokens += piece_tokens
+        new_tokens += piece_tokens
+    if new_tokens:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов (token bucket): не больше rate вызовов в секунду
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def shingles(text: str) -> set:
+    words = normalize_text(text).split()
+    if len(words) < 3:
+        return set(words)
+    return {' '.join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def dedupe_questions(questions: List[dict], threshold: float = 0.6) -> List[dict]:
+    """
+    Убирает почти одинаковые вопросы: сходство шинглов из трех слов не ниже threshold
+    """
+    unique = []
+    seen = []
+    for question in questions:
+        signature = shingles(question.get('question') or '')
+        if any(jaccard(signature, other) >= threshold for other in seen):
+            continue
+        seen.append(signature)
+        unique.append(question)
+    return unique
+
+
+def merge_chunk_questions(per_chunk: List[List[dict]], count: int, threshold: float = 0.6) -> List[dict]:
+    """
+    Объединяет вопросы фрагментов по кругу, чтобы покрыть весь документ,
+    убирает дубликаты и оставляет count вопросов
+    """
+    interleaved = []
+    for i in range(max((len(questions) for questions in per_chunk), default=0)):
+        for questions in per_chunk:
+            if i < len(questions):
+                interleaved.append(questions[i])
+    return dedupe_questions(interleaved, threshold)[:count]
+
+
+def generate_from_chunks(chunks: List[str], generate_chunk, question_count: int,
+                         concurrency: int, rate_limiter: Optional[RateLimiter] = None,
+                         threshold: float = 0.6, on_chunk_done=None) -> dict:
+    """
+    Генерирует вопросы по фрагментам параллельно и собирает одну викторину.
+    generate_chunk(chunk, count) возвращает ответ LLM в формате quizTitle/questions.
+    Ошибки отдельных фрагментов допускаются, если хотя бы один фрагмент удался.
+    on_chunk_done(done, total) вызывается после каждого обработанного фрагмента
+    """
+    # Просим немного больше вопросов, чем нужно, с запасом на дубликаты
+    per_chunk_count = max(2, math.ceil(question_count * 1.5 / len(chunks)))
+
+    def run(chunk):
+        if rate_limiter:
+            rate_limiter.acquire()
+        return generate_chunk(chunk, per_chunk_count)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+        futures = [executor.submit(run, chunk) for chunk in chunks]
+        results = []
+        errors = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(e)
+            if on_chunk_done:
+                on_chunk_done(len(results) + len(errors), len(chunks))
+
+    if not results:
+        raise errors[0]
+    return {
+        "quizTitle": results[0]["quizTitle"],
+        "questions": merge_chunk_questions([result["questions"] for result in results], question_count, threshold)
+    }
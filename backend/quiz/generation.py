@@ -0,0 +1,245 @@
+import json
+import time
+from typing import List
+from ids import new_id
+from config import Config
+from models import Quiz, QuestionType
+from .stream_parser import parse_quiz_stream
+from .chunking import RateLimiter, chunk_text, estimate_tokens, generate_from_chunks
+from .cache import quiz_cache
+from .writer import QuizRows, build_question_rows, build_quiz_rows, insert_quiz_batch, insert_quiz_rows
+
+DEFAULT_QUIZ_TITLE = "Сгенерированная викторина"
+
+SYSTEM_PROMPT = """Ты генератор викторин. Пользователь даст тебе тему, статью или документ. На основе этого сгенерируй {questions_count} вопросов для категории "{category_name}". Возвращай только JSON в таком формате:
+{
+  "quizTitle": "Название викторины",
+  "questions": [
+    {
+      "type": "single",
+      "question": "Вопрос?",
+      "options": ["Вариант1", "Вариант2", "Вариант3", "Вариант4"],
+      "correct": [2],
+      "points": 1
+    },
+    {
+      "type": "multiple",
+      "question": "Вопрос с несколькими ответами?",
+      "options": ["A", "B", "C", "D"],
+      "correct": [0, 3],
+      "points": 2
+    },
+    {
+      "type": "text",
+      "question": "Открытый вопрос?",
+      "answer": "Правильный ответ",
+      "points": 2
+    }
+  ]
+}"""
+
+
+def build_messages(category_name: str, text: str, questions_count: int = 5) -> List[dict]:
+    """
+    Сообщения для LLM: системный промпт с форматом ответа и текст пользователя
+    """
+    system_prompt = SYSTEM_PROMPT.replace('{category_name}', category_name)\
+        .replace('{questions_count}', str(questions_count))
+    return [
+        {
+            "role": "system",
+            "content": system_prompt
+        },
+        {
+            "role": "user",
+            "content": f"Категория: {category_name}. Текст: {text}"
+        }
+    ]
+
+
+def parse_generated_quiz(result: str) -> dict:
+    """
+    Разбирает ответ LLM и проверяет, что в нем есть название и список вопросов.
+    Если ответ не является корректным JSON (пояснения вокруг, обрыв, ошибки
+    в отдельных вопросах), из него извлекаются все корректные вопросы
+    """
+    try:
+        quiz_data = json.loads(result)
+    except ValueError:
+        parser, questions = parse_quiz_stream([result])
+        if not questions:
+            raise
+        quiz_data = {"quizTitle": parser.title or DEFAULT_QUIZ_TITLE, "questions": questions}
+    if not isinstance(quiz_data, dict) or "quizTitle" not in quiz_data or not isinstance(quiz_data.get("questions"), list):
+        raise ValueError("Ответ LLM не соответствует формату викторины")
+    return quiz_data
+
+
+def generate_with_retries(client, messages, timeout: float, retries: int, backoff: float, on_attempt=None) -> dict:
+    """
+    Вызывает LLM и разбирает ответ, повторяя попытку при ошибке
+    с экспоненциальной задержкой
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        if on_attempt:
+            on_attempt(attempt)
+        try:
+            return parse_generated_quiz(client.complete(messages, timeout=timeout))
+        except Exception:
+            if attempt > retries:
+                raise
+            time.sleep(backoff * 2 ** (attempt - 1))
+
+
+# Общее для процесса ограничение частоты запросов к LLM при генерации по фрагментам
+llm_rate_limiter = RateLimiter(Config.LLM_RATE_LIMIT, Config.LLM_RATE_BURST)
+
+
+def generate_quiz_data(client, category_name: str, text: str, question_count: int, on_attempt=None,
+                       on_progress=None) -> dict:
+    """
+    Генерирует викторину по тексту. Короткий текст отправляется одним запросом,
+    длинный делится на фрагменты, которые обрабатываются параллельно,
+    после чего вопросы объединяются без дубликатов.
+    on_progress(done, total) сообщает о готовых фрагментах длинного текста
+    """
+    def generate(chunk, count, on_attempt=None):
+        return generate_with_retries(
+            client,
+            build_messages(category_name, chunk, count),
+            Config.GENERATION_TIMEOUT,
+            Config.GENERATION_RETRIES,
+            Config.GENERATION_RETRY_BACKOFF,
+            on_attempt=on_attempt
+        )
+
+    if estimate_tokens(text) <= Config.CHUNK_MAX_TOKENS:
+        return generate(text, question_count, on_attempt)
+
+    chunks = chunk_text(text, Config.CHUNK_MAX_TOKENS, Config.CHUNK_OVERLAP_TOKENS)
+    return generate_from_chunks(
+        chunks,
+        generate,
+        question_count,
+        Config.CHUNK_CONCURRENCY,
+        llm_rate_limiter,
+        Config.CHUNK_DEDUPE_THRESHOLD,
+        on_chunk_done=on_progress
+    )
+
+
+def convert_generated_question(q_data: dict) -> dict:
+    """
+    Преобразует вопрос из ответа LLM в формат вопроса add_quiz
+    """
+    question_type = None
+    if q_data["type"] == "single":
+        question_type = QuestionType.SINGLE
+    elif q_data["type"] == "multiple":
+        question_type = QuestionType.MULTIPLE
+    elif q_data["type"] == "text":
+        question_type = QuestionType.TEXT_ANSWER
+    
+    options = []
+    # Добавляем варианты ответов для вопросов с вариантами
+    if q_data["type"] in ["single", "multiple"] and "options" in q_data:
+        for i, option_text in enumerate(q_data["options"]):
+            options.append({"name": option_text, "is_correct": i in q_data["correct"]})
+    # Правильный текстовый ответ храним как верный вариант, по нему проверяются ответы
+    elif q_data["type"] == "text" and q_data.get("answer"):
+        options.append({"name": q_data["answer"], "is_correct": True})
+    
+    return {
+        "question_type": question_type,
+        "points": q_data.get("points", 1),
+        "question": q_data.get("question"),
+        "options": options
+    }
+
+
+def convert_generated_quiz(quiz_data: dict, category) -> dict:
+    """
+    Преобразует ответ LLM в формат данных add_quiz
+    """
+    questions = [convert_generated_question(q_data) for q_data in quiz_data["questions"]]
+    
+    return {
+        "title": quiz_data["quizTitle"],
+        "description": f"Автоматически сгенерированная викторина на основе текста. Категория: {category.name}",
+        "category_id": category.id,
+        "questions": questions
+    }
+
+
+def save_quiz_payload(session, payload: dict):
+    """
+    Сохраняет викторину в формате add_quiz пакетной вставкой и возвращает ее строки.
+    Каждый вызов создает новые ID, поэтому один payload можно сохранять многократно
+    """
+    rows = build_quiz_rows(payload, default_points=1)
+    insert_quiz_rows(session, rows)
+    session.commit()
+    quiz_cache.invalidate(rows.quiz['id'])
+    return rows
+
+
+class StreamingQuizWriter:
+    """
+    Сохраняет вопросы сгенерированной викторины по одному, по мере разбора
+    ответа LLM. Викторина создается вместе с первым вопросом, поэтому пустых
+    викторин не остается, а вопросы, сохраненные до обрыва, не теряются
+    """
+    def __init__(self, session, category):
+        self.session = session
+        self.category_id = category.id
+        self.description = f"Автоматически сгенерированная викторина на основе текста. Категория: {category.name}"
+        self.quiz_id = None
+        self.title = None
+        self.count = 0
+
+    def add(self, question_data: dict, title: str = None) -> dict:
+        """
+        Сохраняет вопрос в формате add_quiz и возвращает его в формате ответа API
+        """
+        quiz = None
+        if self.quiz_id is None:
+            self.title = title or DEFAULT_QUIZ_TITLE
+            quiz = {
+                'id': new_id(),
+                'title': self.title,
+                'description': self.description,
+                'category_id': self.category_id
+            }
+            self.quiz_id = quiz['id']
+        question, options = build_question_rows(self.quiz_id, question_data, default_points=1)
+        # Для следующих вопросов строка викторины уже есть, вставляются только вопрос и варианты,
+        # а версия викторины увеличивается, как при любой правке (по ней кэшируются ключи ответов)
+        insert_quiz_batch(self.session, [QuizRows(quiz, [question], options)])
+        if quiz is None:
+            self.session.query(Quiz).filter(Quiz.id == self.quiz_id)\
+                .update({Quiz.version: Quiz.version + 1}, synchronize_session=False)
+        self.session.commit()
+        quiz_cache.invalidate(self.quiz_id)
+        self.count += 1
+        return {
+            'id': question['id'],
+            'question_type': question['question_type'],
+            'points': question['points'],
+            'options': [{'id': option['id'], 'name': option['name'], 'is_correct': option['is_correct']} for option in options],
+            'question': question['question'],
+            'image_url': None
+        }
+
+    def finish(self, title: str = None):
+        """
+        Обновляет название, если оно пришло в ответе позже первого вопроса
+        """
+        if self.quiz_id is None or not title or title == self.title:
+            return
+        self.session.query(Quiz).filter(Quiz.id == self.quiz_id)\
+            .update({Quiz.title: title, Quiz.version: Quiz.version + 1}, synchronize_session=False)
+        self.session.commit()
+        quiz_cache.invalidate(self.quiz_id)
+        self.title = title
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Optional
+from config import Config
+
+
+def generation_key(text: str, category_id: str, model: str, question_count: int = 5) -> str:
+    """
+    Ключ кэша: хэш нормализованного текста, категории, модели и числа вопросов
+    """
+    normalized = ' '.join(unicodedata.normalize('NFKC', text).split())
+    digest = hashlib.sha256()
+    for part in (model, category_id, str(question_count), normalized):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class DiskGenerationStore:
+    """
+    Постоянное хранилище результатов генерации в файле SQLite.
+    При превышении max_bytes удаляются записи, к которым дольше всего не обращались
+    """
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS generation_cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_generation_cache_accessed_at ON generation_cache (accessed_at)')
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._connect() as connection:
+            row = connection.execute('SELECT value FROM generation_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE generation_cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            return row[0]
+
+    def set(self, key: str, value: bytes):
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO generation_cache (key, value, size, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, value, len(value), time.time())
+            )
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM generation_cache').fetchone()[0]
+            while total > self.max_bytes:
+                oldest = connection.execute(
+                    'SELECT key, size FROM generation_cache ORDER BY accessed_at LIMIT 100'
+                ).fetchall()
+                if not oldest:
+                    break
+                for old_key, size in oldest:
+                    if total <= self.max_bytes:
+                        break
+                    connection.execute('DELETE FROM generation_cache WHERE key = ?', (old_key,))
+                    total -= size
+
+
+class GenerationCache:
+    """
+    Двухуровневый кэш сгенерированных викторин: LRU в памяти с ограничением
+    по размеру и постоянное хранилище на диске. В памяти хранятся готовые
+    данные викторины, поэтому попадание не требует ни LLM, ни разбора JSON
+    """
+    def __init__(self, memory_bytes: int, disk_store: Optional[DiskGenerationStore] = None):
+        self.memory_bytes = memory_bytes
+        self.disk_store = disk_store
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, payload: dict, size: int):
+        with self._lock:
+            if key in self._memory:
+                self._memory_size -= self._memory.pop(key)[1]
+            self._memory[key] = (payload, size)
+            self._memory_size += size
+            while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+                _, (_, old_size) = self._memory.popitem(last=False)
+                self._memory_size -= old_size
+                self.evictions += 1
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return item[0]
+        if self.disk_store is not None:
+            value = self.disk_store.get(key)
+            if value is not None:
+                payload = json.loads(value)
+                self._remember(key, payload, len(value))
+                with self._lock:
+                    self.hits += 1
+                return payload
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, payload: dict):
+        value = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self._remember(key, payload, len(value))
+        if self.disk_store is not None:
+            self.disk_store.set(key, value)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'memory_bytes': self._memory_size,
+            'coalesced': single_flight.coalesced
+        }
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом в один:
+    первый вызывающий выполняет функцию, остальные ждут его результат
+    """
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = self._Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def create_generation_cache(config=Config) -> GenerationCache:
+    disk_store = None
+    if config.GENERATION_CACHE_PATH:
+        disk_store = DiskGenerationStore(config.GENERATION_CACHE_PATH, config.GENERATION_CACHE_DISK_BYTES)
+    return GenerationCache(config.GENERATION_CACHE_MEMORY_BYTES, disk_store)
+
+
+single_flight = SingleFlight()
+generation_cache = create_generation_cache()
@@ -0,0 +1,157 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from config import Config
+from models import SessionLocal, Category, GenerationJob, JobStatus
+from .generation import generate_quiz_data, convert_generated_quiz, save_quiz_payload
+from .generation_cache import generation_cache, generation_key, single_flight
+from .llm import get_llm_client
+
+FINISHED_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED)
+UNFINISHED_STATUSES = (JobStatus.PENDING, JobStatus.RUNNING)
+STALE_JOB_ERROR = 'Задача прервана: воркер, выполнявший ее, был перезапущен'
+
+
+def serialize_job(job) -> dict:
+    return {
+        'id': job.id,
+        'status': job.status,
+        'progress': job.progress,
+        'attempts': job.attempts,
+        'quiz_id': job.quiz_id,
+        'error': job.error
+    }
+
+
+def update_job(session, job_id: str, **values):
+    session.query(GenerationJob).filter(GenerationJob.id == job_id).update(values)
+    session.commit()
+
+
+def is_stale(job) -> bool:
+    """
+    Незавершенная задача, которая не обновлялась дольше GENERATION_STALE_AFTER секунд
+    """
+    if job.status in FINISHED_STATUSES:
+        return False
+    updated_at = job.updated_at
+    if updated_at.tzinfo is None:
+        # SQLite возвращает время без часового пояса, func.now() там в UTC
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - updated_at > timedelta(seconds=Config.GENERATION_STALE_AFTER)
+
+
+def fail_stale_jobs(session, job_id: Optional[str] = None) -> int:
+    """
+    Помечает FAILED незавершенные задачи, которые не обновлялись дольше GENERATION_STALE_AFTER
+    секунд. Очередь задач живет в памяти воркера, и после его перезапуска такие задачи
+    уже никто не выполнит. Возвращает число помеченных задач
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=Config.GENERATION_STALE_AFTER)
+    query = session.query(GenerationJob).filter(
+        GenerationJob.status.in_(UNFINISHED_STATUSES),
+        GenerationJob.updated_at < cutoff
+    )
+    if job_id is not None:
+        query = query.filter(GenerationJob.id == job_id)
+    count = query.update(
+        {GenerationJob.status: JobStatus.FAILED, GenerationJob.error: STALE_JOB_ERROR},
+        synchronize_session=False
+    )
+    session.commit()
+    return count
+
+
+def recover_stale_jobs() -> int:
+    """
+    Вызывается при старте воркера gunicorn (post_worker_init) и командой flask recover-jobs:
+    задачи, брошенные предыдущим процессом, завершаются ошибкой, чтобы клиенты не ждали их
+    до таймаута. Свежие задачи других живых воркеров не трогаются
+    """
+    session = SessionLocal()
+    try:
+        return fail_stale_jobs(session)
+    finally:
+        session.close()
+
+
+def run_generation_job(job_id: str, category_id: str, text: str, question_count: int = 5):
+    """
+    Выполняет задачу генерации в фоновом потоке со своей сессией.
+    Повторный запрос с тем же текстом, категорией и моделью берется из кэша,
+    а одинаковые одновременные запросы выполняют один вызов LLM
+    """
+    session = SessionLocal()
+    try:
+        # Задачу, которую уже признали прерванной (fail_stale_jobs), не запускаем
+        started = session.query(GenerationJob)\
+            .filter(GenerationJob.id == job_id, GenerationJob.status == JobStatus.PENDING)\
+            .update({GenerationJob.status: JobStatus.RUNNING, GenerationJob.progress: 10}, synchronize_session=False)
+        session.commit()
+        if not started:
+            return
+        category = session.query(Category).filter(Category.id == category_id).first()
+        client = get_llm_client()
+        key = generation_key(text, category_id, client.model, question_count)
+
+        def generate():
+            quiz_data = generate_quiz_data(
+                client,
+                category.name,
+                text,
+                question_count,
+                on_attempt=lambda attempt: update_job(session, job_id, attempts=attempt),
+                # Прогресс по фрагментам длинного текста заодно обновляет updated_at задачи
+                on_progress=lambda done, total: update_job(session, job_id, progress=10 + 60 * done // total)
+            )
+            payload = convert_generated_quiz(quiz_data, category)
+            generation_cache.set(key, payload)
+            return payload
+
+        payload = generation_cache.get(key)
+        if payload is None:
+            payload = single_flight.do(key, generate)
+        update_job(session, job_id, progress=70)
+        rows = save_quiz_payload(session, payload)
+        update_job(session, job_id, status=JobStatus.SUCCEEDED, progress=100, quiz_id=rows.quiz['id'])
+    except Exception as e:
+        session.rollback()
+        update_job(session, job_id, status=JobStatus.FAILED, error=str(e))
+    finally:
+        session.close()
+
+
+class JobQueue:
+    """
+    Пул потоков для фоновых задач с ограничением числа задач в очереди.
+    Очередь и выполнение живут в памяти воркера: при его перезапуске задачи теряются.
+    Состояние задач генерации хранится в базе, поэтому статус можно запросить у любого воркера,
+    а брошенные задачи завершаются ошибкой через fail_stale_jobs
+    """
+    def __init__(self, workers: int, queue_limit: int, thread_name_prefix: str = 'jobs'):
+        self.queue_limit = queue_limit
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name_prefix)
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args) -> bool:
+        """
+        Ставит задачу в очередь. Возвращает False, если очередь заполнена
+        """
+        with self._lock:
+            if self._active >= self.queue_limit:
+                return False
+            self._active += 1
+        self.executor.submit(self._run, fn, *args)
+        return True
+
+    def _run(self, fn, *args):
+        try:
+            fn(*args)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+generation_queue = JobQueue(Config.GENERATION_WORKERS, Config.GENERATION_QUEUE_LIMIT, 'quiz-generation')
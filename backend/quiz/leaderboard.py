@@ -0,0 +1,395 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, select
+from config import Config
+from models import SessionLocal, User, TestResult, Quiz
+
+
+class SortedKeyList:
+    """
+    Отсортированный список, разбитый на блоки по load..2*load элементов.
+    Вставка и удаление - бинарный поиск блока и сдвиг внутри одного блока,
+    позиция элемента - бинарный поиск плюс смещение блока
+    """
+    def __init__(self, load: int = 1000):
+        self.load = load
+        self._blocks = []
+        self._maxes = []
+        self._offsets = None
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def bulk_load(self, keys: List):
+        """
+        Заполняет список уже отсортированными ключами
+        """
+        self._blocks = [keys[i:i + self.load] for i in range(0, len(keys), self.load)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(keys)
+        self._offsets = None
+
+    def add(self, key):
+        self._offsets = None
+        self._len += 1
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            return
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._blocks[pos].append(key)
+            self._maxes[pos] = key
+        else:
+            insort(self._blocks[pos], key)
+        block = self._blocks[pos]
+        if len(block) > 2 * self.load:
+            tail = block[self.load:]
+            del block[self.load:]
+            self._maxes[pos] = block[-1]
+            self._blocks.insert(pos + 1, tail)
+            self._maxes.insert(pos + 1, tail[-1])
+
+    def remove(self, key):
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            raise ValueError(key)
+        block = self._blocks[pos]
+        i = bisect_left(block, key)
+        if block[i] != key:
+            raise ValueError(key)
+        del block[i]
+        if block:
+            self._maxes[pos] = block[-1]
+        else:
+            del self._blocks[pos]
+            del self._maxes[pos]
+        self._len -= 1
+        self._offsets = None
+
+    def _offset(self, pos: int) -> int:
+        if self._offsets is None:
+            self._offsets = [0] + list(accumulate(len(block) for block in self._blocks))
+        return self._offsets[pos]
+
+    def bisect_left(self, key) -> int:
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            return self._len
+        return self._offset(pos) + bisect_left(self._blocks[pos], key)
+
+    def slice(self, start: int, stop: int) -> List:
+        start = max(start, 0)
+        stop = min(stop, self._len)
+        if start >= stop:
+            return []
+        # Блок, содержащий start, находится по накопленным смещениям
+        self._offset(0)
+        pos = bisect_left(self._offsets, start + 1) - 1
+        result = []
+        index = start - self._offsets[pos]
+        while len(result) < stop - start and pos < len(self._blocks):
+            result.extend(self._blocks[pos][index:index + stop - start - len(result)])
+            pos += 1
+            index = 0
+        return result
+
+
+class Leaderboard:
+    """
+    Рейтинг пользователей по баллам. Ключ сортировки (-score, user_id),
+    место пользователя - число пользователей с большим счетом плюс один
+    (одинаковый счет - одинаковое место)
+    """
+    def __init__(self, scores: Optional[Dict[str, int]] = None):
+        self._scores = {}
+        self._keys = SortedKeyList()
+        if scores:
+            self._scores = dict(scores)
+            self._keys.bulk_load(sorted((-score, user_id) for user_id, score in self._scores.items()))
+
+    def __len__(self):
+        return len(self._scores)
+
+    def set(self, user_id: str, score: int):
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._keys.remove((-old, user_id))
+        self._scores[user_id] = score
+        self._keys.add((-score, user_id))
+
+    def add(self, user_id: str, delta: int):
+        self.set(user_id, self._scores.get(user_id, 0) + delta)
+
+    def set_max(self, user_id: str, score: int):
+        old = self._scores.get(user_id)
+        if old is None or score > old:
+            self.set(user_id, score)
+
+    def score(self, user_id: str) -> Optional[int]:
+        return self._scores.get(user_id)
+
+    def rank(self, user_id: str) -> Optional[Tuple[int, int]]:
+        """
+        Место и счет пользователя за O(log n) или None, если его нет в рейтинге
+        """
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return self._keys.bisect_left((-score, '')) + 1, score
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[int, str, int]]:
+        """
+        Страница рейтинга: (место, user_id, счет)
+        """
+        entries = []
+        rank = None
+        previous = None
+        for position, (negative, user_id) in enumerate(self._keys.slice(offset, offset + limit), offset):
+            if negative != previous:
+                rank = position + 1 if previous is not None else self._keys.bisect_left((negative, '')) + 1
+                previous = negative
+            entries.append((rank, user_id, -negative))
+        return entries
+
+
+class WindowLeaderboard(Leaderboard):
+    """
+    Рейтинг за последние days дней. Баллы хранятся и по дням, и при смене
+    дня баллы вышедшего из окна дня вычитаются
+    """
+    def __init__(self, days: int, today: Optional[date] = None):
+        super().__init__()
+        self.days = days
+        self.today = today or datetime.utcnow().date()
+        self._buckets = {}
+
+    @property
+    def start(self) -> date:
+        return self.today - timedelta(days=self.days - 1)
+
+    def add_on(self, user_id: str, delta: int, day: date):
+        if day < self.start:
+            return
+        bucket = self._buckets.setdefault(day, {})
+        bucket[user_id] = bucket.get(user_id, 0) + delta
+        self.add(user_id, delta)
+
+    def advance(self, today: date):
+        if today <= self.today:
+            return
+        self.today = today
+        for day in [day for day in self._buckets if day < self.start]:
+            for user_id, delta in self._buckets.pop(day).items():
+                remaining = self._scores[user_id] - delta
+                if remaining:
+                    self.set(user_id, remaining)
+                else:
+                    self._keys.remove((-self._scores.pop(user_id), user_id))
+
+
+class LeaderboardService:
+    """
+    Рейтинги в памяти процесса: общий (users.score), по категориям (сумма баллов),
+    по викториннам (лучшая попытка) и за последние 7 и 30 дней.
+    Обновляются по мере сохранения результатов тестов и периодически
+    пересобираются из базы, чтобы учесть записи других процессов.
+    Рейтингов удаленных и архивных викторин нет
+    """
+    WINDOWS = (7, 30)
+
+    def __init__(self, reconcile_interval: float = 300):
+        self.reconcile_interval = reconcile_interval
+        self.reconciled_at = None
+        self.reconcile_seconds = None
+        self._lock = threading.Lock()
+        self._reconcile_lock = threading.Lock()
+        self._global = Leaderboard()
+        self._categories = {}
+        self._quizzes = {}
+        self._windows = {days: WindowLeaderboard(days) for days in self.WINDOWS}
+        # Отправки, учтенные во время пересборки (None - пересборки нет)
+        self._pending = None
+
+    @staticmethod
+    def _apply(boards: tuple, submissions: Iterable[dict]):
+        global_board, categories, quizzes, windows = boards
+        for submission in submissions:
+            user_id = submission['user_id']
+            score = submission['score']
+            global_board.add(user_id, score)
+            if submission.get('category_id'):
+                categories.setdefault(submission['category_id'], Leaderboard()).add(user_id, score)
+            if submission.get('quiz_id'):
+                quizzes.setdefault(submission['quiz_id'], Leaderboard()).set_max(user_id, score)
+            day = datetime.fromisoformat(submission['completed_at']).date()
+            for window in windows.values():
+                window.add_on(user_id, score, day)
+
+    def record(self, submissions: Iterable[dict]):
+        """
+        Учитывает сохраненные в базе отправки (формат submissions.build_submission)
+        """
+        submissions = list(submissions)
+        with self._lock:
+            self._apply((self._global, self._categories, self._quizzes, self._windows), submissions)
+            if self._pending is not None:
+                self._pending.extend(submissions)
+
+    def forget_quiz(self, quiz_id: str):
+        """
+        Убирает рейтинг удаленной викторины (в других процессах - при следующей сверке).
+        Результаты викторины в рейтинге категории по отдельности не хранятся,
+        поэтому ближайший запрос рейтинга пересобирает рейтинги из базы
+        """
+        with self._lock:
+            self._quizzes.pop(quiz_id, None)
+        self.reconciled_at = None
+
+    def board(self, scope: str, key: Optional[str] = None) -> Optional[Leaderboard]:
+        """
+        Рейтинг: global, 7d, 30d, category (key - ID категории) или quiz (key - ID викторины)
+        """
+        self.ensure_fresh()
+        with self._lock:
+            if scope == 'global':
+                return self._global
+            if scope == 'category':
+                return self._categories.get(key) or Leaderboard()
+            if scope == 'quiz':
+                return self._quizzes.get(key) or Leaderboard()
+            if scope.endswith('d') and scope[:-1].isdigit() and int(scope[:-1]) in self._windows:
+                window = self._windows[int(scope[:-1])]
+                window.advance(datetime.utcnow().date())
+                return window
+        return None
+
+    def rank(self, board: Leaderboard, user_id: str):
+        with self._lock:
+            return board.rank(user_id)
+
+    def top(self, board: Leaderboard, limit: int, offset: int = 0):
+        with self._lock:
+            return board.top(limit, offset), len(board)
+
+    def ensure_fresh(self):
+        """
+        Первая загрузка выполняется сразу, последующие сверки с базой - в фоне
+        """
+        if self.reconciled_at is None:
+            with self._reconcile_lock:
+                if self.reconciled_at is None:
+                    self.reconcile()
+        elif time.monotonic() - self.reconciled_at > self.reconcile_interval and not self._reconcile_lock.locked():
+            threading.Thread(target=self._reconcile_in_background, name='leaderboard-reconcile', daemon=True).start()
+
+    def _reconcile_in_background(self):
+        if not self._reconcile_lock.acquire(blocking=False):
+            return
+        try:
+            self.reconcile()
+        except Exception:
+            # Следующая попытка - через reconcile_interval
+            self.reconciled_at = time.monotonic()
+        finally:
+            self._reconcile_lock.release()
+
+    def reconcile(self):
+        """
+        Пересобирает все рейтинги из базы и подменяет их целиком. Отправки, учтенные
+        во время пересборки, запоминаются, и те, которых нет в прочитанном снимке базы,
+        повторно учитываются в новых рейтингах. Все запросы выполняются в одной транзакции:
+        REPEATABLE READ в Postgres, явный BEGIN в SQLite (записи других соединений
+        в SQLite ждут окончания сверки)
+        """
+        started = time.monotonic()
+        today = datetime.utcnow().date()
+        with self._lock:
+            self._pending = []
+        session = SessionLocal()
+        try:
+            dialect = session.get_bind().dialect.name
+            if dialect == 'postgresql':
+                session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+            elif dialect == 'sqlite':
+                session.connection().exec_driver_sql('BEGIN')
+            global_scores = dict(
+                session.query(User.id, func.coalesce(User.score, 0)).yield_per(10000)
+            )
+            category_scores = {}
+            category_rows = (
+                session.query(Quiz.category_id, TestResult.user_id, func.sum(TestResult.score))
+                .join(Quiz, Quiz.id == TestResult.quiz_id)
+                .filter(Quiz.deleted_at.is_(None))
+                .group_by(Quiz.category_id, TestResult.user_id)
+            )
+            for category_id, user_id, score in category_rows.yield_per(10000):
+                category_scores.setdefault(category_id, {})[user_id] = score or 0
+            quiz_scores = {}
+            quiz_rows = (
+                session.query(TestResult.quiz_id, TestResult.user_id, func.max(TestResult.score))
+                .join(Quiz, Quiz.id == TestResult.quiz_id)
+                .filter(Quiz.deleted_at.is_(None))
+                .group_by(TestResult.quiz_id, TestResult.user_id)
+            )
+            for quiz_id, user_id, score in quiz_rows.yield_per(10000):
+                quiz_scores.setdefault(quiz_id, {})[user_id] = score or 0
+            windows = {days: WindowLeaderboard(days, today) for days in self.WINDOWS}
+            day = func.date(TestResult.completed_at)
+            window_rows = (
+                session.query(TestResult.user_id, day, func.sum(TestResult.score))
+                .filter(TestResult.completed_at >= today - timedelta(days=max(self.WINDOWS) - 1))
+                .group_by(TestResult.user_id, day)
+            )
+            for user_id, completed_on, score in window_rows.yield_per(10000):
+                if isinstance(completed_on, str):
+                    completed_on = date.fromisoformat(completed_on)
+                for window in windows.values():
+                    window.add_on(user_id, score or 0, completed_on)
+
+            boards = (
+                Leaderboard(global_scores),
+                {key: Leaderboard(scores) for key, scores in category_scores.items()},
+                {key: Leaderboard(scores) for key, scores in quiz_scores.items()},
+                windows
+            )
+            with self._lock:
+                pending, self._pending = self._pending, None
+                # Проверка в той же транзакции, что и снимок: отправки, которых в нем нет, учитываются заново
+                ids = [submission['test_result_id'] for submission in pending]
+                included = set()
+                for start in range(0, len(ids), 500):
+                    included.update(session.execute(
+                        select(TestResult.id).where(TestResult.id.in_(ids[start:start + 500]))
+                    ).scalars())
+                self._apply(boards, [submission for submission in pending if submission['test_result_id'] not in included])
+                self._global, self._categories, self._quizzes, self._windows = boards
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        finally:
+            session.close()
+        self.reconciled_at = time.monotonic()
+        self.reconcile_seconds = self.reconciled_at - started
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'users': len(self._global),
+                'categories': len(self._categories),
+                'quizzes': len(self._quizzes),
+                'windows': {f'{days}d': len(window) for days, window in self._windows.items()},
+                'reconcile_seconds': self.reconcile_seconds
+            }
+
+
+leaderboards = LeaderboardService(Config.LEADERBOARD_RECONCILE_INTERVAL)
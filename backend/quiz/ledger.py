@@ -0,0 +1,56 @@
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import bindparam, func, select
+from models import User, TestResult
+
+
+def apply_score_deltas(session, deltas: Dict[str, int]):
+    """
+    Увеличивает счета пользователей атомарным UPDATE score = score + delta,
+    без чтения строки в приложение, поэтому одновременные отправки не теряют обновлений
+    """
+    if not deltas:
+        return
+    session.execute(
+        User.__table__.update()
+        .where(User.id == bindparam('user_key'))
+        .values(score=func.coalesce(User.score, 0) + bindparam('delta')),
+        [{'user_key': user_id, 'delta': delta} for user_id, delta in deltas.items()]
+    )
+
+
+def ledger_total():
+    """
+    Сумма баллов пользователя по журналу результатов (test_result) - источник истины для users.score
+    """
+    return (
+        select(func.coalesce(func.sum(TestResult.score), 0))
+        .where(TestResult.user_id == User.id)
+        .scalar_subquery()
+    )
+
+
+def score_drift(session, user_ids: Optional[Iterable[str]] = None) -> List[dict]:
+    """
+    Пользователи, у которых сохраненный счет расходится с суммой по журналу
+    """
+    total = ledger_total()
+    query = session.query(User.id, User.score, total).filter(func.coalesce(User.score, 0) != total)
+    if user_ids is not None:
+        query = query.filter(User.id.in_(list(user_ids)))
+    return [{'user_id': user_id, 'score': score, 'ledger': ledger} for user_id, score, ledger in query]
+
+
+def rebuild_user_scores(session, user_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Пересчитывает users.score по журналу результатов одним UPDATE и возвращает
+    число исправленных строк. Не коммитит транзакцию
+    """
+    total = ledger_total()
+    statement = (
+        User.__table__.update()
+        .where(func.coalesce(User.score, 0) != total)
+        .values(score=total)
+    )
+    if user_ids is not None:
+        statement = statement.where(User.id.in_(list(user_ids)))
+    return session.execute(statement).rowcount
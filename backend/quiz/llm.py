@@ -0,0 +1,121 @@
+import json
+import re
+import threading
+import time
+from typing import Iterator, List, Optional
+from config import Config
+
+
+class GroqLLMClient:
+    """
+    Клиент Groq, создается один раз на процесс
+    """
+    def __init__(self, api_key: str, model: str):
+        from groq import Groq
+        # Повторы выполняет очередь задач, встроенные повторы клиента отключены
+        self.client = Groq(api_key=api_key, max_retries=0)
+        self.model = model
+
+    def complete(self, messages: List[dict], timeout: Optional[float] = None) -> str:
+        chat_completion = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            timeout=timeout
+        )
+        return chat_completion.choices[0].message.content
+
+    def stream(self, messages: List[dict], timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Ответ модели по мере генерации, кусками текста
+        """
+        chunks = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            timeout=timeout,
+            stream=True
+        )
+        for chunk in chunks:
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                yield content
+
+
+class FakeLLMClient:
+    """
+    Локальная замена LLM без сети: возвращает заранее заданный ответ
+    или викторину из вопросов по первым словам текста
+    """
+    def __init__(self, response: Optional[str] = None, delay: float = 0, model: str = 'fake', piece_size: int = 16):
+        self.response = response
+        self.delay = delay
+        self.model = model
+        self.piece_size = piece_size
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, messages: List[dict], timeout: Optional[float] = None) -> str:
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return self._content(messages)
+
+    def stream(self, messages: List[dict], timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Тот же ответ, что и complete(), кусками по piece_size символов.
+        Задержка delay распределяется между кусками
+        """
+        with self._lock:
+            self.calls += 1
+        content = self._content(messages)
+        pieces = [content[i:i + self.piece_size] for i in range(0, len(content), self.piece_size)]
+        for piece in pieces:
+            if self.delay:
+                time.sleep(self.delay / len(pieces))
+            yield piece
+
+    def _content(self, messages: List[dict]) -> str:
+        if self.response is not None:
+            return self.response
+        # По одному вопросу на каждое новое слово текста, сколько просит системный промпт
+        match = re.search(r'сгенерируй (\d+) вопрос', messages[0]['content'])
+        count = int(match.group(1)) if match else 5
+        text = messages[-1]['content'].split('Текст:', 1)[-1]
+        words = list(dict.fromkeys(word.strip('.,!?:;«»"') for word in text.split()))[:count] or ['?']
+        return json.dumps({
+            "quizTitle": "Сгенерированная викторина",
+            "questions": [{
+                "type": "single",
+                "question": f"Что означает «{word}»?",
+                "options": [word, "Вариант 2", "Вариант 3", "Вариант 4"],
+                "correct": [0],
+                "points": 1
+            } for word in words]
+        }, ensure_ascii=False)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """
+    Возвращает общий клиент LLM по LLM_BACKEND (groq или fake)
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            if Config.LLM_BACKEND == 'fake':
+                _client = FakeLLMClient()
+            else:
+                _client = GroqLLMClient(Config.GROQ_API_KEY or "", Config.LLM_MODEL)
+        return _client
+
+
+def set_llm_client(client):
+    """
+    Подменяет клиент LLM (для тестов и бенчмарков)
+    """
+    global _client
+    with _client_lock:
+        _client = client
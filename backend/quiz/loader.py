@@ -0,0 +1,67 @@
+from typing import Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+from models import Quiz, Question
+
+
+def load_quiz_tree(session, quiz_id: str):
+    """
+    Загружает викторину вместе с вопросами и вариантами ответов.
+    Количество запросов не зависит от числа вопросов: один на викторину,
+    один на все вопросы и один на все варианты ответов (selectin loading)
+    """
+    return session.query(Quiz)\
+        .options(selectinload(Quiz.questions).selectinload(Question.options))\
+        .filter(Quiz.id == quiz_id, Quiz.deleted_at.is_(None))\
+        .first()
+
+
+def quiz_version(session, quiz_id: str) -> Optional[int]:
+    """
+    Версия викторины из базы (один запрос по первичному ключу) или None, если викторины нет.
+    Версия увеличивается при каждом изменении вопросов, вариантов и полей викторины
+    """
+    return session.execute(
+        select(Quiz.version).where(Quiz.id == quiz_id, Quiz.deleted_at.is_(None))
+    ).scalar()
+
+
+def quiz_list_version(session) -> str:
+    """
+    Версия списка викторин из базы: время последней записи в любую викторину
+    (max(updated_at) по индексу). Меняется при создании, изменении, удалении и восстановлении
+    """
+    return str(session.execute(select(func.max(Quiz.updated_at))).scalar())
+
+
+def serialize_option(option) -> dict:
+    return {
+        'id': option.id,
+        'name': option.name,
+        'is_correct': option.is_correct
+    }
+
+
+def serialize_question(question) -> dict:
+    return {
+        'id': question.id,
+        'question_type': question.question_type,
+        'points': question.points,
+        'options': [serialize_option(option) for option in question.options],
+        'question': question.question,
+        'image_url': question.image_url
+    }
+
+
+def serialize_quiz(quiz) -> dict:
+    """
+    Преобразует загруженное дерево викторины в словарь для ответа API
+    """
+    return {
+        'id': quiz.id,
+        'title': quiz.title,
+        'description': quiz.description,
+        'category_id': quiz.category_id,
+        'version': quiz.version,
+        'questions': [serialize_question(question) for question in quiz.questions]
+    }
@@ -0,0 +1,86 @@
+import base64
+import json
+from typing import Optional
+from models import Quiz, Category
+
+
+def encode_cursor(quiz_id: str, direction: str) -> str:
+    """
+    Непрозрачный курсор: ключ последней записи страницы и направление
+    """
+    raw = json.dumps({'k': quiz_id, 'd': direction}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Разбирает курсор, при некорректном значении бросает ValueError
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        key, direction = data['k'], data['d']
+    except Exception:
+        raise ValueError("Некорректный курсор")
+    if direction not in ('next', 'prev') or not isinstance(key, str):
+        raise ValueError("Некорректный курсор")
+    return key, direction
+
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def filtered_quizzes(query, category_id: Optional[str] = None, title_prefix: Optional[str] = None):
+    # Удаленные и архивные викторины в списках не показываются
+    query = query.filter(Quiz.deleted_at.is_(None))
+    if category_id:
+        query = query.filter(Quiz.category_id == category_id)
+    if title_prefix:
+        query = query.filter(Quiz.title.like(escape_like(title_prefix) + '%', escape='\\'))
+    return query
+
+
+def keyset_page(session, limit: int, cursor: Optional[str] = None,
+                category_id: Optional[str] = None, title_prefix: Optional[str] = None) -> dict:
+    """
+    Страница викторин с пагинацией по ключу (Quiz.id, первичный ключ).
+    Стоимость запроса не зависит от глубины страницы, в отличие от OFFSET
+    """
+    query = filtered_quizzes(
+        session.query(Quiz, Category.name.label('category_name')).join(Category, Quiz.category_id == Category.id),
+        category_id,
+        title_prefix
+    )
+
+    direction = 'next'
+    if cursor:
+        key, direction = decode_cursor(cursor)
+        if direction == 'next':
+            query = query.filter(Quiz.id > key)
+        else:
+            query = query.filter(Quiz.id < key)
+
+    order = Quiz.id.asc() if direction == 'next' else Quiz.id.desc()
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    rows = query.order_by(order).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+
+    next_cursor = None
+    prev_cursor = None
+    if rows:
+        if direction == 'next':
+            next_cursor = encode_cursor(rows[-1][0].id, 'next') if has_more else None
+            prev_cursor = encode_cursor(rows[0][0].id, 'prev') if cursor else None
+        else:
+            next_cursor = encode_cursor(rows[-1][0].id, 'next')
+            prev_cursor = encode_cursor(rows[0][0].id, 'prev') if has_more else None
+
+    return {
+        'rows': rows,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    }
@@ -0,0 +1,157 @@
+"""
+Удаление викторин.
+
+DELETE /quizes/<id> только помечает викторину (deleted_at), после чего она
+пропадает из списков, поиска и проверки ответов. Вопросы, варианты и история
+ответов удаляются фоновой задачей: ответы - пачками по PURGE_BATCH_SIZE строк,
+каждая пачка в своей транзакции и с паузой, чтобы не держать долгих блокировок;
+затем варианты, вопросы и сама викторина - запросами с подзапросом по quiz_id.
+Результаты тестов (test_result) остаются в журнале баллов
+"""
+import time
+from typing import Optional
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.sql import func
+from config import Config
+from models import SessionLocal, Quiz, Question, Options, UserAnswer, AttemptAnswer, QuizSearchDocument, TestResult
+from .jobs import JobQueue
+
+
+def delete_in_batches(session, table, condition, batch_size: int, pause: float = 0) -> int:
+    """
+    Удаляет строки по условию пачками: ключи пачки выбираются с LIMIT,
+    удаление и commit - отдельно для каждой пачки. Возвращает число удаленных строк
+    """
+    key = table.c.id
+    deleted = 0
+    while True:
+        keys = session.execute(select(key).where(condition).limit(batch_size)).scalars().all()
+        if not keys:
+            break
+        session.execute(delete(table).where(key.in_(keys)))
+        session.commit()
+        deleted += len(keys)
+        if len(keys) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def delete_by_chunks(session, table, column, values: list, chunk_size: int, condition=None, pause: float = 0) -> int:
+    """
+    Удаляет строки, у которых column входит в values, по chunk_size значений за транзакцию
+    """
+    deleted = 0
+    for start in range(0, len(values), chunk_size):
+        statement = delete(table).where(column.in_(values[start:start + chunk_size]))
+        if condition is not None:
+            statement = statement.where(condition)
+        deleted += session.execute(statement).rowcount
+        session.commit()
+        if pause and start + chunk_size < len(values):
+            time.sleep(pause)
+    return deleted
+
+
+def purge_quiz(session, quiz_id: str, batch_size: Optional[int] = None, pause: Optional[float] = None) -> dict:
+    """
+    Окончательно удаляет помеченную викторину и все зависимые строки.
+    Архивные и не помеченные викторины не трогает. Возвращает число удаленных строк по таблицам
+    """
+    batch_size = batch_size or Config.PURGE_BATCH_SIZE
+    pause = Config.PURGE_BATCH_PAUSE if pause is None else pause
+    marked = session.execute(
+        select(Quiz.id).where(Quiz.id == quiz_id, Quiz.deleted_at.isnot(None), Quiz.archived.is_(False))
+    ).first()
+    if marked is None:
+        return {}
+
+    question_ids = select(Question.id).where(Question.quiz_id == quiz_id)
+    option_ids = select(Options.id).where(Options.question_id.in_(question_ids))
+    # Ключ attempt_answer начинается с test_result_id, поэтому ответы удаляются по попыткам викторины
+    # (индекс по test_result.quiz_id): в пачке столько попыток, чтобы вышло около batch_size строк
+    questions_count = session.execute(select(func.count()).select_from(question_ids.subquery())).scalar() or 1
+    attempts = session.execute(select(TestResult.id).where(TestResult.quiz_id == quiz_id)).scalars().all()
+    counts = {
+        'attempt_answer': delete_by_chunks(
+            session, AttemptAnswer.__table__, AttemptAnswer.test_result_id, attempts,
+            max(1, batch_size // questions_count), AttemptAnswer.question_id.in_(question_ids), pause
+        ),
+        'user_answer': delete_in_batches(
+            session, UserAnswer.__table__,
+            or_(UserAnswer.question_id.in_(question_ids), UserAnswer.option_id.in_(option_ids)), batch_size, pause
+        ),
+    }
+    # Ответы старых попыток без quiz_id, вопросы и варианты: их немного, каждая таблица - одним запросом
+    counts['attempt_answer'] += session.execute(delete(AttemptAnswer.__table__)
+                                                .where(AttemptAnswer.question_id.in_(question_ids))).rowcount
+    counts['options'] = session.execute(delete(Options).where(Options.question_id.in_(question_ids))
+                                        .execution_options(synchronize_session=False)).rowcount
+    counts['questions'] = session.execute(delete(Question).where(Question.quiz_id == quiz_id)
+                                          .execution_options(synchronize_session=False)).rowcount
+    session.execute(delete(QuizSearchDocument).where(QuizSearchDocument.quiz_id == quiz_id)
+                    .execution_options(synchronize_session=False))
+    session.execute(delete(Quiz).where(Quiz.id == quiz_id).execution_options(synchronize_session=False))
+    session.commit()
+    return counts
+
+
+def run_purge_job(quiz_id: str):
+    """
+    Удаление в фоновом потоке со своей сессией
+    """
+    session = SessionLocal()
+    try:
+        purge_quiz(session, quiz_id)
+    except Exception:
+        session.rollback()
+        # Викторина остается помеченной, ее удалит следующий запуск flask purge-quizzes
+    finally:
+        session.close()
+
+
+def purge_pending(session) -> int:
+    """
+    Удаляет все помеченные неархивные викторины (например, задачи, не завершенные до перезапуска)
+    """
+    quiz_ids = session.execute(
+        select(Quiz.id).where(Quiz.deleted_at.isnot(None), Quiz.archived.is_(False))
+    ).scalars().all()
+    for quiz_id in quiz_ids:
+        purge_quiz(session, quiz_id)
+    return len(quiz_ids)
+
+
+def mark_deleted(session, quiz_id: str, archive: bool = False) -> Optional[Quiz]:
+    """
+    Помечает викторину удаленной или архивной. Архивную викторину можно удалить
+    окончательно повторным вызовом без archive. Возвращает None, если викторины нет
+    """
+    quiz = session.query(Quiz).filter(Quiz.id == quiz_id).first()
+    if quiz is None or (quiz.deleted_at is not None and not quiz.archived):
+        return quiz
+    session.execute(
+        update(Quiz).where(Quiz.id == quiz_id)
+        .values(deleted_at=func.coalesce(Quiz.deleted_at, func.now()), archived=archive, version=Quiz.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    session.refresh(quiz)
+    return quiz
+
+
+def restore_quiz(session, quiz_id: str) -> bool:
+    """
+    Возвращает архивную викторину. Помеченные к удалению не восстанавливаются
+    """
+    restored = session.execute(
+        update(Quiz).where(Quiz.id == quiz_id, Quiz.archived.is_(True))
+        .values(deleted_at=None, archived=False, version=Quiz.version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    session.commit()
+    return bool(restored)
+
+
+purge_queue = JobQueue(Config.PURGE_WORKERS, Config.PURGE_QUEUE_LIMIT, 'quiz-purge')
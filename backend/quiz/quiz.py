@@ -1,110 +1,193 @@
-from flask import Blueprint, request, jsonify
-from uuid import uuid4
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from typing import List, Optional, Dict, Any
 from sqlalchemy import delete, func
-from models import Quiz, Question, Options, Category, TestResult,QuestionType, SessionLocal, UserAnswer
+from sqlalchemy.exc import IntegrityError
+from ids import new_id
+from models import Quiz, Question, Options, Category, TestResult,QuestionType, SessionLocal, UserAnswer, GenerationJob, JobStatus, User
+from db import close_session, get_session, pool_stats
 from auth import token_required
-import os
-from groq import Groq
+from responses import compress_response, conditional, make_etag, not_modified, with_etag
+from .loader import load_quiz_tree, quiz_list_version, quiz_version, serialize_quiz
+from .cache import quiz_cache
+from .writer import build_quiz_rows, insert_quiz_rows
+from .reconcile import VersionConflict, apply_quiz_changes, diff_quiz, load_quiz_state
+from .purge import mark_deleted, purge_queue, restore_quiz, run_purge_job
+from .transfer import import_quizzes, export_quizzes
+from .scoring import answer_keys, grader, validate_answers
+from .submissions import build_submission, get_submission_writer, publish_stored, store_submissions
+from .analytics import quiz_analytics
+from .attempts import get_attempt_store, public_quizzes
+from .leaderboard import leaderboards
+from .activity import BUCKETS as ACTIVITY_BUCKETS, activity_version, load_activity, next_bucket, tests_count as activity_tests_count
+from .pagination import keyset_page, filtered_quizzes
+from .search import quiz_search
+from .generation import StreamingQuizWriter, build_messages, convert_generated_question
+from .chunking import estimate_tokens
+from .stream_parser import QuizStreamParser
+from .llm import get_llm_client
+from .generation_cache import generation_cache
+from .jobs import generation_queue, run_generation_job, serialize_job, update_job, fail_stale_jobs, is_stale, FINISHED_STATUSES
+from config import Config
+import time
 from flask_cors import CORS
 import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 
 quiz_bp = Blueprint('quiz', __name__)
 
 # Исправляем настройки CORS, чтобы разрешить запросы с localhost:3000
 CORS(quiz_bp, resources={r"/quiz/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"]}})
+quiz_bp.after_request(compress_response)
 
 @quiz_bp.route('/categories', methods = ['GET'])
 @token_required
 def get_categories(current_user):
-    session = SessionLocal()
+    session = get_session()
 
     try:
-        categories = session.query(Category).all()
+        categories = session.query(Category.id, Category.name).all()
+        # Счетчика версий у категорий нет: ETag строится по строкам, но без сериализации и сжатия ответа
+        etag = make_etag('categories', *(f'{category.id}:{category.name}' for category in categories))
+        response = not_modified(etag)
+        if response is not None:
+            return response
         categories_list = [{"id": category.id, "name": category.name} for category in categories]
-        return jsonify({"categories": categories_list})
+        return with_etag(jsonify({"categories": categories_list}), etag)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        session.close()
+
+@quiz_bp.route('/search', methods=['GET'])
+@token_required
+def search_quizes(current_user):
+    """
+    Поиск викторин по названию, описанию, вопросам и вариантам ответов
+    с ранжированием, фильтром по категории, поиском по началу слова и с учетом опечаток
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({"error": "Параметр q обязателен"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), Config.SEARCH_MAX_LIMIT)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "limit и offset должны быть числами"}), 400
+    category_id = request.args.get('category_id')
+
+    results, total = quiz_search.search(get_session(), query, category_id, limit, offset)
+    return jsonify({
+        "query": query,
+        "total": total,
+        "results": results
+    })
+
+def quiz_etag_parts(kind: str, quiz_id: Optional[str] = None) -> Optional[tuple]:
+    """
+    Части ETag списка или викторины из версий в базе, которые видят все воркеры:
+    Quiz.version для викторины, время последней записи в викторины для списка.
+    None, если викторины нет - тогда view отвечает 404
+    """
+    session = get_session()
+    if quiz_id is None:
+        return (kind, quiz_list_version(session))
+    version = quiz_version(session, quiz_id)
+    return None if version is None else (kind, quiz_id, version)
 
 @quiz_bp.route('/quizes', methods=['GET'])
 @token_required
+@conditional(lambda current_user: quiz_etag_parts('quizes'))
 def get_quizes(current_user):
     """
-    Получение списка всех викторин с пагинацией
+    Получение списка викторин с пагинацией по курсору.
+    Параметры skip/limit без cursor по-прежнему работают через OFFSET
     """
-    skip = request.args.get('skip', 0, type=int)
-    limit = request.args.get('limit', 100, type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    cursor = request.args.get('cursor')
+    skip = request.args.get('skip', type=int)
+    category_id = request.args.get('category_id')
+    title_prefix = request.args.get('title')
     
-    session = SessionLocal()
-    try:
-        # Получаем викторины с присоединением категорий
-        quizes = session.query(Quiz, Category.name.label('category_name'))\
-            .join(Category, Quiz.category_id == Category.id)\
-            .offset(skip).limit(limit).all()
-        total_count = session.query(Quiz).count()
-        
-        return jsonify({
-            'quizes': [{
-                'id': quiz.id,
-                'title': quiz.title,
-                'description': quiz.description,
-                'category_id': quiz.category_id,
-                'category_name': category_name
-            } for quiz, category_name in quizes],
-            'total_count': total_count
-        })
-    finally:
-        session.close()
+    session = get_session()
+    if skip is not None and not cursor:
+        # Старый режим для совместимости
+        quizes = filtered_quizzes(
+            session.query(Quiz, Category.name.label('category_name')).join(Category, Quiz.category_id == Category.id),
+            category_id,
+            title_prefix
+        ).order_by(Quiz.id).offset(skip).limit(limit).all()
+        next_cursor = prev_cursor = None
+    else:
+        try:
+            page = keyset_page(session, limit, cursor, category_id, title_prefix)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        quizes = page['rows']
+        next_cursor = page['next_cursor']
+        prev_cursor = page['prev_cursor']
+    
+    # Количество берем из кэша, полный COUNT выполняется только после записи или истечения TTL
+    total_count = quiz_cache.get_count(
+        (category_id, title_prefix),
+        quiz_list_version(session),
+        lambda: filtered_quizzes(session.query(func.count(Quiz.id)), category_id, title_prefix).scalar()
+    )
+    
+    return jsonify({
+        'quizes': [{
+            'id': quiz.id,
+            'title': quiz.title,
+            'description': quiz.description,
+            'category_id': quiz.category_id,
+            'category_name': category_name
+        } for quiz, category_name in quizes],
+        'total_count': total_count,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    })
 
 @quiz_bp.route('/quizes/<quiz_id>', methods=['GET'])
 @token_required
+@conditional(lambda current_user, quiz_id: quiz_etag_parts('quiz', quiz_id))
 def get_quiz_by_id(current_user, quiz_id: str):
     """
     Получение викторины по ID
     """
-    session = SessionLocal()
-    try:
-        quiz = session.query(Quiz).filter(Quiz.id == quiz_id).first()
-        if not quiz:
-            return jsonify({"error": "Викторина не найдена"}), 404
-        
-        # Получаем вопросы для викторины
-        questions = session.query(Question).filter(Question.quiz_id == quiz_id).all()
-        questions_data = []
-        
-        for question in questions:
-            # Получаем варианты ответов для вопроса
-            options = session.query(Options).filter(Options.question_id == question.id).all()
-            options_data = [{
-                'id': option.id,
-                'name': option.name,
-                'is_correct': option.is_correct
-            } for option in options]
-            
-            questions_data.append({
-                'id': question.id,
-                'question_type': question.question_type,
-                'points': question.points,
-                'options': options_data,
-                'question': question.question,
-                'image_url': question.image_url
-            })
-        
-        quiz_data = {
-            'id': quiz.id,
-            'title': quiz.title,
-            'description': quiz.description,
-            'category_id': quiz.category_id,
-            'questions': questions_data
-        }
+    session = get_session()
+    
+    def load_quiz():
+        # Загружаем викторину, вопросы и варианты ответов за фиксированное число запросов
+        quiz = load_quiz_tree(session, quiz_id)
+        return serialize_quiz(quiz) if quiz else None
+    
+    # Версия из базы: кэш каждого воркера видит правки, сделанные в других воркерах
+    version = quiz_version(session, quiz_id)
+    payload = quiz_cache.get_or_load(quiz_id, version, load_quiz) if version is not None else None
+    if payload is None:
+        return jsonify({"error": "Викторина не найдена"}), 404
+    
+    return Response(payload, mimetype='application/json')
+
+def read_quiz_payload():
+    """
+    Данные викторины из запроса: JSON или FormData с полем quizData и изображениями вопросов
+    """
+    # Проверяем, есть ли JSON данные в запросе
+    if 'quizData' in request.form:
+        # Получаем JSON данные из FormData
+        data = json.loads(request.form['quizData'])
         
-        return jsonify(quiz_data)
-    finally:
-        session.close()
+        # Обрабатываем изображения вопросов, если они есть
+        question_images = {}
+        for key in request.files:
+            if key.startswith('question_images['):
+                index = int(key.split('[')[1].split(']')[0])
+                file = request.files[key]
+                # Здесь должна быть логика сохранения файла и получения URL
+                # Для простоты демонстрации просто сохраним имя файла
+                question_images[index] = file.filename
+        return data, question_images
+    # Если данные отправляются как обычный JSON
+    return request.get_json(), {}
 
 @quiz_bp.route('/quizes', methods=['POST'])
 @token_required
@@ -113,371 +196,409 @@ def add_quiz(current_user):
     Создание новой викторины с вопросами и вариантами ответов
     """
     try:
-        # Проверяем, есть ли JSON данные в запросе
-        if 'quizData' in request.form:
-            # Получаем JSON данные из FormData
-            data = json.loads(request.form['quizData'])
+        data, question_images = read_quiz_payload()
             
-            # Обрабатываем изображения вопросов, если они есть
-            question_images = {}
-            for key in request.files:
-                if key.startswith('question_images['):
-                    index = int(key.split('[')[1].split(']')[0])
-                    file = request.files[key]
-                    # Здесь должна быть логика сохранения файла и получения URL
-                    # Для простоты демонстрации просто сохраним имя файла
-                    question_images[index] = file.filename
-            
-        else:
-            # Если данные отправляются как обычный JSON
-            data = request.get_json()
-            question_images = {}
-            
-        title = data.get('title')
-        description = data.get('description')
-        category_id = data.get('category_id')
-        questions_data = data.get('questions', [])
+        session = get_session()
+        # Строим все строки в памяти и вставляем их пакетно одной транзакцией
+        rows = build_quiz_rows(data, question_images)
+        insert_quiz_rows(session, rows)
         
-        session = SessionLocal()
-        try:
-            # Создаем викторину
-            quiz = Quiz(
-                id=str(uuid4()),
-                title=title,
-                description=description,
-                category_id=category_id
-            )
-            session.add(quiz)
-            session.flush()  # Получаем ID викторины
-            
-            # Добавляем вопросы
-            for i, question_data in enumerate(questions_data):
-                question = Question(
-                    id=str(uuid4()),
-                    question_type=question_data["question_type"],
-                    quiz_id=quiz.id,
-                    points=question_data.get("points", 100),
-                    question=question_data.get("question"),
-                    image_url=question_images.get(i)  # Устанавливаем URL изображения, если есть
-                )
-                session.add(question)
-                session.flush()  # Получаем ID вопроса
-                
-                # Добавляем варианты ответов для вопроса
-                if "options" in question_data:
-                    for option_data in question_data["options"]:
-                        option = Options(
-                            id=str(uuid4()),
-                            question_id=question.id,
-                            name=option_data["name"],
-                            is_correct=option_data.get("is_correct", False)
-                        )
-                        session.add(option)
-            
-            session.commit()
-            
-            # Создаем словарь с данными викторины
-            quiz_data = {
-                'id': quiz.id,
-                'title': quiz.title,
-                'description': quiz.description,
-                'category_id': quiz.category_id
-            }
-            
-            return jsonify(quiz_data), 201
-        finally:
-            session.close()
+        session.commit()
+        quiz_cache.invalidate(rows.quiz['id'])
+        
+        # Создаем словарь с данными викторины
+        quiz_data = {
+            'id': rows.quiz['id'],
+            'title': rows.quiz['title'],
+            'description': rows.quiz['description'],
+            'category_id': rows.quiz['category_id'],
+            'version': 1
+        }
+        
+        return jsonify(quiz_data), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@quiz_bp.route('/quizes/<quiz_id>', methods=['PUT'])
-@token_required
-def update_quiz(current_user, quiz_id: str):
+def expected_quiz_version(data) -> Optional[int]:
     """
-    Обновление викторины, вопросов и вариантов ответов
+    Версия викторины, с которой работал клиент: поле version или заголовок If-Match
     """
+    version = data.get('version') if isinstance(data, dict) else None
+    if version is None and request.headers.get('If-Match'):
+        version = request.headers['If-Match'].strip().lstrip('W/').strip('"')
+    if version is None:
+        return None
     try:
-        # Проверяем, есть ли JSON данные в запросе
-        if 'quizData' in request.form:
-            # Получаем JSON данные из FormData
-            data = json.loads(request.form['quizData'])
-            
-            # Обрабатываем изображения вопросов, если они есть
-            question_images = {}
-            for key in request.files:
-                if key.startswith('question_images['):
-                    index = int(key.split('[')[1].split(']')[0])
-                    file = request.files[key]
-                    # Здесь должна быть логика сохранения файла и получения URL
-                    # Для простоты демонстрации просто сохраним имя файла
-                    question_images[index] = file.filename
-            
-        else:
-            # Если данные отправляются как обычный JSON
-            data = request.get_json()
-            question_images = {}
-            
-        title = data.get('title')
-        description = data.get('description')
-        category_id = data.get('category_id')
-        questions_update = data.get('questions')
-        
-        session = SessionLocal()
-        try:
-            quiz = session.query(Quiz).filter(Quiz.id == quiz_id).first()
-            if not quiz:
-                return jsonify({"error": "Викторина не найдена"}), 404
-            
-            # Обновляем данные викторины
-            if title:
-                quiz.title = title
-            if description:
-                quiz.description = description
-            if category_id:
-                quiz.category_id = category_id
-            
-            # Обновляем вопросы и варианты ответов
-            if questions_update:
-                for i, question_data in enumerate(questions_update):
-                    if "id" in question_data and question_data["id"]:
-                        # Обновляем существующий вопрос
-                        question = session.query(Question).filter(Question.id == question_data["id"]).first()
-                        if question:
-                            if "question_type" in question_data:
-                                question.question_type = question_data["question_type"]
-                            if "points" in question_data:
-                                question.points = question_data["points"]
-                            if "question" in question_data:
-                                question.question = question_data["question"]
-                            
-                            # Обновляем URL изображения, если оно было загружено
-                            if i in question_images:
-                                question.image_url = question_images[i]
-                            
-                            # Обновляем или добавляем варианты ответов
-                            if "options" in question_data:
-                                for option_data in question_data["options"]:
-                                    if "id" in option_data and option_data["id"]:
-                                        # Обновляем существующий вариант
-                                        option = session.query(Options).filter(Options.id == option_data["id"]).first()
-                                        if option:
-                                            if "name" in option_data:
-                                                option.name = option_data["name"]
-                                            if "is_correct" in option_data:
-                                                option.is_correct = option_data["is_correct"]
-                                    else:
-                                        # Добавляем новый вариант
-                                        option = Options(
-                                            id=str(uuid4()),
-                                            question_id=question.id,
-                                            name=option_data["name"],
-                                            is_correct=option_data.get("is_correct", False)
-                                        )
-                                        session.add(option)
-                            
-                            # Удаляем указанные варианты ответов
-                            if "delete_options" in question_data:
-                                for option_id in question_data["delete_options"]:
-                                    session.query(Options).filter(Options.id == option_id).delete()
-                    else:
-                        # Создаем новый вопрос
-                        question = Question(
-                            id=str(uuid4()),
-                            question_type=question_data["question_type"],
-                            quiz_id=quiz.id,
-                            points=question_data.get("points", 100),
-                            question=question_data.get("question"),
-                            image_url=question_images.get(i)  # Устанавливаем URL изображения, если есть
-                        )
-                        session.add(question)
-                        session.flush()  # Получаем ID вопроса
-                        
-                        # Добавляем варианты ответов для нового вопроса
-                        if "options" in question_data:
-                            for option_data in question_data["options"]:
-                                option = Options(
-                                    id=str(uuid4()),
-                                    question_id=question.id,
-                                    name=option_data["name"],
-                                    is_correct=option_data.get("is_correct", False)
-                                )
-                                session.add(option)
-            
+        return int(version)
+    except (TypeError, ValueError):
+        raise ValueError("Версия викторины должна быть числом")
+
+def save_quiz_changes(quiz_id: str, partial: bool):
+    """
+    Общая часть PUT и PATCH: сверка с текущим состоянием и пакетное применение изменений
+    """
+    try:
+        data, question_images = read_quiz_payload()
+        expected_version = expected_quiz_version(data)
+        if partial and expected_version is None:
+            return jsonify({"error": "Для PATCH нужна версия викторины (поле version или заголовок If-Match)"}), 428
+
+        session = get_session()
+        state = load_quiz_state(session, quiz_id)
+        if state is None:
+            return jsonify({"error": "Викторина не найдена"}), 404
+        if expected_version is not None and expected_version != state.quiz['version']:
+            return jsonify({"error": "Викторина была изменена другим запросом", "version": state.quiz['version']}), 409
+
+        changes = diff_quiz(state, data, question_images, partial=partial)
+        version = state.quiz['version']
+        if changes:
+            # Версия проверяется еще раз в самом UPDATE: между загрузкой и записью викторину могли изменить
+            version = apply_quiz_changes(session, quiz_id, changes, expected_version or state.quiz['version'])
             session.commit()
-            
-            # Создаем словарь с данными викторины
-            quiz_data = {
-                'id': quiz.id,
-                'title': quiz.title,
-                'description': quiz.description,
-                'category_id': quiz.category_id
-            }
-            
-            return jsonify(quiz_data)
-        finally:
-            session.close()
+            quiz_cache.invalidate(quiz_id)
+
+        quiz = dict(state.quiz, **changes.quiz)
+        # Создаем словарь с данными викторины
+        quiz_data = {
+            'id': quiz['id'],
+            'title': quiz['title'],
+            'description': quiz['description'],
+            'category_id': quiz['category_id'],
+            'version': version,
+            'changes': changes.counts()
+        }
+        
+        return jsonify(quiz_data)
+    except VersionConflict as e:
+        get_session().rollback()
+        if e.current_version is None:
+            return jsonify({"error": "Викторина не найдена"}), 404
+        return jsonify({"error": str(e), "version": e.current_version}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
+        get_session().rollback()
         return jsonify({"error": str(e)}), 500
 
+@quiz_bp.route('/quizes/<quiz_id>', methods=['PUT'])
+@token_required
+def update_quiz(current_user, quiz_id: str):
+    """
+    Обновление викторины, вопросов и вариантов ответов.
+    Версия (version или If-Match) необязательна; если передана - проверяется
+    """
+    return save_quiz_changes(quiz_id, partial=False)
+
+@quiz_bp.route('/quizes/<quiz_id>', methods=['PATCH'])
+@token_required
+def patch_quiz(current_user, quiz_id: str):
+    """
+    Частичное обновление: присылаются только измененные поля и версия викторины.
+    Если версия устарела - 409 с текущей версией
+    """
+    return save_quiz_changes(quiz_id, partial=True)
+
 @quiz_bp.route('/quizes/<quiz_id>', methods=['DELETE'])
 @token_required
 def delete_quiz(current_user, quiz_id: str):
     """
-    Удаление викторины каскадно (включая все вопросы и варианты ответов)
+    Удаление викторины. Викторина сразу скрывается, вопросы, варианты и история ответов
+    удаляются фоновой задачей пачками. С archive=true викторина только архивируется
+    и ее можно вернуть через POST /quizes/<quiz_id>/restore
     """
-    session = SessionLocal()
-    try:
-        # Получаем все вопросы для этой викторины
-        questions = session.query(Question).filter(Question.quiz_id == quiz_id).all()
-        
-        # Удаляем все варианты ответов для каждого вопроса
-        for question in questions:
-            session.query(Options).filter(Options.question_id == question.id).delete()
-        
-        # Удаляем все вопросы
-        session.query(Question).filter(Question.quiz_id == quiz_id).delete()
-        
-        # Удаляем саму викторину
-        quiz = session.query(Quiz).filter(Quiz.id == quiz_id).delete()
-        
-        session.commit()
-        return jsonify({"message": "Викторина успешно удалена"}), 200
-    finally:
-        session.close()
+    archive = request.args.get('archive', 'false').lower() in ('1', 'true', 'yes')
+    session = get_session()
+    quiz = mark_deleted(session, quiz_id, archive)
+    # Удаленная окончательно викторина не архивируется: для API ее уже нет
+    if quiz is None or (archive and not quiz.archived):
+        return jsonify({"error": "Викторина не найдена"}), 404
+    quiz_cache.invalidate(quiz_id)
+    leaderboards.forget_quiz(quiz_id)
+
+    if archive:
+        return jsonify({"message": "Викторина перемещена в архив", "purge": "archived"}), 200
+    # Если очередь заполнена, викторина остается помеченной до запуска flask purge-quizzes
+    queued = purge_queue.submit(run_purge_job, quiz_id)
+    return jsonify({"message": "Викторина успешно удалена", "purge": "queued" if queued else "deferred"}), 200
+
+@quiz_bp.route('/quizes/<quiz_id>/restore', methods=['POST'])
+@token_required
+def restore_archived_quiz(current_user, quiz_id: str):
+    """
+    Восстановление архивной викторины
+    """
+    session = get_session()
+    if not restore_quiz(session, quiz_id):
+        return jsonify({"error": "Архивная викторина не найдена"}), 404
+    quiz_cache.invalidate(quiz_id)
+    return jsonify({"message": "Викторина восстановлена"}), 200
+
+@quiz_bp.route('/import', methods=['POST'])
+@token_required
+def import_quiz_batch(current_user):
+    """
+    Импорт викторин из потока NDJSON (одна викторина в формате add_quiz на строку)
+    """
+    batch_size = request.args.get('batch_size', Config.IMPORT_BATCH_SIZE, type=int)
+    if batch_size < 1:
+        return jsonify({"error": "batch_size должен быть положительным"}), 400
+    
+    session = get_session()
+    results = import_quizzes(session, request.stream, batch_size)
+    for result in results:
+        if result["status"] == "created":
+            quiz_cache.invalidate(result["id"])
+    
+    created = sum(1 for result in results if result["status"] == "created")
+    return jsonify({
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    })
+
+@quiz_bp.route('/export', methods=['GET'])
+@token_required
+def export_quiz_batch(current_user):
+    """
+    Потоковая выгрузка всех викторин в NDJSON
+    """
+    batch_size = request.args.get('batch_size', Config.EXPORT_BATCH_SIZE, type=int)
+    
+    def generate():
+        session = SessionLocal()
+        try:
+            yield from export_quizzes(session, max(batch_size, 1))
+        finally:
+            session.close()
+    
+    # Выгрузка читает своей сессией, соединение запроса освобождается до начала потока
+    close_session()
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @quiz_bp.route('/generate-quiz', methods=['POST'])
 @token_required
 def generate_quiz(current_user):
     """
-    Генерация викторины с использованием LLM на основе текста и категории
+    Ставит генерацию викторины с использованием LLM в очередь и сразу возвращает ID задачи
+    """
+    session = get_session()
+    data = request.json
+    if not data or 'text' not in data or 'category_id' not in data:
+        return jsonify({"error": "Необходимо предоставить текст и ID категории"}), 400
+    
+    text = data['text']
+    category_id = data['category_id']
+    question_count = data.get('question_count', 5)
+    if not isinstance(question_count, int) or not 1 <= question_count <= Config.GENERATION_MAX_QUESTIONS:
+        return jsonify({"error": f"question_count должен быть от 1 до {Config.GENERATION_MAX_QUESTIONS}"}), 400
+    
+    # Проверяем существование категории
+    category = session.query(Category).filter(Category.id == category_id).first()
+    if not category:
+        return jsonify({"error": "Указанная категория не существует"}), 404
+    
+    job = GenerationJob(id=new_id(), user_id=current_user.id, category_id=category_id)
+    session.add(job)
+    session.commit()
+    
+    if not generation_queue.submit(run_generation_job, job.id, category_id, text, question_count):
+        update_job(session, job.id, status=JobStatus.FAILED, error="Очередь генерации переполнена")
+        return jsonify({"error": "Очередь генерации переполнена, попробуйте позже"}), 503
+    
+    return jsonify({"job_id": job.id, "status": JobStatus.PENDING}), 202
+
+@quiz_bp.route('/generate-quiz/stream', methods=['POST'])
+@token_required
+def generate_quiz_stream(current_user):
+    """
+    Генерирует викторину в потоковом режиме: ответ LLM разбирается по мере
+    поступления, каждый готовый вопрос сразу сохраняется и отправляется
+    клиенту событием question (SSE). При обрыве ответа сохраненные вопросы остаются
+    """
+    session = get_session()
+    data = request.json
+    if not data or 'text' not in data or 'category_id' not in data:
+        return jsonify({"error": "Необходимо предоставить текст и ID категории"}), 400
+    
+    text = data['text']
+    question_count = data.get('question_count', 5)
+    if not isinstance(question_count, int) or not 1 <= question_count <= Config.GENERATION_MAX_QUESTIONS:
+        return jsonify({"error": f"question_count должен быть от 1 до {Config.GENERATION_MAX_QUESTIONS}"}), 400
+    # Потоковый режим делает один запрос к LLM, длинные тексты генерируются задачей по фрагментам
+    if estimate_tokens(text) > Config.CHUNK_MAX_TOKENS:
+        return jsonify({"error": "Текст слишком длинный для потоковой генерации, используйте /generate-quiz"}), 413
+    
+    category = session.query(Category).filter(Category.id == data['category_id']).first()
+    if not category:
+        return jsonify({"error": "Указанная категория не существует"}), 404
+    
+    messages = build_messages(category.name, text, question_count)
+    # Соединение запроса не держим на время ответа LLM: вопросы сохраняет сессия потока,
+    # а у категории нужны только уже загруженные id и name
+    close_session()
+    
+    def event(name, payload):
+        return f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
+    def generate():
+        stream_session = SessionLocal()
+        writer = StreamingQuizWriter(stream_session, category)
+        parser = QuizStreamParser()
+        try:
+            pieces = get_llm_client().stream(messages, timeout=Config.GENERATION_TIMEOUT)
+            for piece in pieces:
+                for q_data in parser.feed(piece):
+                    if writer.count < question_count:
+                        yield event('question', writer.add(convert_generated_question(q_data), parser.title))
+                if writer.count >= question_count:
+                    pieces.close()
+                    break
+            parser.close()
+            writer.finish(parser.title)
+            yield event('done', {
+                'quiz_id': writer.quiz_id,
+                'title': writer.title,
+                'questions': writer.count,
+                'rejected': parser.rejected,
+                'truncated': parser.truncated and writer.count < question_count
+            })
+        except Exception as e:
+            stream_session.rollback()
+            yield event('error', {'error': str(e), 'quiz_id': writer.quiz_id, 'questions': writer.count})
+        finally:
+            stream_session.close()
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+@quiz_bp.route('/generate-quiz/<job_id>', methods=['GET'])
+@token_required
+def get_generation_job(current_user, job_id: str):
+    """
+    Статус задачи генерации
+    """
+    session = get_session()
+    job = session.query(GenerationJob).filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({"error": "Задача не найдена"}), 404
+    if is_stale(job):
+        fail_stale_jobs(session, job_id)
+        session.refresh(job)
+    return jsonify(serialize_job(job))
+
+@quiz_bp.route('/generate-quiz/<job_id>/events', methods=['GET'])
+@token_required
+def stream_generation_job(current_user, job_id: str):
+    """
+    Прогресс задачи генерации через Server-Sent Events
+    """
+    user_id = current_user.id
+    deadline = time.monotonic() + Config.GENERATION_TIMEOUT * (Config.GENERATION_RETRIES + 1) + 60
+    
+    def generate():
+        last_state = None
+        while time.monotonic() < deadline:
+            session = SessionLocal()
+            try:
+                job = session.query(GenerationJob).filter_by(id=job_id, user_id=user_id).first()
+                if not job:
+                    yield f"event: error\ndata: {json.dumps({'error': 'Задача не найдена'}, ensure_ascii=False)}\n\n"
+                    return
+                if is_stale(job):
+                    fail_stale_jobs(session, job_id)
+                    session.refresh(job)
+                state = serialize_job(job)
+            finally:
+                session.close()
+            if state != last_state:
+                yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+                last_state = state
+            if state['status'] in FINISHED_STATUSES:
+                return
+            time.sleep(0.5)
+    
+    # Сессия запроса (проверка токена) закрывается до начала потока: иначе соединение
+    # остается занятым до teardown, то есть на все время наблюдения за задачей
+    close_session()
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+def already_saved(session, current_user, idempotency_key: str):
     """
-    session = SessionLocal()
+    Ответ на повтор отправки с ключом, под которым результат уже сохранен, или None
+    """
+    previous = session.query(TestResult).filter_by(user_id=current_user.id, idempotency_key=idempotency_key).first()
+    if not previous:
+        return None
+    return jsonify({
+        "message": "Ответы уже сохранены",
+        "test_result_id": previous.id,
+        "total_score": previous.score,
+        "updated_score": session.query(User.score).filter(User.id == current_user.id).scalar()
+    }), 200
+
+def save_submission(session, current_user, submission: dict, idempotency_key: Optional[str]):
+    """
+    Сохраняет проверенную отправку (сразу или через журнал при SUBMISSION_WRITE_BEHIND)
+    и возвращает ответ API. Общая часть submit-answers и завершения попытки.
+    Ответы проверяются validate_answers до вызова: запись журнала повторяется
+    фоновым потоком, и испорченная запись не сохранилась бы никогда
+    """
+    if Config.SUBMISSION_WRITE_BEHIND:
+        writer = get_submission_writer()
+        submission, created = writer.journal.append(submission)
+        writer.notify()
+        return jsonify({
+            "message": "Ответы приняты",
+            "status": "queued",
+            "test_result_id": submission['test_result_id'],
+            "total_score": submission['score'],
+            "max_score": submission['max_score'],
+            "questions": submission['questions']
+        }), 202 if created else 200
+    
+    if idempotency_key is not None:
+        response = already_saved(session, current_user, idempotency_key)
+        if response is not None:
+            return response
+    
     try:
-        data = request.json
-        if not data or 'text' not in data or 'category_id' not in data:
-            return jsonify({"error": "Необходимо предоставить текст и ID категории"}), 400
-        
-        text = data['text']
-        category_id = data['category_id']
-        
-        # Проверяем существование категории
-        category = session.query(Category).filter(Category.id == category_id).first()
-        if not category:
-            return jsonify({"error": "Указанная категория не существует"}), 404
-        
-        # Используем Groq для генерации викторины
-        
-        client = Groq(
-            api_key=os.environ.get("GROQ_API_KEY", "")
-        )
-        chat_completion = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"""Ты генератор викторин. Пользователь даст тебе тему, статью или документ. На основе этого сгенерируй 5 вопросов для категории "{category.name}". Возвращай только JSON в таком формате:
-{{
-  "quizTitle": "Название викторины",
-  "questions": [
-    {{
-      "type": "single",
-      "question": "Вопрос?",
-      "options": ["Вариант1", "Вариант2", "Вариант3", "Вариант4"],
-      "correct": [2],
-      "points": 1
-    }},
-    {{
-      "type": "multiple",
-      "question": "Вопрос с несколькими ответами?",
-      "options": ["A", "B", "C", "D"],
-      "correct": [0, 3],
-      "points": 2
-    }},
-    {{
-      "type": "text",
-      "question": "Открытый вопрос?",
-      "answer": "Правильный ответ",
-      "points": 2
-    }}
-  ]
-}}"""
-                },
-                {
-                    "role": "user",
-                    "content": f"Категория: {category.name}. Текст: {text}"
-                }
-            ]
-        )
-        
-        result = chat_completion.choices[0].message.content
-        
-        # Парсим JSON результат
-        quiz_data = json.loads(result)
-        
-        # Создаем новую викторину в базе данных
-        new_quiz = Quiz(
-            id=str(uuid4()),
-            title=quiz_data["quizTitle"],
-            description=f"Автоматически сгенерированная викторина на основе текста. Категория: {category.name}",
-            category_id=category_id
-        )
-        session.add(new_quiz)
-        session.flush()
-        
-        # Добавляем вопросы и варианты ответов
-        for q_data in quiz_data["questions"]:
-            question_type = None
-            if q_data["type"] == "single":
-                question_type = QuestionType.SINGLE
-            elif q_data["type"] == "multiple":
-                question_type = QuestionType.MULTIPLE
-            elif q_data["type"] == "text":
-                question_type = QuestionType.TEXT_ANSWER
-                
-            question = Question(
-                id=str(uuid4()),
-                question_type=question_type,
-                quiz_id=new_quiz.id,
-                points=q_data.get("points", 1),
-                question=q_data.get("question")
-            )
-            session.add(question)
-            session.flush()
-            
-            # Добавляем варианты ответов для вопросов с вариантами
-            if q_data["type"] in ["single", "multiple"] and "options" in q_data:
-                for i, option_text in enumerate(q_data["options"]):
-                    is_correct = i in q_data["correct"]
-                    option = Options(
-                        id=str(uuid4()),
-                        question_id=question.id,
-                        name=option_text,
-                        is_correct=is_correct
-                    )
-                    session.add(option)
-        
+        stored = store_submissions(session, [submission])
         session.commit()
-        
-        return jsonify({
-            "id": new_quiz.id,
-            "title": new_quiz.title,
-            "description": new_quiz.description,
-            "category_id": new_quiz.category_id,
-            "generated_data": quiz_data
-        })
-    except Exception as e:
+    except IntegrityError:
+        # Одновременный повтор с тем же ключом уже сохранен
         session.rollback()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        session.close()
+        response = already_saved(session, current_user, idempotency_key) if idempotency_key is not None else None
+        if response is None:
+            raise
+        return response
+    if not stored:
+        # Повтор с тем же ключом сохранился между проверкой выше и store_submissions
+        response = already_saved(session, current_user, submission['idempotency_key'])
+        if response is not None:
+            return response
+        raise RuntimeError("Отправка не сохранена")
+    publish_stored(stored)
+    updated_score = session.query(User.score).filter(User.id == current_user.id).scalar()
+    
+    return jsonify({
+        "message": "Ответы успешно сохранены",
+        "test_result_id": submission['test_result_id'],
+        "total_score": submission['score'],
+        "max_score": submission['max_score'],
+        "questions": submission['questions'],
+        "updated_score": updated_score
+    }), 201
 
 @quiz_bp.route('/submit-answers', methods=['POST'])
 @token_required
 def submit_answers(current_user):
     """
-    Сохраняет ответы пользователя и результаты теста в базе данных
+    Сохраняет ответы пользователя и результаты теста в базе данных.
+    Заголовок Idempotency-Key (или поле idempotency_key) защищает от повторного
+    засчитывания при повторе запроса. При SUBMISSION_WRITE_BEHIND ответ 202
+    возвращается после записи в локальный журнал, в базу отправка попадает позже
     """
-    session = SessionLocal()
+    session = get_session()
     try:
         data = request.get_json()
         
@@ -486,119 +607,353 @@ def submit_answers(current_user):
             
         quiz_id = data['quiz_id']
         answers = data['answers']
-        total_score = data.get('total_score', 0)
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if idempotency_key is not None and (not isinstance(idempotency_key, str) or len(idempotency_key) > 100):
+            return jsonify({"error": "Ключ идемпотентности должен быть строкой не длиннее 100 символов"}), 400
         
-        # Проверяем существование викторины
-        quiz = session.query(Quiz).filter(Quiz.id == quiz_id).first()
-        if not quiz:
+        # Проверяем ответы на сервере по скомпилированному ключу викторины,
+        # присланный клиентом total_score не используется
+        answer_key = answer_keys.get(session, quiz_id)
+        if not answer_key:
             return jsonify({"error": "Викторина не найдена"}), 404
-            
-        # Создаем запись о результате теста
-        test_result = TestResult(
-            id=str(uuid4()),
-            user_id=current_user.id,
-            score=total_score,
-            completed_at=datetime.utcnow()
-        )
-        session.add(test_result)
+        error = validate_answers(answer_key, answers)
+        if error:
+            return jsonify({"error": error}), 400
+        result = grader.grade(answer_key, answers)
+        submission = build_submission(current_user.id, quiz_id, answer_key, result, answers, idempotency_key)
         
-        # Сохраняем ответы пользователя
-        for answer in answers:
-            question_id = answer.get('question_id')
-            option_ids = answer.get('option_ids', [])
-            text_answer = answer.get('text_answer')
-            
-            # Если это вопрос с текстовым ответом
-            if text_answer is not None:
-                user_answer = UserAnswer(
-                    id=str(uuid4()),
-                    user_id=current_user.id,
-                    question_id=question_id,
-                    text_answer=text_answer,
-                    option_id=None
-                )
-                session.add(user_answer)
-            
-            # Если это вопрос с выбором вариантов
-            for option_id in option_ids:
-                user_answer = UserAnswer(
-                    id=str(uuid4()),
-                    user_id=current_user.id,
-                    question_id=question_id,
-                    text_answer=None,
-                    option_id=option_id
-                )
-                session.add(user_answer)
-        
-        # Обновляем счет пользователя
-        current_user.score += total_score
-        
-        session.commit()
-        
-        return jsonify({
-            "message": "Ответы успешно сохранены",
-            "test_result_id": test_result.id,
-            "updated_score": current_user.score
-        }), 201
+        return save_submission(session, current_user, submission, idempotency_key)
     except Exception as e:
         session.rollback()
         return jsonify({"error": str(e)}), 500
-    finally:
-        session.close()
+
+@quiz_bp.route('/submissions/<test_result_id>', methods=['GET'])
+@token_required
+def get_submission_status(current_user, test_result_id: str):
+    """
+    Статус отправки ответов: queued - в журнале, stored - в базе, failed - не удалось сохранить
+    """
+    session = get_session()
+    test_result = session.query(TestResult).filter_by(id=test_result_id, user_id=current_user.id).first()
+    if test_result:
+        return jsonify({"test_result_id": test_result.id, "status": "stored", "total_score": test_result.score})
+    if Config.SUBMISSION_WRITE_BEHIND:
+        entry = get_submission_writer().journal.get(test_result_id)
+        if entry and entry['user_id'] == current_user.id:
+            return jsonify({"test_result_id": test_result_id, "status": entry['status'], "error": entry['error']})
+    return jsonify({"error": "Отправка не найдена"}), 404
+
+def attempt_of(current_user, attempt_id: str):
+    attempt = get_attempt_store().get(attempt_id)
+    if attempt is None or attempt['user_id'] != current_user.id:
+        return None
+    return attempt
+
+def serialize_attempt(attempt: dict, answered: int) -> dict:
+    return {
+        "attempt_id": attempt['id'],
+        "quiz_id": attempt['quiz_id'],
+        "questions_count": len(attempt['question_ids']),
+        "answered": answered,
+        "finished": attempt['test_result_id'] is not None,
+        "test_result_id": attempt['test_result_id'],
+        "expires_at": datetime.utcfromtimestamp(attempt['expires_at']).isoformat() + 'Z'
+    }
+
+@quiz_bp.route('/quizes/<quiz_id>/attempts', methods=['POST'])
+@token_required
+def start_attempt(current_user, quiz_id: str):
+    """
+    Начало прохождения викторины по шагам. Вопросы запрашиваются страницами
+    через GET /attempts/<attempt_id>/questions, без правильных ответов
+    """
+    quiz = public_quizzes.get(get_session(), quiz_id)
+    if quiz is None:
+        return jsonify({"error": "Викторина не найдена"}), 404
+    attempt = get_attempt_store().create(current_user.id, quiz_id, quiz.order)
+    return jsonify(dict(
+        serialize_attempt(attempt, 0),
+        title=quiz.title,
+        description=quiz.description,
+        page_size=Config.ATTEMPT_PAGE_SIZE
+    )), 201
+
+@quiz_bp.route('/attempts/<attempt_id>', methods=['GET'])
+@token_required
+def get_attempt(current_user, attempt_id: str):
+    """
+    Состояние попытки: сколько вопросов отвечено, завершена ли она
+    """
+    attempt = attempt_of(current_user, attempt_id)
+    if attempt is None:
+        return jsonify({"error": "Попытка не найдена или истекла"}), 404
+    return jsonify(serialize_attempt(attempt, get_attempt_store().answered(attempt_id)))
+
+@quiz_bp.route('/attempts/<attempt_id>/questions', methods=['GET'])
+@token_required
+def get_attempt_questions(current_user, attempt_id: str):
+    """
+    Страница вопросов попытки (offset, limit) без is_correct, вместе с уже сохраненными ответами
+    """
+    attempt = attempt_of(current_user, attempt_id)
+    if attempt is None:
+        return jsonify({"error": "Попытка не найдена или истекла"}), 404
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', Config.ATTEMPT_PAGE_SIZE)), 1), Config.ATTEMPT_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "offset и limit должны быть числами"}), 400
+    quiz = public_quizzes.get(get_session(), attempt['quiz_id'])
+    if quiz is None:
+        return jsonify({"error": "Викторина не найдена"}), 404
+
+    # Порядок вопросов зафиксирован при начале попытки; удаленные после этого вопросы пропускаются
+    question_ids = [question_id for question_id in attempt['question_ids'][offset:offset + limit]
+                    if question_id in quiz.questions]
+    answers = get_attempt_store().answers(attempt_id, question_ids)
+    return jsonify({
+        "attempt_id": attempt_id,
+        "offset": offset,
+        "limit": limit,
+        "total": len(attempt['question_ids']),
+        "next_offset": offset + limit if offset + limit < len(attempt['question_ids']) else None,
+        "questions": [dict(quiz.questions[question_id], answer=answers.get(question_id)) for question_id in question_ids]
+    })
+
+@quiz_bp.route('/attempts/<attempt_id>/answers', methods=['PUT'])
+@token_required
+def save_attempt_answers(current_user, attempt_id: str):
+    """
+    Сохранение ответов попытки по мере прохождения. Повторный ответ на вопрос заменяет предыдущий
+    """
+    attempt = attempt_of(current_user, attempt_id)
+    if attempt is None:
+        return jsonify({"error": "Попытка не найдена или истекла"}), 404
+    if attempt['test_result_id'] is not None:
+        return jsonify({"error": "Попытка уже завершена", "test_result_id": attempt['test_result_id']}), 409
+
+    data = request.get_json(silent=True) or {}
+    answers = data.get('answers')
+    if not isinstance(answers, list) or not answers:
+        return jsonify({"error": "Необходимо предоставить ответы"}), 400
+    answer_key = answer_keys.get(get_session(), attempt['quiz_id'])
+    if answer_key is None:
+        return jsonify({"error": "Викторина не найдена"}), 404
+    error = validate_answers(answer_key, answers)
+    if error:
+        return jsonify({"error": error}), 400
+    # Вопросы, удаленные из викторины после начала попытки, тоже не принимаются
+    question_ids = set(attempt['question_ids'])
+    for answer in answers:
+        if answer['question_id'] not in question_ids or answer['question_id'] not in answer_key.questions:
+            return jsonify({"error": "Вопрос не относится к этой попытке"}), 400
+
+    store = get_attempt_store()
+    expires_at = store.save_answers(attempt_id, answers)
+    return jsonify({
+        "attempt_id": attempt_id,
+        "saved": len(answers),
+        "answered": store.answered(attempt_id),
+        "expires_at": datetime.utcfromtimestamp(expires_at).isoformat() + 'Z'
+    })
+
+@quiz_bp.route('/attempts/<attempt_id>/finish', methods=['POST'])
+@token_required
+def finish_attempt(current_user, attempt_id: str):
+    """
+    Завершение попытки: сохраненные ответы проверяются и записываются одной отправкой.
+    Ключ идемпотентности - ID попытки, поэтому повторное завершение не засчитывается дважды
+    """
+    attempt = attempt_of(current_user, attempt_id)
+    if attempt is None:
+        return jsonify({"error": "Попытка не найдена или истекла"}), 404
+    if attempt['test_result_id'] is not None:
+        # Статус сохранения - GET /submissions/<test_result_id>
+        return jsonify({"message": "Попытка уже завершена", "test_result_id": attempt['test_result_id']}), 200
+
+    session = get_session()
+    idempotency_key = f"attempt:{attempt_id}"
+    try:
+        answer_key = answer_keys.get(session, attempt['quiz_id'])
+        if not answer_key:
+            return jsonify({"error": "Викторина не найдена"}), 404
+        answers = list(get_attempt_store().answers(attempt_id).values())
+        result = grader.grade(answer_key, answers)
+        submission = build_submission(current_user.id, attempt['quiz_id'], answer_key, result, answers, idempotency_key)
+        response = save_submission(session, current_user, submission, idempotency_key)
+        get_attempt_store().finish(attempt_id, response[0].get_json()['test_result_id'])
+        return response
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@quiz_bp.route('/quizes/<quiz_id>/analytics', methods=['GET'])
+@token_required
+def get_quiz_analytics(current_user, quiz_id: str):
+    """
+    Анализ заданий викторины: средний балл, доля выбора вариантов, трудность
+    и дискриминация вопросов по ответам попыток из attempt_answer
+    """
+    stats = quiz_analytics.get(get_session(), quiz_id)
+    if stats is None:
+        return jsonify({"error": "Викторина не найдена"}), 404
+    return jsonify(stats)
+
+def leaderboard_response(current_user, scope: str, key: Optional[str] = None):
+    """
+    Страница рейтинга и место текущего пользователя
+    """
+    board = leaderboards.board(scope, key)
+    if board is None:
+        return jsonify({"error": "Неизвестный рейтинг"}), 404
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), Config.LEADERBOARD_MAX_LIMIT)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "limit и offset должны быть числами"}), 400
+    
+    entries, total = leaderboards.top(board, limit, offset)
+    me = leaderboards.rank(board, current_user.id)
+    
+    # Имена только для пользователей на странице, одним запросом по первичному ключу
+    session = get_session()
+    users = {
+        user.id: user for user in
+        session.query(User.id, User.login, User.name, User.surname).filter(User.id.in_([user_id for _, user_id, _ in entries]))
+    } if entries else {}
+    return jsonify({
+        "scope": scope,
+        "id": key,
+        "total": total,
+        "entries": [{
+            "rank": rank,
+            "user_id": user_id,
+            "login": users[user_id].login if user_id in users else None,
+            "name": users[user_id].name if user_id in users else None,
+            "surname": users[user_id].surname if user_id in users else None,
+            "score": score
+        } for rank, user_id, score in entries],
+        "me": {"rank": me[0], "score": me[1]} if me else None
+    })
+
+@quiz_bp.route('/leaderboard', methods=['GET'])
+@quiz_bp.route('/leaderboard/<scope>', methods=['GET'])
+@token_required
+def get_leaderboard(current_user, scope: str = 'global'):
+    """
+    Общий рейтинг (global) или рейтинг за последние 7 или 30 дней (7d, 30d)
+    """
+    if scope not in ('global',) + tuple(f'{days}d' for days in leaderboards.WINDOWS):
+        return jsonify({"error": "Неизвестный рейтинг"}), 404
+    return leaderboard_response(current_user, scope)
+
+@quiz_bp.route('/leaderboard/category/<category_id>', methods=['GET'])
+@token_required
+def get_category_leaderboard(current_user, category_id: str):
+    """
+    Рейтинг по сумме баллов за викторины категории
+    """
+    return leaderboard_response(current_user, 'category', category_id)
+
+@quiz_bp.route('/leaderboard/quiz/<quiz_id>', methods=['GET'])
+@token_required
+def get_quiz_leaderboard(current_user, quiz_id: str):
+    """
+    Рейтинг по лучшей попытке прохождения викторины
+    """
+    return leaderboard_response(current_user, 'quiz', quiz_id)
 
 @quiz_bp.route('/user-tests-count', methods=['GET'])
 @token_required
 def get_user_tests_count(current_user):
-    session = SessionLocal()
+    session = get_session()
     try:
-        # Подсчитываем количество тестов, которые прошел пользователь
-        tests_count = session.query(TestResult).filter_by(user_id=current_user.id).count()
-        return jsonify({"tests_count": tests_count}), 200
+        # Количество тестов берется из дневных итогов активности
+        return jsonify({"tests_count": activity_tests_count(session, current_user.id)}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        session.close()
 
 @quiz_bp.route('/user-activity', methods=['GET'])
 @token_required
+@conditional(lambda current_user: (
+    'activity', current_user.id, datetime.utcnow().date(), *activity_version(get_session(), current_user.id)
+))
 def get_user_activity(current_user):
     """
-    Возвращает активность пользователя по дням за последние 90 дней
+    Активность пользователя из дневных итогов. Параметры: days (по умолчанию 90)
+    или start и end (YYYY-MM-DD), bucket - day, week или month.
+    По умолчанию возвращает плотные массивы counts и scores с датой начала,
+    format=list - прежний список {"date", "count"} по дням
     """
-    session = SessionLocal()
+    session = get_session()
+    bucket = request.args.get('bucket', 'day')
+    output = request.args.get('format', 'compact')
+    if bucket not in ACTIVITY_BUCKETS or output not in ('compact', 'list'):
+        return jsonify({"error": "bucket должен быть day, week или month, format - compact или list"}), 400
     try:
-        days = 90
         today = datetime.utcnow().date()
-        start_date = today - timedelta(days=days-1)
-
-        # Получаем количество тестов по дням
-        results = (
-            session.query(
-                func.date(TestResult.completed_at).label('date'),
-                func.count(TestResult.id).label('count')
-            )
-            .filter(
-                TestResult.user_id == current_user.id,
-                TestResult.completed_at >= start_date
-            )
-            .group_by(func.date(TestResult.completed_at))
-            .all()
-        )
-
-        # Преобразуем в словарь для быстрого поиска
-        activity_map = {str(row.date): row.count for row in results}
-
-        # Формируем полный список дней
-        activity = []
-        for i in range(days):
-            day = start_date + timedelta(days=i)
-            day_str = day.isoformat()
-            activity.append({
-                "date": day_str,
-                "count": activity_map.get(day_str, 0)
-            })
-
+        end = date.fromisoformat(request.args['end']) if 'end' in request.args else today
+        if 'start' in request.args:
+            start_date = date.fromisoformat(request.args['start'])
+        else:
+            start_date = end - timedelta(days=int(request.args.get('days', 90)) - 1)
+    except ValueError:
+        return jsonify({"error": "Некорректный период"}), 400
+    if start_date > end or (end - start_date).days >= Config.ACTIVITY_MAX_DAYS:
+        return jsonify({"error": f"Период должен быть от 1 до {Config.ACTIVITY_MAX_DAYS} дней"}), 400
+    
+    activity = load_activity(session, current_user.id, start_date, end, bucket)
+    if output == 'compact':
         return jsonify(activity)
-    finally:
-        session.close()
+    
+    day = date.fromisoformat(activity['start'])
+    items = []
+    for count in activity['counts']:
+        items.append({"date": day.isoformat(), "count": count})
+        day = next_bucket(day, bucket)
+    return jsonify(items)
 
+
+@quiz_bp.route('/cache-stats', methods=['GET'])
+@token_required
+def get_cache_stats(current_user):
+    """
+    Счетчики попаданий, промахов и вытеснений кэша викторин и кэша генерации
+    """
+    stats = quiz_cache.stats()
+    stats['generation'] = generation_cache.stats()
+    return jsonify(stats)
+
+@quiz_bp.route('/submission-stats', methods=['GET'])
+@token_required
+def get_submission_stats(current_user):
+    """
+    Очередь отложенной записи ответов: записи журнала по статусам и сохраненные пачки
+    """
+    if not Config.SUBMISSION_WRITE_BEHIND:
+        return jsonify({"write_behind": False})
+    return jsonify({"write_behind": True, **get_submission_writer().stats()})
+
+@quiz_bp.route('/attempt-stats', methods=['GET'])
+@token_required
+def get_attempt_stats(current_user):
+    """
+    Число активных и завершенных (еще не истекших) попыток в локальном хранилище
+    """
+    return jsonify(get_attempt_store().stats())
+
+@quiz_bp.route('/pool-stats', methods=['GET'])
+@token_required
+def get_pool_stats(current_user):
+    """
+    Состояние пула соединений и время ожидания соединения
+    """
+    return jsonify(pool_stats())
+
+@quiz_bp.route('/search-stats', methods=['GET'])
+@token_required
+def get_search_stats(current_user):
+    """
+    Состояние поискового индекса: способ поиска, число документов и терминов
+    """
+    return jsonify(quiz_search.stats())
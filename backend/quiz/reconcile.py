@@ -0,0 +1,227 @@
+"""
+Обновление викторины сверкой с текущим состоянием.
+
+Текущее дерево загружается тремя запросами, разница с присланными данными
+считается в памяти, после чего изменения применяются пакетно в одной
+транзакции: UPDATE через executemany (по одному на набор изменяемых колонок),
+DELETE через IN и вставка тем же insert_quiz_batch, что и при создании.
+Число запросов не зависит от количества вопросов и вариантов ответа
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional
+from sqlalchemy import bindparam, delete, select, update
+from ids import new_id
+from models import Quiz, Question, Options, QuestionType
+from .writer import QuizRows, build_question_rows, insert_quiz_batch
+
+QUIZ_FIELDS = ('title', 'description', 'category_id')
+QUESTION_FIELDS = ('question_type', 'points', 'question')
+OPTION_FIELDS = ('name', 'is_correct')
+
+
+class VersionConflict(Exception):
+    """
+    Викторину изменили после того, как клиент получил ее версию
+    """
+    def __init__(self, current_version: Optional[int]):
+        super().__init__("Викторина была изменена другим запросом")
+        self.current_version = current_version
+
+
+class QuizState:
+    """
+    Текущее состояние викторины: поля викторины, вопросы и варианты ответов по ID
+    """
+    def __init__(self, quiz: dict, questions: Dict[str, dict], options: Dict[str, dict]):
+        self.quiz = quiz
+        self.questions = questions
+        self.options = options
+
+
+class QuizChanges:
+    """
+    Разница между текущим состоянием и присланными данными
+    """
+    def __init__(self):
+        self.quiz = {}
+        self.question_updates = []
+        self.option_updates = []
+        self.question_deletes = []
+        self.option_deletes = []
+        self.inserts = QuizRows(None, [], [])
+
+    def __bool__(self):
+        return bool(self.quiz or self.question_updates or self.option_updates or self.question_deletes
+                    or self.option_deletes or self.inserts.questions or self.inserts.options)
+
+    def counts(self) -> dict:
+        return {
+            'quiz_fields': len(self.quiz),
+            'questions_added': len(self.inserts.questions),
+            'questions_updated': len(self.question_updates),
+            'questions_deleted': len(self.question_deletes),
+            'options_added': len(self.inserts.options),
+            'options_updated': len(self.option_updates),
+            'options_deleted': len(self.option_deletes)
+        }
+
+
+def load_quiz_state(session, quiz_id: str) -> Optional[QuizState]:
+    """
+    Загружает викторину, ее вопросы и варианты ответов тремя запросами без ORM-объектов
+    """
+    quiz = session.execute(
+        select(Quiz.id, Quiz.title, Quiz.description, Quiz.category_id, Quiz.version).where(Quiz.id == quiz_id, Quiz.deleted_at.is_(None))
+    ).mappings().first()
+    if quiz is None:
+        return None
+    questions = {row['id']: dict(row) for row in session.execute(
+        select(Question.id, Question.question_type, Question.points, Question.question, Question.image_url)
+        .where(Question.quiz_id == quiz_id)
+    ).mappings()}
+    options = {row['id']: dict(row) for row in session.execute(
+        select(Options.id, Options.question_id, Options.name, Options.is_correct)
+        .join(Question, Question.id == Options.question_id)
+        .where(Question.quiz_id == quiz_id)
+    ).mappings()}
+    return QuizState(dict(quiz), questions, options)
+
+
+def _changed_fields(current: dict, data: dict, fields) -> dict:
+    return {field: data[field] for field in fields if field in data and data[field] != current[field]}
+
+
+def diff_quiz(state: QuizState, data: dict, question_images: Optional[Dict[int, str]] = None,
+              partial: bool = False) -> QuizChanges:
+    """
+    Сравнивает данные запроса с текущим состоянием.
+    Вопросы и варианты с id обновляются (только измененные поля), без id - добавляются,
+    delete_questions и delete_options удаляют. ID, не принадлежащие этой викторине, пропускаются.
+    В режиме PUT (partial=False) пустые поля викторины, как и раньше, не меняются,
+    в режиме PATCH применяется любое присланное значение.
+    Ошибки в данных - ValueError
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Ожидается объект викторины")
+    question_images = question_images or {}
+    changes = QuizChanges()
+
+    for field in QUIZ_FIELDS:
+        if field in data and (partial or data[field]) and data[field] != state.quiz[field]:
+            changes.quiz[field] = data[field]
+    if 'title' in changes.quiz and (not changes.quiz['title'] or len(changes.quiz['title']) > Quiz.title.type.length):
+        raise ValueError("Некорректное название викторины")
+    if 'category_id' in changes.quiz and not changes.quiz['category_id']:
+        raise ValueError("Не указан ID категории")
+
+    questions = data.get('questions') or []
+    if not isinstance(questions, list):
+        raise ValueError("Поле questions должно быть списком")
+    for i, question_data in enumerate(questions):
+        if not isinstance(question_data, dict):
+            raise ValueError(f"Вопрос {i}: ожидается объект")
+        question_id = question_data.get('id')
+        if (not question_id or 'question_type' in question_data) \
+                and question_data.get('question_type') not in QuestionType.__members__:
+            raise ValueError(f"Вопрос {i}: неизвестный тип вопроса")
+        options = question_data.get('options') or []
+        if not isinstance(options, list) or not all(isinstance(option_data, dict) for option_data in options):
+            raise ValueError(f"Вопрос {i}: поле options должно быть списком объектов")
+        for option_data in options:
+            if not option_data.get('id') and not option_data.get('name'):
+                raise ValueError(f"Вопрос {i}: у варианта ответа не указано название")
+
+        if not question_id:
+            question, question_options = build_question_rows(state.quiz['id'], question_data, image_url=question_images.get(i))
+            changes.inserts.questions.append(question)
+            changes.inserts.options.extend(question_options)
+            continue
+
+        current = state.questions.get(question_id)
+        if current is None:
+            continue
+        update_row = _changed_fields(current, question_data, QUESTION_FIELDS)
+        if i in question_images and question_images[i] != current['image_url']:
+            update_row['image_url'] = question_images[i]
+        if update_row:
+            changes.question_updates.append(dict(update_row, id=question_id))
+
+        for option_data in options:
+            option_id = option_data.get('id')
+            if not option_id:
+                changes.inserts.options.append({
+                    'id': new_id(),
+                    'question_id': question_id,
+                    'name': option_data['name'],
+                    'is_correct': option_data.get('is_correct', False)
+                })
+                continue
+            option = state.options.get(option_id)
+            if option is None or option['question_id'] != question_id:
+                continue
+            update_row = _changed_fields(option, option_data, OPTION_FIELDS)
+            if update_row:
+                changes.option_updates.append(dict(update_row, id=option_id))
+
+        for option_id in question_data.get('delete_options') or []:
+            option = state.options.get(option_id)
+            if option is not None and option['question_id'] == question_id:
+                changes.option_deletes.append(option_id)
+
+    deleted_questions = {question_id for question_id in data.get('delete_questions') or [] if question_id in state.questions}
+    if deleted_questions:
+        changes.question_deletes = sorted(deleted_questions)
+        changes.option_deletes.extend(
+            option_id for option_id, option in state.options.items() if option['question_id'] in deleted_questions
+        )
+        changes.question_updates = [row for row in changes.question_updates if row['id'] not in deleted_questions]
+        changes.inserts.options = [row for row in changes.inserts.options if row['question_id'] not in deleted_questions]
+    if changes.option_deletes:
+        changes.option_deletes = sorted(set(changes.option_deletes))
+        deleted_options = set(changes.option_deletes)
+        changes.option_updates = [row for row in changes.option_updates if row['id'] not in deleted_options]
+    return changes
+
+
+def _update_many(session, table, rows: List[dict]):
+    """
+    UPDATE по первичному ключу через executemany: строки группируются по набору
+    изменяемых колонок, на каждую группу - один запрос
+    """
+    groups = defaultdict(list)
+    for row in rows:
+        values = {key: value for key, value in row.items() if key != 'id'}
+        values['_id'] = row['id']
+        groups[tuple(sorted(row))].append(values)
+    for params in groups.values():
+        session.execute(table.update().where(table.c.id == bindparam('_id')), params)
+
+
+def apply_quiz_changes(session, quiz_id: str, changes: QuizChanges, expected_version: Optional[int] = None) -> int:
+    """
+    Применяет изменения в текущей транзакции и возвращает новую версию викторины.
+    Версия увеличивается тем же UPDATE, что меняет поля викторины; если передана
+    expected_version, а версия в базе другая - VersionConflict
+    """
+    statement = update(Quiz).where(Quiz.id == quiz_id, Quiz.deleted_at.is_(None)).values(version=Quiz.version + 1, **changes.quiz)
+    if expected_version is not None:
+        statement = statement.where(Quiz.version == expected_version)
+    if session.execute(statement.execution_options(synchronize_session=False)).rowcount == 0:
+        raise VersionConflict(session.execute(
+            select(Quiz.version).where(Quiz.id == quiz_id, Quiz.deleted_at.is_(None))
+        ).scalar())
+
+    if changes.question_updates:
+        _update_many(session, Question.__table__, changes.question_updates)
+    if changes.option_updates:
+        _update_many(session, Options.__table__, changes.option_updates)
+    if changes.option_deletes:
+        session.execute(delete(Options).where(Options.id.in_(changes.option_deletes))
+                        .execution_options(synchronize_session=False))
+    if changes.question_deletes:
+        session.execute(delete(Question).where(Question.id.in_(changes.question_deletes))
+                        .execution_options(synchronize_session=False))
+    insert_quiz_batch(session, [changes.inserts])
+    if expected_version is not None:
+        return expected_version + 1
+    return session.execute(select(Quiz.version).where(Quiz.id == quiz_id)).scalar()
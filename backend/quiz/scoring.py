@@ -0,0 +1,202 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, FrozenSet, List, Optional
+from config import Config
+from models import QuestionType
+from .loader import load_quiz_tree, quiz_version
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """
+    Нормализует текстовый ответ: регистр, ё/е, пунктуация и лишние пробелы
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е')
+    text = _PUNCTUATION.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+class QuestionKey:
+    """
+    Ключ ответа на один вопрос. options - ID вариантов, которые можно выбрать
+    (у TEXT_ANSWER их нет: названия вариантов и есть правильные ответы)
+    """
+    __slots__ = ('question_type', 'points', 'correct', 'text_answers', 'options')
+
+    def __init__(self, question_type: QuestionType, points: int, correct: FrozenSet[str], text_answers: tuple,
+                 options: FrozenSet[str] = frozenset()):
+        self.question_type = question_type
+        self.points = points
+        self.correct = correct
+        self.text_answers = text_answers
+        self.options = options
+
+
+class AnswerKey:
+    """
+    Скомпилированный ключ ответов викторины: все, что нужно для проверки
+    без обращений к базе
+    """
+    def __init__(self, quiz_id: str, questions: Dict[str, QuestionKey], category_id: Optional[str] = None):
+        self.quiz_id = quiz_id
+        self.category_id = category_id
+        self.questions = questions
+        self.max_score = sum(key.points for key in questions.values())
+
+
+def compile_answer_key(quiz) -> AnswerKey:
+    """
+    Компилирует загруженное дерево викторины в ключ ответов.
+    Для TEXT_ANSWER правильными ответами считаются названия верных вариантов
+    """
+    questions = {}
+    for question in quiz.questions:
+        correct = frozenset(option.id for option in question.options if option.is_correct)
+        text_answers = ()
+        options = frozenset(option.id for option in question.options)
+        if question.question_type == QuestionType.TEXT_ANSWER:
+            text_answers = tuple({normalize_text(option.name) for option in question.options if option.is_correct})
+            options = frozenset()
+        questions[question.id] = QuestionKey(
+            QuestionType(question.question_type),
+            question.points or 0,
+            correct,
+            text_answers,
+            options
+        )
+    return AnswerKey(quiz.id, questions, quiz.category_id)
+
+
+def validate_answers(key: AnswerKey, answers) -> Optional[str]:
+    """
+    Проверяет формат ответов до проверки и сохранения: список объектов,
+    option_ids - список ID вариантов своего вопроса, text_answer - строка.
+    Возвращает текст ошибки или None. Ответы на вопросы не из этой викторины
+    проверяются только по типам, при проверке они не учитываются
+    """
+    if not isinstance(answers, list):
+        return "answers должен быть списком"
+    for answer in answers:
+        if not isinstance(answer, dict) or not isinstance(answer.get('question_id'), str):
+            return "Ответ должен содержать question_id"
+        option_ids = answer.get('option_ids') or []
+        if not isinstance(option_ids, list) or not all(isinstance(option_id, str) for option_id in option_ids):
+            return "option_ids должен быть списком ID"
+        if answer.get('text_answer') is not None and not isinstance(answer['text_answer'], str):
+            return "text_answer должен быть строкой"
+        question_key = key.questions.get(answer['question_id'])
+        if question_key is not None and not question_key.options.issuperset(option_ids):
+            return "Вариант ответа не относится к вопросу"
+    return None
+
+
+class GradeResult:
+    def __init__(self, total_score: int, max_score: int, questions: List[dict]):
+        self.total_score = total_score
+        self.max_score = max_score
+        self.questions = questions
+
+
+class Grader:
+    """
+    Проверка ответов по ключу за один проход.
+    multiple_mode: exact - баллы только за точное совпадение множества,
+    partial - доля баллов за верные варианты минус неверные.
+    text_mode: normalized - совпадение после нормализации,
+    fuzzy - сходство не ниже fuzzy_threshold
+    """
+    def __init__(self, multiple_mode: str = 'exact', text_mode: str = 'normalized', fuzzy_threshold: float = 0.85):
+        self.multiple_mode = multiple_mode
+        self.text_mode = text_mode
+        self.fuzzy_threshold = fuzzy_threshold
+
+    def grade_question(self, key: QuestionKey, option_ids, text_answer) -> float:
+        if key.question_type == QuestionType.TEXT_ANSWER:
+            return key.points if self.match_text(key, text_answer) else 0
+
+        selected = frozenset(option_ids or ())
+        if not selected:
+            return 0
+        if key.question_type == QuestionType.MULTIPLE and self.multiple_mode == 'partial' and key.correct:
+            hits = len(selected & key.correct)
+            wrong = len(selected - key.correct)
+            return key.points * max(0, hits - wrong) / len(key.correct)
+        return key.points if selected == key.correct else 0
+
+    def match_text(self, key: QuestionKey, text_answer) -> bool:
+        answer = normalize_text(text_answer)
+        if not answer or not key.text_answers:
+            return False
+        if answer in key.text_answers:
+            return True
+        if self.text_mode == 'fuzzy':
+            return any(
+                SequenceMatcher(None, answer, expected).ratio() >= self.fuzzy_threshold
+                for expected in key.text_answers
+            )
+        return False
+
+    def grade(self, key: AnswerKey, answers: List[dict]) -> GradeResult:
+        """
+        Проверяет ответы в формате submit_answers. Повторные ответы на один
+        вопрос и вопросы не из этой викторины не учитываются
+        """
+        total = 0
+        seen = set()
+        questions = []
+        for answer in answers:
+            question_id = answer.get('question_id')
+            question_key = key.questions.get(question_id)
+            if question_key is None or question_id in seen:
+                continue
+            seen.add(question_id)
+            score = self.grade_question(question_key, answer.get('option_ids'), answer.get('text_answer'))
+            total += score
+            questions.append({'question_id': question_id, 'score': score, 'max_score': question_key.points})
+        return GradeResult(int(round(total)), key.max_score, questions)
+
+
+class AnswerKeyCache:
+    """
+    LRU кэш ключей ответов внутри процесса. Ключ кэша включает версию
+    викторины из базы (Quiz.version), которая читается при каждом обращении,
+    поэтому правку сразу видят все воркеры
+    """
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session, quiz_id: str) -> Optional[AnswerKey]:
+        version = quiz_version(session, quiz_id)
+        if version is None:
+            return None
+        cache_key = (quiz_id, version)
+        with self._lock:
+            answer_key = self._keys.get(cache_key)
+            if answer_key is not None:
+                self._keys.move_to_end(cache_key)
+                return answer_key
+
+        quiz = load_quiz_tree(session, quiz_id)
+        if quiz is None:
+            return None
+        answer_key = compile_answer_key(quiz)
+        # Викторину могли изменить после чтения версии: ключ сохраняется под версией загруженного дерева
+        cache_key = (quiz_id, quiz.version)
+        with self._lock:
+            self._keys[cache_key] = answer_key
+            while len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+        return answer_key
+
+
+grader = Grader(Config.SCORING_MULTIPLE_MODE, Config.SCORING_TEXT_MODE, Config.SCORING_FUZZY_THRESHOLD)
+answer_keys = AnswerKeyCache(Config.ANSWER_KEY_CACHE_SIZE)
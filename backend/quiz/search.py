@@ -0,0 +1,563 @@
+import heapq
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from config import Config
+from models import SessionLocal, engine, Quiz, Question, Options, QuizSearchDocument
+from .cache import quiz_cache
+from .jobs import JobQueue
+from .leaderboard import SortedKeyList
+
+_WORD = re.compile(r'[^\W_]+')
+
+# Вес полей: совпадение в названии важнее совпадения в тексте вариантов
+FIELD_WEIGHTS = (('title', 3.0), ('description', 1.5), ('questions', 1.0), ('options', 0.5))
+# Буквы весов tsvector в Postgres для тех же полей
+FIELD_LABELS = (('title', 'A'), ('description', 'B'), ('questions', 'C'), ('options', 'D'))
+PREFIX_WEIGHT = 0.8
+TYPO_WEIGHT = 0.6
+PREFIX_MIN_LENGTH = 2
+TYPO_MIN_LENGTH = 4
+MAX_EXPANSIONS = 32
+BM25_K1 = 1.2
+BM25_B = 0.75
+RESULT_FIELDS = ('id', 'title', 'description', 'category_id', 'image_url')
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Слова текста в нижнем регистре, ё заменяется на е
+    """
+    if not text:
+        return []
+    return [word.replace('ё', 'е') for word in _WORD.findall(text.lower())]
+
+
+def deletes(term: str) -> List[str]:
+    """
+    Термин и все его варианты без одного символа
+    """
+    return [term] + [term[:i] + term[i + 1:] for i in range(len(term))]
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """
+    Расстояние Дамерау-Левенштейна между словами не больше единицы
+    """
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class Vocabulary:
+    """
+    Словарь терминов с числом документов: поиск по префиксу через
+    отсортированный список и кандидаты с одной опечаткой через индекс
+    вариантов без одного символа (symmetric delete)
+    """
+    def __init__(self):
+        self.df = {}
+        self._sorted = SortedKeyList()
+        self._deletes = defaultdict(set)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.df
+
+    def __len__(self):
+        return len(self.df)
+
+    def add(self, term: str):
+        if term not in self.df:
+            self.df[term] = 0
+            self._sorted.add(term)
+            if len(term) >= TYPO_MIN_LENGTH:
+                for key in deletes(term):
+                    self._deletes[key].add(term)
+        self.df[term] += 1
+
+    def remove(self, term: str):
+        count = self.df.get(term)
+        if count is None:
+            return
+        if count > 1:
+            self.df[term] = count - 1
+            return
+        del self.df[term]
+        self._sorted.remove(term)
+        if len(term) >= TYPO_MIN_LENGTH:
+            for key in deletes(term):
+                terms = self._deletes.get(key)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._deletes[key]
+
+    def bulk_load(self, df: Dict[str, int]):
+        self.df = dict(df)
+        self._sorted.bulk_load(sorted(self.df))
+        self._deletes = defaultdict(set)
+        for term in self.df:
+            if len(term) >= TYPO_MIN_LENGTH:
+                for key in deletes(term):
+                    self._deletes[key].add(term)
+
+    def prefixed(self, prefix: str, limit: int = MAX_EXPANSIONS) -> List[str]:
+        """
+        Самые частые термины, начинающиеся с prefix
+        """
+        start = self._sorted.bisect_left(prefix)
+        terms = []
+        for term in self._sorted.slice(start, start + limit * 8):
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return heapq.nlargest(limit, terms, key=self.df.get)
+
+    def similar(self, term: str) -> List[str]:
+        """
+        Термины, отличающиеся от term одной опечаткой
+        """
+        if len(term) < TYPO_MIN_LENGTH:
+            return []
+        candidates = set()
+        for key in deletes(term):
+            candidates.update(self._deletes.get(key, ()))
+        return [candidate for candidate in candidates if candidate != term and within_one_edit(term, candidate)]
+
+    def expand(self, token: str) -> List[Tuple[str, float]]:
+        """
+        Термины, которыми может быть слово запроса, с весом: само слово,
+        продолжения слова и, если самого слова нет, слова с одной опечаткой
+        """
+        expansions = {}
+        if token in self.df:
+            expansions[token] = 1.0
+        if len(token) >= PREFIX_MIN_LENGTH:
+            for term in self.prefixed(token):
+                expansions.setdefault(term, PREFIX_WEIGHT)
+        if token not in self.df:
+            for term in self.similar(token):
+                expansions.setdefault(term, TYPO_WEIGHT)
+        return list(expansions.items())
+
+
+def query_tokens(query: str) -> List[str]:
+    return list(dict.fromkeys(tokenize(query)))
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс викторин в памяти с ранжированием BM25.
+    Частота термина в документе учитывает вес поля (FIELD_WEIGHTS).
+    Документ находится, если в нем есть каждое слово запроса (с учетом
+    префиксов и опечаток); слова, которых нет во всем индексе, пропускаются
+    """
+    def __init__(self):
+        self.vocabulary = Vocabulary()
+        self._postings = {}
+        self._documents = {}
+        self._total_length = 0.0
+        # Знаменатель BM25 для каждого документа, пересчитывается после изменений индекса
+        self._norms = None
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, quiz_id: str) -> bool:
+        return quiz_id in self._documents
+
+    def add(self, document: dict):
+        """
+        Добавляет или заменяет документ викторины (формат load_documents)
+        """
+        quiz_id = document['id']
+        self.remove(quiz_id)
+        frequencies = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(document.get(field)):
+                frequencies[token] += weight
+        length = sum(frequencies.values())
+        for term, frequency in frequencies.items():
+            self._postings.setdefault(term, {})[quiz_id] = frequency
+            self.vocabulary.add(term)
+        self._documents[quiz_id] = {
+            'id': quiz_id,
+            'title': document.get('title'),
+            'description': document.get('description'),
+            'category_id': document.get('category_id'),
+            'image_url': document.get('image_url'),
+            'length': length,
+            'terms': tuple(frequencies)
+        }
+        self._total_length += length
+        self._norms = None
+
+    def remove(self, quiz_id: str):
+        document = self._documents.pop(quiz_id, None)
+        if document is None:
+            return
+        for term in document['terms']:
+            postings = self._postings[term]
+            del postings[quiz_id]
+            if not postings:
+                del self._postings[term]
+            self.vocabulary.remove(term)
+        self._total_length -= document['length']
+        self._norms = None
+
+    def document(self, quiz_id: str) -> Optional[dict]:
+        return self._documents.get(quiz_id)
+
+    def search(self, query: str, category_id: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> Tuple[List[Tuple[str, float]], int]:
+        """
+        Страница результатов (quiz_id, score) по убыванию релевантности и общее число найденных
+        """
+        count = len(self._documents)
+        if not count:
+            return [], 0
+        if self._norms is None:
+            average_length = self._total_length / count or 1.0
+            self._norms = {
+                quiz_id: BM25_K1 * (1 - BM25_B + BM25_B * document['length'] / average_length)
+                for quiz_id, document in self._documents.items()
+            }
+        norms = self._norms
+        documents = self._documents
+        scores = defaultdict(float)
+        matched = None
+        for token in query_tokens(query):
+            expansions = self.vocabulary.expand(token)
+            if not expansions:
+                continue
+            token_scores = {}
+            for term, weight in expansions:
+                postings = self._postings[term]
+                factor = weight * (BM25_K1 + 1) * math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for quiz_id, frequency in postings.items():
+                    if category_id and documents[quiz_id]['category_id'] != category_id:
+                        continue
+                    score = factor * frequency / (frequency + norms[quiz_id])
+                    # Из нескольких вариантов слова учитывается лучший
+                    if score > token_scores.get(quiz_id, 0.0):
+                        token_scores[quiz_id] = score
+            matched = set(token_scores) if matched is None else matched.intersection(token_scores)
+            for quiz_id, score in token_scores.items():
+                scores[quiz_id] += score
+        if not matched:
+            return [], 0
+        top = heapq.nlargest(offset + limit, matched, key=lambda quiz_id: scores[quiz_id])
+        return [(quiz_id, scores[quiz_id]) for quiz_id in top[offset:]], len(matched)
+
+
+def load_documents(session, quiz_ids: Optional[Iterable[str]] = None) -> List[dict]:
+    """
+    Тексты викторин для индекса: название, описание, вопросы и варианты ответов
+    """
+    quizzes = session.query(Quiz.id, Quiz.title, Quiz.description, Quiz.category_id, Quiz.image_url)\
+        .filter(Quiz.deleted_at.is_(None))
+    questions = session.query(Question.quiz_id, Question.question)
+    options = session.query(Question.quiz_id, Options.name).join(Options, Options.question_id == Question.id)
+    if quiz_ids is not None:
+        quiz_ids = list(quiz_ids)
+        quizzes = quizzes.filter(Quiz.id.in_(quiz_ids))
+        questions = questions.filter(Question.quiz_id.in_(quiz_ids))
+        options = options.filter(Question.quiz_id.in_(quiz_ids))
+
+    documents = {}
+    for row in quizzes.yield_per(10000):
+        documents[row.id] = {
+            'id': row.id, 'title': row.title, 'description': row.description,
+            'category_id': row.category_id, 'image_url': row.image_url,
+            'questions': [], 'options': []
+        }
+    for quiz_id, text in questions.yield_per(10000):
+        if quiz_id in documents and text:
+            documents[quiz_id]['questions'].append(text)
+    for quiz_id, name in options.yield_per(10000):
+        if quiz_id in documents and name:
+            documents[quiz_id]['options'].append(name)
+    for document in documents.values():
+        document['questions'] = ' '.join(document['questions'])
+        document['options'] = ' '.join(document['options'])
+    return list(documents.values())
+
+
+def document_vector(quiz):
+    """
+    tsvector викторины: поля с весами A-D, тексты вопросов и вариантов одной строкой
+    """
+    questions = select(func.string_agg(Question.question, ' ')) \
+        .where(Question.quiz_id == quiz.id).scalar_subquery()
+    options = select(func.string_agg(Options.name, ' ')) \
+        .select_from(Options).join(Question, Question.id == Options.question_id) \
+        .where(Question.quiz_id == quiz.id).scalar_subquery()
+    texts = {'title': quiz.title, 'description': quiz.description, 'questions': questions, 'options': options}
+    vector = None
+    for field, label in FIELD_LABELS:
+        part = func.setweight(func.to_tsvector(Config.SEARCH_TEXT_CONFIG, func.coalesce(texts[field], '')), label)
+        vector = part if vector is None else vector.op('||')(part)
+    return vector
+
+
+def refresh_documents(session, quiz_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Пересобирает строки quiz_search (Postgres) для викторин или для всех, если quiz_ids не задан.
+    Удаленные викторины удаляются из поиска. Возвращает число документов
+    """
+    statement = delete(QuizSearchDocument)
+    source = select(Quiz.id, Quiz.category_id, document_vector(Quiz)).where(Quiz.deleted_at.is_(None))
+    if quiz_ids is not None:
+        quiz_ids = list(quiz_ids)
+        statement = statement.where(QuizSearchDocument.quiz_id.in_(quiz_ids))
+        source = source.where(Quiz.id.in_(quiz_ids))
+    session.execute(statement)
+    result = session.execute(
+        pg_insert(QuizSearchDocument).from_select(['quiz_id', 'category_id', 'document'], source)
+    )
+    return result.rowcount
+
+
+def document_terms(session, quiz_ids: Iterable[str]) -> set:
+    """
+    Лексемы документов quiz_search (Postgres) указанных викторин
+    """
+    terms = func.unnest(func.tsvector_to_array(QuizSearchDocument.document))
+    rows = session.execute(select(terms).where(QuizSearchDocument.quiz_id.in_(list(quiz_ids))).distinct())
+    return set(rows.scalars())
+
+
+class QuizSearchService:
+    """
+    Поиск викторин по названию, описанию, вопросам и вариантам ответов.
+
+    В Postgres документы хранятся в quiz_search (tsvector + GIN). Запись викторины
+    только помечает ее, документы обновляет фоновая задача через refresh_delay секунд
+    (или поиск, если он раньше); слова запроса ищутся по префиксу (слово:*),
+    опечатки исправляются по словарю ts_stat, который загружается в память.
+    В остальных базах используется InvertedIndex в памяти процесса: измененные
+    викторины переиндексируются перед следующим поиском, а весь индекс
+    пересобирается из базы раз в refresh_interval секунд, чтобы учесть
+    записи других процессов
+    """
+    def __init__(self, backend: str = 'auto', refresh_interval: float = 300, refresh_delay: float = 1.0):
+        self.backend = backend
+        self.refresh_interval = refresh_interval
+        self.refresh_delay = refresh_delay
+        self.built_at = None
+        self.build_seconds = None
+        self._index = InvertedIndex()
+        self._vocabulary = Vocabulary()
+        self._dirty = set()
+        self._changed_during_build = set()
+        self._refresh_scheduled = False
+        self._refresh_queue = JobQueue(1, 1, 'search-refresh')
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @property
+    def uses_postgres(self) -> bool:
+        if self.backend == 'auto':
+            return engine.dialect.name == 'postgresql'
+        return self.backend == 'postgres'
+
+    def invalidate(self, quiz_id: str):
+        """
+        Вызывается после записи викторины (подписка на quiz_cache). Запрос записи
+        не ждет обновления поиска: викторина помечается, а в Postgres ставится
+        фоновая задача, если она еще не стоит
+        """
+        with self._lock:
+            self._dirty.add(quiz_id)
+            self._changed_during_build.add(quiz_id)
+            schedule = self.uses_postgres and not self._refresh_scheduled
+            if schedule:
+                self._refresh_scheduled = True
+        if schedule and not self._refresh_queue.submit(self.refresh_dirty):
+            with self._lock:
+                self._refresh_scheduled = False
+
+    def refresh_dirty(self):
+        """
+        Фоновая задача: обновляет документы quiz_search помеченных викторин одним запросом.
+        При ошибке викторины остаются помеченными и обновятся перед следующим поиском
+        """
+        if self.refresh_delay:
+            time.sleep(self.refresh_delay)
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._refresh_scheduled = False
+        if not dirty:
+            return
+        session = SessionLocal()
+        try:
+            refresh_documents(session, dirty)
+            session.commit()
+            self._learn_terms(session, dirty)
+        except Exception:
+            session.rollback()
+            with self._lock:
+                self._dirty |= dirty
+        finally:
+            session.close()
+
+    def search(self, session, query: str, category_id: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> Tuple[List[dict], int]:
+        """
+        Страница найденных викторин (поля викторины и score) и общее число найденных
+        """
+        self.ensure_fresh()
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        try:
+            if self.uses_postgres:
+                if dirty:
+                    refresh_documents(session, dirty)
+                    session.commit()
+                    self._learn_terms(session, dirty)
+                return self._search_postgres(session, query, category_id, limit, offset)
+            if dirty:
+                documents = load_documents(session, dirty)
+                with self._lock:
+                    for quiz_id in dirty:
+                        self._index.remove(quiz_id)
+                    for document in documents:
+                        self._index.add(document)
+        except Exception:
+            with self._lock:
+                self._dirty |= dirty
+            raise
+        with self._lock:
+            hits, total = self._index.search(query, category_id, limit, offset)
+            documents = [self._index.document(quiz_id) for quiz_id, _ in hits]
+        return [dict({field: document[field] for field in RESULT_FIELDS}, score=round(score, 4))
+                for document, (_, score) in zip(documents, hits)], total
+
+    def _learn_terms(self, session, quiz_ids):
+        """
+        Добавляет в словарь опечаток слова обновленных документов: иначе слова новых
+        викторин отбрасывались бы из запроса как неизвестные до следующей сборки словаря
+        """
+        terms = document_terms(session, quiz_ids)
+        with self._lock:
+            for term in terms:
+                if term not in self._vocabulary:
+                    self._vocabulary.add(term)
+
+    def _search_postgres(self, session, query: str, category_id: Optional[str], limit: int, offset: int):
+        parts = []
+        with self._lock:
+            vocabulary = self._vocabulary
+            for token in query_tokens(query):
+                alternatives = [f'{token}:*']
+                if len(vocabulary) and token not in vocabulary:
+                    if not vocabulary.expand(token):
+                        continue
+                    alternatives += vocabulary.similar(token)
+                parts.append('(' + ' | '.join(alternatives) + ')')
+        if not parts:
+            return [], 0
+        tsquery = func.to_tsquery(Config.SEARCH_TEXT_CONFIG, ' & '.join(parts))
+        rank = func.ts_rank_cd(QuizSearchDocument.document, tsquery)
+        rows = (
+            session.query(Quiz.id, Quiz.title, Quiz.description, Quiz.category_id, Quiz.image_url,
+                          rank.label('score'), func.count().over().label('total'))
+            .join(QuizSearchDocument, QuizSearchDocument.quiz_id == Quiz.id)
+            .filter(QuizSearchDocument.document.op('@@')(tsquery))
+        )
+        if category_id:
+            rows = rows.filter(QuizSearchDocument.category_id == category_id)
+        rows = rows.order_by(rank.desc(), Quiz.id).offset(offset).limit(limit).all()
+        if not rows:
+            return [], 0
+        return [{
+            'id': row.id,
+            'title': row.title,
+            'description': row.description,
+            'category_id': row.category_id,
+            'image_url': row.image_url,
+            'score': round(float(row.score), 4)
+        } for row in rows], rows[0].total
+
+    def ensure_fresh(self):
+        """
+        Первая сборка выполняется сразу, последующие - в фоне
+        """
+        if self.built_at is None:
+            with self._build_lock:
+                if self.built_at is None:
+                    self.rebuild()
+        elif time.monotonic() - self.built_at > self.refresh_interval and not self._build_lock.locked():
+            threading.Thread(target=self._rebuild_in_background, name='search-rebuild', daemon=True).start()
+
+    def _rebuild_in_background(self):
+        if not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            self.rebuild()
+        except Exception:
+            # Следующая попытка - через refresh_interval
+            self.built_at = time.monotonic()
+        finally:
+            self._build_lock.release()
+
+    def rebuild(self):
+        """
+        Собирает индекс в памяти (или словарь для исправления опечаток в Postgres)
+        и подменяет его целиком
+        """
+        started = time.monotonic()
+        with self._lock:
+            self._changed_during_build = set()
+        session = SessionLocal()
+        try:
+            if self.uses_postgres:
+                stat = func.ts_stat('SELECT document FROM quiz_search').table_valued('word', 'ndoc')
+                vocabulary = Vocabulary()
+                vocabulary.bulk_load(dict(session.execute(select(stat.c.word, stat.c.ndoc)).all()))
+            else:
+                index = InvertedIndex()
+                for document in load_documents(session):
+                    index.add(document)
+        finally:
+            session.close()
+        with self._lock:
+            if self.uses_postgres:
+                self._vocabulary = vocabulary
+            else:
+                self._index = index
+            # Викторины, измененные во время сборки, могли не попасть в новый индекс
+            self._dirty |= self._changed_during_build
+            self._changed_during_build = set()
+        self.built_at = time.monotonic()
+        self.build_seconds = self.built_at - started
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'backend': 'postgres' if self.uses_postgres else 'memory',
+                'documents': len(self._index),
+                'terms': len(self._vocabulary) if self.uses_postgres else len(self._index.vocabulary),
+                'build_seconds': self.build_seconds
+            }
+
+
+quiz_search = QuizSearchService(Config.SEARCH_BACKEND, Config.SEARCH_REFRESH_INTERVAL, Config.SEARCH_REFRESH_DELAY)
+quiz_cache.subscribe(quiz_search.invalidate)
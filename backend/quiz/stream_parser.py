@@ -0,0 +1,217 @@
+import json
+import re
+from typing import Iterable, List, Optional
+
+QUESTION_TYPES = ('single', 'multiple', 'text')
+
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_MISSING_COMMA = re.compile(r'(["}\]\d]|true|false|null)(\s*\n\s*)(")')
+_FENCE = re.compile(r'```[a-zA-Z]*')
+
+
+def escape_inner_quotes(fragment: str) -> str:
+    """
+    Экранирует кавычки внутри строк, которые модель забыла экранировать:
+    кавычка закрывает строку, только если за ней идет , : } ] или конец
+    """
+    result = []
+    in_string = False
+    escape = False
+    length = len(fragment)
+    for i, ch in enumerate(fragment):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                rest = fragment[i + 1:].lstrip()
+                if rest and rest[0] not in ',:}]' and i + 1 < length:
+                    result.append('\\"')
+                    continue
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        result.append(ch)
+    return ''.join(result)
+
+
+def repair_json(fragment: str) -> str:
+    """
+    Исправляет типичные ошибки JSON в ответах LLM: обрамление ```json,
+    лишние запятые перед } и ], пропущенные запятые между полями
+    на разных строках и неэкранированные кавычки в строках
+    """
+    fragment = _FENCE.sub('', fragment).strip()
+    fragment = _MISSING_COMMA.sub(r'\1,\2\3', fragment)
+    fragment = escape_inner_quotes(fragment)
+    return _TRAILING_COMMA.sub(r'\1', fragment)
+
+
+def loads_lenient(fragment: str):
+    """
+    json.loads, а при ошибке - повторная попытка после repair_json.
+    Управляющие символы внутри строк допускаются
+    """
+    try:
+        return json.loads(fragment, strict=False)
+    except ValueError:
+        return json.loads(repair_json(fragment), strict=False)
+
+
+def validate_generated_question(question) -> Optional[str]:
+    """
+    Проверяет вопрос из ответа LLM и возвращает текст ошибки или None
+    """
+    if not isinstance(question, dict):
+        return "ожидается объект"
+    if question.get('type') not in QUESTION_TYPES:
+        return "неизвестный тип вопроса"
+    if not isinstance(question.get('question'), str) or not question['question'].strip():
+        return "нет текста вопроса"
+    if question['type'] == 'text':
+        return None
+    options = question.get('options')
+    correct = question.get('correct')
+    if not isinstance(options, list) or len(options) < 2 or not all(isinstance(option, str) for option in options):
+        return "нужно не меньше двух вариантов ответа"
+    if not isinstance(correct, list) or not correct:
+        return "не указаны правильные ответы"
+    if not all(isinstance(i, int) and 0 <= i < len(options) for i in correct):
+        return "номер правильного ответа вне списка вариантов"
+    if question['type'] == 'single' and len(correct) != 1:
+        return "у вопроса с одним ответом должен быть ровно один правильный"
+    return None
+
+
+class QuizStreamParser:
+    """
+    Инкрементальный разбор ответа LLM в формате quizTitle/questions.
+    feed() принимает очередной кусок текста и возвращает вопросы, объект
+    которых уже закрылся. Текст до первой { (пояснения, ```json) пропускается,
+    испорченные вопросы отбрасываются, не ломая разбор остальных.
+    Незакрытый вопрос в конце обрезанного ответа отбрасывается, все
+    предыдущие сохраняются
+    """
+    def __init__(self):
+        self.title = None
+        self.accepted = 0
+        self.rejected = []
+        self.truncated = False
+        self._depth = 0
+        self._started = False
+        self._finished = False
+        self._in_string = False
+        self._escape = False
+        # Ключи и значения верхнего уровня собираются, чтобы найти quizTitle и questions
+        self._token = None
+        self._key = None
+        self._after_colon = False
+        self._questions_depth = None
+        self._item = None
+
+    def feed(self, chunk: str) -> List[dict]:
+        questions = []
+        for ch in chunk:
+            question = self._feed_char(ch)
+            if question is not None:
+                questions.append(question)
+        return questions
+
+    def _feed_char(self, ch: str) -> Optional[dict]:
+        if self._finished:
+            return None
+        if not self._started:
+            if ch == '{':
+                self._started = True
+                self._depth = 1
+            return None
+
+        if self._item is not None:
+            self._item.append(ch)
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == '\\':
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._token is not None:
+                    self._end_token(''.join(self._token))
+                    self._token = None
+                return None
+            if self._token is not None:
+                self._token.append(ch)
+            return None
+
+        if ch == '"':
+            self._in_string = True
+            if self._depth == 1:
+                self._token = []
+        elif self._depth == 1 and ch == ':':
+            self._after_colon = True
+        elif self._depth == 1 and ch == ',':
+            self._key = None
+            self._after_colon = False
+        elif ch in '{[':
+            if self._depth == 1 and ch == '[' and self._after_colon and self._key == 'questions':
+                self._questions_depth = 2
+            elif self._depth == self._questions_depth and ch == '{':
+                self._item = ['{']
+            self._depth += 1
+        elif ch in '}]':
+            self._depth -= 1
+            if self._depth == 0:
+                self._finished = True
+            elif self._questions_depth is not None and self._depth < self._questions_depth:
+                self._questions_depth = None
+            elif self._item is not None and self._depth == self._questions_depth:
+                fragment = ''.join(self._item)
+                self._item = None
+                return self._accept(fragment)
+        return None
+
+    def _end_token(self, value: str):
+        if self._after_colon:
+            if self._key == 'quizTitle':
+                try:
+                    self.title = json.loads(f'"{value}"', strict=False)
+                except ValueError:
+                    self.title = value
+            self._key = None
+            self._after_colon = False
+        else:
+            self._key = value
+
+    def _accept(self, fragment: str) -> Optional[dict]:
+        try:
+            question = loads_lenient(fragment)
+        except ValueError as e:
+            self.rejected.append(f"некорректный JSON: {e}")
+            return None
+        error = validate_generated_question(question)
+        if error:
+            self.rejected.append(error)
+            return None
+        self.accepted += 1
+        return question
+
+    def close(self):
+        """
+        Завершает разбор: отмечает, был ли ответ обрезан
+        """
+        self.truncated = not self._finished
+        self._item = None
+
+
+def parse_quiz_stream(pieces: Iterable[str]):
+    """
+    Разбирает поток кусков ответа LLM и возвращает (parser, questions)
+    """
+    parser = QuizStreamParser()
+    questions = []
+    for piece in pieces:
+        questions.extend(parser.feed(piece))
+    parser.close()
+    return parser, questions
@@ -0,0 +1,368 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import uuid4
+from config import Config
+from ids import new_id
+from models import SessionLocal, TestResult, AttemptAnswer
+from .ledger import apply_score_deltas
+from .activity import activity_deltas, upsert_activity
+from .leaderboard import leaderboards
+from .analytics import quiz_analytics
+
+PENDING = 0
+STORED = 1
+FAILED = 2
+
+STATUS_NAMES = {PENDING: 'queued', STORED: 'stored', FAILED: 'failed'}
+
+
+def build_submission(user_id: str, quiz_id: str, answer_key, result, answers: List[dict],
+                     idempotency_key: Optional[str] = None) -> dict:
+    """
+    Запись об отправке ответов: все, что нужно для сохранения в базе.
+    Ответы на вопросы не из этой викторины и повторные ответы на вопрос
+    отбрасываются, как и при проверке, а из option_ids - все, что не является
+    вариантом этого вопроса в ключе ответов (формат проверяет scoring.validate_answers)
+    """
+    unique = {}
+    for answer in answers:
+        question_id = answer.get('question_id')
+        if isinstance(question_id, str) and question_id in answer_key.questions and question_id not in unique:
+            unique[question_id] = answer
+    return {
+        'idempotency_key': idempotency_key or str(uuid4()),
+        'test_result_id': new_id(),
+        'user_id': user_id,
+        'quiz_id': quiz_id,
+        'category_id': answer_key.category_id,
+        'score': result.total_score,
+        'max_score': result.max_score,
+        'questions': result.questions,
+        'completed_at': datetime.utcnow().isoformat(),
+        'answers': [{
+            'question_id': question_id,
+            'option_ids': known_options(answer_key.questions[question_id], answer.get('option_ids')),
+            'text_answer': answer.get('text_answer')
+        } for question_id, answer in unique.items()]
+    }
+
+
+def known_options(question_key, option_ids) -> List[str]:
+    """
+    Выбранные варианты вопроса без посторонних значений и повторов, в порядке ответа
+    """
+    if not isinstance(option_ids, list):
+        return []
+    selected = []
+    for option_id in option_ids:
+        if isinstance(option_id, str) and option_id in question_key.options and option_id not in selected:
+            selected.append(option_id)
+    return selected
+
+
+def store_submissions(session, submissions: List[dict]) -> List[dict]:
+    """
+    Сохраняет отправки в текущей транзакции многострочными INSERT (ответы -
+    по строке attempt_answer на вопрос), одним атомарным UPDATE счета
+    на пользователя (см. ledger.py) и добавляет их в дневные итоги активности.
+    Отправки, чей ключ идемпотентности уже есть в базе, пропускаются. Возвращает сохраненные отправки
+    """
+    keys = {submission['idempotency_key'] for submission in submissions}
+    existing = set(
+        session.query(TestResult.user_id, TestResult.idempotency_key)
+        .filter(TestResult.idempotency_key.in_(keys))
+        .all()
+    )
+    fresh = []
+    for submission in submissions:
+        pair = (submission['user_id'], submission['idempotency_key'])
+        if pair not in existing:
+            existing.add(pair)
+            fresh.append(submission)
+    if not fresh:
+        return []
+
+    results = []
+    answers = []
+    deltas = defaultdict(int)
+    for submission in fresh:
+        results.append({
+            'id': submission['test_result_id'],
+            'user_id': submission['user_id'],
+            'quiz_id': submission['quiz_id'],
+            'score': submission['score'],
+            'completed_at': datetime.fromisoformat(submission['completed_at']),
+            'idempotency_key': submission['idempotency_key']
+        })
+        deltas[submission['user_id']] += submission['score']
+        for answer in submission['answers']:
+            # Одна строка на вопрос: выбранные варианты списком и текстовый ответ
+            answers.append({
+                'test_result_id': submission['test_result_id'],
+                'question_id': answer['question_id'],
+                'option_ids': answer['option_ids'] or None,
+                'text_answer': answer['text_answer']
+            })
+
+    session.execute(TestResult.__table__.insert(), results)
+    if answers:
+        session.execute(AttemptAnswer.__table__.insert(), answers)
+    apply_score_deltas(session, deltas)
+    upsert_activity(session, activity_deltas(fresh))
+    return fresh
+
+
+def publish_stored(submissions: List[dict]):
+    """
+    Передает сохраненные (после commit) отправки в рейтинги и аналитику в памяти
+    """
+    if submissions:
+        leaderboards.record(submissions)
+        quiz_analytics.record(submissions)
+
+
+class SubmissionJournal:
+    """
+    Журнал отправок в локальном файле SQLite (WAL, synchronous=FULL):
+    запись в него переживает перезапуск процесса. Ключ записи - пользователь
+    и ключ идемпотентности, повторная запись возвращает уже сохраненную.
+    Воркеры забирают записи с арендой, поэтому файл может быть общим
+    для нескольких процессов
+    """
+    def __init__(self, path: str, retention: int = 24 * 3600):
+        self.path = path
+        self.retention = retention
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        # Записи внутри процесса выполняются по очереди: ожидание блокировки SQLite
+        # (busy timeout) растет ступенями и дает длинный хвост задержек
+        self._write_lock = threading.Lock()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS submission ('
+                'key TEXT PRIMARY KEY, test_result_id TEXT NOT NULL UNIQUE, user_id TEXT NOT NULL, '
+                'payload TEXT NOT NULL, status INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, '
+                'claimed_until REAL NOT NULL DEFAULT 0, error TEXT, created_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_submission_status_created_at ON submission (status, created_at)')
+
+    def _connection(self):
+        # Соединение на поток; после fork соединение родителя не используется
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=FULL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _key(submission: dict) -> str:
+        return f"{submission['user_id']}:{submission['idempotency_key']}"
+
+    def append(self, submission: dict) -> Tuple[dict, bool]:
+        """
+        Записывает отправку. Если отправка с тем же ключом уже есть,
+        возвращает ее и False
+        """
+        connection = self._connection()
+        with self._write_lock, connection:
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO submission (key, test_result_id, user_id, payload, created_at) VALUES (?, ?, ?, ?, ?)',
+                (self._key(submission), submission['test_result_id'], submission['user_id'],
+                 json.dumps(submission, ensure_ascii=False), time.time())
+            )
+            if cursor.rowcount:
+                return submission, True
+            row = connection.execute('SELECT payload FROM submission WHERE key = ?', (self._key(submission),)).fetchone()
+        return json.loads(row[0]), False
+
+    def claim(self, limit: int, lease: float) -> List[dict]:
+        """
+        Забирает до limit ожидающих записей на время lease секунд
+        """
+        now = time.time()
+        connection = self._connection()
+        with self._write_lock, connection:
+            # Блокировка на запись сразу, чтобы два процесса не забрали одни и те же записи
+            connection.execute('BEGIN IMMEDIATE')
+            rows = connection.execute(
+                'SELECT key, payload FROM submission WHERE status = ? AND claimed_until < ? ORDER BY created_at LIMIT ?',
+                (PENDING, now, limit)
+            ).fetchall()
+            connection.executemany(
+                'UPDATE submission SET claimed_until = ?, attempts = attempts + 1 WHERE key = ?',
+                [(now + lease, key) for key, _ in rows]
+            )
+        return [json.loads(payload) for _, payload in rows]
+
+    def mark(self, submissions: List[dict], status: int, error: Optional[str] = None):
+        connection = self._connection()
+        with self._write_lock, connection:
+            connection.executemany(
+                'UPDATE submission SET status = ?, error = ?, claimed_until = 0 WHERE key = ?',
+                [(status, error, self._key(submission)) for submission in submissions]
+            )
+
+    def release(self, submissions: List[dict], error: str, max_attempts: int):
+        """
+        Возвращает записи в очередь после ошибки; после max_attempts попыток запись помечается как FAILED
+        """
+        connection = self._connection()
+        with self._write_lock, connection:
+            connection.executemany(
+                'UPDATE submission SET claimed_until = 0, error = ?, '
+                'status = CASE WHEN attempts >= ? THEN ? ELSE status END WHERE key = ?',
+                [(error, max_attempts, FAILED, self._key(submission)) for submission in submissions]
+            )
+
+    def get(self, test_result_id: str) -> Optional[dict]:
+        row = self._connection().execute(
+            'SELECT user_id, status, error FROM submission WHERE test_result_id = ?', (test_result_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'user_id': row[0], 'status': STATUS_NAMES[row[1]], 'error': row[2]}
+
+    def purge(self) -> int:
+        """
+        Удаляет сохраненные в базе записи старше retention секунд
+        """
+        connection = self._connection()
+        with self._write_lock, connection:
+            cursor = connection.execute(
+                'DELETE FROM submission WHERE status = ? AND created_at < ?', (STORED, time.time() - self.retention)
+            )
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        rows = self._connection().execute('SELECT status, COUNT(*) FROM submission GROUP BY status').fetchall()
+        counts = {name: 0 for name in STATUS_NAMES.values()}
+        counts.update({STATUS_NAMES[status]: count for status, count in rows})
+        return counts
+
+
+class SubmissionWriter:
+    """
+    Фоновый поток, переносящий отправки из журнала в базу пачками по batch_size.
+    Если пачка не сохраняется целиком, отправки сохраняются по одной, чтобы одна
+    испорченная запись не блокировала остальные
+    """
+    def __init__(self, journal: SubmissionJournal, batch_size: int = 500, interval: float = 0.05,
+                 lease: float = 30, max_attempts: int = 5):
+        self.journal = journal
+        self.batch_size = batch_size
+        self.interval = interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.stored = 0
+        self.batches = 0
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        # Потоки не переживают fork, поэтому в воркере gunicorn поток запускается заново
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='submission-writer', daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        last_purge = time.monotonic()
+        while True:
+            # Записи других процессов и возвращенные после ошибки подбираются раз в секунду
+            if self._wake.wait(timeout=1):
+                # Небольшая пауза, чтобы собрать в пачку одновременные отправки
+                time.sleep(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if time.monotonic() - last_purge > 60:
+                    self.journal.purge()
+                    last_purge = time.monotonic()
+            except Exception:
+                time.sleep(1)
+
+    def flush(self) -> int:
+        """
+        Сохраняет в базе все ожидающие записи и возвращает их количество
+        """
+        total = 0
+        while True:
+            submissions = self.journal.claim(self.batch_size, self.lease)
+            if not submissions:
+                return total
+            total += self._store_batch(submissions)
+
+    def _store_batch(self, submissions: List[dict]) -> int:
+        session = SessionLocal()
+        try:
+            try:
+                stored = store_submissions(session, submissions)
+                session.commit()
+                publish_stored(stored)
+                self.journal.mark(submissions, STORED)
+                self.batches += 1
+                self.stored += len(submissions)
+                return len(submissions)
+            except Exception:
+                session.rollback()
+
+            stored = 0
+            for submission in submissions:
+                try:
+                    fresh = store_submissions(session, [submission])
+                    session.commit()
+                    publish_stored(fresh)
+                    self.journal.mark([submission], STORED)
+                    stored += 1
+                except Exception as e:
+                    session.rollback()
+                    self.journal.release([submission], str(e), self.max_attempts)
+            self.stored += stored
+            return stored
+        finally:
+            session.close()
+
+    def stats(self) -> dict:
+        return {'batches': self.batches, 'stored': self.stored, **self.journal.stats()}
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_submission_writer() -> SubmissionWriter:
+    """
+    Журнал и фоновый писатель создаются при первой отложенной отправке
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            journal = SubmissionJournal(Config.SUBMISSION_JOURNAL_PATH, Config.SUBMISSION_RETENTION)
+            _writer = SubmissionWriter(
+                journal,
+                Config.SUBMISSION_BATCH_SIZE,
+                Config.SUBMISSION_FLUSH_INTERVAL,
+                Config.SUBMISSION_LEASE,
+                Config.SUBMISSION_MAX_ATTEMPTS
+            )
+    _writer.start()
+    return _writer
@@ -0,0 +1,96 @@
+import json
+from typing import Iterable, Iterator, List
+from sqlalchemy.orm import selectinload
+from models import Quiz, Question, Category
+from .loader import serialize_quiz
+from .writer import build_quiz_rows, insert_quiz_batch, validate_quiz_payload
+
+
+def iter_ndjson(lines: Iterable[bytes]) -> Iterator[tuple]:
+    """
+    Читает NDJSON построчно и возвращает (номер строки, объект, ошибка).
+    Пустые строки пропускаются
+    """
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line), None
+        except ValueError as e:
+            yield line_no, None, f"Некорректный JSON: {e}"
+
+
+def import_quizzes(session, lines: Iterable[bytes], batch_size: int = 100) -> List[dict]:
+    """
+    Импортирует викторины из NDJSON пачками по batch_size.
+    Каждая пачка вставляется пакетными INSERT и фиксируется отдельной транзакцией.
+    Если пачка не записалась целиком, ее викторины записываются по одной,
+    чтобы ошибка одной строки не отменяла остальные
+    """
+    results = []
+    batch = []
+    known_categories = set()
+
+    def flush():
+        if not batch:
+            return
+        # Проверяем существование категорий одним запросом на пачку
+        category_ids = {rows.quiz['category_id'] for _, rows in batch} - known_categories
+        if category_ids:
+            found = session.query(Category.id).filter(Category.id.in_(category_ids)).all()
+            known_categories.update(category_id for category_id, in found)
+
+        valid = []
+        for line_no, rows in batch:
+            if rows.quiz['category_id'] in known_categories:
+                valid.append((line_no, rows))
+            else:
+                results.append({"line": line_no, "status": "error", "error": "Указанная категория не существует"})
+
+        try:
+            insert_quiz_batch(session, [rows for _, rows in valid])
+            session.commit()
+            results.extend({"line": line_no, "status": "created", "id": rows.quiz['id']} for line_no, rows in valid)
+        except Exception:
+            session.rollback()
+            for line_no, rows in valid:
+                try:
+                    insert_quiz_batch(session, [rows])
+                    session.commit()
+                    results.append({"line": line_no, "status": "created", "id": rows.quiz['id']})
+                except Exception as e:
+                    session.rollback()
+                    results.append({"line": line_no, "status": "error", "error": str(e)})
+        batch.clear()
+
+    for line_no, data, error in iter_ndjson(lines):
+        if error is None:
+            error = validate_quiz_payload(data)
+        if error:
+            results.append({"line": line_no, "status": "error", "error": error})
+            continue
+        batch.append((line_no, build_quiz_rows(data)))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    results.sort(key=lambda result: result["line"])
+    return results
+
+
+def export_quizzes(session, batch_size: int = 100) -> Iterator[bytes]:
+    """
+    Выгружает все викторины с вопросами и вариантами ответов в NDJSON.
+    Викторины читаются серверным курсором пачками по batch_size, вопросы и
+    варианты подгружаются selectin-запросами на пачку, поэтому память не
+    зависит от размера таблицы
+    """
+    query = session.query(Quiz)\
+        .options(selectinload(Quiz.questions).selectinload(Question.options))\
+        .filter(Quiz.deleted_at.is_(None))\
+        .order_by(Quiz.id)\
+        .execution_options(stream_results=True)\
+        .yield_per(batch_size)
+    for quiz in query:
+        yield json.dumps(serialize_quiz(quiz), ensure_ascii=False).encode('utf-8') + b'\n'
@@ -0,0 +1,118 @@
+from typing import Dict, List, Optional
+from ids import new_id
+from models import Quiz, Question, Options, QuestionType
+
+
+class QuizRows:
+    """
+    Строки викторины, вопросов и вариантов ответов, подготовленные для вставки
+    """
+    def __init__(self, quiz: dict, questions: List[dict], options: List[dict]):
+        self.quiz = quiz
+        self.questions = questions
+        self.options = options
+
+
+def build_quiz_rows(data: dict, question_images: Optional[Dict[int, str]] = None, default_points: int = 100) -> QuizRows:
+    """
+    Строит в памяти все строки викторины по данным в формате add_quiz.
+    ID генерируются на клиенте, поэтому flush для их получения не нужен
+    """
+    question_images = question_images or {}
+    quiz = {
+        'id': new_id(),
+        'title': data.get('title'),
+        'description': data.get('description'),
+        'category_id': data.get('category_id')
+    }
+    questions = []
+    options = []
+    for i, question_data in enumerate(data.get('questions', [])):
+        question, question_options = build_question_rows(quiz['id'], question_data, default_points, question_images.get(i))
+        questions.append(question)
+        options.extend(question_options)
+    return QuizRows(quiz, questions, options)
+
+
+def build_question_rows(quiz_id: str, question_data: dict, default_points: int = 100, image_url: Optional[str] = None):
+    """
+    Строки одного вопроса и его вариантов ответа для существующей викторины
+    """
+    question = {
+        'id': new_id(),
+        'question_type': question_data["question_type"],
+        'quiz_id': quiz_id,
+        'points': question_data.get("points", default_points),
+        'question': question_data.get("question"),
+        'image_url': image_url
+    }
+    options = [{
+        'id': new_id(),
+        'question_id': question['id'],
+        'name': option_data["name"],
+        'is_correct': option_data.get("is_correct", False)
+    } for option_data in question_data.get("options", [])]
+    return question, options
+
+
+def validate_quiz_payload(data) -> Optional[str]:
+    """
+    Проверяет данные викторины в формате add_quiz и возвращает текст ошибки или None
+    """
+    if not isinstance(data, dict):
+        return "Ожидается объект викторины"
+    title = data.get('title')
+    if not title:
+        return "Не указано название викторины"
+    if not isinstance(title, str):
+        return "Название викторины должно быть строкой"
+    if len(title) > Quiz.title.type.length:
+        return "Слишком длинное название викторины"
+    if data.get('description') is not None and not isinstance(data['description'], str):
+        return "Описание викторины должно быть строкой"
+    if not data.get('category_id'):
+        return "Не указан ID категории"
+    questions = data.get('questions', [])
+    if not isinstance(questions, list):
+        return "Поле questions должно быть списком"
+    for i, question_data in enumerate(questions):
+        if not isinstance(question_data, dict):
+            return f"Вопрос {i}: ожидается объект"
+        if question_data.get("question_type") not in QuestionType.__members__:
+            return f"Вопрос {i}: неизвестный тип вопроса"
+        if question_data.get("question") is not None and not isinstance(question_data["question"], str):
+            return f"Вопрос {i}: текст вопроса должен быть строкой"
+        options = question_data.get("options", [])
+        if not isinstance(options, list):
+            return f"Вопрос {i}: поле options должно быть списком"
+        for option_data in options:
+            if not isinstance(option_data, dict) or not option_data.get("name"):
+                return f"Вопрос {i}: у варианта ответа не указано название"
+            if not isinstance(option_data["name"], str):
+                return f"Вопрос {i}: название варианта ответа должно быть строкой"
+            if len(option_data["name"]) > Options.name.type.length:
+                return f"Вопрос {i}: слишком длинное название варианта ответа"
+    return None
+
+
+def insert_quiz_rows(session, rows: QuizRows):
+    """
+    Вставляет строки тремя многострочными INSERT (executemany) в текущей транзакции.
+    Для psycopg2 SQLAlchemy 1.4 по умолчанию выполняет их через execute_values
+    """
+    insert_quiz_batch(session, [rows])
+
+
+def insert_quiz_batch(session, batch: List[QuizRows]):
+    """
+    Вставляет несколько викторин теми же тремя INSERT, что и одну
+    """
+    quizzes = [rows.quiz for rows in batch if rows.quiz]
+    questions = [question for rows in batch for question in rows.questions]
+    options = [option for rows in batch for option in rows.options]
+    if quizzes:
+        session.execute(Quiz.__table__.insert(), quizzes)
+    if questions:
+        session.execute(Question.__table__.insert(), questions)
+    if options:
+        session.execute(Options.__table__.insert(), options)
@@ -0,0 +1,182 @@
+"""
+Сжатие ответов и условные GET для блюпринтов API.
+
+compress_response (after_request) сжимает JSON и текст не меньше
+COMPRESS_MIN_SIZE байт в br (если установлен пакет brotli) или gzip
+по заголовку Accept-Encoding. Потоковые ответы (SSE, NDJSON) не сжимаются,
+сжатые тела ответов с ETag кэшируются по хэшу тела.
+
+conditional ставит сильный ETag из версии данных, общей для всех воркеров
+(версии в базе): она читается до основного запроса, и при совпадении
+с If-None-Match view не вызывается - сразу 304. Хэш тела ответа - только
+запасной вариант для данных без версии
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Optional
+from flask import Response, make_response, request
+from config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/html', 'text/csv')
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def make_etag(*parts) -> str:
+    """
+    Значение ETag из частей версии данных
+    """
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+
+
+def body_etag(data: bytes) -> str:
+    """
+    Значение ETag из тела ответа
+    """
+    return hashlib.sha1(data).hexdigest()[:32]
+
+
+def _matching_tag(etag: str) -> Optional[str]:
+    """
+    Тег из If-None-Match, совпадающий с etag с учетом суффикса кодировки (-gzip, -br)
+    """
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+    if if_none_match.star_tag:
+        return etag
+    for tag in if_none_match.as_set():
+        if tag == etag or any(tag == f'{etag}-{encoding}' for encoding in ENCODINGS):
+            return tag
+    return None
+
+
+def not_modified(etag: str) -> Optional[Response]:
+    """
+    Ответ 304, если клиенту уже известна эта версия, иначе None
+    """
+    tag = _matching_tag(etag)
+    if tag is None:
+        return None
+    response = Response(status=304)
+    response.set_etag(tag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def with_etag(response, etag: str):
+    """
+    Ставит ETag и требует проверки при каждом использовании (ответы зависят от пользователя)
+    """
+    response = make_response(response)
+    if response.status_code == 200:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def conditional(version: Callable[..., Optional[tuple]]):
+    """
+    Декоратор view: version получает те же аргументы, что и view, и возвращает части версии
+    данных. В ETag также входит путь с параметрами запроса. Если version вернула None
+    (данных нет или у них нет версии), view вызывается всегда, а ETag успешного ответа
+    считается по телу: 304 тогда экономит только передачу
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            parts = version(*args, **kwargs)
+            if parts is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                etag = body_etag(response.get_data())
+                return not_modified(etag) or with_etag(response, etag)
+            etag = make_etag(request.full_path, *parts)
+            response = not_modified(etag)
+            if response is not None:
+                return response
+            return with_etag(view(*args, **kwargs), etag)
+        return wrapper
+    return decorator
+
+
+def choose_encoding() -> Optional[str]:
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=Config.COMPRESS_BROTLI_QUALITY)
+    # mtime=0: одинаковое тело дает одинаковый результат
+    return gzip.compress(data, compresslevel=Config.COMPRESS_LEVEL, mtime=0)
+
+
+class CompressedCache:
+    """
+    LRU сжатых тел по (хэш тела, кодировка): одинаковое тело повторно не сжимается.
+    Ключ - само содержимое, а не ETag: под одной версией данных тела разных
+    воркеров или загрузок могут отличаться, и чужое сжатое тело не вернется
+    """
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, data: bytes, encoding: str) -> bytes:
+        if self.max_size <= 0:
+            return compress(data, encoding)
+        key = (hashlib.sha1(data).digest(), encoding)
+        with self._lock:
+            compressed = self._items.get(key)
+            if compressed is not None:
+                self._items.move_to_end(key)
+                return compressed
+        compressed = compress(data, encoding)
+        with self._lock:
+            self._items[key] = compressed
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return compressed
+
+
+compressed_cache = CompressedCache(Config.COMPRESS_CACHE_SIZE)
+
+
+def compress_response(response):
+    """
+    after_request: сжимает ответ, если клиент это поддерживает и тело достаточно большое
+    """
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.content_length is not None and response.content_length < Config.COMPRESS_MIN_SIZE:
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < Config.COMPRESS_MIN_SIZE:
+        return response
+
+    etag, weak = response.get_etag()
+    # Кэшируются только ответы с сильным ETag: их тела повторяются, остальные сжимаются каждый раз
+    if etag and not weak:
+        response.set_data(compressed_cache.get_or_compress(data, encoding))
+    else:
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # Сжатое тело - другое представление, поэтому у него свой сильный ETag
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
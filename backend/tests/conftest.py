@@ -0,0 +1,170 @@
+"""
+Общая настройка тестов: временная SQLite база и файлы журналов вне каталога instance.
+Переменные окружения задаются до импорта приложения, потому что Config читает их при импорте
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+_tmp_dir = tempfile.mkdtemp(prefix='quizmaker-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}"
+os.environ['SUBMISSION_JOURNAL_PATH'] = os.path.join(_tmp_dir, 'submissions.db')
+os.environ['ATTEMPT_STORE_PATH'] = os.path.join(_tmp_dir, 'attempts.db')
+os.environ['GENERATION_CACHE_PATH'] = os.path.join(_tmp_dir, 'generation_cache.db')
+os.environ.setdefault('LLM_BACKEND', 'fake')
+
+# Схема создается так же, как командой flask db-upgrade на пустой базе
+import migrations
+from models import Base, engine
+
+migrations.create_schema(engine, Base.metadata)
+
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from app import app
+from models import SessionLocal, Category, User, JobStatus, engine as db_engine
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(client):
+    """
+    Регистрирует нового пользователя и возвращает его id и заголовки с токеном
+    """
+    def make() -> dict:
+        login = f'user-{uuid4().hex[:8]}'
+        client.post('/api/auth/register', json={'login': login, 'password': 'p', 'name': 'u', 'surname': 'u'})
+        token = client.post('/api/auth/login', json={'login': login, 'password': 'p'}).json['token']
+        session = SessionLocal()
+        user_id = session.query(User.id).filter(User.login == login).scalar()
+        session.close()
+        return {'id': user_id, 'headers': {'Authorization': f'Bearer {token}'}}
+
+    return make
+
+
+@pytest.fixture
+def user(make_user):
+    """
+    Зарегистрированный пользователь: id и заголовки с его токеном
+    """
+    return make_user()
+
+
+@pytest.fixture
+def category():
+    """
+    ID новой категории
+    """
+    session = SessionLocal()
+    category = Category(id=str(uuid4()), name='Тесты')
+    session.add(category)
+    session.commit()
+    category_id = category.id
+    session.close()
+    return category_id
+
+
+@pytest.fixture
+def make_quiz(client, user, category):
+    """
+    Создает викторину через API из questions_count вопросов SINGLE по 10 баллов
+    (или из переданных questions) и возвращает ее вместе с правильными ответами (answers)
+    """
+    def make(questions_count: int = 1, questions: list = None, title: str = 'Викторина') -> dict:
+        if questions is None:
+            questions = [{
+                'question_type': 'SINGLE',
+                'question': f'Вопрос {i}?',
+                'points': 10,
+                'options': [{'name': 'Верно', 'is_correct': True}, {'name': 'Неверно'}]
+            } for i in range(questions_count)]
+        response = client.post('/api/quiz/quizes', json={
+            'title': title, 'category_id': category, 'questions': questions
+        }, headers=user['headers'])
+        assert response.status_code == 201, response.data
+        quiz = client.get(f"/api/quiz/quizes/{response.json['id']}", headers=user['headers']).json
+        quiz['answers'] = [{
+            'question_id': question['id'],
+            'option_ids': [option['id'] for option in question['options'] if option['is_correct']]
+        } for question in quiz['questions']]
+        return quiz
+
+    return make
+
+
+@pytest.fixture
+def wait_for_job(client, user):
+    """
+    Ждет завершения задачи генерации и возвращает ее статус
+    """
+    def wait(job_id: str, timeout: float = 10) -> dict:
+        deadline = time.monotonic() + timeout
+        while True:
+            status = client.get(f'/api/quiz/generate-quiz/{job_id}', headers=user['headers']).json
+            if status['status'] in (JobStatus.SUCCEEDED, JobStatus.FAILED) or time.monotonic() > deadline:
+                return status
+            time.sleep(0.02)
+
+    return wait
+
+
+@pytest.fixture
+def count_queries():
+    """
+    Контекстный менеджер, собирающий SQL запросы к базе тестов в список
+    """
+    @contextmanager
+    def count():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db_engine, 'after_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db_engine, 'after_cursor_execute', record)
+
+    return count
+
+
+@pytest.fixture
+def make_postgres_engine():
+    """
+    Фабрика движков для новых пустых баз Postgres на сервере TEST_POSTGRES_URL
+    (без него тест пропускается). Базы удаляются после теста
+    """
+    url = os.environ.get('TEST_POSTGRES_URL')
+    if not url:
+        pytest.skip('TEST_POSTGRES_URL не задан')
+    server = create_engine(url, isolation_level='AUTOCOMMIT')
+    engines = []
+
+    def make():
+        name = f'test_{uuid4().hex[:12]}'
+        with server.connect() as connection:
+            connection.exec_driver_sql(f"CREATE DATABASE {name} ENCODING 'UTF8' TEMPLATE template0")
+        engine = create_engine(make_url(str(server.url)).set(database=name))
+        engines.append((name, engine))
+        return engine
+
+    yield make
+    with server.connect() as connection:
+        for name, engine in engines:
+            engine.dispose()
+            connection.exec_driver_sql(f'DROP DATABASE IF EXISTS {name}')
+    server.dispose()
@@ -0,0 +1,108 @@
+"""
+Активность пользователя из дневных итогов: итоги обновляются при отправке,
+пересобираются из журнала результатов и группируются по дням, неделям и месяцам
+"""
+from datetime import date, datetime, timedelta
+import pytest
+from config import Config
+from models import SessionLocal, UserActivityDaily, TestResult as ResultRow
+from quiz.activity import backfill_activity, load_activity
+
+
+def add_results(user_id: str, *results):
+    session = SessionLocal()
+    session.add_all([ResultRow(user_id=user_id, score=score, completed_at=completed_at)
+                     for completed_at, score in results])
+    session.commit()
+    session.close()
+
+
+def daily_rows(session, user_id: str) -> dict:
+    return {
+        day: (count, score)
+        for day, count, score in session.query(
+            UserActivityDaily.day, UserActivityDaily.tests_count, UserActivityDaily.score_sum
+        ).filter(UserActivityDaily.user_id == user_id)
+    }
+
+
+@pytest.fixture
+def history(user):
+    """
+    Результаты, записанные в журнал в обход отправки (как до появления дневных итогов)
+    """
+    add_results(
+        user['id'],
+        (datetime(2024, 1, 30, 10), 5),
+        (datetime(2024, 1, 30, 18), 7),
+        (datetime(2024, 2, 1, 9), 3),
+        (datetime(2024, 2, 12, 9), 4),
+    )
+    session = SessionLocal()
+    backfill_activity(session, [user['id']])
+    session.commit()
+    session.close()
+    return user
+
+
+def test_backfill_builds_daily_rows(history):
+    session = SessionLocal()
+    try:
+        assert daily_rows(session, history['id']) == {
+            date(2024, 1, 30): (2, 12), date(2024, 2, 1): (1, 3), date(2024, 2, 12): (1, 4)
+        }
+        # Повторная пересборка не удваивает итоги
+        backfill_activity(session, [history['id']])
+        session.commit()
+        assert sum(count for count, _ in daily_rows(session, history['id']).values()) == 4
+    finally:
+        session.close()
+
+
+@pytest.mark.parametrize('bucket, start, counts, scores', [
+    ('day', '2024-01-29', [0, 2, 0, 1] + [0] * 10 + [1], [0, 12, 0, 3] + [0] * 10 + [4]),
+    ('week', '2024-01-29', [3, 0, 1], [15, 0, 4]),
+    ('month', '2024-01-01', [2, 2], [12, 7]),
+])
+def test_activity_is_grouped_into_buckets(history, bucket, start, counts, scores):
+    session = SessionLocal()
+    activity = load_activity(session, history['id'], date(2024, 1, 29), date(2024, 2, 12), bucket)
+    session.close()
+
+    assert activity == {'start': start, 'end': '2024-02-12', 'bucket': bucket,
+                        'counts': counts, 'scores': scores, 'total': 4}
+
+
+def test_submission_updates_activity(monkeypatch, client, user, make_quiz):
+    monkeypatch.setattr(Config, 'SUBMISSION_WRITE_BEHIND', False)
+    quiz = make_quiz(1)
+    for _ in range(2):
+        response = client.post('/api/quiz/submit-answers', json={'quiz_id': quiz['id'], 'answers': quiz['answers']},
+                               headers=user['headers'])
+        assert response.status_code == 201
+
+    activity = client.get('/api/quiz/user-activity?days=7', headers=user['headers']).json
+    today = datetime.utcnow().date()
+    assert activity['start'] == (today - timedelta(days=6)).isoformat()
+    assert activity['counts'] == [0] * 6 + [2] and activity['scores'] == [0] * 6 + [20]
+    assert client.get('/api/quiz/user-tests-count', headers=user['headers']).json == {'tests_count': 2}
+
+    items = client.get('/api/quiz/user-activity?days=2&format=list', headers=user['headers']).json
+    assert items == [{'date': (today - timedelta(days=1)).isoformat(), 'count': 0},
+                     {'date': today.isoformat(), 'count': 2}]
+
+    # Итоги, обновленные при отправке, совпадают с пересобранными из журнала
+    session = SessionLocal()
+    try:
+        before = daily_rows(session, user['id'])
+        backfill_activity(session, [user['id']])
+        session.commit()
+        assert daily_rows(session, user['id']) == before
+    finally:
+        session.close()
+
+
+@pytest.mark.parametrize('query', ['bucket=year', 'format=xml', 'start=2024-13-01', 'start=2024-02-01&end=2024-01-01',
+                                   f'days={Config.ACTIVITY_MAX_DAYS + 1}'])
+def test_invalid_activity_range(client, user, query):
+    assert client.get(f'/api/quiz/user-activity?{query}', headers=user['headers']).status_code == 400
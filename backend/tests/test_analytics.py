@@ -0,0 +1,107 @@
+"""
+Аналитика ответов: статистика вопросов по матрице попыток, матрица
+пересобирается, когда викторину изменили в другом воркере (версия в базе
+выросла без инвалидации кэша этого процесса)
+"""
+from types import SimpleNamespace
+from sqlalchemy import update
+from models import SessionLocal, Quiz, Options, QuestionType
+from quiz.analytics import QuizAnswerMatrix
+
+# (попытка, балл, выбранный вариант первого и второго вопроса)
+ATTEMPTS = [('r1', 20, 'a', 'c'), ('r2', 10, 'a', 'd'), ('r3', 10, 'b', 'c'), ('r4', 0, 'b', 'd')]
+
+
+def make_matrix() -> QuizAnswerMatrix:
+    def question(question_id, correct, wrong):
+        return SimpleNamespace(id=question_id, question=question_id, question_type=QuestionType.SINGLE, points=10,
+                               options=[SimpleNamespace(id=correct, name=correct, is_correct=True),
+                                        SimpleNamespace(id=wrong, name=wrong, is_correct=False)])
+    quiz = SimpleNamespace(id='quiz', category_id='category', version=1,
+                           questions=[question('q1', 'a', 'b'), question('q2', 'c', 'd')])
+    return QuizAnswerMatrix(quiz)
+
+
+def attempt_answers(attempts) -> list:
+    return [(attempt_id, question_id, [option_id], None)
+            for attempt_id, _, *options in attempts
+            for question_id, option_id in zip(('q1', 'q2'), options)]
+
+
+def test_matrix_statistics():
+    matrix = make_matrix()
+    matrix.load([(attempt_id, score) for attempt_id, score, *_ in ATTEMPTS], attempt_answers(ATTEMPTS))
+    stats = matrix.compute()
+
+    assert stats['attempts'] == 4 and stats['max_score'] == 20
+    assert stats['score'] == {'mean': 10.0, 'median': 10.0, 'std': 7.07, 'min': 0.0, 'max': 20.0,
+                              'p25': 7.5, 'p75': 12.5, 'mean_percent': 50.0}
+    first = stats['questions'][0]
+    assert (first['answered'], first['correct'], first['difficulty']) == (4, 2, 0.5)
+    # Лучшая попытка ответила верно, худшая - нет
+    assert first['discrimination'] == 1.0
+    assert [(option['count'], option['share']) for option in first['options']] == [(2, 0.5), (2, 0.5)]
+
+
+def test_appended_attempts_match_loaded():
+    partial = make_matrix()
+    partial.load([('r1', 20)], attempt_answers(ATTEMPTS[:1]))
+    for attempt_id, score, first, second in ATTEMPTS[1:]:
+        partial.append({'test_result_id': attempt_id, 'score': score, 'answers': [
+            {'question_id': 'q1', 'option_ids': [first]}, {'question_id': 'q2', 'option_ids': [second]}
+        ]})
+    # Повторное добавление той же попытки не учитывается
+    partial.append({'test_result_id': 'r1', 'score': 20, 'answers': []})
+    full = make_matrix()
+    full.load([(attempt_id, score) for attempt_id, score, *_ in ATTEMPTS], attempt_answers(ATTEMPTS))
+
+    assert partial.compute() == full.compute()
+
+
+def test_unanswered_question_is_not_counted():
+    matrix = make_matrix()
+    matrix.load([('r1', 10), ('r2', 0)], [('r1', 'q1', ['a'], None), ('r2', 'q1', ['b'], None)])
+    second = matrix.compute()['questions'][1]
+
+    assert (second['answered'], second['difficulty']) == (0, None)
+    assert [option['share'] for option in second['options']] == [None, None]
+
+
+def submit(client, user, quiz):
+    response = client.post('/api/quiz/submit-answers', json={'quiz_id': quiz['id'], 'answers': quiz['answers']},
+                           headers=user['headers'])
+    assert response.status_code == 201, response.data
+
+
+def analytics(client, user, quiz_id: str):
+    response = client.get(f'/api/quiz/quizes/{quiz_id}/analytics', headers=user['headers'])
+    assert response.status_code == 200, response.data
+    return response.json
+
+
+def test_options_changed_in_other_worker_rebuild_matrix(client, user, make_quiz):
+    quiz = make_quiz(1)
+    submit(client, user, quiz)
+    question = analytics(client, user, quiz['id'])['questions'][0]
+    assert question['correct'] == 1
+
+    # Другой воркер меняет правильный вариант: выбранный ранее ответ становится неверным
+    session = SessionLocal()
+    for option in quiz['questions'][0]['options']:
+        session.execute(update(Options).where(Options.id == option['id']).values(is_correct=not option['is_correct']))
+    session.execute(update(Quiz).where(Quiz.id == quiz['id']).values(version=Quiz.version + 1))
+    session.commit()
+    session.close()
+
+    question = analytics(client, user, quiz['id'])['questions'][0]
+    assert question['correct'] == 0
+    assert [option['is_correct'] for option in question['options']] == [False, True]
+
+
+def test_deleted_quiz_has_no_analytics(client, user, make_quiz):
+    quiz = make_quiz(1)
+    analytics(client, user, quiz['id'])
+
+    response = client.delete(f"/api/quiz/quizes/{quiz['id']}", headers=user['headers'])
+    assert response.status_code == 200
+    assert client.get(f"/api/quiz/quizes/{quiz['id']}/analytics", headers=user['headers']).status_code == 404
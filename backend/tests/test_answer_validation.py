@@ -0,0 +1,80 @@
+"""
+Формат ответов проверяется до проверки и сохранения: option_ids - список
+строковых ID вариантов своего вопроса, иначе 400, а не 500 или испорченная запись
+"""
+import pytest
+from models import SessionLocal, AttemptAnswer, TestResult as ResultRow
+
+
+def invalid_option_ids(quiz: dict, other: dict) -> list:
+    question = quiz['questions'][0]
+    return [
+        'not-a-list',
+        [1, 2],
+        [None],
+        [[question['options'][0]['id']]],
+        [f"{question['options'][0]['id']},{question['options'][1]['id']}"],
+        ['00000000-0000-7000-8000-000000000000'],
+        [other['questions'][0]['options'][0]['id']],
+    ]
+
+
+@pytest.fixture
+def quizzes(make_quiz):
+    return make_quiz(1), make_quiz(1)
+
+
+def test_submit_rejects_malformed_option_ids(client, user, quizzes):
+    quiz, other = quizzes
+    question_id = quiz['questions'][0]['id']
+
+    for option_ids in invalid_option_ids(quiz, other):
+        response = client.post('/api/quiz/submit-answers', json={
+            'quiz_id': quiz['id'], 'answers': [{'question_id': question_id, 'option_ids': option_ids}]
+        }, headers=user['headers'])
+        assert response.status_code == 400, (option_ids, response.data)
+
+    for answers in ['oops', ['oops'], [{'question_id': ['x']}], [{'question_id': question_id, 'text_answer': 5}]]:
+        response = client.post('/api/quiz/submit-answers', json={'quiz_id': quiz['id'], 'answers': answers},
+                               headers=user['headers'])
+        assert response.status_code == 400, (answers, response.data)
+
+    session = SessionLocal()
+    assert session.query(ResultRow).filter_by(user_id=user['id']).count() == 0
+    session.close()
+
+
+def test_submit_stores_only_known_options(client, user, make_quiz):
+    quiz = make_quiz(1)
+    question = quiz['questions'][0]
+    correct = quiz['answers'][0]['option_ids']
+
+    response = client.post('/api/quiz/submit-answers', json={
+        'quiz_id': quiz['id'], 'answers': [{'question_id': question['id'], 'option_ids': correct + correct}]
+    }, headers=user['headers'])
+
+    assert response.status_code == 201, response.data
+    assert response.json['total_score'] == 10
+    session = SessionLocal()
+    stored = session.query(AttemptAnswer.option_ids).filter_by(test_result_id=response.json['test_result_id']).scalar()
+    session.close()
+    assert list(stored) == correct
+
+
+def test_attempt_rejects_malformed_option_ids(client, user, quizzes):
+    quiz, other = quizzes
+    question_id = quiz['questions'][0]['id']
+    attempt_id = client.post(f"/api/quiz/quizes/{quiz['id']}/attempts", headers=user['headers']).json['attempt_id']
+    url = f'/api/quiz/attempts/{attempt_id}/answers'
+
+    for option_ids in invalid_option_ids(quiz, other):
+        response = client.put(url, json={'answers': [{'question_id': question_id, 'option_ids': option_ids}]},
+                              headers=user['headers'])
+        assert response.status_code == 400, (option_ids, response.data)
+    assert client.get(f'/api/quiz/attempts/{attempt_id}', headers=user['headers']).json['answered'] == 0
+
+    response = client.put(url, json={'answers': quiz['answers']}, headers=user['headers'])
+    assert response.status_code == 200
+    finished = client.post(f'/api/quiz/attempts/{attempt_id}/finish', headers=user['headers'])
+    assert finished.status_code == 201, finished.data
+    assert finished.json['total_score'] == 10
@@ -0,0 +1,113 @@
+"""
+Прохождение по шагам: вопросы отдаются страницами без ключа ответа, ответы
+сохраняются по мере прохождения, завершение записывает один результат,
+а незавершенные попытки истекают
+"""
+from types import SimpleNamespace
+import pytest
+from config import Config
+from models import SessionLocal, AttemptAnswer, TestResult as ResultRow
+from quiz.attempts import AttemptStore
+
+QUESTIONS = [{
+    'question_type': 'SINGLE', 'question': f'Вопрос {i}?', 'points': 10,
+    'options': [{'name': 'Верно', 'is_correct': True}, {'name': 'Неверно'}]
+} for i in range(4)] + [{
+    'question_type': 'TEXT_ANSWER', 'question': 'Столица Франции?', 'points': 5,
+    'options': [{'name': 'Париж', 'is_correct': True}]
+}]
+
+
+@pytest.fixture
+def quiz(make_quiz):
+    return make_quiz(questions=QUESTIONS)
+
+
+def start(client, user, quiz) -> str:
+    response = client.post(f"/api/quiz/quizes/{quiz['id']}/attempts", headers=user['headers'])
+    assert response.status_code == 201, response.data
+    assert response.json['questions_count'] == 5 and response.json['answered'] == 0
+    return response.json['attempt_id']
+
+
+def test_questions_are_paged_without_answer_key(client, user, quiz):
+    attempt_id = start(client, user, quiz)
+    pages = []
+    offset = 0
+    while offset is not None:
+        page = client.get(f'/api/quiz/attempts/{attempt_id}/questions?offset={offset}&limit=2',
+                          headers=user['headers']).json
+        pages.append(page['questions'])
+        offset = page['next_offset']
+
+    questions = [question for page in pages for question in page]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [question['id'] for question in questions] == [question['id'] for question in quiz['questions']]
+    assert all('is_correct' not in option for question in questions for option in question['options'])
+    # Названия вариантов TEXT_ANSWER - это правильные ответы
+    assert questions[-1]['options'] == []
+
+
+def test_attempt_is_saved_incrementally_and_finished_once(monkeypatch, client, user, quiz):
+    monkeypatch.setattr(Config, 'SUBMISSION_WRITE_BEHIND', False)
+    attempt_id = start(client, user, quiz)
+    url = f'/api/quiz/attempts/{attempt_id}'
+    single, text = quiz['answers'][:4], {'question_id': quiz['questions'][4]['id'], 'text_answer': ' париж '}
+    wrong = {'question_id': single[0]['question_id'], 'option_ids': [quiz['questions'][0]['options'][1]['id']]}
+
+    assert client.put(f'{url}/answers', json={'answers': [wrong, single[1]]}, headers=user['headers']).json['answered'] == 2
+    # Повторный ответ на вопрос заменяет предыдущий
+    saved = client.put(f'{url}/answers', json={'answers': [single[0], single[2], text]}, headers=user['headers']).json
+    assert saved['saved'] == 3 and saved['answered'] == 4
+    first = client.get(f'{url}/questions?limit=1', headers=user['headers']).json['questions'][0]
+    assert first['answer']['option_ids'] == single[0]['option_ids']
+
+    finished = client.post(f'{url}/finish', headers=user['headers'])
+    assert finished.status_code == 201, finished.data
+    assert finished.json['total_score'] == 35
+    test_result_id = finished.json['test_result_id']
+
+    again = client.post(f'{url}/finish', headers=user['headers'])
+    assert again.status_code == 200 and again.json['test_result_id'] == test_result_id
+    assert client.put(f'{url}/answers', json={'answers': [single[3]]}, headers=user['headers']).status_code == 409
+    assert client.get(url, headers=user['headers']).json['finished']
+
+    session = SessionLocal()
+    try:
+        assert session.query(ResultRow).filter_by(user_id=user['id']).count() == 1
+        assert session.query(AttemptAnswer).filter_by(test_result_id=test_result_id).count() == 4
+    finally:
+        session.close()
+
+
+def test_attempt_belongs_to_its_user(client, user, make_user, quiz):
+    attempt_id = start(client, user, quiz)
+    other = make_user()['headers']
+
+    assert client.get(f'/api/quiz/attempts/{attempt_id}', headers=other).status_code == 404
+    assert client.post(f'/api/quiz/attempts/{attempt_id}/finish', headers=other).status_code == 404
+    assert client.post('/api/quiz/quizes/00000000-0000-7000-8000-000000000000/attempts',
+                       headers=user['headers']).status_code == 404
+
+
+def test_store_expires_idle_attempts(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('quiz.attempts.time', SimpleNamespace(time=lambda: now[0]))
+    store = AttemptStore(str(tmp_path / 'attempts.db'), ttl=60)
+    idle = store.create('user', 'quiz', ['q1', 'q2'])
+    active = store.create('user', 'quiz', ['q1'])
+
+    now[0] += 50
+    # Сохранение ответа продлевает попытку
+    store.save_answers(active['id'], [{'question_id': 'q1', 'option_ids': ['a', 'b']}])
+    now[0] += 20
+
+    assert store.get(idle['id']) is None
+    assert store.get(active['id'])['question_ids'] == ['q1']
+    assert store.answers(active['id']) == {'q1': {'question_id': 'q1', 'option_ids': ['a', 'b'], 'text_answer': None}}
+    assert store.cleanup(force=True) == 1
+    assert store.stats() == {'active': 1, 'finished': 0}
+
+    store.finish(active['id'], 'result')
+    assert store.answers(active['id']) == {}
+    assert store.stats() == {'active': 0, 'finished': 1}
@@ -0,0 +1,74 @@
+"""
+Аутентификация: в быстром режиме (AUTH_FAST_PATH) пользователь берется из токена,
+а версия токена - из кэша; смена данных отзывает старые токены в обоих режимах
+"""
+import pytest
+from config import Config
+from models import SessionLocal, User
+from auth.auth import user_records
+from auth.principal import UserRecordCache
+
+
+@pytest.fixture(params=[False, True], ids=['db', 'fast'])
+def fast_path(request, monkeypatch):
+    monkeypatch.setattr(Config, 'AUTH_FAST_PATH', request.param)
+    return request.param
+
+
+def users_queries(statements: list) -> list:
+    return [statement for statement in statements if 'FROM users' in statement]
+
+
+def test_fast_path_skips_user_lookup(client, user, fast_path, count_queries):
+    client.get('/api/quiz/pool-stats', headers=user['headers'])
+
+    with count_queries() as statements:
+        response = client.get('/api/quiz/pool-stats', headers=user['headers'])
+
+    assert response.status_code == 200
+    assert len(users_queries(statements)) == (0 if fast_path else 1)
+
+
+def test_changed_user_data_revokes_old_token(client, user, fast_path):
+    response = client.post('/api/auth/change_user_data', json={'name': 'Новое'}, headers=user['headers'])
+    assert response.status_code == 200, response.data
+    new_headers = {'Authorization': f"Bearer {response.json['token']}"}
+
+    old = client.get('/api/quiz/pool-stats', headers=user['headers'])
+    assert old.status_code == 403 and old.json['message'] == 'Token has been revoked!'
+    assert client.get('/api/quiz/pool-stats', headers=new_headers).status_code == 200
+
+
+def test_deleted_user(client, user, fast_path):
+    user_records.invalidate(user['id'])
+    client.get('/api/quiz/pool-stats', headers=user['headers'])
+    session = SessionLocal()
+    session.query(User).filter_by(id=user['id']).delete()
+    session.commit()
+    session.close()
+
+    response = client.post('/api/auth/change_user_data', json={'name': 'x'}, headers=user['headers'])
+    if fast_path:
+        # Версия токена еще в кэше: пользователя нет только в базе
+        assert response.status_code == 401
+    else:
+        assert response.status_code == 403
+    assert client.get('/api/quiz/pool-stats', headers=user['headers']).status_code == 403
+
+
+def test_invalid_tokens(client):
+    assert client.get('/api/quiz/pool-stats').status_code == 403
+    assert client.get('/api/quiz/pool-stats', headers={'Authorization': 'Bearer broken'}).status_code == 403
+
+
+def test_user_record_cache_expires():
+    cache = UserRecordCache(ttl=-1)
+    cache.set('user', 3)
+    assert cache.get('user') is None
+
+    cache = UserRecordCache(ttl=60, max_size=2)
+    for user_id in ('a', 'b', 'c'):
+        cache.set(user_id, 1)
+    assert cache.get('c').token_version == 1
+    cache.invalidate('c')
+    assert cache.get('c') is None
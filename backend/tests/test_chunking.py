@@ -0,0 +1,158 @@
+"""
+Генерация по длинному тексту: деление на фрагменты с перекрытием,
+параллельная генерация и удаление почти одинаковых вопросов
+"""
+import threading
+import time
+from uuid import uuid4
+import pytest
+from config import Config
+from models import JobStatus
+from quiz import generation
+from quiz.chunking import (RateLimiter, chunk_text, dedupe_questions, estimate_tokens, generate_from_chunks,
+                           merge_chunk_questions)
+from quiz.llm import FakeLLMClient, set_llm_client
+
+
+def paragraph(section: int, number: int) -> str:
+    return ' '.join(f'Раздел{section} абзац{number} предложение{i} про тему.' for i in range(8))
+
+
+def document(sections: int = 4, paragraphs: int = 5) -> str:
+    return '\n\n'.join(
+        f'# Глава {section}\n\n' + '\n\n'.join(paragraph(section, number) for number in range(paragraphs))
+        for section in range(sections)
+    )
+
+
+def question(text: str) -> dict:
+    return {'question': text, 'type': 'single', 'options': []}
+
+
+def test_chunks_fit_limit_and_cover_text():
+    text = document()
+    chunks = chunk_text(text, max_tokens=200, overlap_tokens=30)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 200 for chunk in chunks)
+    for section in range(4):
+        for number in range(5):
+            assert any(paragraph(section, number) in chunk for chunk in chunks)
+
+
+def test_chunks_overlap_and_start_at_sections():
+    chunks = chunk_text(document(), max_tokens=200, overlap_tokens=30)
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        head = chunk.split('\n\n', 1)[0]
+        assert head.split()[-1] in previous
+    # Заполненный больше чем наполовину фрагмент не продолжается следующим разделом
+    assert all(chunk.count('# Глава') <= 1 for chunk in chunks)
+
+
+def test_oversized_paragraph_is_split_by_sentences():
+    text = ' '.join(f'Предложение номер {i} без заголовков.' for i in range(200))
+    chunks = chunk_text(text, max_tokens=100)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 100 for chunk in chunks)
+    assert all(chunk.endswith('.') for chunk in chunks)
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text('Короткий текст.', max_tokens=100, overlap_tokens=20) == ['Короткий текст.']
+
+
+def test_dedupe_drops_near_duplicates():
+    questions = [
+        question('Какой город является столицей Франции?'),
+        question('Какой город является столицей  Франции ?'),
+        question('Какой город является столицей Франции сегодня?'),
+        question('Какая река протекает через Париж?'),
+    ]
+
+    assert [q['question'] for q in dedupe_questions(questions)] == [
+        'Какой город является столицей Франции?',
+        'Какая река протекает через Париж?',
+    ]
+
+
+def test_merge_interleaves_chunks():
+    per_chunk = [
+        [question(f'Первый фрагмент вопрос номер {i}') for i in range(3)],
+        [question(f'Второй фрагмент вопрос номер {i}') for i in range(3)],
+    ]
+
+    merged = merge_chunk_questions(per_chunk, count=4)
+
+    assert [q['question'] for q in merged] == [
+        'Первый фрагмент вопрос номер 0', 'Второй фрагмент вопрос номер 0',
+        'Первый фрагмент вопрос номер 1', 'Второй фрагмент вопрос номер 1',
+    ]
+
+
+def test_generate_from_chunks_runs_in_parallel_and_tolerates_failures():
+    running = []
+    peak = []
+    lock = threading.Lock()
+    progress = []
+
+    def generate_chunk(chunk, count):
+        with lock:
+            running.append(chunk)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(chunk)
+        if chunk == 'сломанный':
+            raise TimeoutError(chunk)
+        return {'quizTitle': f'Тема {chunk}',
+                'questions': [question(f'Вопрос про {chunk} номер {i}') for i in range(count)]}
+
+    result = generate_from_chunks(['первый', 'сломанный', 'третий'], generate_chunk, question_count=4,
+                                  concurrency=3, on_chunk_done=lambda done, total: progress.append((done, total)))
+
+    assert max(peak) == 3
+    assert result['quizTitle'] == 'Тема первый'
+    assert len(result['questions']) == 4
+    assert {q['question'].split()[2] for q in result['questions']} == {'первый', 'третий'}
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_generate_from_chunks_fails_when_every_chunk_fails():
+    def generate_chunk(chunk, count):
+        raise TimeoutError(chunk)
+
+    with pytest.raises(TimeoutError):
+        generate_from_chunks(['a', 'b'], generate_chunk, question_count=2, concurrency=2)
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(rate=50, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+
+    assert time.monotonic() - started >= 0.09
+
+
+def test_long_text_is_generated_by_chunks(client, user, category, wait_for_job, monkeypatch):
+    monkeypatch.setattr(Config, 'CHUNK_MAX_TOKENS', 200)
+    monkeypatch.setattr(Config, 'CHUNK_OVERLAP_TOKENS', 30)
+    monkeypatch.setattr(generation, 'llm_rate_limiter', None)
+    text = f'{uuid4().hex}\n\n{document()}'
+    llm = FakeLLMClient()
+    set_llm_client(llm)
+    try:
+        response = client.post('/api/quiz/generate-quiz', json={
+            'text': text, 'category_id': category, 'question_count': 6
+        }, headers=user['headers'])
+        status = wait_for_job(response.json['job_id'])
+    finally:
+        set_llm_client(None)
+
+    assert status['status'] == JobStatus.SUCCEEDED, status
+    assert llm.calls == len(chunk_text(text, 200, 30)) > 1
+    quiz = client.get(f"/api/quiz/quizes/{status['quiz_id']}", headers=user['headers']).json
+    questions = [q['question'] for q in quiz['questions']]
+    assert len(questions) == len(set(questions)) == 6
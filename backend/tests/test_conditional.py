@@ -0,0 +1,117 @@
+"""
+ETag списка и викторины строятся из версий в базе, одинаковых для всех воркеров,
+а не из хэша тела ответа; сжатие выбирается по Accept-Encoding, у сжатого
+представления свой ETag
+"""
+import gzip
+import pytest
+from sqlalchemy import update
+import responses
+from models import SessionLocal, Quiz
+
+
+@pytest.fixture(autouse=True)
+def no_body_hashing(monkeypatch):
+    def body_etag(data):
+        raise AssertionError('ETag посчитан по телу ответа')
+    monkeypatch.setattr(responses, 'body_etag', body_etag)
+
+
+def change_in_other_worker(quiz_id: str, **values):
+    session = SessionLocal()
+    try:
+        session.execute(update(Quiz).where(Quiz.id == quiz_id).values(version=Quiz.version + 1, **values))
+        session.commit()
+    finally:
+        session.close()
+
+
+def revalidate(client, user, url: str, etag: str):
+    return client.get(url, headers={**user['headers'], 'If-None-Match': f'"{etag}"'})
+
+
+def test_quiz_etag_follows_database_version(client, user, make_quiz):
+    quiz = make_quiz(1)
+    url = f"/api/quiz/quizes/{quiz['id']}"
+    etag = client.get(url, headers=user['headers']).get_etag()[0]
+
+    assert revalidate(client, user, url, etag).status_code == 304
+
+    change_in_other_worker(quiz['id'], title='Правка')
+    response = revalidate(client, user, url, etag)
+    assert response.status_code == 200
+    assert response.json['title'] == 'Правка'
+    assert response.get_etag()[0] != etag
+
+
+@pytest.mark.parametrize('change', ['title', 'delete'])
+def test_list_etag_follows_quiz_writes(client, user, make_quiz, change):
+    quiz = make_quiz(1)
+    url = '/api/quiz/quizes?limit=500'
+    etag = client.get(url, headers=user['headers']).get_etag()[0]
+
+    assert revalidate(client, user, url, etag).status_code == 304
+
+    if change == 'title':
+        change_in_other_worker(quiz['id'], title='Новое название')
+    else:
+        change_in_other_worker(quiz['id'], deleted_at=Quiz.updated_at)
+    response = revalidate(client, user, url, etag)
+    assert response.status_code == 200
+    titles = {item['id']: item['title'] for item in response.json['quizes']}
+    assert titles.get(quiz['id']) == ('Новое название' if change == 'title' else None)
+
+
+def test_missing_quiz_has_no_etag(client, user):
+    response = client.get('/api/quiz/quizes/00000000-0000-7000-8000-000000000000', headers=user['headers'])
+
+    assert response.status_code == 404
+    assert response.get_etag() == (None, None)
+
+
+@pytest.fixture
+def large_quiz(make_quiz):
+    quiz = make_quiz(20)
+    return f"/api/quiz/quizes/{quiz['id']}"
+
+
+def test_response_is_compressed_by_accept_encoding(client, user, large_quiz):
+    plain = client.get(large_quiz, headers=user['headers'])
+    compressed = client.get(large_quiz, headers={**user['headers'], 'Accept-Encoding': 'gzip, deflate'})
+    refused = client.get(large_quiz, headers={**user['headers'], 'Accept-Encoding': 'gzip;q=0, identity'})
+
+    assert 'Content-Encoding' not in plain.headers and 'Content-Encoding' not in refused.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert all('Accept-Encoding' in response.headers['Vary'] for response in (plain, compressed))
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    assert len(compressed.get_data()) < len(plain.get_data()) // 2
+    assert compressed.get_etag()[0] == f"{plain.get_etag()[0]}-gzip"
+
+
+def test_compressed_etag_revalidates(client, user, large_quiz):
+    headers = {**user['headers'], 'Accept-Encoding': 'gzip'}
+    etag = client.get(large_quiz, headers=headers).get_etag()[0]
+
+    response = client.get(large_quiz, headers={**headers, 'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_etag()[0] == etag and response.get_data() == b''
+
+
+def test_same_body_is_compressed_once(client, user, large_quiz, monkeypatch):
+    calls = []
+    compress = responses.compress
+    monkeypatch.setattr(responses, 'compress', lambda data, encoding: calls.append(encoding) or compress(data, encoding))
+    monkeypatch.setattr(responses, 'compressed_cache', responses.CompressedCache())
+    headers = {**user['headers'], 'Accept-Encoding': 'gzip'}
+
+    bodies = [client.get(large_quiz, headers=headers).get_data() for _ in range(3)]
+    assert calls == ['gzip'] and len(set(bodies)) == 1
+
+
+def test_small_and_streamed_responses_are_not_compressed(client, user, large_quiz):
+    headers = {**user['headers'], 'Accept-Encoding': 'gzip'}
+
+    small = client.get('/api/quiz/user-tests-count', headers=headers)
+    streamed = client.get('/api/quiz/export', headers=headers)
+    assert small.status_code == 200 and 'Content-Encoding' not in small.headers
+    assert streamed.status_code == 200 and 'Content-Encoding' not in streamed.headers
@@ -0,0 +1,55 @@
+"""
+Пул соединений и сессия на время запроса: аутентифицированный запрос
+занимает одно соединение и возвращает его в teardown
+"""
+import pytest
+from sqlalchemy.pool import QueuePool
+from db import InstrumentedQueuePool, engine_options, pool_metrics
+
+
+class PostgresConfig:
+    SQLALCHEMY_DATABASE_URI = 'postgresql://user@db/quizmaker'
+    DB_POOL_SIZE = 7
+    DB_MAX_OVERFLOW = 3
+    DB_POOL_TIMEOUT = 5
+    DB_POOL_RECYCLE = 600
+    DB_POOL_PRE_PING = True
+    DB_STATEMENT_TIMEOUT_MS = 2000
+
+
+def test_engine_options_from_config():
+    options = engine_options(PostgresConfig)
+
+    assert options['poolclass'] is InstrumentedQueuePool and issubclass(InstrumentedQueuePool, QueuePool)
+    assert (options['pool_size'], options['max_overflow'], options['pool_timeout'], options['pool_recycle']) == \
+           (7, 3, 5, 600)
+    assert options['pool_pre_ping'] is True
+    assert options['connect_args'] == {'options': '-c statement_timeout=2000'}
+
+
+def test_sqlite_uses_default_pool():
+    class SqliteConfig(PostgresConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///quiz.db'
+
+    assert engine_options(SqliteConfig) == {}
+
+
+@pytest.mark.parametrize('path', ['/api/quiz/quizes/{quiz_id}', '/api/quiz/quizes?limit=5',
+                                  '/api/quiz/quizes/00000000-0000-7000-8000-000000000000'])
+def test_request_uses_one_connection(client, user, make_quiz, path):
+    quiz = make_quiz(2)
+    checkouts, checkins = pool_metrics.checkouts, pool_metrics.checkins
+
+    client.get(path.format(quiz_id=quiz['id']), headers=user['headers'])
+
+    assert pool_metrics.checkouts - checkouts == 1
+    assert pool_metrics.checkins - checkins == 1
+
+
+def test_connection_is_returned_after_error(client, user, monkeypatch):
+    checkouts, checkins = pool_metrics.checkouts, pool_metrics.checkins
+    monkeypatch.setattr('quiz.quiz.keyset_page', lambda *args: 1 / 0)
+
+    assert client.get('/api/quiz/quizes', headers=user['headers']).status_code == 500
+
+    assert pool_metrics.checkouts - checkouts == pool_metrics.checkins - checkins == 1
@@ -0,0 +1,100 @@
+"""
+Кэш сгенерированных викторин по содержимому запроса: повтор с тем же текстом
+не вызывает LLM, одновременные одинаковые запросы выполняют один вызов
+"""
+import threading
+import time
+import pytest
+from uuid import uuid4
+from models import JobStatus
+from quiz.generation_cache import DiskGenerationStore, GenerationCache, SingleFlight, generation_key
+from quiz.llm import FakeLLMClient, set_llm_client
+
+
+def test_key_normalizes_whitespace():
+    key = generation_key('Кошки  и\nсобаки ', 'category', 'model', 5)
+
+    assert key == generation_key('Кошки и собаки', 'category', 'model', 5)
+    assert key != generation_key('Кошки и собаки', 'other', 'model', 5)
+    assert key != generation_key('Кошки и собаки', 'category', 'other', 5)
+    assert key != generation_key('Кошки и собаки', 'category', 'model', 6)
+    assert key != generation_key('кошки и собаки', 'category', 'model', 5)
+
+
+def test_disk_store_survives_restart_and_evicts_oldest(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    store = DiskGenerationStore(path, max_bytes=25)
+    store.set('a', b'x' * 10)
+    time.sleep(0.01)
+    store.set('b', b'y' * 10)
+    time.sleep(0.01)
+    assert store.get('a') == b'x' * 10
+    store.set('c', b'z' * 10)
+
+    reopened = DiskGenerationStore(path, max_bytes=25)
+    assert reopened.get('b') is None
+    assert reopened.get('a') == b'x' * 10 and reopened.get('c') == b'z' * 10
+
+    cache = GenerationCache(memory_bytes=1000, disk_store=reopened)
+    cache.set('quiz', {'title': 'Т'})
+    assert GenerationCache(memory_bytes=1000, disk_store=reopened).get('quiz') == {'title': 'Т'}
+
+
+def test_memory_lru_by_size():
+    cache = GenerationCache(memory_bytes=40)
+    cache.set('a', {'v': 'a' * 10})
+    cache.set('b', {'v': 'b' * 10})
+    cache.get('a')
+    cache.set('c', {'v': 'c' * 10})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'v': 'a' * 10} and cache.get('c') == {'v': 'c' * 10}
+    assert cache.evictions == 1 and cache.misses == 1
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return 'payload'
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', work))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.coalesced < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1] and results == ['payload'] * 5
+
+
+def test_single_flight_forgets_failed_call():
+    flight = SingleFlight()
+
+    with pytest.raises(ValueError):
+        flight.do('key', lambda: int('x'))
+    assert flight.do('key', lambda: 1) == 1
+
+
+def test_repeated_generation_uses_cache(client, user, category, wait_for_job):
+    llm = FakeLLMClient()
+    set_llm_client(llm)
+    text = f'повтор {uuid4().hex}'
+    try:
+        statuses = [wait_for_job(client.post('/api/quiz/generate-quiz', json={
+            'text': variant, 'category_id': category
+        }, headers=user['headers']).json['job_id']) for variant in (text, f'  {text}\n')]
+    finally:
+        set_llm_client(None)
+
+    assert [status['status'] for status in statuses] == [JobStatus.SUCCEEDED] * 2
+    assert llm.calls == 1
+    # Из кэша берутся данные викторины, каждая задача сохраняет свою викторину
+    assert statuses[0]['quiz_id'] != statuses[1]['quiz_id']
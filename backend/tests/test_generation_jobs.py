@@ -0,0 +1,122 @@
+"""
+Генерация викторин фоновыми задачами: запрос возвращается до ответа LLM,
+переполненная очередь отвечает 503. Задачи, брошенные перезапущенным воркером,
+завершаются ошибкой и не выполняются, если очередь до них все же дойдет
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+import pytest
+from models import SessionLocal, GenerationJob, JobStatus
+from quiz.jobs import JobQueue, recover_stale_jobs, run_generation_job, STALE_JOB_ERROR
+from quiz.llm import FakeLLMClient, set_llm_client
+
+
+@pytest.fixture
+def make_job(user, category):
+    session = SessionLocal()
+
+    def make(status, age):
+        # updated_at задается явно: так задача выглядит брошенной age секунд назад
+        updated_at = datetime.utcnow() - timedelta(seconds=age)
+        job = GenerationJob(id=str(uuid4()), user_id=user['id'], category_id=category, status=status,
+                            created_at=updated_at, updated_at=updated_at)
+        session.add(job)
+        session.commit()
+        return job.id
+
+    yield make
+    session.close()
+
+
+def job_state(job_id):
+    session = SessionLocal()
+    try:
+        job = session.query(GenerationJob).filter_by(id=job_id).one()
+        return job.status, job.error
+    finally:
+        session.close()
+
+
+def test_startup_fails_only_stale_jobs(make_job):
+    stale_pending = make_job(JobStatus.PENDING, 3600)
+    stale_running = make_job(JobStatus.RUNNING, 3600)
+    fresh_running = make_job(JobStatus.RUNNING, 0)
+    finished = make_job(JobStatus.SUCCEEDED, 3600)
+
+    assert recover_stale_jobs() >= 2
+
+    assert job_state(stale_pending) == (JobStatus.FAILED, STALE_JOB_ERROR)
+    assert job_state(stale_running) == (JobStatus.FAILED, STALE_JOB_ERROR)
+    assert job_state(fresh_running) == (JobStatus.RUNNING, None)
+    assert job_state(finished) == (JobStatus.SUCCEEDED, None)
+
+
+def test_status_request_fails_stale_job(client, user, make_job):
+    job_id = make_job(JobStatus.RUNNING, 3600)
+
+    response = client.get(f'/api/quiz/generate-quiz/{job_id}', headers=user['headers'])
+
+    assert response.status_code == 200
+    assert response.json['status'] == JobStatus.FAILED
+    assert response.json['error'] == STALE_JOB_ERROR
+
+
+def test_failed_job_is_not_started(make_job):
+    job_id = make_job(JobStatus.PENDING, 3600)
+    recover_stale_jobs()
+
+    run_generation_job(job_id, 'unused', 'текст', 3)
+
+    assert job_state(job_id) == (JobStatus.FAILED, STALE_JOB_ERROR)
+
+
+@pytest.fixture
+def slow_llm():
+    client = FakeLLMClient(delay=0.5)
+    set_llm_client(client)
+    yield client
+    # Следующий вызов get_llm_client создаст клиент по LLM_BACKEND
+    set_llm_client(None)
+
+
+def test_generation_runs_in_background(client, user, category, slow_llm, wait_for_job):
+    started = time.monotonic()
+    response = client.post('/api/quiz/generate-quiz', json={
+        'text': f'кошка собака {uuid4().hex}', 'category_id': category, 'question_count': 3
+    }, headers=user['headers'])
+
+    assert response.status_code == 202, response.data
+    assert time.monotonic() - started < slow_llm.delay
+    status = wait_for_job(response.json['job_id'])
+    assert status['status'] == JobStatus.SUCCEEDED, status
+    assert status['progress'] == 100 and slow_llm.calls == 1
+    quiz = client.get(f"/api/quiz/quizes/{status['quiz_id']}", headers=user['headers']).json
+    assert len(quiz['questions']) == 3
+
+
+def test_full_queue_rejects_job(client, user, category, monkeypatch):
+    monkeypatch.setattr('quiz.quiz.generation_queue', JobQueue(1, 0))
+
+    response = client.post('/api/quiz/generate-quiz', json={'text': 'текст', 'category_id': category},
+                           headers=user['headers'])
+
+    assert response.status_code == 503
+    session = SessionLocal()
+    job = session.query(GenerationJob).filter_by(user_id=user['id']).one()
+    assert job.status == JobStatus.FAILED
+    session.close()
+
+
+def test_job_queue_limit():
+    queue = JobQueue(1, 2)
+    release = threading.Event()
+    done = []
+
+    assert queue.submit(release.wait)
+    assert queue.submit(done.append, 1)
+    assert not queue.submit(done.append, 2)
+    release.set()
+    queue.executor.shutdown(wait=True)
+    assert done == [1]
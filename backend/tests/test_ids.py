@@ -0,0 +1,91 @@
+"""
+Ключи записей: UUIDv7 растут монотонно, тип GUID хранит их в Postgres
+нативным uuid, а в SQLite строкой, и в обоих случаях возвращает строку
+"""
+import time
+from uuid import UUID, uuid4
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, select
+import ids
+from ids import new_id, uuid7
+from models import GUID, SessionLocal, Question, Options
+
+
+def test_uuid7_layout():
+    before = time.time_ns() // 1_000_000
+    value = uuid7()
+    after = time.time_ns() // 1_000_000
+
+    assert value.version == 7
+    assert value.variant == 'specified in RFC 4122'
+    assert before <= value.int >> 80 <= after
+
+
+def test_uuid7_is_monotonic():
+    values = [new_id() for _ in range(10000)]
+
+    assert len(set(values)) == len(values)
+    assert sorted(values) == values
+
+
+def test_uuid7_counter_overflow_moves_to_next_millisecond(monkeypatch):
+    monkeypatch.setattr(ids, '_last_ms', 0)
+    monkeypatch.setattr(ids.time, 'time_ns', lambda: 1_700_000_000_000 * 1_000_000)
+    values = [uuid7() for _ in range(5000)]
+
+    assert sorted(values) == values and len(set(values)) == len(values)
+    # 4096 значений счетчика не хватает на одну миллисекунду
+    assert values[-1].int >> 80 == 1_700_000_000_001
+
+
+def test_models_get_time_ordered_ids(make_quiz):
+    quiz = make_quiz(2)
+    session = SessionLocal()
+    try:
+        question_ids = session.query(Question.id).filter(Question.quiz_id == quiz['id']).order_by(Question.id).all()
+        option_ids = session.query(Options.id).filter(Options.question_id == question_ids[0][0]).order_by(Options.id).all()
+    finally:
+        session.close()
+
+    assert UUID(quiz['id']).version == 7
+    # Порядок по ключу совпадает с порядком создания
+    assert [question_id for question_id, in question_ids] == [question['id'] for question in quiz['questions']]
+    assert [option_id for option_id, in option_ids] == [option['id'] for option in quiz['questions'][0]['options']]
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def engine(request, tmp_path):
+    if request.param == 'postgresql':
+        return request.getfixturevalue('make_postgres_engine')()
+    return create_engine(f"sqlite:///{tmp_path / 'ids.db'}")
+
+
+def test_guid_round_trip(engine):
+    table = Table('items', MetaData(), Column('id', GUID, primary_key=True), Column('position', Integer))
+    table.create(engine)
+    generated = [new_id() for _ in range(3)]
+    legacy = uuid4()
+
+    with engine.begin() as connection:
+        connection.execute(table.insert(), [{'id': value, 'position': i} for i, value in enumerate(generated)])
+        connection.execute(table.insert(), {'id': legacy, 'position': 3})
+        rows = connection.execute(select(table.c.id, table.c.position).order_by(table.c.id)).all()
+        found = connection.execute(select(table.c.position).where(table.c.id == generated[1])).scalar()
+        missing = connection.execute(select(table.c.position).where(table.c.id == 'not-a-uuid')).all()
+
+    assert all(isinstance(value, str) for value, _ in rows)
+    assert {value for value, _ in rows} == set(generated) | {str(legacy)}
+    # UUIDv7 сортируются по времени создания и на строках, и на нативном uuid
+    assert [value for value, _ in rows if value != str(legacy)] == generated
+    assert found == 1 and missing == []
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql(
+                "SELECT data_type FROM information_schema.columns WHERE table_name = 'items' AND column_name = 'id'"
+            ).scalar() == 'uuid'
+
+
+def test_lookup_by_malformed_id_is_not_found(client, user):
+    response = client.get('/api/quiz/quizes/not-a-uuid', headers=user['headers'])
+
+    assert response.status_code == 404
@@ -0,0 +1,90 @@
+"""
+Рейтинги в памяти: блочный отсортированный список, места с учетом равных
+баллов, страницы рейтинга, окна за последние дни и рейтинги через API
+"""
+import random
+from datetime import date
+import pytest
+from config import Config
+from quiz.leaderboard import Leaderboard, SortedKeyList, WindowLeaderboard
+
+
+def test_sorted_key_list_matches_sorted():
+    rng = random.Random(7)
+    keys = SortedKeyList(load=4)
+    expected = []
+    for _ in range(500):
+        key = rng.randrange(200)
+        if expected and rng.random() < 0.3:
+            key = rng.choice(expected)
+            keys.remove(key)
+            expected.remove(key)
+        else:
+            keys.add(key)
+            expected.append(key)
+    expected.sort()
+
+    assert len(keys) == len(expected)
+    assert keys.slice(0, len(expected)) == expected
+    assert keys.slice(10, 25) == expected[10:25]
+    assert [keys.bisect_left(key) for key in (-1, 50, 100, 1000)] == [
+        sum(value < key for value in expected) for key in (-1, 50, 100, 1000)
+    ]
+    with pytest.raises(ValueError):
+        keys.remove(1000)
+
+
+def test_rank_and_top_with_ties():
+    board = Leaderboard({'a': 30, 'b': 50, 'c': 30, 'd': 10})
+    board.add('d', 45)
+    board.set_max('b', 20)
+
+    assert board.rank('d') == (1, 55)
+    assert board.rank('a') == (3, 30) and board.rank('c') == (3, 30)
+    assert board.rank('missing') is None
+    assert board.top(3) == [(1, 'd', 55), (2, 'b', 50), (3, 'a', 30)]
+    # Место первого на странице считается с учетом предыдущих страниц
+    assert board.top(2, offset=3) == [(3, 'c', 30)]
+
+
+def test_window_drops_days_that_leave_it():
+    window = WindowLeaderboard(7, today=date(2024, 3, 10))
+    window.add_on('a', 10, date(2024, 3, 4))
+    window.add_on('a', 5, date(2024, 3, 10))
+    window.add_on('b', 8, date(2024, 3, 9))
+    window.add_on('c', 100, date(2024, 3, 3))
+
+    assert window.top(10) == [(1, 'a', 15), (2, 'b', 8)]
+    window.advance(date(2024, 3, 11))
+    assert window.top(10) == [(1, 'b', 8), (2, 'a', 5)]
+    window.advance(date(2024, 3, 20))
+    assert window.top(10) == [] and len(window) == 0
+
+
+def test_boards_through_api(monkeypatch, client, make_user, make_quiz, category):
+    monkeypatch.setattr(Config, 'SUBMISSION_WRITE_BEHIND', False)
+    quiz = make_quiz(2)
+    users = [make_user() for _ in range(3)]
+    wrong = [{'question_id': question['id'], 'option_ids': [question['options'][1]['id']]}
+             for question in quiz['questions']]
+    for user, attempts in zip(users, [[quiz['answers']], [quiz['answers'][:1], wrong], [wrong]]):
+        for answers in attempts:
+            response = client.post('/api/quiz/submit-answers', json={'quiz_id': quiz['id'], 'answers': answers},
+                                   headers=user['headers'])
+            assert response.status_code == 201, response.data
+
+    board = client.get(f"/api/quiz/leaderboard/quiz/{quiz['id']}", headers=users[1]['headers']).json
+    # В рейтинге викторины - лучшая попытка
+    assert [(entry['rank'], entry['user_id'], entry['score']) for entry in board['entries']] == [
+        (1, users[0]['id'], 20), (2, users[1]['id'], 10), (3, users[2]['id'], 0)
+    ]
+    assert board['total'] == 3 and board['me'] == {'rank': 2, 'score': 10}
+    assert board['entries'][0]['login'].startswith('user-')
+
+    page = client.get(f'/api/quiz/leaderboard/category/{category}?limit=1&offset=1', headers=users[0]['headers']).json
+    assert [(entry['rank'], entry['score']) for entry in page['entries']] == [(2, 10)]
+    weekly = client.get('/api/quiz/leaderboard/7d?limit=100', headers=users[0]['headers']).json
+    assert weekly['me']['score'] == 20
+
+    assert client.get('/api/quiz/leaderboard/1d', headers=users[0]['headers']).status_code == 404
+    assert client.get('/api/quiz/leaderboard?limit=x', headers=users[0]['headers']).status_code == 400
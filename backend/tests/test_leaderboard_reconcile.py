@@ -0,0 +1,88 @@
+"""
+Сверка рейтингов с базой: отправки, сохраненные во время пересборки,
+не теряются, а рейтинги удаленных викторин и их баллы в рейтинге категории не возвращаются
+"""
+import threading
+import time
+import pytest
+from sqlalchemy import event
+from app import app
+from models import SessionLocal, engine, User
+from quiz.leaderboard import leaderboards
+
+
+@pytest.fixture
+def quiz(make_quiz):
+    return make_quiz(1, title='Рейтинг')
+
+
+def submit(user, quiz):
+    response = app.test_client().post(
+        '/api/quiz/submit-answers', json={'quiz_id': quiz['id'], 'answers': quiz['answers']}, headers=user['headers']
+    )
+    assert response.status_code == 201, response.data
+
+
+def stored_score(user_id: str) -> int:
+    session = SessionLocal()
+    try:
+        return session.query(User.score).filter(User.id == user_id).scalar()
+    finally:
+        session.close()
+
+
+def test_submission_during_reconcile_is_not_lost(user, quiz):
+    leaderboards.reconcile()
+    paused = threading.Event()
+    resume = threading.Event()
+    reconcile_thread = threading.Thread(target=leaderboards.reconcile)
+
+    def pause_after_first_query(conn, cursor, statement, parameters, context, executemany):
+        # Сверка останавливается после чтения общего рейтинга, пока сохраняется отправка
+        if threading.current_thread() is reconcile_thread and not paused.is_set():
+            paused.set()
+            resume.wait(5)
+
+    event.listen(engine, 'after_cursor_execute', pause_after_first_query)
+    try:
+        reconcile_thread.start()
+        assert paused.wait(5)
+        submit_thread = threading.Thread(target=submit, args=(user, quiz))
+        submit_thread.start()
+        time.sleep(0.3)
+        resume.set()
+        reconcile_thread.join(10)
+        submit_thread.join(10)
+    finally:
+        resume.set()
+        event.remove(engine, 'after_cursor_execute', pause_after_first_query)
+
+    board = leaderboards.board('global')
+    assert leaderboards.rank(board, user['id'])[1] == stored_score(user['id']) == 10
+    quiz_board = leaderboards.board('quiz', quiz['id'])
+    assert leaderboards.rank(quiz_board, user['id'])[1] == 10
+
+
+def test_deleted_quiz_board_is_dropped(client, user, quiz):
+    submit(user, quiz)
+    assert len(leaderboards.board('quiz', quiz['id'])) == 1
+    response = client.delete(f"/api/quiz/quizes/{quiz['id']}?archive=true", headers=user['headers'])
+    assert response.status_code == 200, response.data
+    assert len(leaderboards.board('quiz', quiz['id'])) == 0
+    leaderboards.reconcile()
+    assert len(leaderboards.board('quiz', quiz['id'])) == 0
+
+
+def test_deleted_quiz_leaves_category_board(client, user, make_quiz, category):
+    kept = make_quiz(1, title='Остается')
+    deleted = make_quiz(1, title='Удаляется')
+    submit(user, kept)
+    submit(user, deleted)
+    leaderboards.reconcile()
+    board = leaderboards.board('category', category)
+    assert leaderboards.rank(board, user['id'])[1] == 20
+
+    response = client.delete(f"/api/quiz/quizes/{deleted['id']}?archive=true", headers=user['headers'])
+    assert response.status_code == 200, response.data
+    board = leaderboards.board('category', category)
+    assert leaderboards.rank(board, user['id'])[1] == 10
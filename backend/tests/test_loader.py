@@ -0,0 +1,45 @@
+"""
+Загрузка викторины: число запросов не зависит от числа вопросов
+"""
+from models import SessionLocal
+from quiz.loader import load_quiz_tree, quiz_version, serialize_quiz
+
+
+def load(quiz_id: str):
+    session = SessionLocal()
+    try:
+        quiz = load_quiz_tree(session, quiz_id)
+        return None if quiz is None else serialize_quiz(quiz)
+    finally:
+        session.close()
+
+
+def test_query_count_does_not_grow_with_questions(make_quiz, count_queries):
+    small = make_quiz(2)
+    large = make_quiz(20)
+
+    with count_queries() as small_queries:
+        load(small['id'])
+    with count_queries() as large_queries:
+        loaded = load(large['id'])
+
+    assert len(small_queries) == len(large_queries) == 3
+    assert len(loaded['questions']) == 20
+    assert all(len(question['options']) == 2 for question in loaded['questions'])
+
+
+def test_tree_matches_api_response(client, user, make_quiz):
+    quiz = make_quiz(3)
+    loaded = load(quiz['id'])
+
+    assert loaded == {key: value for key, value in quiz.items() if key != 'answers'}
+
+
+def test_deleted_quiz_is_not_loaded(client, user, make_quiz):
+    quiz = make_quiz(1)
+    assert client.delete(f"/api/quiz/quizes/{quiz['id']}", headers=user['headers']).status_code == 200
+
+    assert load(quiz['id']) is None
+    session = SessionLocal()
+    assert quiz_version(session, quiz['id']) is None
+    session.close()
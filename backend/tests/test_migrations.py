@@ -0,0 +1,211 @@
+"""
+Обновление базы со схемой до миграций (ключи varchar, без новых таблиц)
+командой db-upgrade дает ту же схему, что и создание пустой базы; миграции
+идемпотентны, колонки внешних ключей и фильтров покрыты индексами, ответы
+попыток переносятся из user_answer в attempt_answer.
+На Postgres тест запускается, если задан TEST_POSTGRES_URL (сервер, где можно создавать базы)
+"""
+import importlib
+from uuid import uuid4
+import pytest
+from sqlalchemy import (
+    Boolean, Column, DateTime, Enum, ForeignKey, Integer, MetaData, String, Table, Text, create_engine, func, inspect
+)
+from sqlalchemy.orm import Session
+import migrations
+from models import Base, AttemptAnswer, UserAnswer
+
+
+def baseline_metadata() -> MetaData:
+    """
+    Схема до первой миграции
+    """
+    metadata = MetaData()
+    Table('users', metadata,
+          Column('id', String(36), primary_key=True),
+          Column('login', String(80), unique=True, nullable=False),
+          Column('password', String(128), nullable=False),
+          Column('name', String(20)),
+          Column('surname', String(20)),
+          Column('score', Integer))
+    Table('category', metadata,
+          Column('id', String(32), primary_key=True),
+          Column('name', String(36), nullable=False))
+    Table('quiz', metadata,
+          Column('id', String(36), primary_key=True),
+          Column('title', String(56), nullable=False),
+          Column('description', Text),
+          Column('category_id', String(36), ForeignKey('category.id'), nullable=False),
+          Column('image_url', String(500)))
+    Table('questions', metadata,
+          Column('id', String(36), primary_key=True),
+          Column('question_type', Enum('SINGLE', 'MULTIPLE', 'TEXT_ANSWER', name='questiontype'), nullable=False),
+          Column('quiz_id', String(36), ForeignKey('quiz.id'), nullable=False),
+          Column('points', Integer, nullable=False),
+          Column('question', Text),
+          Column('image_url', String(500)))
+    Table('options', metadata,
+          Column('id', String(36), primary_key=True),
+          Column('question_id', String(36), ForeignKey('questions.id')),
+          Column('name', String(100), nullable=False),
+          Column('is_correct', Boolean))
+    Table('user_answer', metadata,
+          Column('id', String(36), primary_key=True),
+          Column('user_id', String(36), ForeignKey('users.id')),
+          Column('question_id', String(36), ForeignKey('questions.id')),
+          Column('text_answer', Text),
+          Column('option_id', String(36), ForeignKey('options.id')))
+    Table('test_result', metadata,
+          Column('id', String(36), primary_key=True),
+          Column('user_id', String(36), ForeignKey('users.id')),
+          Column('score', Integer),
+          Column('completed_at', DateTime(timezone=True), server_default=func.now(), nullable=False))
+    return metadata
+
+
+def seed_baseline(engine) -> dict:
+    metadata = baseline_metadata()
+    metadata.create_all(engine)
+    t = metadata.tables
+    ids = {'user': str(uuid4()), 'category': uuid4().hex, 'quiz': str(uuid4()),
+           'question': str(uuid4()), 'option': str(uuid4()), 'result': str(uuid4())}
+    with engine.begin() as connection:
+        connection.execute(t['users'].insert(), {'id': ids['user'], 'login': 'old', 'password': 'p', 'score': 10})
+        connection.execute(t['category'].insert(), {'id': ids['category'], 'name': 'Old'})
+        connection.execute(t['quiz'].insert(), {'id': ids['quiz'], 'title': 'Old', 'category_id': ids['category']})
+        connection.execute(t['questions'].insert(), {'id': ids['question'], 'question_type': 'SINGLE',
+                                                      'quiz_id': ids['quiz'], 'points': 10})
+        connection.execute(t['options'].insert(), {'id': ids['option'], 'question_id': ids['question'],
+                                                    'name': 'a', 'is_correct': True})
+        connection.execute(t['user_answer'].insert(), {'id': str(uuid4()), 'user_id': ids['user'],
+                                                        'question_id': ids['question'], 'option_id': ids['option']})
+        connection.execute(t['test_result'].insert(), {'id': ids['result'], 'user_id': ids['user'], 'score': 10})
+    return ids
+
+
+def describe(engine) -> dict:
+    inspector = inspect(engine)
+    # В SQLite миграции не меняют типы колонок (0007) и ON DELETE внешних ключей (0009),
+    # а длина строк там не проверяется
+    strict = engine.dialect.name != 'sqlite'
+    schema = {}
+    for table in inspector.get_table_names():
+        schema[table] = {
+            'columns': {
+                column['name']: (str(column['type']) if strict else None, column['nullable'])
+                for column in inspector.get_columns(table)
+            },
+            'foreign_keys': sorted(
+                (tuple(key['constrained_columns']), key['referred_table'],
+                 (key['options'] or {}).get('ondelete') if strict else None)
+                for key in inspector.get_foreign_keys(table)
+            ),
+            'indexes': sorted(index['name'] for index in inspector.get_indexes(table)),
+        }
+    return schema
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def make_engine(request, tmp_path):
+    """
+    Фабрика движков для пустых баз выбранного диалекта
+    """
+    if request.param == 'postgresql':
+        return request.getfixturevalue('make_postgres_engine')
+    return lambda: create_engine(f"sqlite:///{tmp_path / f'{uuid4().hex}.db'}")
+
+
+def test_upgrade_of_baseline_matches_fresh_schema(make_engine):
+    upgraded = make_engine()
+    ids = seed_baseline(upgraded)
+    applied = migrations.upgrade(upgraded)
+    fresh = make_engine()
+    assert migrations.create_schema(fresh, Base.metadata)
+
+    assert applied == [name for _, name in migrations.discover()]
+    assert describe(upgraded) == describe(fresh)
+
+    with upgraded.connect() as connection:
+        activity = connection.exec_driver_sql('SELECT tests_count, score_sum FROM user_activity_daily').fetchall()
+        quiz_id = connection.exec_driver_sql('SELECT id FROM quiz').scalar()
+    assert [tuple(row) for row in activity] == [(1, 10)]
+    assert str(quiz_id) == ids['quiz']
+
+    if upgraded.dialect.name == 'postgresql':
+        # Викторины, созданные до quiz_search, находятся поиском без flask rebuild-search
+        with upgraded.connect() as connection:
+            found = connection.exec_driver_sql(
+                "SELECT quiz_id FROM quiz_search WHERE document @@ to_tsquery('simple', 'old')"
+            ).scalars().all()
+        assert [str(quiz_id) for quiz_id in found] == [ids['quiz']]
+
+
+def test_create_schema_marks_migrations_applied(make_engine):
+    engine = make_engine()
+
+    assert migrations.create_schema(engine, Base.metadata)
+    assert not migrations.create_schema(engine, Base.metadata)
+    assert migrations.pending(engine) == []
+    assert migrations.upgrade(engine) == []
+
+
+def test_migrations_are_idempotent(make_engine):
+    engine = make_engine()
+    seed_baseline(engine)
+    migrations.upgrade(engine)
+    schema = describe(engine)
+
+    # Повторный запуск каждой миграции (например, после сбоя между DDL и записью версии) ничего не меняет
+    for _, name in migrations.discover():
+        module = importlib.import_module(f'migrations.versions.{name}')
+        with engine.begin() as connection:
+            module.upgrade(connection)
+    assert describe(engine) == schema
+
+
+def test_filter_columns_are_indexed(make_engine):
+    engine = make_engine()
+    seed_baseline(engine)
+    migrations.upgrade(engine)
+    inspector = inspect(engine)
+
+    def leading_columns(table: str) -> set:
+        return {index['column_names'][0] for index in inspector.get_indexes(table)} | \
+               set(inspector.get_pk_constraint(table)['constrained_columns'][:1])
+
+    assert {'category_id', 'title', 'updated_at'} <= leading_columns('quiz')
+    assert 'quiz_id' in leading_columns('questions')
+    assert 'question_id' in leading_columns('options')
+    assert {'user_id', 'question_id', 'option_id', 'test_result_id'} <= leading_columns('user_answer')
+    assert {'user_id', 'quiz_id'} <= leading_columns('test_result')
+    assert 'test_result_id' in leading_columns('attempt_answer')
+
+
+def test_answers_of_attempts_move_to_attempt_answer(make_engine):
+    engine = make_engine()
+    ids = seed_baseline(engine)
+    # Состояние после 0005: у ответов появилась ссылка на попытку
+    names = [name for _, name in migrations.discover()]
+    for name in names[:names.index('0005_add_user_answer_test_result_id') + 1]:
+        with engine.begin() as connection:
+            importlib.import_module(f'migrations.versions.{name}').upgrade(connection)
+    metadata = MetaData()
+    user_answer = Table('user_answer', metadata, autoload_with=engine)
+    options = Table('options', metadata, autoload_with=engine)
+    second = str(uuid4())
+    with engine.begin() as connection:
+        connection.execute(options.insert(), {'id': second, 'question_id': ids['question'], 'name': 'b'})
+        connection.execute(user_answer.insert(), [
+            {'id': str(uuid4()), 'user_id': ids['user'], 'question_id': ids['question'],
+             'option_id': option_id, 'test_result_id': ids['result']}
+            for option_id in (ids['option'], second)
+        ])
+
+    migrations.upgrade(engine)
+
+    with Session(bind=engine) as session:
+        stored = session.query(AttemptAnswer.test_result_id, AttemptAnswer.question_id, AttemptAnswer.option_ids).all()
+        assert [(str(result_id), str(question_id), sorted(option_ids)) for result_id, question_id, option_ids in stored] \
+            == [(ids['result'], ids['question'], sorted([ids['option'], second]))]
+        # Ответ без попытки остается в user_answer
+        assert session.query(UserAnswer).count() == 1
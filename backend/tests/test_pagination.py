@@ -0,0 +1,71 @@
+"""
+Пагинация списка викторин по курсору и кэш количества
+"""
+import pytest
+from quiz.pagination import decode_cursor, encode_cursor
+
+
+def page(client, user, **params) -> dict:
+    response = client.get('/api/quiz/quizes', query_string=params, headers=user['headers'])
+    assert response.status_code == 200, response.data
+    return response.json
+
+
+def ids(data: dict) -> list:
+    return [quiz['id'] for quiz in data['quizes']]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('01900000-0000-7000-8000-000000000001', 'prev')
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == ('01900000-0000-7000-8000-000000000001', 'prev')
+
+
+@pytest.mark.parametrize('cursor', ['!!!', encode_cursor('x', 'sideways'), 'eyJrIjoxLCJkIjoibmV4dCJ9'])
+def test_invalid_cursor(client, user, cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+    assert client.get('/api/quiz/quizes', query_string={'cursor': cursor},
+                      headers=user['headers']).status_code == 400
+
+
+def test_pages_forward_and_back(client, user, category, make_quiz):
+    created = sorted(make_quiz(1, title=f'Страница {i}')['id'] for i in range(5))
+
+    first = page(client, user, category_id=category, limit=2)
+    second = page(client, user, category_id=category, limit=2, cursor=first['next_cursor'])
+    third = page(client, user, category_id=category, limit=2, cursor=second['next_cursor'])
+
+    assert ids(first) + ids(second) + ids(third) == created
+    assert first['prev_cursor'] is None and third['next_cursor'] is None
+    assert first['total_count'] == third['total_count'] == 5
+    assert ids(page(client, user, category_id=category, limit=2, cursor=third['prev_cursor'])) == ids(second)
+    assert ids(page(client, user, category_id=category, limit=2, cursor=second['prev_cursor'])) == ids(first)
+    # Старый режим skip/limit
+    assert ids(page(client, user, category_id=category, limit=2, skip=2)) == ids(second)
+
+
+def test_title_prefix_is_escaped(client, user, category, make_quiz):
+    match = make_quiz(1, title='100% верно')['id']
+    make_quiz(1, title='100 вопросов')
+
+    assert ids(page(client, user, category_id=category, title='100%')) == [match]
+    assert ids(page(client, user, category_id=category, title='_')) == []
+
+
+def counts(statements: list) -> list:
+    return [statement for statement in statements if 'count(quiz.id)' in statement.lower()]
+
+
+def test_count_is_cached_until_quiz_write(client, user, category, make_quiz, count_queries):
+    make_quiz(1)
+    with count_queries() as statements:
+        assert page(client, user, category_id=category)['total_count'] == 1
+    assert len(counts(statements)) == 1
+
+    with count_queries() as statements:
+        assert page(client, user, category_id=category)['total_count'] == 1
+    assert counts(statements) == []
+
+    make_quiz(1)
+    assert page(client, user, category_id=category)['total_count'] == 2
@@ -0,0 +1,108 @@
+"""
+Удаление викторин: пометка скрывает викторину сразу, очистка удаляет вопросы,
+варианты и ответы пачками, оставляя результаты в журнале баллов; архив и восстановление
+"""
+import pytest
+from config import Config
+from models import SessionLocal, Quiz, Question, Options, AttemptAnswer, TestResult as ResultRow
+from quiz.purge import purge_pending, purge_quiz
+
+
+@pytest.fixture
+def deferred_purge(monkeypatch):
+    """
+    Фоновая очистка не запускается: викторина остается помеченной до явного вызова
+    """
+    monkeypatch.setattr('quiz.quiz.purge_queue.submit', lambda *args: False)
+
+
+def quiz_state(quiz_id: str):
+    session = SessionLocal()
+    try:
+        quiz = session.query(Quiz).filter_by(id=quiz_id).first()
+        return None if quiz is None else (quiz.deleted_at is not None, quiz.archived)
+    finally:
+        session.close()
+
+
+def quiz_ids(client, user) -> set:
+    return {quiz['id'] for quiz in client.get('/api/quiz/quizes?limit=500', headers=user['headers']).json['quizes']}
+
+
+def submit(client, user, quiz):
+    return client.post('/api/quiz/submit-answers', json={'quiz_id': quiz['id'], 'answers': quiz['answers']},
+                       headers=user['headers'])
+
+
+def rows(quiz_id: str, result_ids: list) -> dict:
+    session = SessionLocal()
+    try:
+        question_ids = session.query(Question.id).filter(Question.quiz_id == quiz_id)
+        return {
+            'questions': question_ids.count(),
+            'options': session.query(Options).filter(Options.question_id.in_(question_ids)).count(),
+            'attempt_answer': session.query(AttemptAnswer).filter(AttemptAnswer.test_result_id.in_(result_ids)).count(),
+            'test_result': session.query(ResultRow).filter(ResultRow.id.in_(result_ids)).count(),
+        }
+    finally:
+        session.close()
+
+
+def test_deleted_quiz_is_hidden_then_purged(monkeypatch, client, user, make_quiz, deferred_purge):
+    monkeypatch.setattr(Config, 'SUBMISSION_WRITE_BEHIND', False)
+    quiz = make_quiz(3)
+    result_ids = [submit(client, user, quiz).json['test_result_id'] for _ in range(5)]
+    url = f"/api/quiz/quizes/{quiz['id']}"
+
+    assert client.delete(url, headers=user['headers']).json['purge'] == 'deferred'
+    assert client.get(url, headers=user['headers']).status_code == 404
+    assert quiz['id'] not in quiz_ids(client, user)
+    assert submit(client, user, quiz).status_code == 404
+    assert rows(quiz['id'], result_ids)['questions'] == 3
+
+    session = SessionLocal()
+    try:
+        # Пачки по два ответа: три вопроса на попытку не помещаются в одну пачку
+        counts = purge_quiz(session, quiz['id'], batch_size=4, pause=0)
+        assert session.query(Quiz).filter_by(id=quiz['id']).first() is None
+    finally:
+        session.close()
+    assert counts['attempt_answer'] == 15 and counts['options'] == 6 and counts['questions'] == 3
+    # Результаты тестов остаются в журнале баллов
+    assert rows(quiz['id'], result_ids) == {'questions': 0, 'options': 0, 'attempt_answer': 0, 'test_result': 5}
+
+
+def test_archive_restore_and_pending_purge(client, user, make_quiz, deferred_purge):
+    archived, deleted = make_quiz(1), make_quiz(1)
+    archived_url = f"/api/quiz/quizes/{archived['id']}"
+
+    assert client.delete(f'{archived_url}?archive=true', headers=user['headers']).json['purge'] == 'archived'
+    assert client.delete(f"/api/quiz/quizes/{deleted['id']}", headers=user['headers']).status_code == 200
+    assert not {archived['id'], deleted['id']} & quiz_ids(client, user)
+
+    # Очистка удаляет только помеченные к удалению, архивные остаются
+    session = SessionLocal()
+    try:
+        assert purge_pending(session) >= 1
+    finally:
+        session.close()
+    assert quiz_state(deleted['id']) is None
+    assert quiz_state(archived['id']) == (True, True)
+
+    assert client.post(f'{archived_url}/restore', headers=user['headers']).status_code == 200
+    assert quiz_state(archived['id']) == (False, False)
+    assert archived['id'] in quiz_ids(client, user)
+    assert client.get(archived_url, headers=user['headers']).json['title'] == archived['title']
+
+
+def test_deleted_quiz_is_not_archived(client, user, make_quiz, deferred_purge):
+    quiz = make_quiz(1)
+    url = f"/api/quiz/quizes/{quiz['id']}"
+
+    response = client.delete(url, headers=user['headers'])
+    assert response.status_code == 200
+    assert response.json['purge'] == 'deferred'
+
+    assert client.delete(f'{url}?archive=true', headers=user['headers']).status_code == 404
+    assert quiz_state(quiz['id']) == (True, False)
+    assert client.post(f'{url}/restore', headers=user['headers']).status_code == 404
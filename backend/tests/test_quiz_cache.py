@@ -0,0 +1,103 @@
+"""
+Кэш сериализованных викторин: LRU и TTL локального бэкенда, общий бэкенд
+для нескольких воркеров, счетчики; правка из другого воркера (версия в базе
+меняется без инвалидации кэша этого процесса) сразу видна в ответе
+"""
+from types import SimpleNamespace
+from sqlalchemy import func, update
+from models import SessionLocal, Quiz
+from quiz.cache import FakeRedisClient, LocalCacheBackend, QuizCache, SharedCacheBackend, create_quiz_cache
+
+
+def test_local_backend_evicts_by_size_and_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('quiz.cache.time', SimpleNamespace(monotonic=lambda: now[0]))
+    backend = LocalCacheBackend(max_size=2, ttl=10)
+    backend.set('a', b'1')
+    backend.set('b', b'2')
+    assert backend.get('a') == b'1'
+    # Самая давно использованная запись - b
+    backend.set('c', b'3')
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == (b'1', None, b'3')
+
+    now[0] += 11
+    assert backend.get('a') is None
+    assert backend.evictions == 2
+
+
+def test_read_through_counts_hits_and_misses():
+    cache = QuizCache(LocalCacheBackend())
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {'id': 'quiz', 'title': 'Викторина'}
+
+    first = cache.get_or_load('quiz', 1, loader)
+    assert cache.get_or_load('quiz', 1, loader) == first
+    assert cache.get_or_load('quiz', 2, loader) == first
+    assert cache.get_or_load('missing', 1, lambda: None) is None
+    assert len(loads) == 2
+    assert cache.stats() == {'backend': 'LocalCacheBackend', 'hits': 1, 'misses': 3, 'evictions': 0}
+
+
+def test_shared_backend_is_seen_by_every_worker():
+    client = FakeRedisClient()
+    workers = [QuizCache(SharedCacheBackend(client)) for _ in range(2)]
+
+    workers[0].get_or_load('quiz', 1, lambda: {'title': 'Общая'})
+    assert workers[1].get_or_load('quiz', 1, lambda: None) == '{"title": "Общая"}'.encode()
+    assert workers[1].hits == 1
+
+
+def test_backend_is_chosen_by_config():
+    config = SimpleNamespace(QUIZ_CACHE_BACKEND='fake', QUIZ_CACHE_URL='', QUIZ_CACHE_SIZE=10,
+                             QUIZ_CACHE_TTL=30, QUIZ_COUNT_TTL=5)
+    assert isinstance(create_quiz_cache(config).backend, SharedCacheBackend)
+    config.QUIZ_CACHE_BACKEND = 'local'
+    backend = create_quiz_cache(config).backend
+    assert isinstance(backend, LocalCacheBackend) and (backend.max_size, backend.ttl) == (10, 30)
+
+
+def change_in_other_worker(quiz_id: str, **values):
+    session = SessionLocal()
+    try:
+        session.execute(update(Quiz).where(Quiz.id == quiz_id).values(version=Quiz.version + 1, **values))
+        session.commit()
+    finally:
+        session.close()
+
+
+def test_edit_from_other_worker_is_served(client, user, make_quiz):
+    quiz = make_quiz(1, title='До правки')
+
+    change_in_other_worker(quiz['id'], title='После правки')
+    response = client.get(f"/api/quiz/quizes/{quiz['id']}", headers=user['headers'])
+
+    assert response.status_code == 200
+    assert response.json['title'] == 'После правки'
+    assert response.json['version'] == quiz['version'] + 1
+
+
+def test_delete_from_other_worker_is_served(client, user, make_quiz):
+    quiz = make_quiz(1)
+
+    change_in_other_worker(quiz['id'], deleted_at=func.now())
+    response = client.get(f"/api/quiz/quizes/{quiz['id']}", headers=user['headers'])
+
+    assert response.status_code == 404
+
+
+def test_api_write_is_served_and_counted(client, user, make_quiz):
+    quiz = make_quiz(1, title='До правки')
+    url = f"/api/quiz/quizes/{quiz['id']}"
+    before = client.get('/api/quiz/cache-stats', headers=user['headers']).json
+
+    client.get(url, headers=user['headers'])
+    response = client.put(url, json={'title': 'После правки'}, headers=user['headers'])
+    assert response.status_code == 200
+    assert client.get(url, headers=user['headers']).json['title'] == 'После правки'
+
+    after = client.get('/api/quiz/cache-stats', headers=user['headers']).json
+    # make_quiz уже прочитала викторину: первый GET - попадание, GET после правки - промах
+    assert (after['hits'] - before['hits'], after['misses'] - before['misses']) == (1, 1)
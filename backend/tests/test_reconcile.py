@@ -0,0 +1,134 @@
+"""
+Обновление викторины сверкой: разница считается в памяти, изменения применяются
+пакетно (число запросов не зависит от размера викторины), PATCH требует версию
+и возвращает 409, если викторину уже изменили
+"""
+import pytest
+from models import SessionLocal
+from quiz.reconcile import QuizState, VersionConflict, apply_quiz_changes, diff_quiz, load_quiz_state
+
+
+@pytest.fixture
+def state():
+    return QuizState(
+        {'id': 'quiz', 'title': 'Викторина', 'description': 'Описание', 'category_id': 'category', 'version': 3},
+        {
+            'q1': {'id': 'q1', 'question_type': 'SINGLE', 'points': 10, 'question': 'Первый', 'image_url': None},
+            'q2': {'id': 'q2', 'question_type': 'SINGLE', 'points': 10, 'question': 'Второй', 'image_url': None},
+        },
+        {
+            'o1': {'id': 'o1', 'question_id': 'q1', 'name': 'да', 'is_correct': True},
+            'o2': {'id': 'o2', 'question_id': 'q1', 'name': 'нет', 'is_correct': False},
+            'o3': {'id': 'o3', 'question_id': 'q2', 'name': 'да', 'is_correct': True},
+        }
+    )
+
+
+def test_diff_contains_only_changed_fields(state):
+    changes = diff_quiz(state, {
+        'title': 'Викторина',
+        'description': 'Новое описание',
+        'questions': [
+            {'id': 'q1', 'question': 'Первый', 'points': 20, 'options': [
+                {'id': 'o1', 'name': 'да', 'is_correct': True},
+                {'id': 'o2', 'name': 'нет', 'is_correct': True},
+                {'name': 'может быть'},
+            ], 'delete_options': ['o3']},
+            {'question_type': 'TEXT_ANSWER', 'question': 'Новый', 'points': 5, 'options': [{'name': 'ответ'}]},
+            # ID другой викторины пропускается
+            {'id': 'other', 'question': 'Чужой'},
+        ]
+    })
+
+    assert changes.quiz == {'description': 'Новое описание'}
+    assert changes.question_updates == [{'id': 'q1', 'points': 20}]
+    assert changes.option_updates == [{'id': 'o2', 'is_correct': True}]
+    # Вариант другого вопроса не удаляется через delete_options этого
+    assert changes.option_deletes == []
+    assert [row['question'] for row in changes.inserts.questions] == ['Новый']
+    assert sorted(row['name'] for row in changes.inserts.options) == ['может быть', 'ответ']
+
+
+def test_deleted_question_takes_its_options(state):
+    changes = diff_quiz(state, {
+        'questions': [{'id': 'q2', 'points': 30, 'options': [{'id': 'o3', 'name': 'нет'}, {'name': 'новый'}]}],
+        'delete_questions': ['q2', 'missing']
+    })
+
+    assert changes.question_deletes == ['q2'] and changes.option_deletes == ['o3']
+    assert not changes.question_updates and not changes.option_updates and not changes.inserts.options
+
+
+def test_put_keeps_empty_fields_and_patch_applies_them(state):
+    assert not diff_quiz(state, {'title': '', 'description': ''})
+    assert diff_quiz(state, {'description': ''}, partial=True).quiz == {'description': ''}
+    with pytest.raises(ValueError):
+        diff_quiz(state, {'title': ''}, partial=True)
+    with pytest.raises(ValueError):
+        diff_quiz(state, {'questions': [{'question': 'Без типа'}]})
+
+
+@pytest.mark.parametrize('questions_count', [2, 20])
+def test_update_query_count_does_not_depend_on_size(client, user, make_quiz, count_queries, questions_count):
+    quiz = make_quiz(questions_count)
+    payload = {'title': 'Правка', 'questions': [{
+        'id': question['id'],
+        'points': 20,
+        'options': [{'id': option['id'], 'name': f"{option['name']}!"} for option in question['options']],
+        'delete_options': [question['options'][1]['id']]
+    } for question in quiz['questions']] + [{'question_type': 'SINGLE', 'question': 'Новый', 'points': 1,
+                                             'options': [{'name': 'a', 'is_correct': True}]}]}
+
+    with count_queries() as statements:
+        response = client.put(f"/api/quiz/quizes/{quiz['id']}", json=payload, headers=user['headers'])
+
+    assert response.status_code == 200, response.data
+    assert response.json['changes'] == {
+        'quiz_fields': 1, 'questions_added': 1, 'questions_updated': questions_count, 'questions_deleted': 0,
+        'options_added': 1, 'options_updated': questions_count, 'options_deleted': questions_count
+    }
+    writes = [s for s in statements if s.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))]
+    # UPDATE викторины, вопросов и вариантов, DELETE вариантов, INSERT вопроса и варианта
+    assert len(writes) == 6
+    updated = client.get(f"/api/quiz/quizes/{quiz['id']}", headers=user['headers']).json
+    assert updated['version'] == 2 and len(updated['questions']) == questions_count + 1
+    assert all(question['points'] == 20 and len(question['options']) == 1
+               for question in updated['questions'][:questions_count])
+
+
+def test_patch_requires_current_version(client, user, make_quiz):
+    quiz = make_quiz(1)
+    url = f"/api/quiz/quizes/{quiz['id']}"
+
+    assert client.patch(url, json={'title': 'Без версии'}, headers=user['headers']).status_code == 428
+    assert client.patch(url, json={'title': 'x', 'version': 'abc'}, headers=user['headers']).status_code == 400
+
+    response = client.patch(url, json={'description': ''}, headers={**user['headers'], 'If-Match': '"1"'})
+    assert response.status_code == 200 and response.json['version'] == 2
+
+    # Второй клиент работал с версией 1
+    stale = client.patch(url, json={'title': 'Опоздал', 'version': 1}, headers=user['headers'])
+    assert stale.status_code == 409 and stale.json['version'] == 2
+    assert client.put(url, json={'title': 'Опоздал', 'version': 1}, headers=user['headers']).status_code == 409
+
+    current = client.get(url, headers=user['headers']).json
+    assert current['title'] == 'Викторина' and current['description'] == ''
+
+
+def test_write_between_load_and_apply_is_a_conflict(make_quiz):
+    quiz = make_quiz(1)
+    session = SessionLocal()
+    other = SessionLocal()
+    try:
+        state = load_quiz_state(session, quiz['id'])
+        changes = diff_quiz(state, {'title': 'Первый'})
+        apply_quiz_changes(other, quiz['id'], diff_quiz(state, {'title': 'Второй'}), state.quiz['version'])
+        other.commit()
+
+        with pytest.raises(VersionConflict) as conflict:
+            apply_quiz_changes(session, quiz['id'], changes, state.quiz['version'])
+        assert conflict.value.current_version == 2
+    finally:
+        session.rollback()
+        session.close()
+        other.close()
@@ -0,0 +1,106 @@
+"""
+Учет баллов при одновременных отправках: счет пользователя и дневные итоги
+активности должны совпадать с суммой по журналу результатов (test_result)
+"""
+import threading
+import time
+import pytest
+from sqlalchemy import func, update
+from app import app
+from config import Config
+from models import SessionLocal, User, UserActivityDaily, TestResult as ResultRow
+from quiz.ledger import score_drift
+from quiz.submissions import get_submission_writer
+
+THREADS = 8
+SUBMISSIONS_PER_THREAD = 20
+
+
+def wait_for_journal(timeout: float = 30):
+    """
+    Дожидается, пока журнал отложенных отправок опустеет: часть пачек может
+    сохранять фоновый поток писателя, а flush забирает только свободные записи
+    """
+    writer = get_submission_writer()
+    deadline = time.monotonic() + timeout
+    while writer.journal.stats()['queued'] and time.monotonic() < deadline:
+        writer.flush()
+        time.sleep(0.05)
+    return writer.journal.stats()
+
+
+@pytest.fixture
+def quiz(make_quiz):
+    return make_quiz(3, title='Конкурентные отправки')
+
+
+@pytest.mark.parametrize('write_behind', [False, True], ids=['sync', 'write-behind'])
+def test_concurrent_submissions_keep_score_and_rollups(monkeypatch, user, quiz, write_behind):
+    monkeypatch.setattr(Config, 'SUBMISSION_WRITE_BEHIND', write_behind)
+    errors = []
+
+    def submit():
+        client = app.test_client()
+        for _ in range(SUBMISSIONS_PER_THREAD):
+            response = client.post(
+                '/api/quiz/submit-answers',
+                json={'quiz_id': quiz['id'], 'answers': quiz['answers']},
+                headers=user['headers']
+            )
+            if response.status_code not in (201, 202):
+                errors.append((response.status_code, response.data))
+
+    threads = [threading.Thread(target=submit) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    if write_behind:
+        journal = wait_for_journal()
+        assert journal['queued'] == 0 and journal['failed'] == 0
+
+    session = SessionLocal()
+    try:
+        results_count, results_sum = session.query(
+            func.count(ResultRow.id), func.coalesce(func.sum(ResultRow.score), 0)
+        ).filter(ResultRow.user_id == user['id']).one()
+        rollup_count, rollup_sum = session.query(
+            func.coalesce(func.sum(UserActivityDaily.tests_count), 0),
+            func.coalesce(func.sum(UserActivityDaily.score_sum), 0)
+        ).filter(UserActivityDaily.user_id == user['id']).one()
+        score = session.query(User.score).filter(User.id == user['id']).scalar()
+
+        assert results_count == THREADS * SUBMISSIONS_PER_THREAD
+        assert results_sum == THREADS * SUBMISSIONS_PER_THREAD * 30
+        assert score == results_sum
+        assert (rollup_count, rollup_sum) == (results_count, results_sum)
+        assert score_drift(session, [user['id']]) == []
+    finally:
+        session.close()
+
+
+def test_rebuild_scores_restores_ledger_total(monkeypatch, client, user, quiz):
+    monkeypatch.setattr(Config, 'SUBMISSION_WRITE_BEHIND', False)
+    for _ in range(2):
+        response = client.post('/api/quiz/submit-answers', json={'quiz_id': quiz['id'], 'answers': quiz['answers']},
+                               headers=user['headers'])
+        assert response.status_code == 201
+    session = SessionLocal()
+    session.execute(update(User).where(User.id == user['id']).values(score=7))
+    session.commit()
+    assert score_drift(session, [user['id']]) == [{'user_id': user['id'], 'score': 7, 'ledger': 60}]
+    session.close()
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['rebuild-scores', '--dry-run'])
+    assert f"{user['id']}: 7 -> 60" in result.output
+    result = runner.invoke(args=['rebuild-scores'])
+    assert result.exit_code == 0, result.output
+
+    session = SessionLocal()
+    try:
+        assert session.query(User.score).filter(User.id == user['id']).scalar() == 60
+        assert score_drift(session, [user['id']]) == []
+    finally:
+        session.close()
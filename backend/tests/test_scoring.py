@@ -0,0 +1,103 @@
+"""
+Проверка ответов по скомпилированному ключу: режимы exact/partial для MULTIPLE,
+normalized/fuzzy для TEXT_ANSWER
+"""
+from types import SimpleNamespace
+import pytest
+from models import QuestionType
+from quiz.scoring import Grader, compile_answer_key, normalize_text
+
+
+def option(option_id: str, name: str, is_correct: bool = False):
+    return SimpleNamespace(id=option_id, name=name, is_correct=is_correct)
+
+
+@pytest.fixture
+def key():
+    quiz = SimpleNamespace(id='quiz', category_id='category', questions=[
+        SimpleNamespace(id='single', question_type=QuestionType.SINGLE, points=10,
+                        options=[option('s1', 'да', True), option('s2', 'нет')]),
+        SimpleNamespace(id='multiple', question_type=QuestionType.MULTIPLE, points=30,
+                        options=[option('m1', 'a', True), option('m2', 'b', True), option('m3', 'c', True),
+                                 option('m4', 'd')]),
+        SimpleNamespace(id='text', question_type=QuestionType.TEXT_ANSWER, points=5,
+                        options=[option('t1', 'Санкт-Петербург', True), option('t2', 'Ёлка', True)]),
+    ])
+    return compile_answer_key(quiz)
+
+
+def grade(grader: Grader, key, **answers) -> list:
+    result = grader.grade(key, [
+        {'question_id': question_id, 'text_answer': answer} if question_id == 'text'
+        else {'question_id': question_id, 'option_ids': answer}
+        for question_id, answer in answers.items()
+    ])
+    return [question['score'] for question in result.questions]
+
+
+def test_compiled_key(key):
+    assert key.max_score == 45 and key.category_id == 'category'
+    assert key.questions['multiple'].correct == {'m1', 'm2', 'm3'}
+    assert key.questions['multiple'].options == {'m1', 'm2', 'm3', 'm4'}
+    # Названия верных вариантов TEXT_ANSWER - это ответы, выбирать их нельзя
+    assert key.questions['text'].options == frozenset()
+    assert set(key.questions['text'].text_answers) == {'санкт петербург', 'елка'}
+
+
+def test_exact_mode(key):
+    grader = Grader('exact')
+    assert grade(grader, key, single=['s1'], multiple=['m3', 'm1', 'm2']) == [10, 30]
+    assert grade(grader, key, single=['s1', 's2'], multiple=['m1', 'm2']) == [0, 0]
+    assert grade(grader, key, single=[], multiple=None) == [0, 0]
+
+
+def test_partial_mode(key):
+    grader = Grader('partial')
+    assert grade(grader, key, multiple=['m1', 'm2']) == [20]
+    # Неверный вариант отменяет один верный
+    assert grade(grader, key, multiple=['m1', 'm2', 'm4']) == [10]
+    assert grade(grader, key, multiple=['m1', 'm4', 'm4']) == [0]
+    # SINGLE проверяется целиком и в этом режиме
+    assert grade(grader, key, single=['s1', 's2']) == [0]
+
+
+def test_normalized_text(key):
+    grader = Grader(text_mode='normalized')
+    assert grade(grader, key, text='  санкт петербург!! ') == [5]
+    assert grade(grader, key, text='елка') == [5]
+    assert grade(grader, key, text='Санкт-Питербург') == [0]
+    assert grade(grader, key, text=None) == [0]
+
+
+def test_fuzzy_text(key):
+    grader = Grader(text_mode='fuzzy', fuzzy_threshold=0.85)
+    assert grade(grader, key, text='Санкт-Питербург') == [5]
+    assert grade(grader, key, text='Москва') == [0]
+
+
+def test_duplicate_and_foreign_answers_are_ignored(key):
+    result = Grader().grade(key, [
+        {'question_id': 'single', 'option_ids': ['s1']},
+        {'question_id': 'single', 'option_ids': ['s1']},
+        {'question_id': 'other', 'option_ids': ['s1']},
+    ])
+    assert result.total_score == 10 and result.max_score == 45
+    assert [question['question_id'] for question in result.questions] == ['single']
+
+
+def test_normalize_text():
+    assert normalize_text('  Ёж,  ЁЛКА!  ') == 'еж елка'
+    assert normalize_text(None) == ''
+
+
+def test_client_score_is_ignored(client, user, make_quiz):
+    quiz = make_quiz(2)
+    answers = [quiz['answers'][0], {'question_id': quiz['questions'][1]['id'], 'option_ids': []}]
+
+    response = client.post('/api/quiz/submit-answers', json={
+        'quiz_id': quiz['id'], 'answers': answers, 'total_score': 1000
+    }, headers=user['headers'])
+
+    assert response.status_code == 201, response.data
+    assert response.json['total_score'] == 10 and response.json['max_score'] == 20
+    assert response.json['updated_score'] == 10
@@ -0,0 +1,106 @@
+"""
+Поиск викторин: индекс в памяти (SQLite) через API и документы quiz_search
+в Postgres (если задан TEST_POSTGRES_URL)
+"""
+import time
+from uuid import uuid4
+import pytest
+from sqlalchemy.orm import Session
+import migrations
+from models import SessionLocal, Base, Category, Quiz, Question, Options, QuestionType
+from quiz.search import QuizSearchService, document_terms, refresh_documents
+
+
+def search(client, user, query: str, **params) -> list:
+    response = client.get('/api/quiz/search', query_string={'q': query, **params}, headers=user['headers'])
+    assert response.status_code == 200, response.data
+    return [item['id'] for item in response.json['results']]
+
+
+@pytest.fixture
+def quizzes(make_quiz):
+    word = f'слово{uuid4().hex[:6]}'
+    python = make_quiz(questions=[{'question_type': 'SINGLE', 'question': f'Что такое {word}?', 'points': 1,
+                                   'options': [{'name': 'кортеж', 'is_correct': True}, {'name': 'список'}]}],
+                       title=f'Основы Python {word}')
+    history = make_quiz(1, title=f'История {word}')
+    return word, python, history
+
+
+def test_search_words_prefixes_and_typos(client, user, quizzes):
+    word, python, history = quizzes
+
+    assert set(search(client, user, word)) == {python['id'], history['id']}
+    assert search(client, user, f'{word} кортеж') == [python['id']]
+    assert search(client, user, f'{word} pyth') == [python['id']]
+    assert search(client, user, f'{word} pyhton') == [python['id']]
+    assert search(client, user, f'{word} кортеж история') == []
+
+
+def test_search_follows_edits_and_deletes(client, user, quizzes):
+    word, python, history = quizzes
+
+    response = client.put(f"/api/quiz/quizes/{history['id']}", json={'title': f'Python и история {word}'},
+                          headers=user['headers'])
+    assert response.status_code == 200
+    assert set(search(client, user, f'{word} python')) == {python['id'], history['id']}
+
+    assert client.delete(f"/api/quiz/quizes/{python['id']}", headers=user['headers']).status_code == 200
+    assert search(client, user, f'{word} python') == [history['id']]
+
+
+def test_search_filters_by_category(client, user, quizzes, category):
+    word, python, history = quizzes
+    session = SessionLocal()
+    other = Category(id=str(uuid4()), name='Другая')
+    session.add(other)
+    session.commit()
+    other_id = other.id
+    session.close()
+    response = client.post('/api/quiz/quizes', json={'title': f'Python в другой категории {word}', 'category_id': other_id,
+                                                     'questions': []}, headers=user['headers'])
+    assert response.status_code == 201, response.data
+
+    assert len(search(client, user, word)) == 3
+    assert set(search(client, user, word, category_id=category)) == {python['id'], history['id']}
+    assert search(client, user, f'{word} python', category_id=other_id) == [response.json['id']]
+
+
+@pytest.fixture
+def pg_session(make_postgres_engine):
+    engine = make_postgres_engine()
+    migrations.create_schema(engine, Base.metadata)
+    session = Session(bind=engine)
+    category = Category(id=str(uuid4()), name='Тесты')
+    session.add(category)
+    session.commit()
+    session.info['category_id'] = category.id
+    yield session
+    session.close()
+
+
+def add_quiz(session, title: str, option: str) -> str:
+    quiz = Quiz(title=title, category_id=session.info['category_id'])
+    quiz.questions = [Question(question_type=QuestionType.SINGLE, question='Вопрос', points=1,
+                               options=[Options(name=option, is_correct=True)])]
+    session.add(quiz)
+    session.commit()
+    return quiz.id
+
+
+def test_postgres_search_finds_words_of_new_quizzes(pg_session):
+    old = add_quiz(pg_session, 'История', 'петр')
+    refresh_documents(pg_session)
+    pg_session.commit()
+
+    # Словарь опечаток собран до появления новой викторины
+    service = QuizSearchService('postgres', refresh_delay=0)
+    service._vocabulary.bulk_load({term: 1 for term in document_terms(pg_session, [old])})
+    service.built_at = time.monotonic()
+
+    new = add_quiz(pg_session, 'Основы Python', 'кортеж')
+    service._dirty.add(new)
+    results, total = service.search(pg_session, 'python')
+    assert [item['id'] for item in results] == [new] and total == 1
+    results, _ = service.search(pg_session, 'pyhton кортеж')
+    assert [item['id'] for item in results] == [new]
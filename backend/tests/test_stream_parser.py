@@ -0,0 +1,108 @@
+"""
+Потоковая генерация: вопросы разбираются по мере поступления ответа LLM,
+испорченные отбрасываются, а обрезанный ответ сохраняет готовые вопросы
+"""
+import json
+from uuid import uuid4
+import pytest
+from quiz.llm import FakeLLMClient, set_llm_client
+from quiz.stream_parser import QuizStreamParser, loads_lenient, parse_quiz_stream
+
+GOOD = '{"type": "single", "question": "Столица Франции?", "options": ["Париж", "Лион"], "correct": [0]}'
+TEXT = '{"type": "text", "question": "Назовите столицу Италии", "correct": "Рим"}'
+BROKEN = '{"type": "single", "question": "Без вариантов", "options": ["Один"], "correct": [0]}'
+RESPONSE = f'Вот викторина:\n```json\n{{"quizTitle": "Столицы \\"мира\\"", "questions": [{GOOD}, {BROKEN}, {TEXT}]}}\n```'
+
+
+def pieces(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize('size', [1, 7, 1000])
+def test_questions_are_emitted_as_they_close(size):
+    parser = QuizStreamParser()
+    emitted = []
+    for piece in pieces(RESPONSE, size):
+        emitted.append([q['question'] for q in parser.feed(piece)])
+    parser.close()
+
+    assert [q for batch in emitted for q in batch] == ['Столица Франции?', 'Назовите столицу Италии']
+    if size == 1:
+        # Вопрос отдается сразу после своей закрывающей скобки, не дожидаясь конца ответа
+        closed_at = RESPONSE.index(GOOD) + len(GOOD) - 1
+        assert emitted[closed_at] == ['Столица Франции?']
+    assert parser.title == 'Столицы "мира"'
+    assert parser.accepted == 2
+    assert parser.rejected == ['нужно не меньше двух вариантов ответа']
+    assert not parser.truncated
+
+
+def test_truncated_response_keeps_closed_questions():
+    parser, questions = parse_quiz_stream(pieces(RESPONSE[:RESPONSE.index(TEXT) + 20], 5))
+
+    assert [q['question'] for q in questions] == ['Столица Франции?']
+    assert parser.truncated
+
+
+def test_broken_question_does_not_stop_parsing():
+    garbage = '{"type": "single", "question": "Сломан", "options": ["a", "b"], "correct": [0], "points": }'
+    parser, questions = parse_quiz_stream([f'{{"quizTitle": "T", "questions": [{garbage}, {GOOD}]}}'])
+
+    assert [q['question'] for q in questions] == ['Столица Франции?']
+    assert len(parser.rejected) == 1 and parser.rejected[0].startswith('некорректный JSON')
+
+
+def test_loads_lenient_repairs_common_mistakes():
+    assert loads_lenient('```json\n{"a": [1, 2,],}\n```') == {'a': [1, 2]}
+    assert loads_lenient('{"a": 1\n"b": "он сказал "да""}') == {'a': 1, 'b': 'он сказал "да"'}
+    with pytest.raises(ValueError):
+        loads_lenient('{"a": ')
+
+
+def events(response) -> list:
+    result = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        result.append((lines['event'], json.loads(lines['data'])))
+    return result
+
+
+def generate_stream(client, user, category, llm, question_count: int = 5) -> list:
+    set_llm_client(llm)
+    try:
+        response = client.post('/api/quiz/generate-quiz/stream', json={
+            'text': f'Текст {uuid4().hex}', 'category_id': category, 'question_count': question_count
+        }, headers=user['headers'])
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        return events(response)
+    finally:
+        set_llm_client(None)
+
+
+def test_stream_endpoint_saves_questions_as_they_arrive(client, user, category):
+    result = generate_stream(client, user, category, FakeLLMClient(response=RESPONSE, piece_size=9))
+
+    assert [name for name, _ in result] == ['question', 'question', 'done']
+    done = result[-1][1]
+    assert done['questions'] == 2 and done['title'] == 'Столицы "мира"' and not done['truncated']
+    assert done['rejected'] == ['нужно не меньше двух вариантов ответа']
+    quiz = client.get(f"/api/quiz/quizes/{done['quiz_id']}", headers=user['headers']).json
+    assert [q['question'] for q in quiz['questions']] == ['Столица Франции?', 'Назовите столицу Италии']
+
+
+def test_stream_endpoint_stops_at_question_count(client, user, category):
+    result = generate_stream(client, user, category, FakeLLMClient(piece_size=4), question_count=1)
+
+    assert [name for name, _ in result] == ['question', 'done']
+    assert result[-1][1]['questions'] == 1
+
+
+def test_stream_endpoint_reports_truncated_response(client, user, category):
+    llm = FakeLLMClient(response=RESPONSE[:RESPONSE.index(TEXT) + 20], piece_size=9)
+    result = generate_stream(client, user, category, llm)
+
+    done = result[-1][1]
+    assert done['questions'] == 1 and done['truncated']
+    quiz = client.get(f"/api/quiz/quizes/{done['quiz_id']}", headers=user['headers']).json
+    assert [q['question'] for q in quiz['questions']] == ['Столица Франции?']
@@ -0,0 +1,82 @@
+"""
+Импорт и выгрузка викторин в NDJSON: ошибка в строке не отменяет остальные,
+выгруженные викторины импортируются обратно без изменений
+"""
+import json
+
+
+def ndjson(*lines) -> bytes:
+    return b'\n'.join(line if isinstance(line, bytes) else json.dumps(line).encode() for line in lines) + b'\n'
+
+
+def quiz_line(category: str, title: str) -> dict:
+    return {'title': title, 'category_id': category, 'questions': [{
+        'question_type': 'SINGLE', 'question': 'Вопрос?', 'points': 5,
+        'options': [{'name': 'да', 'is_correct': True}, {'name': 'нет'}]
+    }]}
+
+
+def content(quiz: dict) -> tuple:
+    """
+    Содержимое викторины без ID
+    """
+    return quiz['title'], [
+        (question['question'], question['points'], [(option['name'], option['is_correct']) for option in question['options']])
+        for question in quiz['questions']
+    ]
+
+
+def import_lines(client, user, body: bytes, batch_size: int = 2) -> dict:
+    response = client.post(f'/api/quiz/import?batch_size={batch_size}', data=body,
+                           content_type='application/x-ndjson', headers=user['headers'])
+    assert response.status_code == 200, response.data
+    return response.json
+
+
+def export_lines(client, user) -> dict:
+    response = client.get('/api/quiz/export?batch_size=2', headers=user['headers'])
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    quizzes = [json.loads(line) for line in response.data.splitlines()]
+    return {quiz['id']: quiz for quiz in quizzes}
+
+
+def test_import_reports_each_line(client, user, category):
+    body = ndjson(
+        quiz_line(category, 'Первая'),
+        b'',
+        b'{"title": ',
+        {'category_id': category},
+        quiz_line('00000000-0000-7000-8000-000000000000', 'Без категории'),
+        quiz_line(category, 'Вторая'),
+    )
+
+    result = import_lines(client, user, body)
+
+    statuses = [(item['line'], item['status']) for item in result['results']]
+    assert statuses == [(1, 'created'), (3, 'error'), (4, 'error'), (5, 'error'), (6, 'created')]
+    assert result['created'] == 2 and result['failed'] == 3
+    assert result['results'][2]['error'] == "Не указано название викторины"
+    assert result['results'][3]['error'] == "Указанная категория не существует"
+
+
+def test_export_round_trip(client, user, category):
+    created = import_lines(client, user, ndjson(*(quiz_line(category, f'Выгрузка {i}') for i in range(3))))
+    ids = [item['id'] for item in created['results']]
+
+    exported = export_lines(client, user)
+    assert set(ids) <= set(exported)
+    assert [exported[quiz_id]['title'] for quiz_id in ids] == ['Выгрузка 0', 'Выгрузка 1', 'Выгрузка 2']
+
+    copies = import_lines(client, user, ndjson(*(exported[quiz_id] for quiz_id in ids)))
+    assert copies['created'] == 3
+    for original_id, item in zip(ids, copies['results']):
+        copy = client.get(f"/api/quiz/quizes/{item['id']}", headers=user['headers']).json
+        assert content(copy) == content(exported[original_id])
+
+
+def test_deleted_quizzes_are_not_exported(client, user, make_quiz):
+    quiz = make_quiz(1)
+    assert client.delete(f"/api/quiz/quizes/{quiz['id']}", headers=user['headers']).status_code == 200
+
+    assert quiz['id'] not in export_lines(client, user)
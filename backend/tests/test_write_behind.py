@@ -0,0 +1,115 @@
+"""
+Отправки через журнал (SUBMISSION_WRITE_BEHIND): испорченные ответы отклоняются
+до записи в журнал, а не остаются в нем до исчерпания попыток сохранения;
+повтор с тем же ключом не засчитывается дважды, журнал переживает перезапуск,
+а запись, которую не удается сохранить, не блокирует остальные
+"""
+import json
+import sqlite3
+from uuid import uuid4
+import pytest
+from config import Config
+from models import SessionLocal, TestResult as ResultRow
+from quiz import submissions
+from quiz.submissions import SubmissionJournal, SubmissionWriter, get_submission_writer
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    monkeypatch.setattr(Config, 'SUBMISSION_WRITE_BEHIND', True)
+    return get_submission_writer()
+
+
+@pytest.fixture
+def stopped_writer(monkeypatch, tmp_path):
+    """
+    Журнал во временном файле без фонового потока: записи сохраняются только явным flush
+    """
+    monkeypatch.setattr(Config, 'SUBMISSION_WRITE_BEHIND', True)
+    writer = SubmissionWriter(SubmissionJournal(str(tmp_path / 'journal.db')), max_attempts=1)
+    monkeypatch.setattr(writer, 'start', lambda: None)
+    monkeypatch.setattr(submissions, '_writer', writer)
+    return writer
+
+
+def submit(client, user, quiz, answers, **headers):
+    return client.post('/api/quiz/submit-answers', json={'quiz_id': quiz['id'], 'answers': answers},
+                       headers={**user['headers'], **headers})
+
+
+def stored_results(user_id: str) -> list:
+    session = SessionLocal()
+    try:
+        return [result_id for result_id, in session.query(ResultRow.id).filter(ResultRow.user_id == user_id)]
+    finally:
+        session.close()
+
+
+def test_malformed_answers_are_not_journaled(client, user, make_quiz, writer):
+    quiz = make_quiz(1)
+    question_id = quiz['questions'][0]['id']
+    before = writer.journal.stats()
+
+    for answers in [[{'question_id': question_id, 'option_ids': [1]}],
+                    [{'question_id': question_id, 'option_ids': ['a,b']}],
+                    [{'question_id': question_id, 'text_answer': {'x': 1}}]]:
+        assert submit(client, user, quiz, answers).status_code == 400
+
+    assert writer.journal.stats() == before
+
+
+def test_valid_submission_is_stored_after_flush(client, user, make_quiz, writer):
+    quiz = make_quiz(2)
+
+    response = submit(client, user, quiz, quiz['answers'])
+    assert response.status_code == 202, response.data
+    writer.flush()
+
+    status = client.get(f"/api/quiz/submissions/{response.json['test_result_id']}", headers=user['headers'])
+    assert status.json['status'] == 'stored'
+    assert status.json['total_score'] == 20
+    assert writer.journal.stats()['failed'] == 0
+
+
+@pytest.mark.parametrize('write_behind', [False, True], ids=['sync', 'write-behind'])
+def test_retry_with_same_key_is_counted_once(monkeypatch, client, user, make_quiz, write_behind):
+    monkeypatch.setattr(Config, 'SUBMISSION_WRITE_BEHIND', write_behind)
+    quiz = make_quiz(1)
+    key = uuid4().hex
+
+    first = submit(client, user, quiz, quiz['answers'], **{'Idempotency-Key': key})
+    retry = submit(client, user, quiz, quiz['answers'], **{'Idempotency-Key': key})
+    assert first.status_code == (202 if write_behind else 201)
+    assert retry.status_code == 200
+    assert retry.json['test_result_id'] == first.json['test_result_id']
+    if write_behind:
+        get_submission_writer().flush()
+
+    assert stored_results(user['id']) == [first.json['test_result_id']]
+
+
+def test_journal_survives_restart(client, user, make_quiz, stopped_writer):
+    quiz = make_quiz(1)
+    accepted = [submit(client, user, quiz, quiz['answers']).json['test_result_id'] for _ in range(2)]
+    assert stopped_writer.journal.stats()['queued'] == 2 and stored_results(user['id']) == []
+
+    # Новый процесс открывает тот же файл журнала
+    restarted = SubmissionWriter(SubmissionJournal(stopped_writer.journal.path))
+    assert restarted.flush() == 2
+    assert sorted(stored_results(user['id'])) == sorted(accepted)
+    assert stopped_writer.journal.get(accepted[0])['status'] == 'stored'
+
+
+def test_failing_submission_does_not_block_batch(client, user, make_quiz, stopped_writer):
+    quiz = make_quiz(1)
+    accepted = submit(client, user, quiz, quiz['answers']).json['test_result_id']
+    with sqlite3.connect(stopped_writer.journal.path) as connection:
+        broken = json.loads(connection.execute('SELECT payload FROM submission').fetchone()[0])
+    broken.update(test_result_id=str(uuid4()), idempotency_key=uuid4().hex, completed_at='не дата')
+    stopped_writer.journal.append(broken)
+
+    assert stopped_writer.flush() == 1
+    assert stored_results(user['id']) == [accepted]
+    assert stopped_writer.journal.get(broken['test_result_id'])['status'] == 'failed'
+    status = client.get(f"/api/quiz/submissions/{broken['test_result_id']}", headers=user['headers']).json
+    assert status['status'] == 'failed'
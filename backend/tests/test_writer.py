@@ -0,0 +1,62 @@
+"""
+Создание викторины: все строки строятся в памяти и вставляются тремя
+многострочными INSERT независимо от числа вопросов и вариантов
+"""
+from models import SessionLocal
+from quiz.loader import load_quiz_tree, serialize_quiz
+from quiz.writer import build_quiz_rows, insert_quiz_batch, validate_quiz_payload
+
+
+def quiz_data(category: str, questions_count: int) -> dict:
+    return {'title': 'Пакетная вставка', 'category_id': category, 'questions': [{
+        'question_type': 'MULTIPLE', 'question': f'Вопрос {i}', 'points': i,
+        'options': [{'name': 'a', 'is_correct': True}, {'name': 'b', 'is_correct': True}, {'name': 'c'}]
+    } for i in range(questions_count)]}
+
+
+def inserts(statements: list) -> list:
+    return [statement for statement in statements if statement.lstrip().upper().startswith('INSERT')]
+
+
+def test_insert_count_does_not_grow_with_questions(client, user, category, count_queries):
+    counts = []
+    for questions_count in (2, 25):
+        with count_queries() as statements:
+            response = client.post('/api/quiz/quizes', json=quiz_data(category, questions_count),
+                                   headers=user['headers'])
+        assert response.status_code == 201, response.data
+        counts.append(len(inserts(statements)))
+
+    assert counts == [3, 3]
+    quiz = client.get(f"/api/quiz/quizes/{response.json['id']}", headers=user['headers']).json
+    assert [question['points'] for question in quiz['questions']] == list(range(25))
+    assert all([option['is_correct'] for option in question['options']] == [True, True, False]
+               for question in quiz['questions'])
+
+
+def test_batch_of_quizzes_uses_same_inserts(category, count_queries):
+    batch = [build_quiz_rows(quiz_data(category, 3)) for _ in range(4)]
+    session = SessionLocal()
+    try:
+        with count_queries() as statements:
+            insert_quiz_batch(session, batch)
+        session.commit()
+        assert len(inserts(statements)) == 3
+        for rows in batch:
+            quiz = serialize_quiz(load_quiz_tree(session, rows.quiz['id']))
+            assert [question['id'] for question in quiz['questions']] == [row['id'] for row in rows.questions]
+    finally:
+        session.close()
+
+
+def test_invalid_payloads(category):
+    assert validate_quiz_payload(quiz_data(category, 1)) is None
+    assert validate_quiz_payload([]) == "Ожидается объект викторины"
+    assert validate_quiz_payload({'category_id': category}) == "Не указано название викторины"
+    assert validate_quiz_payload({'title': 'x' * 57, 'category_id': category}) == "Слишком длинное название викторины"
+    data = quiz_data(category, 1)
+    data['questions'][0]['question_type'] = 'ESSAY'
+    assert validate_quiz_payload(data) == "Вопрос 0: неизвестный тип вопроса"
+    data = quiz_data(category, 1)
+    data['questions'][0]['options'].append({'name': ''})
+    assert validate_quiz_payload(data) == "Вопрос 0: у варианта ответа не указано название"